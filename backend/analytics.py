@@ -0,0 +1,430 @@
+import math
+import logging
+import threading
+import collections
+from flask import Blueprint, request, jsonify
+from sqlalchemy import func, select
+from models import db, User, Course, Enrollment, Assignment, Grade
+from auth import jwt_required, get_jwt_identity
+from students import get_letter_grade
+from tenancy import current_tenant
+
+# NumPy is optional; without it the same statistics are computed in pure Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+analytics_bp = Blueprint('analytics', __name__)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Same cutoffs as students.get_letter_grade, lowest first
+LETTER_CUTOFFS = [(60, 'D'), (70, 'C'), (80, 'B'), (90, 'A')]
+LETTERS = ['A', 'B', 'C', 'D', 'F']
+PERCENTILES = (10, 25, 50, 75, 90)
+# Percentage histogram bins: [0, 10), [10, 20), ... [90, 100+]
+BINS = 10
+CACHE_SIZE = 2048
+
+
+# Grade data for a set of courses, three queries regardless of course count
+def load_columns(course_ids):
+    assignments = db.session.query(
+        Assignment.id, Assignment.course_id, Assignment.title, Assignment.points, Assignment.weight
+    ).filter(Assignment.course_id.in_(course_ids)).order_by(Assignment.id).all()
+
+    grades = db.session.query(Grade.student_id, Grade.assignment_id, Grade.score) \
+        .join(Assignment, Assignment.id == Grade.assignment_id) \
+        .filter(Assignment.course_id.in_(course_ids)) \
+        .order_by(Grade.assignment_id).all()  # sum in assignment order, like get_student_grades
+
+    enrollments = db.session.query(Enrollment.student_id, Enrollment.course_id, Enrollment.grade) \
+        .filter(Enrollment.course_id.in_(course_ids), Enrollment.status != 'dropped') \
+        .order_by(Enrollment.id).all()
+
+    return assignments, grades, enrollments
+
+
+def percentile(sorted_values, q):
+    # Linear interpolation between closest ranks, as numpy.percentile does
+    if not sorted_values:
+        return None
+    h = (len(sorted_values) - 1) * q / 100.0
+    lower = math.floor(h)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (h - lower)
+
+
+def _round(value, digits=2):
+    return None if value is None or value != value else round(float(value), digits)
+
+
+def _summary(course_id, percentages, earned, letters, assignment_rows):
+    # percentages: sorted list of course percentages (students with a computable grade).
+    # fsum, so the result does not depend on the order each path lists students in
+    count = len(percentages)
+    mean = math.fsum(percentages) / count if count else None
+    std = math.sqrt(math.fsum((p - mean) ** 2 for p in percentages) / count) if count else None
+
+    histogram = [0] * BINS
+    for p in percentages:
+        histogram[min(int(p // (100 / BINS)), BINS - 1)] += 1
+
+    graded_letters = sum(letters.values())
+    return {
+        "course_id": course_id,
+        "students": len(earned),
+        "graded_students": count,
+        "average_percentage": _round(mean),
+        "average_weighted_score": _round(math.fsum(earned) / len(earned)) if earned else None,
+        "std_percentage": _round(std),
+        "min_percentage": _round(percentages[0]) if count else None,
+        "max_percentage": _round(percentages[-1]) if count else None,
+        "percentiles": {f"p{q}": _round(percentile(percentages, q)) for q in PERCENTILES},
+        "pass_rate": _round(1 - letters.get('F', 0) / graded_letters, 4) if graded_letters else None,
+        "letter_grades": {letter: letters.get(letter, 0) for letter in sorted(set(LETTERS) | set(letters))},
+        "distribution": histogram,
+        "assignments": assignment_rows
+    }
+
+
+# Pure-Python path: one pass over enrollments, grades and assignments
+def _compute_python(course_ids, assignments, grades, enrollments):
+    totals = collections.defaultdict(float)
+    assignment_info = {}
+    for assignment_id, course_id, title, points, weight in assignments:
+        totals[course_id] += points * weight
+        assignment_info[assignment_id] = (course_id, title, points, weight)
+
+    earned = {}
+    overrides = {}
+    for student_id, course_id, grade in enrollments:
+        earned[(course_id, student_id)] = 0.0
+        overrides[(course_id, student_id)] = grade
+
+    graded = collections.defaultdict(list)  # assignment_id -> [score / points]
+    for student_id, assignment_id, score in grades:
+        course_id, title, points, weight = assignment_info[assignment_id]
+        key = (course_id, student_id)
+        if key not in earned:
+            continue  # graded but no longer enrolled
+        earned[key] += score * weight
+        graded[assignment_id].append(score / points if points else 0.0)
+
+    per_course = {course_id: ([], [], collections.Counter()) for course_id in course_ids}
+    for (course_id, student_id), points_earned in earned.items():
+        percentages, earned_list, letters = per_course[course_id]
+        earned_list.append(points_earned)
+        letter = None
+        if totals[course_id] > 0:
+            percentage = points_earned / totals[course_id] * 100
+            percentages.append(percentage)
+            letter = get_letter_grade(percentage)
+        letter = overrides[(course_id, student_id)] or letter
+        if letter:
+            letters[letter] += 1
+
+    enrolled = collections.Counter(course_id for _, course_id, _ in enrollments)
+    assignment_rows = collections.defaultdict(list)
+    for assignment_id, (course_id, title, points, weight) in assignment_info.items():
+        ratios = graded.get(assignment_id, [])
+        mean = sum(ratios) / len(ratios) if ratios else None
+        std = math.sqrt(sum((r - mean) ** 2 for r in ratios) / len(ratios)) if ratios else None
+        assignment_rows[course_id].append(_assignment_row(
+            assignment_id, title, points, weight, len(ratios), enrolled[course_id], mean, std))
+
+    results = {}
+    for course_id in course_ids:
+        percentages, earned_list, letters = per_course[course_id]
+        percentages.sort()
+        results[course_id] = (_summary(course_id, percentages, earned_list, letters, assignment_rows[course_id]),
+                              percentages)
+    return results
+
+
+# NumPy path: every per-student and per-assignment aggregate is a bincount
+# over integer group indexes, so the Python-level work is per course, not per grade
+def _compute_numpy(course_ids, assignments, grades, enrollments):
+    course_pos = {course_id: i for i, course_id in enumerate(course_ids)}
+    n_courses = len(course_ids)
+
+    a_ids = np.array([a[0] for a in assignments], dtype=np.int64)
+    a_course = np.array([course_pos[a[1]] for a in assignments], dtype=np.int64)
+    a_points = np.array([a[3] for a in assignments], dtype=np.float64)
+    a_weight = np.array([a[4] for a in assignments], dtype=np.float64)
+    totals = np.bincount(a_course, weights=a_points * a_weight, minlength=n_courses)
+
+    e_student = np.array([e[0] for e in enrollments], dtype=np.int64)
+    e_course = np.array([course_pos[e[1]] for e in enrollments], dtype=np.int64)
+    n_enrollments = len(enrollments)
+
+    g_student = np.array([g[0] for g in grades], dtype=np.int64)
+    g_assignment = np.array([g[1] for g in grades], dtype=np.int64)
+    g_score = np.array([g[2] for g in grades], dtype=np.float64)
+
+    # Match each grade to its assignment (ids are sorted) and enrollment
+    g_aidx = np.searchsorted(a_ids, g_assignment)
+    stride = int(max(e_student.max(initial=0), g_student.max(initial=0))) + 1
+    e_key = e_course * stride + e_student
+    e_order = np.argsort(e_key, kind='stable')
+    e_sorted = e_key[e_order]
+    g_key = a_course[g_aidx] * stride + g_student
+    if n_enrollments:
+        pos = np.minimum(np.searchsorted(e_sorted, g_key), n_enrollments - 1)
+        matched = e_sorted[pos] == g_key  # graded but no longer enrolled otherwise
+        g_eidx = e_order[pos[matched]]
+    else:
+        matched = np.zeros(len(grades), dtype=bool)
+        g_eidx = np.zeros(0, dtype=np.int64)
+    g_aidx = g_aidx[matched]
+    g_score = g_score[matched]
+
+    earned = np.bincount(g_eidx, weights=g_score * a_weight[g_aidx], minlength=n_enrollments)
+    e_total = totals[e_course]
+    has_total = e_total > 0
+    percentages = np.divide(earned, e_total, out=np.zeros(n_enrollments), where=has_total) * 100
+
+    # Letter codes: computed from the percentage, overridden by Enrollment.grade
+    letter_codes = {letter: i for i, letter in enumerate(LETTERS)}
+    cutoffs = np.array([cutoff for cutoff, _ in LETTER_CUTOFFS], dtype=np.float64)
+    band_codes = np.array([letter_codes[letter] for letter in ['F'] + [letter for _, letter in LETTER_CUTOFFS]])
+    codes = np.where(has_total, band_codes[np.searchsorted(cutoffs, percentages, side='right')], -1)
+    for i, (_, _, override) in enumerate(enrollments):
+        if override:
+            codes[i] = letter_codes.setdefault(override, len(letter_codes))
+    code_letters = {code: letter for letter, code in letter_codes.items()}
+    has_letter = codes >= 0
+    letter_counts = np.bincount(e_course[has_letter] * len(letter_codes) + codes[has_letter],
+                                minlength=n_courses * len(letter_codes)).reshape(n_courses, len(letter_codes))
+
+    # Assignment difficulty: graded count, mean and std of score / points
+    n_assignments = len(assignments)
+    ratios = np.divide(g_score, a_points[g_aidx], out=np.zeros(len(g_score)), where=a_points[g_aidx] > 0)
+    graded = np.bincount(g_aidx, minlength=n_assignments)
+    ratio_sum = np.bincount(g_aidx, weights=ratios, minlength=n_assignments)
+    ratio_sq = np.bincount(g_aidx, weights=ratios * ratios, minlength=n_assignments)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio_mean = ratio_sum / graded
+        ratio_std = np.sqrt(np.maximum(ratio_sq / graded - ratio_mean * ratio_mean, 0))
+    enrolled = np.bincount(e_course, minlength=n_courses)
+
+    assignment_rows = collections.defaultdict(list)
+    for i, (assignment_id, course_id, title, points, weight) in enumerate(assignments):
+        has_grades = graded[i] > 0
+        assignment_rows[course_id].append(_assignment_row(
+            assignment_id, title, points, weight, int(graded[i]), int(enrolled[a_course[i]]),
+            float(ratio_mean[i]) if has_grades else None, float(ratio_std[i]) if has_grades else None))
+
+    # Group students by course with one sort, then slice per course
+    order = np.lexsort((percentages, e_course))
+    bounds = np.searchsorted(e_course[order], np.arange(n_courses + 1))
+    results = {}
+    for c, course_id in enumerate(course_ids):
+        members = order[bounds[c]:bounds[c + 1]]
+        course_percentages = percentages[members][has_total[members]].tolist()
+        letters = {code_letters[k]: int(n) for k, n in enumerate(letter_counts[c]) if n}
+        results[course_id] = (_summary(course_id, course_percentages, earned[members].tolist(), letters,
+                                       assignment_rows[course_id]),
+                              course_percentages)
+    return results
+
+
+def _assignment_row(assignment_id, title, points, weight, graded, enrolled, mean, std):
+    return {
+        "assignment_id": assignment_id,
+        "title": title,
+        "points": points,
+        "weight": weight,
+        "graded": graded,
+        "completion_rate": _round(graded / enrolled, 4) if enrolled else None,
+        "mean_percentage": _round(mean * 100) if mean is not None else None,
+        "std_percentage": _round(std * 100) if std is not None else None
+    }
+
+
+def compute(course_ids, use_numpy=None):
+    if not course_ids:
+        return {}
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    assignments, grades, enrollments = load_columns(course_ids)
+    compute_fn = _compute_numpy if use_numpy else _compute_python
+    return compute_fn(course_ids, assignments, grades, enrollments)
+
+
+# Cheap per-course change marker: counts and latest timestamps of the rows
+# the statistics depend on, for all requested courses in one query. Any
+# grade, final grade, enrollment or assignment change (from any worker)
+# changes it, which invalidates the cached statistics.
+def fingerprints(course_ids):
+    def scalar(column, *criteria):
+        return select(column).where(*criteria).correlate(Course).scalar_subquery()
+
+    rows = db.session.query(
+        Course.id, Course.term, Course.year,
+        scalar(func.count(Enrollment.id), Enrollment.course_id == Course.id),
+        scalar(func.max(Enrollment.updated_at), Enrollment.course_id == Course.id),
+        scalar(func.count(Assignment.id), Assignment.course_id == Course.id),
+        scalar(func.max(Assignment.updated_at), Assignment.course_id == Course.id),
+        select(func.count(Grade.id)).join(Assignment, Assignment.id == Grade.assignment_id)
+        .where(Assignment.course_id == Course.id).correlate(Course).scalar_subquery(),
+        select(func.max(Grade.graded_at)).join(Assignment, Assignment.id == Grade.assignment_id)
+        .where(Assignment.course_id == Course.id).correlate(Course).scalar_subquery(),
+    ).filter(Course.id.in_(course_ids)).all()
+    tenant = current_tenant()
+    return {row[0]: ((tenant, row[0], row[1], row[2]), tuple(row[3:])) for row in rows}
+
+
+# LRU of (tenant, course_id, term, year) -> (fingerprint, summary, sorted percentages)
+class StatsCache:
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, fingerprint):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != fingerprint:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, fingerprint, summary, percentages):
+        with self._lock:
+            self._entries[key] = (fingerprint, summary, percentages)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+cache = StatsCache()
+
+
+# {course_id: (summary, sorted percentages)}, recomputing only stale courses
+def course_statistics(course_ids):
+    marks = fingerprints(course_ids)
+    results = {}
+    stale = []
+    for course_id, (key, fingerprint) in marks.items():
+        cached = cache.get(key, fingerprint)
+        if cached is None:
+            stale.append(course_id)
+        else:
+            results[course_id] = cached
+
+    for course_id, (summary, percentages) in compute(stale).items():
+        key, fingerprint = marks[course_id]
+        cache.put(key, fingerprint, summary, percentages)
+        results[course_id] = (summary, percentages)
+    return results
+
+
+# Term-wide aggregate built from the cached per-course results
+def combine(course_summaries):
+    percentages = sorted(p for _, course_percentages in course_summaries for p in course_percentages)
+    letters = collections.Counter()
+    earned_total = 0.0
+    students = 0
+    for summary, _ in course_summaries:
+        letters.update({k: v for k, v in summary["letter_grades"].items() if v})
+        if summary["average_weighted_score"] is not None:
+            earned_total += summary["average_weighted_score"] * summary["students"]
+        students += summary["students"]
+
+    combined = _summary(None, percentages, [], letters, [])
+    combined.pop("course_id")
+    combined.pop("assignments")
+    combined["students"] = students
+    combined["average_weighted_score"] = _round(earned_total / students) if students else None
+    combined["courses"] = len(course_summaries)
+    return combined
+
+
+# A term's courses (optionally one department's), with their statistics
+def term_statistics(term, year, department=None):
+    query = db.session.query(Course.id, Course.code, Course.title, Course.department) \
+        .filter(Course.term == term, Course.year == year)
+    if department:
+        query = query.filter(Course.department == department)
+    courses = query.order_by(Course.id).all()
+    return courses, course_statistics([c.id for c in courses])
+
+
+def _can_view_department(user, department):
+    return user.role == 'admin' or (user.role == 'professor' and user.department == department)
+
+
+@analytics_bp.route('/courses/<int:course_id>', methods=['GET'])
+@jwt_required
+def get_course_analytics(course_id):
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({"error": "Course not found"}), 404
+
+    # Instructors, their department's professors and admins
+    if not (course.instructor_id == user.id or _can_view_department(user, course.department)):
+        return jsonify({"error": "Permission denied"}), 403
+
+    summary, _ = course_statistics([course.id])[course.id]
+    return jsonify({
+        "course": {
+            "id": course.id,
+            "code": course.code,
+            "title": course.title,
+            "term": course.term,
+            "year": course.year,
+            "department": course.department
+        },
+        **summary
+    })
+
+
+# Per-course statistics plus a combined summary for a term:
+# /api/analytics/terms?term=Fall&year=2024[&department=Physics]
+@analytics_bp.route('/terms', methods=['GET'])
+@jwt_required
+def get_term_analytics():
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+
+    term = request.args.get('term')
+    year = request.args.get('year', type=int)
+    department = request.args.get('department')
+    if not term or year is None:
+        return jsonify({"error": "term and year are required"}), 400
+
+    # Professors may only look at their own department
+    if user.role != 'admin':
+        if user.role != 'professor' or not department or not _can_view_department(user, department):
+            return jsonify({"error": "Permission denied"}), 403
+
+    courses, statistics = term_statistics(term, year, department)
+    summaries = [statistics[c.id] for c in courses if c.id in statistics]
+
+    course_results = []
+    for course in courses:
+        summary, _ = statistics[course.id]
+        entry = {"code": course.code, "title": course.title, "department": course.department}
+        entry.update({k: v for k, v in summary.items() if k != 'assignments'})
+        course_results.append(entry)
+
+    return jsonify({
+        "term": term,
+        "year": year,
+        "department": department,
+        "summary": combine(summaries),
+        "courses": course_results
+    })
@@ -1,61 +1,162 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, current_app, request, jsonify, render_template
 from flask_cors import CORS
 import os
+import importlib
 from models import db, User, Course, Enrollment, Assignment, Grade
+from database import init_database
+from tenancy import tenants_bp, init_tenancy, create_all
+from compression import init_compression
+from events import init_events
+from uploads import init_uploads
+from jobs import jobs_bp, init_jobs
+from idempotency import init_idempotency
 from auth import auth_bp, jwt_required, get_jwt_identity, init_jwt
 from courses import courses_bp
 from students import students_bp
 from professors import professors_bp
-from smart_contracts import smart_contracts_bp
+import chain_guard
 import logging
 import datetime
 
-app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}})  # Enable CORS for all API routes
-
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# App configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///university.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'dev-secret-key')
-app.config['ALGORAND_API_KEY'] = os.environ.get('ALGORAND_API_KEY')
-app.config['ALGORAND_APP_ID'] = os.environ.get('ALGORAND_APP_ID')
+# Optional features: name -> (module, blueprint, url prefix). A feature's
+# module is only imported when it is enabled in FEATURES, so a deployment
+# without the blockchain never loads algosdk.
+FEATURE_BLUEPRINTS = {
+    'blockchain': ('smart_contracts', 'smart_contracts_bp', '/api/blockchain'),
+    'notifications': ('notifications', 'notifications_bp', '/api/notifications'),
+    'analytics': ('analytics', 'analytics_bp', '/api/analytics'),
+}
+
 
-# Initialize extensions
-db.init_app(app)
-init_jwt(app)  # Initialize JWT
+# Build the application. Nothing here touches the database, so a pre-forking
+# server can import it once in the master (gunicorn --preload) and share the
+# loaded code with every worker; see wsgi.py and gunicorn.conf.py. config
+# overrides the settings read from the environment.
+def create_app(config=None):
+    app = Flask(__name__)
+    CORS(app, resources={r"/api/*": {"origins": "*"}})  # Enable CORS for all API routes
+    
+    # App configuration
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///university.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['DB_ENGINE_PROFILE'] = os.environ.get('DB_ENGINE_PROFILE', 'auto')  # 'auto', 'sqlite', 'server' or 'default'
+    app.config['DATABASE_REPLICA_URLS'] = [url for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url]
+    app.config['REPLICA_STALENESS_SECONDS'] = float(os.environ.get('REPLICA_STALENESS_SECONDS', 5))
+    app.config['TENANT_DATABASE_URLS'] = dict(item.split('=', 1) for item in os.environ.get('TENANT_DATABASE_URLS', '').split(',') if item)  # tenant=url per institution
+    app.config['TENANT_HOSTS'] = dict(item.split('=', 1) for item in os.environ.get('TENANT_HOSTS', '').split(',') if item)  # host=tenant, for requests without a token
+    app.config['TENANT_CLAIM'] = os.environ.get('TENANT_CLAIM', 'tenant')  # JWT claim naming the token's institution
+    app.config['TENANT_DEFAULT_NAME'] = os.environ.get('TENANT_DEFAULT_NAME', 'default')  # how reports name DATABASE_URL's institution
+    app.config['TENANT_FANOUT_WORKERS'] = int(os.environ.get('TENANT_FANOUT_WORKERS', 8))  # databases read at once by cross-tenant reports
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'dev-secret-key')
+    app.config['ALGORAND_API_KEY'] = os.environ.get('ALGORAND_API_KEY')
+    app.config['ALGORAND_APP_ID'] = os.environ.get('ALGORAND_APP_ID')
+    app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))  # gzip 1-9
+    app.config['COMPRESS_BR_LEVEL'] = int(os.environ.get('COMPRESS_BR_LEVEL', 4))  # brotli 0-11
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes
+    app.config['COMPRESS_STREAMS'] = os.environ.get('COMPRESS_STREAMS', 'false').lower() == 'true'
+    app.config['EVENT_BUS'] = os.environ.get('EVENT_BUS', 'local')  # 'local' (one process) or 'database' (all workers)
+    app.config['EVENT_POLL_INTERVAL'] = float(os.environ.get('EVENT_POLL_INTERVAL', 0.5))  # seconds
+    app.config['EVENT_RETENTION_SECONDS'] = int(os.environ.get('EVENT_RETENTION_SECONDS', 3600))
+    app.config['EVENT_REORDER_SECONDS'] = float(os.environ.get('EVENT_REORDER_SECONDS', 5))  # wait for ids that commit late
+    app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join(app.instance_path, 'uploads'))
+    app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_BYTES', 100 * 1024 * 1024))
+    app.config['UPLOAD_CHUNK_SIZE'] = int(os.environ.get('UPLOAD_CHUNK_SIZE', 64 * 1024))  # bytes read per step
+    app.config['UPLOAD_SESSION_TTL'] = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))  # seconds
+    app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'  # let nginx/Apache send files
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))  # threads per process; 0 leaves jobs to `python -m jobs`
+    app.config['JOB_POLL_INTERVAL'] = float(os.environ.get('JOB_POLL_INTERVAL', 1.0))  # seconds
+    app.config['JOB_LEASE_SECONDS'] = int(os.environ.get('JOB_LEASE_SECONDS', 300))  # a running job not renewed for this long is retried
+    app.config['JOB_MAX_ATTEMPTS'] = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+    app.config['JOB_RETRY_BASE_SECONDS'] = float(os.environ.get('JOB_RETRY_BASE_SECONDS', 2.0))
+    app.config['JOB_RETRY_MAX_SECONDS'] = float(os.environ.get('JOB_RETRY_MAX_SECONDS', 300.0))
+    app.config['IDEMPOTENCY_KEY_TTL'] = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 24 * 3600))  # seconds a stored response is replayed
+    app.config['IDEMPOTENCY_LOCK_TIMEOUT'] = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 120))  # seconds before an unfinished request counts as dead; keep above the worker timeout
+    app.config['ASGI_THREADS'] = int(os.environ.get('ASGI_THREADS', 16))  # threads per ASGI worker for the Flask routes
+    app.config['ASYNC_DATABASE_URL'] = os.environ.get('ASYNC_DATABASE_URL')  # default: DATABASE_URL with its async driver
+    app.config['FEATURES'] = [f for f in os.environ.get('FEATURES', ','.join(FEATURE_BLUEPRINTS)).split(',') if f]  # optional features to enable
+    app.config.update(config or {})
+    
+    unknown = set(app.config['FEATURES']) - set(FEATURE_BLUEPRINTS)
+    if unknown:
+        raise ValueError(f"Unknown FEATURES {sorted(unknown)}, expected some of {sorted(FEATURE_BLUEPRINTS)}")
+    
+    # Initialize extensions
+    init_database(app)
+    init_tenancy(app)
+    init_jwt(app)  # Initialize JWT
+    init_compression(app)
+    init_events(app)
+    init_uploads(app)
+    init_jobs(app)
+    init_idempotency(app)
+    
+    # Register blueprints
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(courses_bp, url_prefix='/api/courses')
+    app.register_blueprint(students_bp, url_prefix='/api/students')
+    app.register_blueprint(professors_bp, url_prefix='/api/professors')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    app.register_blueprint(tenants_bp, url_prefix='/api/tenants')
+    for feature in app.config['FEATURES']:
+        module, blueprint, url_prefix = FEATURE_BLUEPRINTS[feature]
+        app.register_blueprint(getattr(importlib.import_module(module), blueprint), url_prefix=url_prefix)
+    
+    app.add_url_rule('/', view_func=index)
+    app.add_url_rule('/api/health', view_func=health_check, methods=['GET'])
+    app.add_url_rule('/api/profile', view_func=get_profile, methods=['GET'])
+    app.add_url_rule('/api/dashboard', view_func=get_dashboard_data, methods=['GET'])
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(500, server_error)
+    
+    # flask --app wsgi init-db: create missing tables once, before starting workers
+    @app.cli.command('init-db')
+    def init_db():
+        create_all(app)
+        logger.info("Database tables created")
+    
+    return app
 
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(courses_bp, url_prefix='/api/courses')
-app.register_blueprint(students_bp, url_prefix='/api/students')
-app.register_blueprint(professors_bp, url_prefix='/api/professors')
-app.register_blueprint(smart_contracts_bp, url_prefix='/api/blockchain')
 
 # Root route to test if the server is running
-@app.route('/')
 def index():
+    endpoints = {
+        "health": "/api/health",
+        "auth": "/api/auth/*",
+        "courses": "/api/courses/*",
+        "students": "/api/students/*",
+        "professors": "/api/professors/*",
+        "blockchain": "/api/blockchain/*",
+        "notifications": "/api/notifications/stream",
+        "analytics": "/api/analytics/*",
+        "jobs": "/api/jobs/*",
+        "tenants": "/api/tenants/*"
+    }
+    for feature in set(FEATURE_BLUEPRINTS) - set(current_app.config['FEATURES']):
+        del endpoints[feature]
+    
     return jsonify({
         "status": "ok",
         "message": "University Course Management API is running",
-        "endpoints": {
-            "health": "/api/health",
-            "auth": "/api/auth/*",
-            "courses": "/api/courses/*",
-            "students": "/api/students/*",
-            "professors": "/api/professors/*",
-            "blockchain": "/api/blockchain/*"
-        }
+        "endpoints": endpoints
     })
 
-@app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "ok", "message": "University Course Management API is running"})
+    if 'blockchain' not in current_app.config['FEATURES']:
+        return jsonify({"status": "ok", "message": "University Course Management API is running"})
+    
+    blockchain = chain_guard.health_report()
+    status = "degraded" if blockchain["circuit_breaker"]["state"] == "open" else "ok"
+    
+    return jsonify({
+        "status": status,
+        "message": "University Course Management API is running",
+        "blockchain": blockchain
+    })
 
-@app.route('/api/profile', methods=['GET'])
 @jwt_required
 def get_profile():
     current_user_id = get_jwt_identity()
@@ -72,7 +173,6 @@ def get_profile():
         "created_at": user.created_at.isoformat()
     })
 
-@app.route('/api/dashboard', methods=['GET'])
 @jwt_required
 def get_dashboard_data():
     current_user_id = get_jwt_identity()
@@ -165,18 +265,16 @@ def get_dashboard_data():
         })
 
 # Error handlers
-@app.errorhandler(404)
 def not_found(e):
     return jsonify({"error": "Not found", "message": "The requested resource does not exist"}), 404
 
-@app.errorhandler(500)
 def server_error(e):
     return jsonify({"error": "Server error", "message": str(e)}), 500
 
+# Development server; production runs wsgi:application under gunicorn
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()  # Create tables within app context
-        logger.info("Database tables created")
+    app = create_app()
+    create_all(app)  # Every institution's database
+    logger.info("Database tables created")
     
     app.run(debug=True, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
-
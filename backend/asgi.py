@@ -0,0 +1,329 @@
+# ASGI entry point. Enrollment verification and course enrollment spend
+# most of their time waiting on algod / the indexer; here they run as
+# coroutines on an async database session and async chain clients
+# (chain_async.py), so one worker holds thousands of them in flight instead of
+# one per thread. Every other route is the Flask app, run in a thread pool.
+#   cd backend
+#   flask --app wsgi init-db
+#   GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn asgi:application
+#   uvicorn asgi:application --workers 2          (without gunicorn)
+# python -m benchmarks.asgi_bench compares it with the WSGI deployment.
+import io
+import re
+import sys
+import json
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, update
+from jwt import ExpiredSignatureError, InvalidTokenError
+from flask_jwt_extended import decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from models import db, User, Course, Enrollment, ChainEnrollment
+from database import create_async_sessions
+from compression import negotiate_encoding, available_encodings, compress_bytes
+from chain_guard import guarded_acall, CircuitOpenError
+from tenancy import all_tenants, choose_tenant, tenant_context, TenantError
+from app import create_app
+import smart_contracts
+import registration
+import waitlist
+import events
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class HTTPError(Exception):
+    def __init__(self, body, status):
+        super().__init__(body)
+        self.body = body
+        self.status = status
+
+
+class AsyncApplication:
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.chain = 'blockchain' in flask_app.config['FEATURES']
+        # Flask requests, and the synchronous steps of the async views
+        self.threads = ThreadPoolExecutor(max_workers=flask_app.config['ASGI_THREADS'], thread_name_prefix='asgi')
+        # (method, path pattern, view); anything else goes to Flask
+        self.routes = [('POST', re.compile(r'/api/courses/(\d+)/enroll'), enroll_in_course)]
+        if self.chain:
+            self.routes.append(('GET', re.compile(r'/api/blockchain/verify-enrollment/(\d+)'), verify_enrollment))
+        self.engines = []
+        self.sessions = {}  # tenant -> async session factory
+        self.http = self.algod = self.indexer = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            return
+
+        for method, pattern, view in self.routes:
+            match = pattern.fullmatch(scope['path'])
+            if match and scope['method'] == method:
+                try:
+                    body, status = await view(self, scope, *(int(arg) for arg in match.groups()))
+                except HTTPError as e:
+                    body, status = e.body, e.status
+                except Exception as e:
+                    logger.error(f"Error in {view.__name__}: {str(e)}")
+                    body, status = {"error": "Server error", "message": str(e)}, 500
+                return await respond(self, scope, send, body, status)
+
+        return await self.wsgi(scope, receive, send)
+
+    # Database engines and chain clients belong to the worker's event loop
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                for tenant in all_tenants(self.flask_app):
+                    engine, self.sessions[tenant] = create_async_sessions(self.flask_app, tenant)
+                    self.engines.append(engine)
+                if self.chain:
+                    import chain_async
+                    self.http = chain_async.create_http_client()
+                    self.algod = chain_async.get_algod_client(self.http)
+                    self.indexer = chain_async.get_indexer_client(self.http)
+                logger.info(f"ASGI worker ready: {len(self.routes)} async routes, "
+                            f"{self.config['ASGI_THREADS']} threads for Flask")
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.http:
+                    await self.http.close()
+                for engine in self.engines:
+                    await engine.dispose()
+                self.threads.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # Run func(*args) in the thread pool inside the tenant's app context, for
+    # code that uses the Flask-SQLAlchemy session
+    async def run_sync(self, tenant, func, *args):
+        def call():
+            with tenant_context(self.flask_app, tenant):
+                return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.threads, call)
+
+    # (JWT identity, tenant), checked the way flask_jwt_extended's
+    # jwt_required and tenancy.py do
+    def authenticate(self, scope):
+        header = request_header(scope, 'authorization')
+        if header is None:
+            raise HTTPError({"msg": "Missing Authorization Header"}, 401)
+        if not header.startswith('Bearer '):
+            raise HTTPError({"msg": "Missing 'Bearer' type in 'Authorization' header. "
+                                    "Expected 'Authorization: Bearer <JWT>'"}, 401)
+        try:
+            with self.flask_app.app_context():
+                claims = decode_token(header[len('Bearer '):])
+        except ExpiredSignatureError:
+            raise HTTPError({"msg": "Token has expired"}, 401)
+        except (InvalidTokenError, JWTExtendedException) as e:
+            raise HTTPError({"msg": str(e)}, 422)
+        if claims.get('type') != 'access':
+            raise HTTPError({"msg": "Only non-refresh tokens are allowed"}, 422)
+        tenant = None
+        if self.config['TENANT_DATABASE_URLS']:
+            try:
+                tenant = choose_tenant(self.config, request_header(scope, 'host'), claims)
+            except TenantError as e:
+                raise HTTPError({"error": e.message}, e.status)
+        return claims[self.config['JWT_IDENTITY_CLAIM']], tenant
+
+    # Serve a request with the Flask app on a pool thread. The body is read in
+    # full first; the response is passed on chunk by chunk, so streams (SSE)
+    # work, each holding a thread as under gthread, until the client leaves.
+    async def wsgi(self, scope, receive, send):
+        body = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        environ = wsgi_environ(scope, b''.join(body))
+
+        loop = asyncio.get_running_loop()
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        def call_app():
+            started = {}
+
+            def start_response(status, headers, exc_info=None):
+                started['status'] = int(status.split(' ', 1)[0])
+                started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+            def emit(message):
+                asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+            iterable = self.flask_app(environ, start_response)
+            try:
+                emit({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+                for chunk in iterable:
+                    if disconnected.is_set():
+                        break
+                    if chunk:
+                        emit({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                emit({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await loop.run_in_executor(self.threads, call_app)
+        finally:
+            watcher.cancel()
+
+
+def request_header(scope, name):
+    name = name.encode('latin-1')
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+# PEP 3333 environ for an ASGI HTTP scope
+def wsgi_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = name if name == 'CONTENT_TYPE' else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+# A JSON response as Flask's jsonify, Flask-CORS and compression.py would
+# send it
+async def respond(app, scope, send, body, status):
+    payload = (json.dumps(body, sort_keys=True, separators=(',', ':')) + '\n').encode()
+    headers = [(b'content-type', b'application/json')]
+    vary = []
+    origin = request_header(scope, 'origin')
+    headers.append((b'access-control-allow-origin', origin.encode('latin-1') if origin is not None else b'*'))
+    if origin is not None:
+        vary.append('Origin')
+    if app.config['COMPRESS_ENABLED']:
+        vary.append('Accept-Encoding')
+        encoding = negotiate_encoding(request_header(scope, 'accept-encoding') or '', available_encodings())
+        if encoding and len(payload) >= app.config['COMPRESS_MIN_SIZE']:
+            payload = compress_bytes(payload, encoding, app.config)
+            headers.append((b'content-encoding', encoding.encode()))
+    if vary:
+        headers.append((b'vary', ', '.join(vary).encode()))
+    headers.append((b'content-length', str(len(payload)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+# smart_contracts.verify_enrollment. The database session is closed before
+# the indexer is asked, so requests waiting on the chain hold no connection.
+async def verify_enrollment(app, scope, enrollment_id):
+    current_user_id, tenant = app.authenticate(scope)
+
+    async with app.sessions[tenant]() as session:
+        user = await session.get(User, current_user_id)
+        enrollment = await session.get(Enrollment, enrollment_id)
+        course = await session.get(Course, enrollment.course_id) if enrollment else None
+        answer = smart_contracts.verification_precheck(user, enrollment, course)
+        if answer:
+            return answer
+
+        # Answer from the local chain mirror when it has the transaction
+        mirrored = (await session.execute(select(ChainEnrollment).filter_by(
+            transaction_id=enrollment.transaction_id).limit(1))).scalar()
+        if mirrored:
+            return smart_contracts.verify_mirrored(enrollment, course, mirrored), 200
+
+    try:
+        transaction_info = await guarded_acall('verify_enrollment', app.indexer.transaction, enrollment.transaction_id)
+        return smart_contracts.verify_indexed(enrollment, course, transaction_info), 200
+
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        return {"error": "Blockchain temporarily unavailable"}, 503
+
+    except Exception as e:
+        logger.error(f"Error verifying enrollment: {str(e)}")
+        return {"error": str(e)}, 500
+
+
+# courses.enroll_in_course. The checks and the insert are the same
+# registration.enroll_one as under WSGI, run on a pool thread; recording the
+# transfer on chain, which waits for confirmation rounds, is awaited here.
+async def enroll_in_course(app, scope, course_id):
+    current_user_id, tenant = app.authenticate(scope)
+
+    enrollment, contract_address = await app.run_sync(tenant, _enroll, current_user_id, course_id)
+    if app.chain and contract_address:
+        import chain_async
+        transaction_id = await chain_async.enroll_student(app.algod, contract_address, current_user_id, course_id)
+        if transaction_id:
+            async with app.sessions[tenant].begin() as session:
+                await session.execute(update(Enrollment).where(Enrollment.id == enrollment["id"])
+                                      .values(transaction_id=transaction_id))
+            enrollment["transaction_id"] = transaction_id
+
+    return {
+        "message": "Successfully enrolled in course",
+        "enrollment": enrollment
+    }, 201
+
+
+# Commit the enrollment and announce it (seat count and the student's event
+# stream; unlike the WSGI view, before the chain transfer rather than after).
+# Returns (enrollment, the course's contract address).
+def _enroll(student_id, course_id):
+    try:
+        enrollment, course = registration.enroll_one(student_id, course_id)
+        db.session.commit()
+    except registration.EnrollmentError as e:
+        raise HTTPError({"error": e.message, **e.extra}, e.status)
+    except Exception as e:
+        db.session.rollback()
+        raise HTTPError({"error": str(e)}, 500)
+
+    waitlist.publish_seats(course)
+    events.notify(student_id, 'enrollment', waitlist.enrollment_event(enrollment, course))
+    return {
+        "id": enrollment.id,
+        "course_id": course.id,
+        "course_title": course.title,
+        "transaction_id": enrollment.transaction_id
+    }, course.contract_address
+
+
+application = AsyncApplication(create_app())
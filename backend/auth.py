@@ -17,6 +17,14 @@ def jwt_required(f):
         return flask_jwt_required()(f)(*args, **kwargs)
     return decorated
 
+# Same as jwt_required, but also accepts the token as ?jwt=<token>, for
+# clients that cannot set headers (browser EventSource streams)
+def jwt_required_query(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        return flask_jwt_required(locations=['headers', 'query_string'])(f)(*args, **kwargs)
+    return decorated
+
 def get_jwt_identity():
     return flask_get_jwt_identity()
 
@@ -0,0 +1,96 @@
+# Grade analytics: NumPy vs pure-Python statistics, and the cached path.
+#
+# Seeds a university, computes statistics for every course both ways and
+# checks they agree, checks one course's letter histogram against the final
+# grades students.get_student_grades reports, then times a term request
+# cold and warm (fingerprint-validated cache).
+#
+#   cd backend
+#   python -m benchmarks.analytics_bench --scale small
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+import collections
+from benchmarks.seed import SCALES, seed_university
+from benchmarks import harness
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return round(min(timings), 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark analytics.py")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    app = harness.load_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-analytics-'), 'analytics.db')}")
+    from models import db, Course, Enrollment
+    import analytics
+
+    failures = []
+    with app.app_context():
+        db.create_all()
+        seed_university(**SCALES[args.scale])
+        course_ids = [c.id for c in Course.query.order_by(Course.id)]
+        fixture = harness.build_fixture()
+        tokens = harness.build_tokens(fixture)
+
+        columns = analytics.load_columns(course_ids)
+        timings = {"load_ms": best_of(args.repeat, lambda: analytics.load_columns(course_ids))}
+        if analytics.np is not None:
+            timings["numpy_ms"] = best_of(args.repeat, lambda: analytics._compute_numpy(course_ids, *columns))
+        timings["python_ms"] = best_of(args.repeat, lambda: analytics._compute_python(course_ids, *columns))
+
+        python_results = analytics._compute_python(course_ids, *columns)
+        if analytics.np is not None:
+            numpy_results = analytics._compute_numpy(course_ids, *columns)
+            mismatched = [cid for cid in course_ids
+                          if json.dumps(numpy_results[cid][0], sort_keys=True) != json.dumps(python_results[cid][0], sort_keys=True)]
+            if mismatched:
+                failures.append(f"numpy and python statistics differ for courses {mismatched[:10]}")
+
+        # Letter histogram must match the final grades the student endpoint reports
+        course_id = fixture["course_id"]
+        student_ids = [e.student_id for e in Enrollment.query.filter(
+            Enrollment.course_id == course_id, Enrollment.status != 'dropped')]
+
+    client = app.test_client()
+    admin = {"Authorization": f"Bearer {tokens['admin']}"}
+    expected = collections.Counter()
+    for student_id in student_ids:
+        for entry in client.get(f"/api/students/{student_id}/grades", headers=admin).get_json():
+            if entry["course"]["id"] == course_id and entry["final_grade"]:
+                expected[entry["final_grade"]] += 1
+    reported = client.get(f"/api/analytics/courses/{course_id}", headers=admin).get_json()["letter_grades"]
+    if {k: v for k, v in reported.items() if v} != dict(expected):
+        failures.append(f"course {course_id} letter grades {reported} != student grades {dict(expected)}")
+
+    term_url = f"/api/analytics/terms?term={fixture['term']}&year={fixture['year']}"
+
+    def term_cold():
+        analytics.cache.clear()
+        client.get(term_url, headers=admin)
+
+    timings["term_request_cold_ms"] = best_of(args.repeat, term_cold)
+    timings["term_request_warm_ms"] = best_of(args.repeat, lambda: client.get(term_url, headers=admin))
+
+    print(json.dumps({"courses": len(course_ids), "numpy": analytics.np is not None, **timings}, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# Reproducible API benchmark.
+#
+# Seeds a synthetic university, then drives every endpoint through the Flask
+# test client (latency + queries per request) and through a multi-threaded HTTP
+# load generator (throughput + latency under concurrency). Results are written
+# as JSON so runs on different commits can be compared with --compare.
+#
+#   cd backend
+#   python -m benchmarks.api_bench --scale small --output bench-small.json
+#   python -m benchmarks.api_bench --scale small --compare bench-small.json
+#
+# --target http://host:port sends the HTTP phase to an already running server
+# (e.g. gunicorn) that uses the same --database.
+import os
+import sys
+import json
+import argparse
+import logging
+import tempfile
+from benchmarks.seed import SCALES, seed_university
+from benchmarks import harness
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the University Course Management API")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    for field in ('students', 'professors', 'courses', 'enrollments', 'assignments', 'submissions', 'grades'):
+        parser.add_argument(f'--{field}', type=int, help=f"override the number of seeded {field}")
+    parser.add_argument('--database', help="SQLAlchemy URL (default: a fresh SQLite file in a temp dir)")
+    parser.add_argument('--skip-seed', action='store_true', help="reuse an already seeded --database")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=20, help="test-client calls per endpoint")
+    parser.add_argument('--threads', type=int, default=8, help="HTTP load generator threads")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds of HTTP load per endpoint")
+    parser.add_argument('--mode', choices=['client', 'http', 'both'], default='both')
+    parser.add_argument('--target', help="base URL of an external server for the HTTP phase")
+    parser.add_argument('--endpoints', help="comma-separated endpoint names to run (default: all)")
+    parser.add_argument('--no-writes', action='store_true', help="skip endpoints that modify data")
+    parser.add_argument('--output', help="write results JSON to this file")
+    parser.add_argument('--compare', help="baseline results JSON to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    scale = dict(SCALES[args.scale])
+    for field in scale:
+        if getattr(args, field) is not None:
+            scale[field] = getattr(args, field)
+
+    database = args.database or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-bench-'), 'bench.db')}"
+    app = harness.load_app(database)
+
+    with app.app_context():
+        from models import db
+        import search
+        if not args.skip_seed:
+            db.drop_all()
+            search.reset_index()
+            db.create_all()
+            seed_university(seed=args.seed, **scale)
+        search.get_index()
+        fixture = harness.build_fixture()
+        tokens = harness.build_tokens(fixture)
+        engine = db.engine
+
+    endpoints = harness.build_endpoints(fixture)
+    if args.endpoints:
+        wanted = set(args.endpoints.split(','))
+        endpoints = [e for e in endpoints if e.name in wanted]
+    if args.no_writes:
+        endpoints = [e for e in endpoints if not e.writes]
+
+    results = {}
+    if args.mode in ('client', 'both'):
+        results["client"] = harness.run_client(app, endpoints, tokens, args.iterations)
+
+    if args.mode in ('http', 'both'):
+        if args.target:
+            results["http"] = harness.run_http(args.target, endpoints, tokens, args.threads, args.duration)
+        else:
+            base_url, shutdown = harness.start_local_server(app)
+            try:
+                results["http"] = harness.run_http(base_url, endpoints, tokens, args.threads, args.duration, engine)
+            finally:
+                shutdown()
+
+    report = {
+        "meta": harness.run_metadata(scale, {k: v for k, v in vars(args).items() if k not in scale}),
+        "results": results
+    }
+
+    for mode, stats in results.items():
+        print(f"[{mode}]")
+        print(f"{'endpoint':32} {'reqs':>7} {'err':>5} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'q/req':>7}")
+        for name, s in stats.items():
+            print(f"{name:32} {s['requests']:>7} {s['errors']:>5} {s['throughput_rps']!s:>9} {s['p50_ms']!s:>9} "
+                  f"{s['p95_ms']!s:>9} {s['p99_ms']!s:>9} {s.get('queries_per_request')!s:>7}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(harness.compare_results(baseline, report))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
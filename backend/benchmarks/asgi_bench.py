@@ -0,0 +1,349 @@
+# ASGI (asgi.py) against the WSGI deployment (wsgi.py under gthread) for the
+# routes that wait on the chain.
+#
+# Starts benchmarks.chain_http (algod and indexer over HTTP, --chain-ms per
+# call, a block every --round-ms), then both servers under gunicorn with
+# gunicorn.conf.py: gthread with its default workers and threads, and one
+# UvicornWorker. Both reach the chain over HTTP. Each is loaded in turn:
+#   - enrollment: --enroll-clients students enrolling at once for
+#     --duration seconds, every enrollment waiting for its transfer to confirm;
+#   - verification of those enrollments through the indexer at each
+#     --concurrency level;
+# recording throughput, latency, the most chain calls the server had in
+# flight at once and its peak memory. Then the same requests are sent to
+# both and the answers compared: the async routes (including their errors)
+# and some routes the ASGI app hands to Flask.
+#
+#   cd backend
+#   python -m benchmarks.asgi_bench --concurrency 16,256,1024 --chain-ms 250
+import os
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import datetime
+import itertools
+import logging
+import tempfile
+import threading
+import subprocess
+import http.client
+from algosdk import account
+from flask_jwt_extended import create_access_token
+from benchmarks.seed import seed_university
+from benchmarks.server_bench import BACKEND, free_port, children, memory
+from benchmarks import harness
+
+SERVERS = {
+    'wsgi': ('wsgi:application', {"GUNICORN_WORKER_CLASS": 'gthread'}),
+    'asgi': ('asgi:application', {"GUNICORN_WORKER_CLASS": 'uvicorn.workers.UvicornWorker'}),
+}
+COURSES = 40
+# Headers a client or cache acts on, which must match between the servers
+COMPARED_HEADERS = ('content-type', 'content-encoding', 'access-control-allow-origin', 'vary')
+
+
+def request(port, method, path, headers=None, body=None, timeout=60):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request(method, path, body=json.dumps(body) if body is not None else None,
+                           headers={"Content-Type": "application/json", **(headers or {})})
+        response = connection.getresponse()
+        # Repeated headers joined into one, as HTTP defines them
+        headers = {}
+        for name, value in response.getheaders():
+            headers[name.lower()] = f"{headers[name.lower()]}, {value}" if name.lower() in headers else value
+        if 'vary' in headers:
+            headers['vary'] = ', '.join(sorted(token.strip() for token in headers['vary'].split(',')))
+        return response.status, headers, response.read()
+    finally:
+        connection.close()
+
+
+def start(module, port, env, log):
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', module], cwd=BACKEND,
+                               env=dict(env, GUNICORN_BIND=f"127.0.0.1:{port}"), stdout=log, stderr=log)
+    started = time.perf_counter()
+    while True:
+        try:
+            if request(port, 'GET', '/api/health', timeout=1)[0] == 200:
+                return process
+        except OSError:
+            pass
+        if process.poll() is not None or time.perf_counter() - started > 60:
+            raise RuntimeError(f"{module} did not start, see {log.name}")
+        time.sleep(0.1)
+
+
+def stop(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# Keep-alive HTTP/1.1 clients on asyncio streams, so thousands of concurrent
+# requests do not need thousands of threads here. next_request(n) gives
+# (method, path, headers); returns the summary plus every (status, body).
+async def load(port, next_request, concurrency, duration):
+    latencies = []
+    statuses = {}
+    responses = []
+    sequence = itertools.count()
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        reader = writer = None
+        while time.perf_counter() < deadline:
+            method, path, headers = next_request(next(sequence))
+            lines = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1", "Content-Length: 0"]
+            lines += [f"{name}: {value}" for name, value in headers.items()]
+            t0 = time.perf_counter()
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=2 ** 20)
+                writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode())
+                status, close, body = await asyncio.wait_for(read_response(reader), 120)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+                status, close, body = 599, True, b''
+            latencies.append((time.perf_counter() - t0) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+            responses.append((status, body))
+            if close and writer is not None:
+                writer.close()
+                reader = writer = None
+        if writer is not None:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return harness.summarize(latencies, time.perf_counter() - started, statuses), responses
+
+
+async def read_response(reader):
+    status = int((await reader.readuntil(b'\r\n')).split(b' ', 2)[1])
+    headers = {}
+    while (line := await reader.readuntil(b'\r\n')) != b'\r\n':
+        name, value = line.decode('latin-1').split(':', 1)
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers['content-length']))
+    return status, headers.get('connection', '').lower() == 'close', body
+
+
+# Sample the RSS of a server's processes while a phase runs
+class PeakMemory:
+    def __init__(self, pid):
+        self.pid = pid
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(0.1):
+            try:
+                pids = [self.pid] + children(self.pid)
+                self.peak = max(self.peak, sum(memory(pid)[0] for pid in pids))
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def chain_stats(port, reset=False):
+    return json.loads(request(port, 'POST' if reset else 'GET', '/stats')[2])
+
+
+def run_server(port, pid, chain_port, students, tokens, courses, args):
+    result = {}
+    pairs = iter([(student, course) for course in courses for student in students])
+
+    def next_enrollment(n):
+        student, course = next(pairs)
+        return 'POST', f"/api/courses/{course}/enroll", {"Authorization": f"Bearer {tokens[student]}"}
+
+    chain_stats(chain_port, reset=True)
+    with PeakMemory(pid) as peak:
+        summary, responses = asyncio.run(load(port, next_enrollment, args.enroll_clients, args.duration))
+    stats = chain_stats(chain_port)
+    enrolled = [json.loads(body)["enrollment"] for status, body in responses if status == 201]
+    result["enroll"] = dict(summary, algod_in_flight_max=stats["algod_in_flight_max"], peak_rss_mb=round(peak.peak, 1),
+                            with_transaction=sum(1 for e in enrolled if e["transaction_id"]))
+
+    admin = {"Authorization": f"Bearer {tokens['admin']}"}
+    verified = [e["id"] for e in enrolled if e["transaction_id"]] or [0]
+    for concurrency in args.concurrency:
+        chain_stats(chain_port, reset=True)
+        with PeakMemory(pid) as peak:
+            summary, responses = asyncio.run(load(
+                port, lambda n: ('GET', f"/api/blockchain/verify-enrollment/{verified[n % len(verified)]}", admin),
+                concurrency, args.duration))
+        stats = chain_stats(chain_port)
+        result[f"verify_{concurrency}"] = dict(
+            summary, indexer_in_flight_max=stats["indexer_in_flight_max"], peak_rss_mb=round(peak.peak, 1),
+            not_verified=sum(1 for status, body in responses if status == 200 and not json.loads(body)["verified"]))
+    return result, enrolled
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the ASGI and WSGI servers on the chain-bound routes")
+    parser.add_argument('--concurrency', default='16,256,1024', help="concurrent verification clients, per level")
+    parser.add_argument('--enroll-clients', type=int, default=128)
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds of load per phase")
+    parser.add_argument('--chain-ms', type=float, default=250, help="simulated algod / indexer round trip")
+    parser.add_argument('--round-ms', type=float, default=500, help="simulated block time")
+    parser.add_argument('--students', type=int, default=2000)
+    args = parser.parse_args(argv)
+    args.concurrency = [int(c) for c in args.concurrency.split(',')]
+    logging.basicConfig(level=logging.ERROR)
+
+    workdir = tempfile.mkdtemp(prefix='ucm-asgi-')
+    private_key, _ = account.generate_account()
+    os.environ['ALGORAND_ADMIN_PRIVATE_KEY'] = base64.b64encode(private_key.encode()).decode()
+    database = f"sqlite:///{os.path.join(workdir, 'asgi.db')}"
+    app = harness.load_app(database)
+    from models import db, User, Course, Enrollment, ChainEnrollment
+
+    expires = datetime.timedelta(days=1)
+    with app.app_context():
+        db.create_all()
+        seed_university(students=args.students, professors=2, courses=0, enrollments=0, assignments=0)
+        for i in range(COURSES):
+            db.session.add(Course(code=f"ASGI{i:03d}", title=f"Async course {i}", credits=3, capacity=args.students,
+                                  term='Fall', year=2024, department='Benchmarks', fee=0, status='active',
+                                  contract_address=str(300000 + i)))
+        # A course with a contract and an enrollment that was never sent to the chain
+        db.session.add(Course(code='ASGI999', title='Unrecorded', credits=3, capacity=10, term='Fall', year=2024,
+                              department='Benchmarks', fee=0, status='active', contract_address='399999'))
+        db.session.commit()
+        students = [u.id for u in User.query.filter_by(role='student').order_by(User.id)]
+        courses = [c.id for c in Course.query.filter(Course.code.like('ASGI0%')).order_by(Course.id)]
+        unrecorded = Course.query.filter_by(code='ASGI999').one()
+        db.session.add(Enrollment(student_id=students[-1], course_id=unrecorded.id, status='enrolled'))
+        db.session.commit()
+        unrecorded_enrollment = Enrollment.query.filter_by(course_id=unrecorded.id).one().id
+        admin_id = User.query.filter_by(role='admin').first().id
+        tokens = {student: create_access_token(identity=student, expires_delta=expires) for student in students}
+        tokens['admin'] = create_access_token(identity=admin_id, expires_delta=expires)
+
+    chain_port = free_port()
+    chain_env = dict(os.environ, BENCH_CHAIN_MS=str(args.chain_ms), BENCH_ROUND_MS=str(args.round_ms))
+    logs = {name: open(os.path.join(workdir, f"{name}.log"), 'w') for name in ('chain', *SERVERS)}
+    chain = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'benchmarks.chain_http:application', '--port',
+                              str(chain_port), '--log-level', 'warning', '--no-access-log'], cwd=BACKEND,
+                             env=chain_env, stdout=logs['chain'], stderr=logs['chain'])
+    env = dict(os.environ, DATABASE_URL=database, JOB_WORKERS='0', GUNICORN_ACCESS_LOG='', GUNICORN_LOG_LEVEL='warning',
+               ALGORAND_ALGOD_ADDRESS=f"http://127.0.0.1:{chain_port}",
+               ALGORAND_INDEXER_ADDRESS=f"http://127.0.0.1:{chain_port}/indexer")
+    ports = {}
+    servers = {}
+    results = {"cores": os.cpu_count(), "chain_ms": args.chain_ms, "round_ms": args.round_ms,
+               "enroll_clients": args.enroll_clients, "duration_s": args.duration}
+    failures = []
+    try:
+        for name, (module, profile) in SERVERS.items():
+            ports[name] = free_port()
+            servers[name] = start(module, ports[name], dict(env, **profile), logs[name])
+        results["wsgi_workers"] = len(children(servers['wsgi'].pid))
+        results["asgi_workers"] = len(children(servers['asgi'].pid))
+
+        # Half the students each, so every enrollment is new
+        enrolled = {}
+        for i, name in enumerate(SERVERS):
+            half = students[i::2]
+            results[name], enrolled[name] = run_server(ports[name], servers[name].pid, chain_port, half, tokens,
+                                                       courses, args)
+            for phase, summary in results[name].items():
+                if summary["errors"] or set(summary["statuses"]) - {'200', '201'}:
+                    failures.append(f"{name} {phase}: statuses {summary['statuses']}")
+                if summary.get("not_verified"):
+                    failures.append(f"{name} {phase}: {summary['not_verified']} enrollments not verified")
+            if results[name]["enroll"]["with_transaction"] != results[name]["enroll"]["statuses"].get('201'):
+                failures.append(f"{name}: {results[name]['enroll']['with_transaction']} of "
+                                f"{results[name]['enroll']['statuses'].get('201')} enrollments recorded on chain")
+
+        top = f"verify_{max(args.concurrency)}"
+        results["verify_throughput_ratio"] = round(results['asgi'][top]["throughput_rps"] /
+                                                   results['wsgi'][top]["throughput_rps"], 2)
+        results["enroll_throughput_ratio"] = round(results['asgi']["enroll"]["throughput_rps"] /
+                                                   results['wsgi']["enroll"]["throughput_rps"], 2)
+        if results["verify_throughput_ratio"] <= 1:
+            failures.append(f"ASGI verification at {max(args.concurrency)} clients is not faster than WSGI")
+        if results['asgi'][top]["indexer_in_flight_max"] <= results['wsgi'][top]["indexer_in_flight_max"]:
+            failures.append("ASGI did not hold more indexer calls in flight than WSGI")
+
+        # Every transaction ID the ASGI path stored is one the chain confirmed
+        with app.app_context():
+            stored = {e.id: e.transaction_id for e in Enrollment.query.filter(
+                Enrollment.id.in_([e["id"] for e in enrolled['asgi']]))}
+        if any(stored[e["id"]] != e["transaction_id"] for e in enrolled['asgi']):
+            failures.append("ASGI enrollments answered with a transaction ID the database does not have")
+
+        # The same requests against both servers
+        sample = next(e for e in enrolled['wsgi'] if e["transaction_id"])
+        with app.app_context():
+            owner = db.session.get(Enrollment, sample["id"]).student_id
+            mirrored = next(e for e in enrolled['asgi'] if e["transaction_id"])
+            row = db.session.get(Enrollment, mirrored["id"])
+            db.session.add(ChainEnrollment(transaction_id=row.transaction_id, asset_id=300000 + courses.index(row.course_id),
+                                           student_id=row.student_id, course_id=row.course_id, confirmed_round=1,
+                                           fee=1000, timestamp='0'))
+            db.session.commit()
+        other = next(s for s in students if s != owner)
+        admin = {"Authorization": f"Bearer {tokens['admin']}"}
+        cases = {
+            "verify_indexer": ('GET', f"/api/blockchain/verify-enrollment/{sample['id']}", dict(admin, Origin='http://ui.test')),
+            "verify_owner": ('GET', f"/api/blockchain/verify-enrollment/{sample['id']}",
+                             {"Authorization": f"Bearer {tokens[owner]}"}),
+            "verify_mirror": ('GET', f"/api/blockchain/verify-enrollment/{mirrored['id']}", admin),
+            "verify_unrecorded": ('GET', f"/api/blockchain/verify-enrollment/{unrecorded_enrollment}", admin),
+            "verify_other_student": ('GET', f"/api/blockchain/verify-enrollment/{sample['id']}",
+                                     {"Authorization": f"Bearer {tokens[other]}"}),
+            "verify_missing": ('GET', '/api/blockchain/verify-enrollment/999999', admin),
+            "verify_no_token": ('GET', f"/api/blockchain/verify-enrollment/{sample['id']}", {}),
+            "verify_bad_token": ('GET', f"/api/blockchain/verify-enrollment/{sample['id']}", {"Authorization": "Bearer x"}),
+            "enroll_again": ('POST', f"/api/courses/{sample['course_id']}/enroll", {"Authorization": f"Bearer {tokens[owner]}"}),
+            "enroll_admin": ('POST', f"/api/courses/{courses[0]}/enroll", admin),
+            "enroll_missing_course": ('POST', '/api/courses/999999/enroll', {"Authorization": f"Bearer {tokens[owner]}"}),
+            "flask_course": ('GET', f"/api/courses/{courses[0]}", {}),
+            "verify_gzip": ('GET', f"/api/blockchain/verify-enrollment/{sample['id']}",
+                            dict(admin, **{"Accept-Encoding": 'gzip'})),
+            "flask_index": ('GET', '/', {}),
+            "flask_not_found": ('GET', '/api/nowhere', {}),
+            "flask_login_refused": ('POST', '/api/auth/login', {}),
+        }
+        mismatched = []
+        for case, (method, path, headers) in cases.items():
+            body = {"email": "admin@university.edu", "password": "wrong"} if case == 'flask_login_refused' else None
+            answers = [request(ports[name], method, path, headers, body) for name in SERVERS]
+            (status, wsgi_headers, wsgi_body), (asgi_status, asgi_headers, asgi_body) = answers
+            if (status, wsgi_body) != (asgi_status, asgi_body) or \
+                    any(wsgi_headers.get(h) != asgi_headers.get(h) for h in COMPARED_HEADERS):
+                mismatched.append(case)
+                headers = {h: (wsgi_headers.get(h), asgi_headers.get(h)) for h in COMPARED_HEADERS
+                           if wsgi_headers.get(h) != asgi_headers.get(h)}
+                failures.append(f"{case}: WSGI {status} {wsgi_body[:200]!r}, ASGI {asgi_status} {asgi_body[:200]!r}, "
+                                f"headers (WSGI, ASGI) {headers}")
+        results["responses_compared"] = len(cases) - len(mismatched)
+    finally:
+        for process in [*servers.values(), chain]:
+            stop(process)
+        for log in logs.values():
+            log.close()
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
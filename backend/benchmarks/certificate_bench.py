@@ -0,0 +1,189 @@
+# Bulk certificate issuance against an in-memory algod (benchmarks/fake_algod.py).
+#
+# Builds a course with one large section (default 1,000 students, most of
+# them passing) and compares the per-student endpoint, which waits for a
+# round per certificate, with the bulk run, which sends groups of 16 several
+# at a time. The bulk run is started over HTTP and driven through the job
+# table, with failures injected along the way: a group sent without a
+# response, a group the node rejects and a group that never confirms. The
+# first attempt ends with transactions still unaccounted for; the chain then
+# moves past their validity window and algod forgets them, and the retried
+# job has to settle them through the indexer. At the end every passing
+# student must own exactly one certificate asset on the fake ledger, matching
+# the asset ID recorded locally, and nobody else any.
+#
+#   cd backend
+#   python -m benchmarks.certificate_bench --students 1000 --round-ms 20
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import logging
+import datetime
+import tempfile
+from collections import Counter
+from sqlalchemy import insert, update
+from algosdk import account
+from benchmarks.seed import seed_university
+from benchmarks.fake_algod import FakeAlgod, FakeIndexer
+from benchmarks import harness
+
+GRADES = ['A', 'A', 'B', 'B', 'B', 'C', 'C', 'D', 'F', 'Incomplete', None]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bulk certificate issuance")
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--round-ms', type=float, default=20, help="simulated block time")
+    parser.add_argument('--single', type=int, default=20, help="students issued one at a time for comparison")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    # get_admin_account() expects the base64 of the SDK's base64 private key
+    private_key, _ = account.generate_account()
+    os.environ['ALGORAND_ADMIN_PRIVATE_KEY'] = base64.b64encode(private_key.encode()).decode()
+    app = harness.load_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-certificates-'), 'certs.db')}")
+    from models import db, User, Course, Enrollment, Certificate, Job
+    import smart_contracts
+    import jobs
+
+    algod = FakeAlgod(round_seconds=args.round_ms / 1000)
+    smart_contracts.get_algod_client = lambda: algod
+    smart_contracts.get_indexer_client = lambda: FakeIndexer(algod)
+
+    failures = []
+    with app.app_context():
+        db.create_all()
+        seed_university(students=args.students, professors=1, courses=2, enrollments=0, assignments=0)
+        rng = random.Random(3)
+        student_ids = [u.id for u in User.query.filter_by(role='student').order_by(User.id)]
+        bulk_course, single_course = [c.id for c in Course.query.order_by(Course.id)]
+        professor_id = db.session.get(Course, bulk_course).instructor_id
+        db.session.execute(update(Course).where(Course.id == bulk_course).values(instructor_id=professor_id))
+        now = datetime.datetime.utcnow()
+        grades = {student_id: rng.choice(GRADES) for student_id in student_ids}
+        db.session.execute(insert(Enrollment), [
+            dict(student_id=student_id, course_id=bulk_course, status='completed', grade=grade,
+                 created_at=now, updated_at=now) for student_id, grade in grades.items()
+        ] + [
+            dict(student_id=student_id, course_id=single_course, status='completed', grade='A',
+                 created_at=now, updated_at=now) for student_id in student_ids[:args.single]
+        ])
+        db.session.commit()
+        passing = {s for s, g in grades.items() if g and g not in ('F', 'Incomplete')}
+        tokens = {student_id: harness.build_tokens({"admin_id": 1, "student_id": student_id,
+                                                    "professor_id": professor_id})
+                  for student_id in student_ids[:args.single]}
+    client = app.test_client()
+    professor = {"Authorization": f"Bearer {tokens[student_ids[0]]['professor']}"}
+    results = {"students": args.students, "passing": len(passing), "round_ms": args.round_ms}
+
+    # One at a time, the way students request them today
+    rounds, t0 = algod.rounds_waited, time.perf_counter()
+    issued_single = {}
+    for student_id in student_ids[:args.single]:
+        response = client.post(f"/api/blockchain/course/{single_course}/certificate",
+                               headers={"Authorization": f"Bearer {tokens[student_id]['student']}"})
+        if response.status_code != 200:
+            failures.append(f"single certificate returned {response.status_code}: {response.get_json()}")
+            break
+        issued_single[student_id] = response.get_json()["certificate"]["asset_id"]
+    elapsed = time.perf_counter() - t0
+    results["single_ms_per_certificate"] = round(elapsed * 1000 / args.single, 1)
+    results["single_rounds_per_certificate"] = round((algod.rounds_waited - rounds) / args.single, 2)
+    again = client.post(f"/api/blockchain/course/{single_course}/certificate",
+                        headers={"Authorization": f"Bearer {tokens[student_ids[0]]['student']}"})
+    if again.get_json().get("certificate", {}).get("asset_id") != issued_single.get(student_ids[0]):
+        failures.append("asking twice minted a second certificate")
+
+    # Bulk run, with a timeout, a rejection and a lost group on its first attempt
+    algod.failures = {algod.sends + 3: 'timeout', algod.sends + 5: 'reject', algod.sends + 7: 'lose'}
+    url = f"/api/blockchain/course/{bulk_course}/certificates"
+    response = client.post(url, headers=professor)
+    if response.status_code != 202:
+        failures.append(f"bulk run returned {response.status_code}: {response.get_json()}")
+        print(json.dumps(results, indent=2))
+        for failure in failures:
+            print(f"FAIL {failure}")
+        return 1
+    job_id = response.get_json()["job"]["id"]
+    if client.post(url, headers=professor).get_json()["job"]["id"] != job_id:
+        failures.append("a second bulk request started another run")
+    student = {"Authorization": f"Bearer {tokens[student_ids[0]]['student']}"}
+    if client.get(url, headers=student).status_code != 403:
+        failures.append("a student could read the course's certificates")
+
+    def run_due_jobs():
+        with app.app_context():
+            while (claimed := jobs.claim_next('certificate-bench', 300)) is not None:
+                jobs.run_job(claimed, 'certificate-bench')
+            return db.session.get(Job, job_id).status
+
+    rounds, t0 = algod.rounds_waited, time.perf_counter()
+    status = run_due_jobs()
+    elapsed = time.perf_counter() - t0
+    summary = client.get(url, headers=professor).get_json()["summary"]
+    results["first_attempt"] = {"job_status": status, **summary}
+    if status != 'queued' or not summary["submitted"]:
+        failures.append(f"first attempt should leave unconfirmed transactions for a retry, got {status} {summary}")
+
+    # Time passes: the lost group expires, and algod no longer remembers any of it
+    algod.advance(1100)
+    algod.forget()
+    with app.app_context():
+        db.session.execute(update(Job).where(Job.id == job_id).values(run_at=datetime.datetime.utcnow()))
+        db.session.commit()
+    t1 = time.perf_counter()
+    rounds_before_retry = algod.rounds_waited
+    status = run_due_jobs()
+    elapsed += time.perf_counter() - t1
+    bulk_rounds = algod.rounds_waited - rounds
+
+    response = client.get(url, headers=professor).get_json()
+    job = client.get(f"/api/jobs/{job_id}", headers=professor).get_json()
+    results.update(bulk_ms=round(elapsed * 1000, 1), bulk_ms_per_certificate=round(elapsed * 1000 / len(passing), 2),
+                   bulk_rounds=bulk_rounds, retry_rounds=algod.rounds_waited - rounds_before_retry,
+                   job_attempts=job["attempts"], final=response["summary"])
+    if status != 'succeeded' or response["summary"]["issued"] != len(passing) or response["summary"]["total"] != len(passing):
+        failures.append(f"bulk run ended {status} with {response['summary']}: {job['error']}")
+    if job["progress"]["current"] != len(passing) or job["progress"]["total"] != len(passing):
+        failures.append(f"job progress {job['progress']} does not cover {len(passing)} certificates")
+
+    # The ledger is the truth: one asset per passing student, matching our records
+    minted = Counter()
+    ledger = {}
+    for asset_id, note in algod.created_assets():
+        if note["course_id"] == bulk_course:
+            minted[note["student_id"]] += 1
+            ledger[note["student_id"]] = asset_id
+    duplicates = [s for s, n in minted.items() if n > 1]
+    if duplicates:
+        failures.append(f"{len(duplicates)} students got more than one certificate asset")
+    if set(minted) != passing:
+        failures.append(f"{len(passing - set(minted))} passing students without an asset, "
+                        f"{len(set(minted) - passing)} assets for students who did not pass")
+    recorded = {c["student_id"]: c["asset_id"] for c in response["certificates"]}
+    if recorded != ledger:
+        failures.append("recorded asset IDs do not match the ledger")
+
+    # The per-student endpoint now returns the bulk certificate
+    with app.app_context():
+        student_id = next(iter(passing))
+        token = harness.build_tokens({"admin_id": 1, "student_id": student_id, "professor_id": professor_id})['student']
+    assets = len(algod.ledger)
+    response = client.post(f"/api/blockchain/course/{bulk_course}/certificate", headers={"Authorization": f"Bearer {token}"})
+    if response.get_json().get("certificate", {}).get("asset_id") != ledger.get(student_id) or len(algod.ledger) != assets:
+        failures.append("the per-student endpoint minted again after the bulk run")
+
+    results["speedup_rounds"] = round(results["single_rounds_per_certificate"] * len(passing) / max(bulk_rounds, 1), 1)
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# The algod and indexer REST endpoints over the in-memory ledger of
+# benchmarks/fake_algod.py, for app servers that reach the chain over HTTP:
+# the algosdk clients under WSGI, chain_async.py under ASGI.
+#   - a block is produced every BENCH_ROUND_MS, and wait-for-block-after
+#     returns when it is, so confirmation takes real rounds;
+#   - every call takes BENCH_CHAIN_MS, awaited rather than slept, so this
+#     server never limits how many calls are in flight;
+#   - the indexer is served under /indexer;
+#   - GET /stats reports calls and the most calls in flight at once, and
+#     POST /stats resets them.
+#
+#   uvicorn benchmarks.chain_http:application --port 4001
+#   ALGORAND_ALGOD_ADDRESS=http://127.0.0.1:4001 ALGORAND_INDEXER_ADDRESS=http://127.0.0.1:4001/indexer
+# Served by benchmarks/asgi_bench.py.
+import os
+import re
+import json
+import asyncio
+import msgpack
+from algosdk import encoding, error
+from benchmarks.fake_algod import FakeAlgod, FakeIndexer, GENESIS_HASH
+
+ROUND_SECONDS = float(os.environ.get('BENCH_ROUND_MS', 250)) / 1000
+CHAIN_SECONDS = float(os.environ.get('BENCH_CHAIN_MS', 50)) / 1000
+
+algod = FakeAlgod()
+indexer = FakeIndexer(algod)
+stats = {}
+in_flight = {}
+block = asyncio.Event()
+
+
+def reset_stats():
+    stats.clear()
+    stats.update(algod_calls=0, indexer_calls=0, algod_in_flight_max=0, indexer_in_flight_max=0)
+
+
+reset_stats()
+
+
+async def produce_blocks():
+    global block
+    while True:
+        await asyncio.sleep(ROUND_SECONDS)
+        algod.advance(1)
+        produced, block = block, asyncio.Event()
+        produced.set()
+
+
+async def wait_for_block_after(round_num):
+    while algod.round <= round_num:
+        await block.wait()
+    return algod.status()
+
+
+# The body is the signed transactions' msgpack encodings, back to back
+async def send_transactions(body):
+    unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+    unpacker.feed(body)
+    return {"txId": algod.send_transactions([encoding.msgpack_decode(decoded) for decoded in unpacker])}
+
+
+def suggested_params():
+    return {"fee": 0, "min-fee": 1000, "last-round": algod.round, "genesis-hash": GENESIS_HASH,
+            "genesis-id": 'fakenet-v1', "consensus-version": 'future'}
+
+
+# (method, pattern, service, handler(match, body)) -> awaitable or plain result
+ROUTES = [
+    ('GET', re.compile(r'/v2/status'), 'algod', lambda m, body: algod.status()),
+    ('GET', re.compile(r'/v2/status/wait-for-block-after/(\d+)'), 'algod',
+     lambda m, body: wait_for_block_after(int(m.group(1)))),
+    ('GET', re.compile(r'/v2/transactions/params'), 'algod', lambda m, body: suggested_params()),
+    ('POST', re.compile(r'/v2/transactions'), 'algod', lambda m, body: send_transactions(body)),
+    ('GET', re.compile(r'/v2/transactions/pending/(\w+)'), 'algod',
+     lambda m, body: algod.pending_transaction_info(m.group(1))),
+    ('GET', re.compile(r'/indexer/health'), 'indexer', lambda m, body: indexer.health()),
+    ('GET', re.compile(r'/indexer/v2/transactions/(\w+)'), 'indexer', lambda m, body: indexer.transaction(m.group(1))),
+]
+
+
+async def handle(method, path, body):
+    if path == '/stats':
+        if method == 'POST':
+            reset_stats()
+        return 200, dict(stats, round=algod.round, transactions=len(algod.ledger))
+
+    for route_method, pattern, service, handler in ROUTES:
+        match = pattern.fullmatch(path)
+        if match and method == route_method:
+            break
+    else:
+        return 404, {"message": f"no route for {method} {path}"}
+
+    stats[f"{service}_calls"] += 1
+    in_flight[service] = in_flight.get(service, 0) + 1
+    stats[f"{service}_in_flight_max"] = max(stats[f"{service}_in_flight_max"], in_flight[service])
+    try:
+        await asyncio.sleep(CHAIN_SECONDS)
+        result = handler(match, body)
+        if asyncio.iscoroutine(result):
+            result = await result
+        return 200, result
+    except error.AlgodHTTPError as e:
+        return e.code or 400, {"message": str(e)}
+    except error.IndexerHTTPError as e:
+        return 404, {"message": str(e)}
+    finally:
+        in_flight[service] -= 1
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                asyncio.get_running_loop().create_task(produce_blocks())
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    body = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        body.append(message.get('body', b''))
+        more_body = message.get('more_body', False)
+
+    status, result = await handle(scope['method'], scope['path'], b''.join(body))
+    payload = json.dumps(result).encode()
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]})
+    await send({'type': 'http.response.body', 'body': payload})
@@ -0,0 +1,28 @@
+# wsgi:application with the Algorand clients replaced by the in-memory fakes
+# (benchmarks/fake_algod.py). Every indexer call takes BENCH_CHAIN_MS, so the
+# blockchain routes block on "the network" the way they do in production.
+# BENCH_ENROLLMENT=asset:student:course is the enrollment transfer the
+# indexer reports for any transaction ID. Served by benchmarks/server_bench.py.
+import os
+import json
+import base64
+from benchmarks.fake_algod import FakeAlgod, FakeIndexer
+from wsgi import application
+import smart_contracts
+
+
+class EnrollmentIndexer(FakeIndexer):
+    def transaction(self, txid, **kwargs):
+        self._call()
+        asset_id, student_id, course_id = (int(v) for v in os.environ['BENCH_ENROLLMENT'].split(':'))
+        note = {"action": 'enroll', "student_id": student_id, "course_id": course_id, "timestamp": '2024-01-15T09:00:00'}
+        return {"current-round": self.algod.round, "transaction": {
+            "id": txid, "confirmed-round": self.algod.round, "fee": 1000, "tx-type": 'axfer',
+            "asset-transfer-transaction": {"asset-id": asset_id, "amount": 1},
+            "note": base64.b64encode(json.dumps(note).encode()).decode()}}
+
+
+_algod = FakeAlgod()
+_indexer = EnrollmentIndexer(_algod, page_seconds=float(os.environ.get('BENCH_CHAIN_MS', 50)) / 1000)
+smart_contracts.get_algod_client = lambda: _algod
+smart_contracts.get_indexer_client = lambda: _indexer
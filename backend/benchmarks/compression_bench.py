@@ -0,0 +1,62 @@
+# Bandwidth and latency effect of response compression on GET /api/courses/.
+#
+# Seeds a catalog of --courses courses and fetches it once per encoding through
+# the Flask test client. Reports the body size, server-side time (query,
+# serialization and compression) and the modelled transfer time on a few link
+# speeds, so the CPU cost of compressing can be weighed against the bytes saved.
+#
+#   cd backend
+#   python -m benchmarks.compression_bench --courses 4000
+import os
+import sys
+import time
+import argparse
+import logging
+import tempfile
+from benchmarks.seed import seed_university
+from benchmarks import harness
+
+LINKS_MBIT = (10, 100, 1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure response compression on the course catalog")
+    parser.add_argument('--courses', type=int, default=4000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    app = harness.load_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-gzip-'), 'gzip.db')}")
+    from models import db
+    import compression
+
+    with app.app_context():
+        db.create_all()
+        seed_university(students=2000, professors=100, courses=args.courses, enrollments=20000, assignments=0)
+
+    client = app.test_client()
+    encodings = ['identity'] + list(compression.available_encodings())
+
+    print(f"{'encoding':10} {'bytes':>10} {'ratio':>7} {'server ms':>10} " +
+          " ".join(f"{f'{mbit} Mbit/s ms':>15}" for mbit in LINKS_MBIT))
+    baseline_size = None
+    for encoding in encodings:
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            response = client.get('/api/courses/', headers={'Accept-Encoding': encoding})
+            body = response.get_data()
+            timings.append((time.perf_counter() - t0) * 1000)
+
+        size = len(body)
+        baseline_size = baseline_size or size
+        server_ms = min(timings)
+        transfer = " ".join(f"{server_ms + size * 8 / (mbit * 1000):>15.1f}" for mbit in LINKS_MBIT)
+        print(f"{response.headers.get('Content-Encoding', 'identity'):10} {size:>10} "
+              f"{size / baseline_size:>7.2f} {server_ms:>10.1f} {transfer}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# Course contract creation: idempotent retries, asset lookup before minting
+# and the reconciliation sweep (idempotency.py, course_contracts.py).
+#
+# Runs against the in-memory algod (benchmarks/fake_algod.py) with a block
+# time of --round-ms, so every mint costs real waiting:
+#   - a course created with an Idempotency-Key and retried with the same key
+#     replays the stored response without minting or waiting again; the key
+#     with another body is refused;
+#   - a creation whose send times out leaves an asset on chain but no address
+#     locally; the retried contract job adopts that asset instead of minting;
+#   - the sweep adopts assets whose address was never stored, reports
+#     duplicate and orphaned assets, and with create_missing queues contract
+#     jobs for the courses that still have none.
+# The ledger is checked at the end: exactly one live course asset per course.
+#
+#   cd backend
+#   python -m benchmarks.contract_bench --courses 40 --round-ms 50
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import logging
+import tempfile
+from collections import Counter
+from sqlalchemy import update
+from algosdk import account
+from benchmarks.seed import seed_university
+from benchmarks.fake_algod import FakeAlgod, FakeIndexer
+from benchmarks import harness
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark idempotent course contract creation")
+    parser.add_argument('--courses', type=int, default=40)
+    parser.add_argument('--round-ms', type=float, default=50, help="simulated block time")
+    parser.add_argument('--retries', type=int, default=20, help="replayed creation requests")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.CRITICAL)
+
+    private_key, admin_address = account.generate_account()
+    os.environ['ALGORAND_ADMIN_PRIVATE_KEY'] = base64.b64encode(private_key.encode()).decode()
+    app = harness.load_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-contracts-'), 'contracts.db')}")
+    from models import db, Course, Job
+    import smart_contracts
+    import jobs
+
+    algod = FakeAlgod(round_seconds=args.round_ms / 1000)
+    indexer = FakeIndexer(algod)
+    smart_contracts.get_algod_client = lambda: algod
+    smart_contracts.get_indexer_client = lambda: indexer
+    private_key_bytes, _ = smart_contracts.get_admin_account()
+
+    failures = []
+    results = {"courses": args.courses, "round_ms": args.round_ms}
+    with app.app_context():
+        db.create_all()
+        seed_university(students=10, professors=2, courses=args.courses, enrollments=0, assignments=0)
+        tokens = harness.build_tokens({"admin_id": 1, "student_id": 1, "professor_id": 2})
+    client = app.test_client()
+    admin = {"Authorization": f"Bearer {tokens['admin']}"}
+
+    def course_assets():
+        return Counter(note["course_id"] for _, note in algod.created_assets() if "credits" in note)
+
+    def run_due_jobs():
+        with app.app_context():
+            while (claimed := jobs.claim_next('contract-bench', 300)) is not None:
+                jobs.run_job(claimed, 'contract-bench')
+
+    def new_course(code, **extra):
+        return {"code": code, "title": "Contract benchmark", "credits": 3, "capacity": 30, "term": "Fall",
+                "year": 2024, "department": "Benchmarks", "fee": 0, **extra}
+
+    # Idempotent creation: the retry is answered from the stored response
+    headers = {**admin, "Idempotency-Key": "create-IDEM101"}
+    t0 = time.perf_counter()
+    first = client.post('/api/courses/', json=new_course('IDEM101'), headers=headers)
+    results["create_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    sends = algod.sends
+    t0 = time.perf_counter()
+    for _ in range(args.retries):
+        retry = client.post('/api/courses/', json=new_course('IDEM101'), headers=headers)
+        if retry.get_data() != first.get_data() or retry.status_code != first.status_code \
+                or retry.headers.get('Idempotent-Replayed') != 'true':
+            failures.append(f"retry returned {retry.status_code} {retry.get_json()}, first {first.status_code}")
+            break
+    results["replay_ms"] = round((time.perf_counter() - t0) * 1000 / args.retries, 2)
+    if first.status_code != 201 or not first.get_json()["course"].get("contract_address"):
+        failures.append(f"creation returned {first.status_code}: {first.get_json()}")
+    if algod.sends != sends:
+        failures.append(f"replayed creations sent {algod.sends - sends} transactions")
+    mismatch = client.post('/api/courses/', json=new_course('IDEM102'), headers=headers)
+    if mismatch.status_code != 422:
+        failures.append(f"reusing the key for another course returned {mismatch.status_code}")
+    if client.post('/api/courses/', json=new_course('IDEM101'), headers=admin).status_code != 409:
+        failures.append("creating the same code without a key was not refused")
+
+    # The send times out after the node took the transaction: the course is
+    # stored without a contract while its asset confirms on chain
+    algod.failures = {algod.sends + 1: 'timeout'}
+    created = client.post('/api/courses/', json=new_course('LOST201'), headers=admin).get_json()["course"]
+    algod.advance(1)
+    if created.get("contract_address"):
+        failures.append("the timed out creation reported a contract")
+    sends, rounds = algod.sends, algod.rounds_waited
+    with app.app_context():
+        job, _ = jobs.enqueue('course_contract', {"course_id": created["id"]})
+    run_due_jobs()
+    with app.app_context():
+        adopted = db.session.get(Course, created["id"]).contract_address
+    results["adopt_rounds_waited"] = algod.rounds_waited - rounds
+    if algod.sends != sends:
+        failures.append("the contract job minted again instead of adopting the asset")
+    if course_assets()[created["id"]] != 1 or not adopted:
+        failures.append(f"course {created['id']} has {course_assets()[created['id']]} assets, address {adopted}")
+
+    # Sweep: half the seeded courses have assets whose address was lost, one
+    # has a duplicate, and one asset belongs to a course that was deleted
+    with app.app_context():
+        seeded = Course.query.filter(Course.code.notin_(['IDEM101', 'LOST201'])).order_by(Course.id).all()
+        lost = seeded[:len(seeded) // 2]
+        for course in lost:
+            smart_contracts._create_course_contract(course, private_key_bytes, admin_address)
+        duplicated = lost[0]
+        # Mint a second asset for it, as a pre-lookup retry would have
+        find_course_asset = smart_contracts.course_contracts.find_course_asset
+        smart_contracts.course_contracts.find_course_asset = lambda *a: None
+        try:
+            smart_contracts._create_course_contract(duplicated, private_key_bytes, admin_address)
+        finally:
+            smart_contracts.course_contracts.find_course_asset = find_course_asset
+        gone = Course(code='GONE301', title='Deleted', credits=3, capacity=10, term='Fall', year=2024,
+                      department='Benchmarks', fee=0, status='active')
+        db.session.add(gone)
+        db.session.commit()
+        smart_contracts._create_course_contract(gone, private_key_bytes, admin_address)
+        db.session.delete(gone)
+        db.session.execute(update(Course).where(Course.id.in_([c.id for c in lost])).values(contract_address=None))
+        db.session.commit()
+        lost_ids = {c.id for c in lost}
+        without = {c.id for c in seeded} - lost_ids
+        duplicated_id = duplicated.id
+
+    sends = algod.sends
+    response = client.post('/api/blockchain/contracts/sweep', json={"create_missing": True}, headers=admin)
+    if response.status_code != 202:
+        failures.append(f"sweep returned {response.status_code}: {response.get_json()}")
+    job_id = response.get_json()["job"]["id"]
+    t0 = time.perf_counter()
+    with app.app_context():
+        claimed = jobs.claim_next('contract-bench', 300)
+        jobs.run_job(claimed, 'contract-bench')
+    results["sweep_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    report = client.get(f"/api/jobs/{job_id}", headers=admin).get_json()["result"]
+    results["sweep"] = {k: len(v) if isinstance(v, list) else v for k, v in report.items()}
+    if {a["course_id"] for a in report["adopted"]} != lost_ids:
+        failures.append(f"sweep adopted {len(report['adopted'])} courses, expected {len(lost_ids)}")
+    if [d["course_id"] for d in report["duplicates"]] != [duplicated_id]:
+        failures.append(f"sweep reported duplicates {report['duplicates']}")
+    if [o["name"] for o in report["orphans"]] != ['Course_GONE301']:
+        failures.append(f"sweep reported orphans {report['orphans']}")
+    if set(report["missing"]) != without or len(report.get("queued", [])) != len(without):
+        failures.append(f"sweep left {len(report['missing'])} courses missing, queued {len(report.get('queued', []))}")
+    if algod.sends != sends:
+        failures.append("the sweep itself sent transactions")
+
+    run_due_jobs()
+    with app.app_context():
+        contracts = {c.id: c.contract_address for c in Course.query}
+        failed = Job.query.filter_by(status='failed').count()
+    assets = course_assets()
+    if not all(contracts.values()) or failed:
+        failures.append(f"{sum(1 for v in contracts.values() if not v)} courses without a contract, {failed} failed jobs")
+    extra = {course_id: n for course_id, n in assets.items() if n != 1 and course_id != duplicated_id}
+    if extra or assets[duplicated_id] != 2:
+        failures.append(f"unexpected asset counts on the ledger: {extra}")
+
+    # A second sweep finds nothing left to adopt
+    with app.app_context():
+        import course_contracts
+        again = course_contracts.sweep(indexer, admin_address)
+    if again["adopted"] or again["missing"]:
+        failures.append(f"second sweep still adopted {len(again['adopted'])}, missing {len(again['missing'])}")
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# Concurrent read/write throughput per database engine profile.
+#
+# Simulates several gunicorn workers (separate processes) sharing one SQLite
+# file: reader processes run the catalog and roster queries, writer processes
+# insert submissions and update grades. Each profile gets a freshly seeded copy
+# of the database, so "default" (rollback journal, no tuning) can be compared
+# with "sqlite" (WAL, synchronous=NORMAL, busy timeout, mmap, page cache).
+#
+#   cd backend
+#   python -m benchmarks.db_concurrency --readers 4 --writers 2 --duration 10
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+import multiprocessing
+from benchmarks.seed import SCALES, seed_university
+from benchmarks.harness import summarize
+
+
+def _worker(role, database_url, profile, duration, worker_id, queue):
+    os.environ['DB_ENGINE_PROFILE'] = profile
+    logging.disable(logging.CRITICAL)
+    from benchmarks import harness
+    app = harness.load_app(database_url)
+    from models import db, Course, Enrollment, Submission, Grade
+
+    latencies = []
+    statuses = {}
+    with app.app_context():
+        course_ids = [c.id for c in Course.query.with_entities(Course.id).limit(200)]
+        grade_ids = [g.id for g in Grade.query.with_entities(Grade.id).limit(500)]
+        pairs = Enrollment.query.with_entities(Enrollment.student_id, Enrollment.course_id).limit(500).all()
+
+        n = 0
+        started = time.perf_counter()
+        deadline = started + duration
+        while time.perf_counter() < deadline:
+            n += 1
+            t0 = time.perf_counter()
+            try:
+                if role == 'reader':
+                    course_id = course_ids[n % len(course_ids)]
+                    Course.query.filter_by(status='active').all()
+                    Enrollment.query.filter_by(course_id=course_id).all()
+                else:
+                    grade = db.session.get(Grade, grade_ids[n % len(grade_ids)])
+                    grade.score = (grade.score + 1) % 100
+                    db.session.add(Submission(assignment_id=1, student_id=pairs[n % len(pairs)][0],
+                                              content=f"writer {worker_id} #{n}"))
+                    db.session.commit()
+                status = 200
+            except Exception:
+                db.session.rollback()
+                status = 500
+            latencies.append((time.perf_counter() - t0) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+            db.session.remove()
+        elapsed = time.perf_counter() - started
+
+    queue.put((role, latencies, statuses, elapsed))
+
+
+def run_profile(profile, args, scale):
+    directory = tempfile.mkdtemp(prefix=f'ucm-db-{profile}-')
+    database_url = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+
+    # Seed in a child process so every run starts from its own import of app.py
+    seeder = multiprocessing.Process(target=_seed, args=(database_url, profile, scale))
+    seeder.start()
+    seeder.join()
+
+    queue = multiprocessing.Queue()
+    processes = []
+    for i in range(args.readers):
+        processes.append(multiprocessing.Process(target=_worker, args=('reader', database_url, profile, args.duration, i, queue)))
+    for i in range(args.writers):
+        processes.append(multiprocessing.Process(target=_worker, args=('writer', database_url, profile, args.duration, i, queue)))
+    for process in processes:
+        process.start()
+    outcomes = [queue.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    result = {}
+    for role in ('reader', 'writer'):
+        latencies = []
+        statuses = {}
+        elapsed = 0.0
+        for outcome_role, outcome_latencies, outcome_statuses, outcome_elapsed in outcomes:
+            if outcome_role != role:
+                continue
+            latencies.extend(outcome_latencies)
+            elapsed = max(elapsed, outcome_elapsed)
+            for status, count in outcome_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+        result[role + 's'] = summarize(latencies, elapsed, statuses)
+    return result
+
+
+def _seed(database_url, profile, scale):
+    os.environ['DB_ENGINE_PROFILE'] = profile
+    logging.disable(logging.CRITICAL)
+    from benchmarks import harness
+    app = harness.load_app(database_url)
+    from models import db
+    with app.app_context():
+        db.create_all()
+        seed_university(**scale)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare concurrent SQLite throughput across engine profiles")
+    parser.add_argument('--scale', choices=sorted(SCALES), default='tiny')
+    parser.add_argument('--profiles', default='default,sqlite')
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--output', help="write results JSON to this file")
+    args = parser.parse_args(argv)
+
+    multiprocessing.set_start_method('spawn')
+    results = {}
+    for profile in args.profiles.split(','):
+        results[profile] = run_profile(profile, args, SCALES[args.scale])
+
+    print(f"{'profile':10} {'role':8} {'ops':>8} {'errors':>7} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for profile, roles in results.items():
+        for role, s in roles.items():
+            print(f"{profile:10} {role:8} {s['requests']:>8} {s['errors']:>7} {s['throughput_rps']!s:>9} "
+                  f"{s['p50_ms']!s:>9} {s['p95_ms']!s:>9} {s['p99_ms']!s:>9}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"options": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
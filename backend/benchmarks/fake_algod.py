@@ -0,0 +1,229 @@
+# In-memory stand-ins for the algod and indexer clients, enough for the
+# chain code paths in smart_contracts.py, certificates.py and chain_mirror.py.
+#
+# Transactions sent in one round confirm together when the next block is
+# "produced" (status_after_block). Asset creations get sequential asset IDs.
+# Failures can be scheduled per send_transactions call:
+#   reject   - the node answers with an HTTP error; nothing enters the pool
+#   timeout  - the node takes the group but the client never hears back
+#   lose     - the node answers but the group never confirms
+# forget() drops algod's memory of confirmed transactions, as a real node
+# does after a while, so only the indexer still knows about them.
+import copy
+import time
+import bisect
+import json
+import base64
+import hashlib
+import threading
+from algosdk import error, transaction
+
+GENESIS_HASH = base64.b64encode(hashlib.sha256(b'fakenet').digest()).decode()
+
+
+class FakeAlgod:
+    def __init__(self, round_seconds=0.0, first_round=1000):
+        self.round = first_round
+        self.round_seconds = round_seconds
+        self.pool = {}  # txid -> signed transaction
+        self.recent = {}  # txid -> pending info, what pending_transaction_info still knows
+        self.ledger = {}  # txid -> (confirmed round, signed transaction, asset id, offset in round)
+        self.history = []  # txids in confirmation order
+        self.history_rounds = []  # confirmed round of each entry in history
+        self.next_asset_id = 100000
+        self.sends = 0
+        self.failures = {}  # send number -> 'reject' | 'timeout' | 'lose'
+        self.rounds_waited = 0
+        self._lock = threading.Lock()
+
+    def status(self):
+        return {"last-round": self.round}
+
+    def status_after_block(self, round_num):
+        if self.round_seconds:
+            time.sleep(self.round_seconds)
+        with self._lock:
+            self.rounds_waited += 1
+            if self.round <= round_num:
+                self._produce_block()
+        return self.status()
+
+    def suggested_params(self):
+        return transaction.SuggestedParams(fee=1000, first=self.round, last=self.round + 1000, gh=GENESIS_HASH,
+                                           gen='fakenet-v1', flat_fee=True)
+
+    def send_transaction(self, signed_txn, **kwargs):
+        return self.send_transactions([signed_txn])
+
+    def send_transactions(self, signed_txns, **kwargs):
+        with self._lock:
+            self.sends += 1
+            failure = self.failures.pop(self.sends, None)
+            if failure == 'reject':
+                raise error.AlgodHTTPError("TransactionPool.Remember: transaction rejected", 400)
+            txns = [signed_txn.transaction for signed_txn in signed_txns]
+            if any(txn.last_valid_round < self.round for txn in txns):
+                raise error.AlgodHTTPError("txn dead: round outside of validity range", 400)
+            if len(txns) > 1 and len({txn.group for txn in txns} | {self._group_id(txns)}) != 1:
+                raise error.AlgodHTTPError("group id mismatch", 400)
+            if failure != 'lose':
+                for signed_txn in signed_txns:
+                    txid = signed_txn.get_txid()
+                    if txid in self.ledger or txid in self.pool:
+                        raise error.AlgodHTTPError(f"transaction already in ledger: {txid}", 400)
+                    self.pool[txid] = signed_txn
+            if failure == 'timeout':
+                raise TimeoutError("timed out")
+        return signed_txns[0].get_txid()
+
+    # The group ID covers the transactions as they were before it was assigned
+    def _group_id(self, txns):
+        ungrouped = [copy.copy(txn) for txn in txns]
+        for txn in ungrouped:
+            txn.group = None
+        return transaction.calculate_group_id(ungrouped)
+
+    def pending_transaction_info(self, txid, **kwargs):
+        with self._lock:
+            if txid in self.recent:
+                return self.recent[txid]
+            if txid in self.pool:
+                return {"confirmed-round": 0, "pool-error": ""}
+        raise error.AlgodHTTPError("txn does not exist", 404)
+
+    # Let rounds pass without anyone waiting on them
+    def advance(self, rounds):
+        with self._lock:
+            for _ in range(rounds):
+                self._produce_block()
+
+    def forget(self):
+        with self._lock:
+            self.recent.clear()
+
+    def _produce_block(self):
+        self.round += 1
+        for offset, (txid, signed_txn) in enumerate(self.pool.items()):
+            info = {"confirmed-round": self.round, "pool-error": ""}
+            asset_id = None
+            if isinstance(signed_txn.transaction, transaction.AssetConfigTxn) and not signed_txn.transaction.index:
+                asset_id = info["asset-index"] = self.next_asset_id
+                self.next_asset_id += 1
+            self.recent[txid] = info
+            self.ledger[txid] = (self.round, signed_txn, asset_id, offset)
+            self.history.append(txid)
+            self.history_rounds.append(self.round)
+        self.pool = {}
+
+    # Asset creations on the ledger: [(asset id, decoded note)]
+    def created_assets(self):
+        return [(asset_id, json.loads(signed_txn.transaction.note))
+                for _, signed_txn, asset_id, _ in self.ledger.values() if asset_id is not None]
+
+
+# Answers the indexer calls the code makes (health, search_transactions,
+# search_assets) from
+# the fake algod's ledger, in the indexer's JSON shape. page_seconds adds a
+# round trip per call, which is what parallel catch-up is meant to hide.
+class FakeIndexer:
+    def __init__(self, algod, page_seconds=0.0):
+        self.algod = algod
+        self.page_seconds = page_seconds
+        self.calls = 0
+        self.failures = set()  # call numbers that raise, as a dropped connection would
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+            failing = self.calls in self.failures
+        if self.page_seconds:
+            time.sleep(self.page_seconds)
+        if failing:
+            raise ConnectionResetError("connection reset by peer")
+
+    def health(self, **kwargs):
+        self._call()
+        return {"round": self.algod.round}
+
+    def transaction(self, txid, **kwargs):
+        self._call()
+        with self.algod._lock:
+            if txid not in self.algod.ledger:
+                raise error.IndexerHTTPError(f"no transaction found for tx id {txid}")
+            return {"current-round": self.algod.round, "transaction": self._render(txid)}
+
+    def search_transactions(self, txid=None, address=None, min_round=None, max_round=None, limit=None,
+                            next_page=None, **kwargs):
+        self._call()
+        limit = limit or 1000
+        with self.algod._lock:
+            if txid is not None:
+                found = [txid] if txid in self.algod.ledger else []
+                return {"current-round": self.algod.round, "transactions": [self._render(t) for t in found]}
+
+            position = int(next_page) if next_page else bisect.bisect_left(self.algod.history_rounds, min_round or 0)
+            transactions = []
+            while position < len(self.algod.history) and len(transactions) < limit:
+                if max_round is not None and self.algod.history_rounds[position] > max_round:
+                    break
+                txn = self.algod.ledger[self.algod.history[position]][1].transaction
+                if address is None or address in (txn.sender, getattr(txn, 'receiver', None)):
+                    transactions.append(self._render(self.algod.history[position]))
+                position += 1
+            page = {"current-round": self.algod.round, "transactions": transactions}
+            if len(transactions) == limit:
+                page["next-token"] = str(position)
+            return page
+
+    # Name and unit filters match whole values, ignoring case, as the indexer does
+    def search_assets(self, creator=None, name=None, unit=None, limit=None, next_page=None, include_all=False,
+                      **kwargs):
+        self._call()
+        limit = limit or 1000
+        after = int(next_page) if next_page else 0
+        with self.algod._lock:
+            created = sorted((asset_id, confirmed_round, signed_txn.transaction)
+                             for confirmed_round, signed_txn, asset_id, _ in self.algod.ledger.values()
+                             if asset_id is not None and asset_id > after)
+            assets = []
+            for asset_id, confirmed_round, txn in created:
+                if creator is not None and txn.sender != creator:
+                    continue
+                if name is not None and (txn.asset_name or '').lower() != name.lower():
+                    continue
+                if unit is not None and (txn.unit_name or '').lower() != unit.lower():
+                    continue
+                assets.append({"index": asset_id, "deleted": False, "created-at-round": confirmed_round, "params": {
+                    "creator": txn.sender, "name": txn.asset_name, "unit-name": txn.unit_name, "total": txn.total,
+                    "decimals": txn.decimals, "url": txn.url, "manager": txn.manager}})
+                if len(assets) == limit:
+                    break
+            page = {"current-round": self.algod.round, "assets": assets}
+            if len(assets) == limit:
+                page["next-token"] = str(assets[-1]["index"])
+            return page
+
+    def _render(self, txid):
+        confirmed_round, signed_txn, asset_id, offset = self.algod.ledger[txid]
+        txn = signed_txn.transaction
+        rendered = {
+            "id": txid,
+            "confirmed-round": confirmed_round,
+            "round-time": 1700000000 + confirmed_round * 3,
+            "intra-round-offset": offset,
+            "sender": txn.sender,
+            "fee": txn.fee,
+            "tx-type": txn.type,
+            "note": base64.b64encode(txn.note or b'').decode()
+        }
+        if asset_id is not None:
+            rendered["created-asset-index"] = asset_id
+        if isinstance(txn, transaction.AssetTransferTxn):
+            rendered["asset-transfer-transaction"] = {"asset-id": txn.index, "amount": txn.amount,
+                                                      "receiver": txn.receiver}
+        elif isinstance(txn, transaction.AssetConfigTxn):
+            rendered["asset-config-transaction"] = {"asset-id": txn.index or 0, "params": {
+                "name": txn.asset_name, "unit-name": txn.unit_name, "total": txn.total, "url": txn.url,
+                "manager": txn.manager}}
+        return rendered
@@ -0,0 +1,141 @@
+# Section gradebook: vectorized section grades vs the per-student endpoint.
+#
+# Builds one large section (default 1,000 students x 60 assignments, about
+# 85% graded, a few students placed exactly on letter boundaries), checks the
+# NumPy and pure-Python paths agree with each other and with the final grade
+# students.get_student_grades reports for a sample of students, times the
+# gradebook against the 200 ms target, then times the bulk write.
+#
+#   cd backend
+#   python -m benchmarks.gradebook_bench --students 1000 --assignments 60
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import logging
+import datetime
+import tempfile
+from sqlalchemy import insert
+from benchmarks.seed import seed_university
+from benchmarks import harness
+
+TARGET_MS = 200
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return round(min(timings), 2)
+
+
+# One course (id 1) with every seeded student enrolled and graded
+def build_section(students, assignments, graded=0.85, seed=7):
+    from models import db, User, Course, Enrollment, Assignment, Grade
+    rng = random.Random(seed)
+    seed_university(students=students, professors=1, courses=1, enrollments=0, assignments=0)
+    course = db.session.get(Course, 1)
+    course.capacity = students
+    student_ids = [u.id for u in User.query.filter_by(role='student').order_by(User.id)]
+    now = datetime.datetime(2024, 1, 15, 9, 0, 0)
+
+    db.session.execute(insert(Enrollment), [
+        dict(student_id=student_id, course_id=course.id, status='enrolled', created_at=now, updated_at=now)
+        for student_id in student_ids
+    ])
+    db.session.execute(insert(Assignment), [
+        dict(id=i + 1, course_id=course.id, title=f'Assignment {i + 1}', due_date=now,
+             points=rng.choice([10, 20, 50, 100]), weight=rng.choice([0.5, 1.0, 1.5, 2.0]),
+             created_at=now, updated_at=now)
+        for i in range(assignments)
+    ])
+    points = {a.id: a.points for a in Assignment.query.filter_by(course_id=course.id)}
+
+    grades = []
+    for n, student_id in enumerate(student_ids):
+        for assignment_id, assignment_points in points.items():
+            if n < 4:
+                # Every score at exactly 90/80/70/60% of the points
+                grades.append((student_id, assignment_id, assignment_points * (0.9 - 0.1 * n)))
+            elif rng.random() < graded:
+                grades.append((student_id, assignment_id, round(rng.uniform(0.4, 1.0) * assignment_points, 1)))
+    db.session.execute(insert(Grade), [
+        dict(student_id=s, assignment_id=a, score=score, graded_at=now) for s, a, score in grades
+    ])
+    db.session.commit()
+    return course.id, course.instructor_id, student_ids, len(grades)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark gradebook.py")
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--assignments', type=int, default=60)
+    parser.add_argument('--sample', type=int, default=25, help="students checked against /api/students/<id>/grades")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    app = harness.load_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-gradebook-'), 'gradebook.db')}")
+    from models import db, Enrollment
+    import gradebook
+
+    failures = []
+    with app.app_context():
+        db.create_all()
+        course_id, professor_id, student_ids, n_grades = build_section(args.students, args.assignments)
+        tokens = harness.build_tokens({"admin_id": 1, "student_id": student_ids[0], "professor_id": professor_id})
+
+        python_results = gradebook.section_grades(course_id, use_numpy=False)
+        timings = {"python_ms": best_of(args.repeat, lambda: gradebook.section_grades(course_id, use_numpy=False))}
+        if gradebook.np is not None:
+            numpy_results = gradebook.section_grades(course_id, use_numpy=True)
+            timings["numpy_ms"] = best_of(args.repeat, lambda: gradebook.section_grades(course_id, use_numpy=True))
+            if numpy_results != python_results:
+                failures.append("numpy and python section grades differ")
+        computed = {r["student_id"]: r["computed_grade"] for r in python_results}
+        boundary = [computed[student_id] for student_id in student_ids[:4]]
+        if boundary != ['A', 'B', 'C', 'D']:
+            failures.append(f"boundary students graded {boundary}, expected A, B, C, D")
+
+    client = app.test_client()
+    admin = {"Authorization": f"Bearer {tokens['admin']}"}
+    professor = {"Authorization": f"Bearer {tokens['professor']}"}
+    sample = student_ids[:4] + random.Random(1).sample(student_ids[4:], min(args.sample, len(student_ids) - 4))
+    t0 = time.perf_counter()
+    for student_id in sample:
+        entry = next(e for e in client.get(f"/api/students/{student_id}/grades", headers=admin).get_json()
+                     if e["course"]["id"] == course_id)
+        if entry["final_grade"] != computed[student_id]:
+            failures.append(f"student {student_id}: endpoint {entry['final_grade']} != gradebook {computed[student_id]}")
+    timings["student_endpoint_ms_per_student"] = round((time.perf_counter() - t0) * 1000 / len(sample), 2)
+
+    url = f"/api/professors/{professor_id}/courses/{course_id}/gradebook"
+    timings["gradebook_request_ms"] = best_of(args.repeat, lambda: client.get(url, headers=professor))
+    t0 = time.perf_counter()
+    response = client.post(url, headers=professor, json={"overwrite": True})
+    timings["apply_request_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    if response.status_code != 200:
+        failures.append(f"POST gradebook returned {response.status_code}")
+    else:
+        with app.app_context():
+            stored = dict(db.session.query(Enrollment.student_id, Enrollment.grade).filter_by(course_id=course_id))
+        if stored != computed:
+            failures.append("Enrollment.grade does not match the computed grades after POST")
+
+    best = min(v for k, v in timings.items() if k in ('python_ms', 'numpy_ms'))
+    if best > TARGET_MS:
+        failures.append(f"section grades took {best} ms, target is {TARGET_MS} ms")
+
+    print(json.dumps({"students": len(student_ids), "assignments": args.assignments, "grades": n_grades,
+                      "numpy": gradebook.np is not None, **timings}, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,370 @@
+import os
+import json
+import time
+import itertools
+import threading
+import http.client
+import subprocess
+import platform
+import tempfile
+import datetime
+from urllib.parse import urlsplit
+from sqlalchemy import event, func
+from flask_jwt_extended import create_access_token
+from models import db, User, Course, Enrollment, Assignment, Submission
+
+
+# Build the Flask app bound to the given database. Some modules read their
+# settings from the environment at import time, so this has to run before
+# anything else imports app.py.
+def load_app(database_url):
+    os.environ['DATABASE_URL'] = database_url
+    # Keep uploaded benchmark files out of the instance folder
+    os.environ.setdefault('UPLOAD_FOLDER', tempfile.mkdtemp(prefix='ucm-uploads-'))
+    # No background job threads: their polling would show up in query counts
+    os.environ.setdefault('JOB_WORKERS', '0')
+    from app import create_app
+    return create_app()
+
+
+# Counts (and optionally records) every SQL statement sent to the engine
+class QueryCounter:
+    def __init__(self, engine, record=False):
+        self.engine = engine
+        self.record = record
+        self.count = 0
+        self.statements = []
+        self._lock = threading.Lock()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        with self._lock:
+            self.count += 1
+            if self.record:
+                self.statements.append(statement)
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.statements = []
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+
+
+# Pick the busiest entities in the seeded data so every endpoint runs its worst case
+def build_fixture():
+    student_id, _ = db.session.query(Enrollment.student_id, func.count(Enrollment.id)) \
+        .group_by(Enrollment.student_id).order_by(func.count(Enrollment.id).desc()).first()
+    course_id, _ = db.session.query(Enrollment.course_id, func.count(Enrollment.id)) \
+        .join(Course, Course.id == Enrollment.course_id).filter(Course.instructor_id.isnot(None)) \
+        .group_by(Enrollment.course_id).order_by(func.count(Enrollment.id).desc()).first()
+    course = db.session.get(Course, course_id)
+    professor_id = course.instructor_id
+    admin_id = User.query.filter_by(role='admin').first().id
+
+    student_enrollment = Enrollment.query.filter_by(student_id=student_id).first()
+    student_assignment = Assignment.query.filter_by(course_id=student_enrollment.course_id).first()
+    submission = Submission.query.join(Assignment).filter(Assignment.course_id == course_id).first()
+    roster = [e.student_id for e in Enrollment.query.filter_by(course_id=course_id).limit(50)]
+    open_course_ids = [c.id for c in Course.query.filter_by(status='active').order_by(Course.id).limit(200)]
+
+    return {
+        "admin_id": admin_id,
+        "student_id": student_id,
+        "professor_id": professor_id,
+        "course_id": course_id,
+        "department": course.department,
+        "term": course.term,
+        "year": course.year,
+        "enrollment_id": student_enrollment.id,
+        "student_assignment_id": student_assignment.id if student_assignment else None,
+        "submission_id": submission.id if submission else None,
+        "roster": roster,
+        "open_course_ids": open_course_ids
+    }
+
+
+def build_tokens(fixture):
+    expires = datetime.timedelta(days=1)
+    return {
+        "admin": create_access_token(identity=fixture["admin_id"], expires_delta=expires),
+        "student": create_access_token(identity=fixture["student_id"], expires_delta=expires),
+        "professor": create_access_token(identity=fixture["professor_id"], expires_delta=expires),
+    }
+
+
+class Endpoint:
+    def __init__(self, name, method, path, role=None, body=None, writes=False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.role = role
+        self.body = body
+        self.writes = writes
+
+    # Produce (path, json_body) for the n-th call; writes get fresh values per call
+    def request(self, n):
+        path = self.path(n) if callable(self.path) else self.path
+        body = self.body(n) if callable(self.body) else self.body
+        return path, body
+
+
+# Every route registered by the blueprints and app.py, bound to the fixture ids
+def build_endpoints(fixture):
+    f = fixture
+    run = f"{os.getpid()}{int(time.time())}"
+    open_courses = f["open_course_ids"] or [f["course_id"]]
+    roster_grades = [{"student_id": s, "grade": "B"} for s in f["roster"]]
+
+    return [
+        Endpoint('index', 'GET', '/'),
+        Endpoint('health', 'GET', '/api/health'),
+        Endpoint('profile', 'GET', '/api/profile', 'student'),
+        Endpoint('dashboard_student', 'GET', '/api/dashboard', 'student'),
+        Endpoint('dashboard_professor', 'GET', '/api/dashboard', 'professor'),
+        Endpoint('dashboard_admin', 'GET', '/api/dashboard', 'admin'),
+        Endpoint('auth_register', 'POST', '/api/auth/register', writes=True,
+                 body=lambda n: {"email": f"bench{run}_{n}@university.edu", "password": "benchmark",
+                                 "name": f"Bench {n}", "role": "student"}),
+        Endpoint('auth_login', 'POST', '/api/auth/login',
+                 body={"email": "admin@university.edu", "password": "benchmark"}),
+        Endpoint('auth_logout', 'POST', '/api/auth/logout', 'student'),
+        Endpoint('auth_change_password', 'POST', '/api/auth/change-password', 'admin', writes=True,
+                 body={"current_password": "benchmark", "new_password": "benchmark"}),
+        Endpoint('courses_list', 'GET', '/api/courses/'),
+        Endpoint('courses_list_filtered', 'GET',
+                 f"/api/courses/?department={f['department']}&term={f['term']}&year={f['year']}"),
+        Endpoint('course_search', 'GET', '/api/courses/search?q=intro%20alg'),
+        Endpoint('course_detail', 'GET', f"/api/courses/{f['course_id']}"),
+        Endpoint('course_create', 'POST', '/api/courses/', 'admin', writes=True,
+                 body=lambda n: {"code": f"B{run}{n}", "title": "Benchmark course", "credits": 3,
+                                 "capacity": 30, "term": "Fall", "year": 2024, "department": "Benchmarks",
+                                 "fee": 0, "create_contract": False}),
+        Endpoint('course_update', 'PUT', f"/api/courses/{f['course_id']}", 'professor', writes=True,
+                 body=lambda n: {"description": f"Updated by benchmark run {run} call {n}"}),
+        Endpoint('course_enroll', 'POST', lambda n: f"/api/courses/{open_courses[n % len(open_courses)]}/enroll",
+                 'student', writes=True),
+        Endpoint('course_meetings', 'GET', f"/api/courses/{f['course_id']}/meetings"),
+        Endpoint('course_meeting_create', 'POST', f"/api/courses/{f['course_id']}/meetings", 'professor',
+                 writes=True, body={"days": "S", "start_time": "10:00", "end_time": "11:00", "room": "Bench"}),
+        Endpoint('schedule_check', 'POST', '/api/courses/schedule/check', 'student',
+                 body={"course_ids": open_courses[:20]}),
+        Endpoint('course_enroll_batch', 'POST', '/api/courses/enroll/batch', 'student', writes=True,
+                 body=lambda n: {"course_ids": [open_courses[(n * 5 + i) % len(open_courses)] for i in range(5)],
+                                 "mode": "best_effort"}),
+        Endpoint('course_seats', 'GET', f"/api/courses/{f['course_id']}/seats"),
+        Endpoint('course_waitlist_student', 'GET', f"/api/courses/{f['course_id']}/waitlist", 'student'),
+        Endpoint('course_waitlist_professor', 'GET', f"/api/courses/{f['course_id']}/waitlist", 'professor'),
+        Endpoint('course_assignments', 'GET', f"/api/courses/{f['course_id']}/assignments"),
+        Endpoint('course_assignment_create', 'POST', f"/api/courses/{f['course_id']}/assignments", 'professor',
+                 writes=True,
+                 body=lambda n: {"title": f"Bench assignment {n}", "due_date": "2024-12-01T12:00:00",
+                                 "points": 100, "weight": 0.1}),
+        Endpoint('students_list', 'GET', '/api/students/', 'admin'),
+        Endpoint('student_detail', 'GET', f"/api/students/{f['student_id']}", 'student'),
+        Endpoint('student_courses', 'GET', f"/api/students/{f['student_id']}/courses", 'student'),
+        Endpoint('student_assignments', 'GET', f"/api/students/{f['student_id']}/assignments", 'student'),
+        Endpoint('student_submit', 'POST', f"/api/students/{f['student_id']}/submissions", 'student', writes=True,
+                 body={"assignment_id": f["student_assignment_id"], "content": "Benchmark submission"}),
+        Endpoint('student_grades', 'GET', f"/api/students/{f['student_id']}/grades", 'student'),
+        Endpoint('professors_list', 'GET', '/api/professors/'),
+        Endpoint('professor_detail', 'GET', f"/api/professors/{f['professor_id']}"),
+        Endpoint('professor_courses', 'GET', f"/api/professors/{f['professor_id']}/courses", 'professor'),
+        Endpoint('professor_grade', 'POST', f"/api/professors/{f['professor_id']}/assignments/grade", 'professor',
+                 writes=True, body={"submission_id": f["submission_id"], "score": 8, "feedback": "Benchmark"}),
+        Endpoint('professor_course_students', 'GET',
+                 f"/api/professors/{f['professor_id']}/courses/{f['course_id']}/students", 'professor'),
+        Endpoint('professor_final_grades', 'POST',
+                 f"/api/professors/{f['professor_id']}/courses/{f['course_id']}/grades", 'professor', writes=True,
+                 body={"grades": roster_grades}),
+        Endpoint('professor_final_grades_async', 'POST',
+                 f"/api/professors/{f['professor_id']}/courses/{f['course_id']}/grades?async=true", 'professor',
+                 writes=True, body={"grades": roster_grades}),
+        Endpoint('professor_gradebook', 'GET',
+                 f"/api/professors/{f['professor_id']}/courses/{f['course_id']}/gradebook", 'professor'),
+        Endpoint('professor_gradebook_apply', 'POST',
+                 f"/api/professors/{f['professor_id']}/courses/{f['course_id']}/gradebook", 'professor', writes=True,
+                 body={"overwrite": True}),
+        Endpoint('student_transcript', 'GET', f"/api/students/{f['student_id']}/transcript", 'student'),
+        Endpoint('deans_list', 'GET', f"/api/students/deans-list?term={f['term']}&year={f['year']}", 'admin'),
+        Endpoint('analytics_course', 'GET', f"/api/analytics/courses/{f['course_id']}", 'admin'),
+        Endpoint('analytics_term', 'GET', f"/api/analytics/terms?term={f['term']}&year={f['year']}", 'admin'),
+        Endpoint('blockchain_verify', 'GET', f"/api/blockchain/verify-enrollment/{f['enrollment_id']}", 'student'),
+        Endpoint('blockchain_certificate', 'POST', f"/api/blockchain/course/{f['course_id']}/certificate", 'student'),
+        Endpoint('blockchain_course_certificates', 'GET', f"/api/blockchain/course/{f['course_id']}/certificates",
+                 'professor'),
+        Endpoint('blockchain_student_certificates', 'GET',
+                 f"/api/blockchain/students/{f['student_id']}/certificates", 'student'),
+        Endpoint('blockchain_contract_sweep', 'POST', '/api/blockchain/contracts/sweep', 'admin', writes=True),
+        Endpoint('jobs_list', 'GET', '/api/jobs/', 'professor'),
+        Endpoint('tenants_summary', 'GET', '/api/tenants/summary', 'admin'),
+        Endpoint('tenants_term', 'GET', f"/api/tenants/terms?term={f['term']}&year={f['year']}", 'admin'),
+    ]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies_ms, elapsed_s, statuses, queries=None):
+    latencies_ms = sorted(latencies_ms)
+    requests = len(latencies_ms)
+    result = {
+        "requests": requests,
+        "errors": sum(count for status, count in statuses.items() if int(status) >= 500),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(requests / elapsed_s, 2) if elapsed_s else None,
+        "p50_ms": round(percentile(latencies_ms, 50), 3) if requests else None,
+        "p95_ms": round(percentile(latencies_ms, 95), 3) if requests else None,
+        "p99_ms": round(percentile(latencies_ms, 99), 3) if requests else None,
+        "max_ms": round(latencies_ms[-1], 3) if requests else None,
+    }
+    if queries is not None:
+        result["queries_per_request"] = round(queries / requests, 2) if requests else None
+    return result
+
+
+# Drive each endpoint sequentially in-process through the Flask test client
+def run_client(app, endpoints, tokens, iterations):
+    client = app.test_client()
+    results = {}
+
+    with app.app_context():
+        engine = db.engine
+
+    with QueryCounter(engine) as counter:
+        for endpoint in endpoints:
+            headers = {"Authorization": f"Bearer {tokens[endpoint.role]}"} if endpoint.role else {}
+            latencies = []
+            statuses = {}
+            counter.reset()
+            started = time.perf_counter()
+
+            for n in range(iterations):
+                path, body = endpoint.request(n)
+                t0 = time.perf_counter()
+                response = client.open(path, method=endpoint.method, json=body, headers=headers)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+            results[endpoint.name] = summarize(latencies, time.perf_counter() - started, statuses, counter.count)
+
+    return results
+
+
+# Serve the app on a local threaded werkzeug server; returns (base_url, shutdown)
+def start_local_server(app):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return f"http://127.0.0.1:{server.server_port}", server.shutdown
+
+
+# Multi-threaded HTTP load: every thread issues requests for `duration` seconds
+def run_http(base_url, endpoints, tokens, threads, duration, engine=None):
+    target = urlsplit(base_url)
+    results = {}
+
+    for endpoint in endpoints:
+        headers = {"Content-Type": "application/json"}
+        if endpoint.role:
+            headers["Authorization"] = f"Bearer {tokens[endpoint.role]}"
+
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+        sequence = itertools.count()
+        deadline = time.perf_counter() + duration
+
+        def worker():
+            connection = http.client.HTTPConnection(target.hostname, target.port, timeout=60)
+            local_latencies = []
+            local_statuses = {}
+            while time.perf_counter() < deadline:
+                path, body = endpoint.request(next(sequence))
+                payload = json.dumps(body) if body is not None else None
+                t0 = time.perf_counter()
+                try:
+                    connection.request(endpoint.method, path, body=payload, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                    if response.will_close:
+                        connection.close()
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    status = 599
+                local_latencies.append((time.perf_counter() - t0) * 1000)
+                local_statuses[status] = local_statuses.get(status, 0) + 1
+            connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                for status, count in local_statuses.items():
+                    statuses[status] = statuses.get(status, 0) + count
+
+        counter = QueryCounter(engine) if engine is not None else None
+        if counter:
+            counter.__enter__()
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if counter:
+            counter.__exit__(None, None, None)
+
+        results[endpoint.name] = summarize(latencies, elapsed, statuses, counter.count if counter else None)
+
+    return results
+
+
+def run_metadata(scale, options):
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "commit": commit,
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scale": scale,
+        "options": options
+    }
+
+
+# Side-by-side comparison of two saved result files (p95 latency, throughput, queries)
+def compare_results(baseline, current):
+    lines = []
+    for mode, endpoints in current["results"].items():
+        base_mode = baseline.get("results", {}).get(mode, {})
+        lines.append(f"[{mode}]")
+        lines.append(f"{'endpoint':32} {'p95 ms':>10} {'Δ%':>8} {'rps':>10} {'Δ%':>8} {'q/req':>7} {'base':>7}")
+        for name, stats in endpoints.items():
+            base = base_mode.get(name)
+            if not base:
+                lines.append(f"{name:32} {stats['p95_ms']!s:>10} {'new':>8}")
+                continue
+            lines.append(f"{name:32} {stats['p95_ms']!s:>10} {_delta(base['p95_ms'], stats['p95_ms']):>8} "
+                         f"{stats['throughput_rps']!s:>10} {_delta(base['throughput_rps'], stats['throughput_rps']):>8} "
+                         f"{stats.get('queries_per_request')!s:>7} {base.get('queries_per_request')!s:>7}")
+    return "\n".join(lines)
+
+
+def _delta(before, after):
+    if not before or after is None:
+        return "-"
+    return f"{(after - before) / before * 100:+.1f}"
@@ -0,0 +1,180 @@
+# Background jobs: throughput and behaviour of the database-backed runner in jobs.py.
+#
+# Queues a batch of short jobs and measures how fast the worker threads drain
+# them, then checks that a job failing twice is retried with backoff and
+# succeeds, that a permanent failure is not retried, that an idempotency key
+# returns the original job (and is refused for a different payload), that a
+# job left "running" by a dead worker is picked up again once its lease
+# expires, that no job ran twice, and that a final-grade submission sent with
+# "Prefer: respond-async" returns 202 and finishes behind /api/jobs/<id>.
+#
+#   cd backend
+#   python -m benchmarks.jobs_bench --jobs 500 --workers 4
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import datetime
+import tempfile
+import threading
+from collections import Counter
+from benchmarks.seed import SCALES, seed_university
+from benchmarks import harness
+
+
+def wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark jobs.py")
+    parser.add_argument('--jobs', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--work-ms', type=float, default=2.0, help="simulated I/O wait per job")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    os.environ['JOB_WORKERS'] = str(args.workers)
+    os.environ['JOB_POLL_INTERVAL'] = '0.05'
+    os.environ['JOB_RETRY_BASE_SECONDS'] = '0.05'
+    os.environ['JOB_LEASE_SECONDS'] = '1'
+    app = harness.load_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-jobs-'), 'jobs.db')}")
+    from models import db, Job, Course, Enrollment
+    import jobs
+
+    runs = Counter()
+    runs_lock = threading.Lock()
+
+    @jobs.register('bench_sleep')
+    def sleep_job(context, payload):
+        with runs_lock:
+            runs[payload["n"]] += 1
+        time.sleep(args.work_ms / 1000)
+        return {"n": payload["n"]}
+
+    @jobs.register('bench_flaky')
+    def flaky_job(context, payload):
+        if context.attempt < 3:
+            raise ConnectionError(f"attempt {context.attempt} failed")
+        return {"attempt": context.attempt}
+
+    @jobs.register('bench_permanent')
+    def permanent_job(context, payload):
+        raise jobs.PermanentJobError("bad input")
+
+    failures = []
+    results = {"workers": args.workers, "jobs": args.jobs}
+
+    def status_of(job_id):
+        with app.app_context():
+            return db.session.get(Job, job_id).status
+
+    with app.app_context():
+        db.create_all()
+        seed_university(**SCALES['tiny'])
+        course = Course.query.filter(Course.instructor_id.isnot(None)).first()
+        course_id, professor_id = course.id, course.instructor_id
+        student_ids = [e.student_id for e in Enrollment.query.filter_by(course_id=course_id)]
+        tokens = harness.build_tokens({"admin_id": 1, "student_id": student_ids[0], "professor_id": professor_id})
+
+        # Throughput: queue everything first, then let the workers drain it
+        jobs.runner.workers = 0
+        t0 = time.perf_counter()
+        batch = [jobs.enqueue('bench_sleep', {"n": n})[0].id for n in range(args.jobs)]
+        results["enqueue_per_s"] = round(args.jobs / (time.perf_counter() - t0))
+        jobs.runner.workers = args.workers
+
+    t0 = time.perf_counter()
+    jobs.runner.wake()
+
+    def drained():
+        with app.app_context():
+            return Job.query.filter(Job.id.in_(batch), Job.status == 'succeeded').count() == len(batch)
+    if not wait_for(drained, 120):
+        failures.append("batch did not finish within 120 s")
+    elapsed = time.perf_counter() - t0
+    results["drain_s"] = round(elapsed, 2)
+    results["jobs_per_s"] = round(args.jobs / elapsed)
+    results["serial_floor_s"] = round(args.jobs * args.work_ms / 1000, 2)
+    twice = [n for n, count in runs.items() if count > 1]
+    if twice or len(runs) != args.jobs:
+        failures.append(f"{len(twice)} jobs ran more than once, {args.jobs - len(runs)} never ran")
+
+    with app.app_context():
+        # Retries with backoff, then success
+        flaky = jobs.enqueue('bench_flaky', {})[0].id
+        permanent = jobs.enqueue('bench_permanent', {})[0].id
+    wait_for(lambda: status_of(flaky) == 'succeeded' and status_of(permanent) == 'failed', 10)
+    with app.app_context():
+        job = db.session.get(Job, flaky)
+        if job.status != 'succeeded' or job.attempts != 3:
+            failures.append(f"flaky job ended {job.status} after {job.attempts} attempts, expected succeeded after 3")
+        job = db.session.get(Job, permanent)
+        if job.status != 'failed' or job.attempts != 1:
+            failures.append(f"permanent failure ended {job.status} after {job.attempts} attempts, expected failed after 1")
+
+        # Idempotency keys
+        first, created = jobs.enqueue('bench_sleep', {"n": -1}, user_id=professor_id, idempotency_key='bench-key')
+        again, created_again = jobs.enqueue('bench_sleep', {"n": -1}, user_id=professor_id, idempotency_key='bench-key')
+        if not created or created_again or again.id != first.id:
+            failures.append("idempotency key created a second job")
+        try:
+            jobs.enqueue('bench_sleep', {"n": -2}, user_id=professor_id, idempotency_key='bench-key')
+            failures.append("idempotency key was accepted for a different payload")
+        except jobs.JobError as e:
+            if e.status != 422:
+                failures.append(f"reused idempotency key raised {e.status}, expected 422")
+
+        # A worker that died mid-job: running, lease long expired
+        orphan = Job(kind='bench_sleep', payload=json.dumps({"n": -3}), status='running', attempts=1,
+                     locked_by='dead-worker', locked_at=datetime.datetime.utcnow() - datetime.timedelta(minutes=5))
+        db.session.add(orphan)
+        db.session.commit()
+        orphan = orphan.id
+    jobs.runner.wake()
+    if not wait_for(lambda: status_of(orphan) == 'succeeded', 10):
+        failures.append(f"orphaned job was not recovered (status {status_of(orphan)})")
+
+    # Over HTTP: 202, Location, poll until done
+    client = app.test_client()
+    professor = {"Authorization": f"Bearer {tokens['professor']}"}
+    grades = [{"student_id": student_id, "grade": "B"} for student_id in student_ids]
+    response = client.post(f"/api/professors/{professor_id}/courses/{course_id}/grades", json={"grades": grades},
+                           headers={**professor, "Prefer": "respond-async", "Idempotency-Key": "bench-grades"})
+    if response.status_code != 202 or not response.headers.get('Location'):
+        failures.append(f"async final grades returned {response.status_code}")
+    else:
+        location = response.headers['Location']
+        repeat = client.post(f"/api/professors/{professor_id}/courses/{course_id}/grades", json={"grades": grades},
+                             headers={**professor, "Prefer": "respond-async", "Idempotency-Key": "bench-grades"})
+        if repeat.headers.get('Location') != location:
+            failures.append("repeated async request with the same Idempotency-Key queued a new job")
+        wait_for(lambda: client.get(location, headers=professor).get_json()["status"] != 'queued'
+                 and client.get(location, headers=professor).get_json()["status"] != 'running', 10)
+        job = client.get(location, headers=professor).get_json()
+        if job["status"] != 'succeeded' or len(job["result"]["updated_grades"]) != len(grades):
+            failures.append(f"final grades job ended {job['status']}: {job['error']}")
+        student = {"Authorization": f"Bearer {tokens['student']}"}
+        if client.get(location, headers=student).status_code != 404:
+            failures.append("another user could read the job")
+        with app.app_context():
+            stored = {e.grade for e in Enrollment.query.filter_by(course_id=course_id)}
+        if stored != {'B'}:
+            failures.append(f"enrollment grades after the job: {stored}")
+
+    jobs.runner.stop()
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# Chain mirror: catch-up speed, incremental sync and local verification (chain_mirror.py).
+#
+# Builds a chain history on the in-memory algod (benchmarks/fake_algod.py):
+# course assets, a few thousand enrollment transfers spread over many rounds,
+# and bulk-issued certificates. Then:
+#   - a full catch-up with one worker and with --workers, against an indexer
+#     that takes --page-ms per call, and checks both mirrored everything;
+#   - an interrupted parallel catch-up (one page fails) resumes from the
+#     round it reached without gaps or duplicates;
+#   - an incremental sync reads only the new rounds;
+#   - /verify-enrollment answers from the mirror without calling the indexer,
+#     and the certificate lookups match the ledger.
+#
+#   cd backend
+#   python -m benchmarks.mirror_bench --enrollments 3000 --workers 8 --page-ms 30
+import os
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import logging
+import datetime
+import tempfile
+from sqlalchemy import delete, insert, update
+from algosdk import account
+from benchmarks.seed import seed_university
+from benchmarks.fake_algod import FakeAlgod, FakeIndexer
+from benchmarks import harness
+
+ENROLL_BATCH = 64
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark chain_mirror.py")
+    parser.add_argument('--enrollments', type=int, default=3000)
+    parser.add_argument('--courses', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--page-ms', type=float, default=30, help="simulated indexer round trip")
+    parser.add_argument('--page-limit', type=int, default=100, help="transactions per indexer page")
+    parser.add_argument('--verify', type=int, default=50, help="enrollments verified through the API")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    private_key, admin_address = account.generate_account()
+    os.environ['ALGORAND_ADMIN_PRIVATE_KEY'] = base64.b64encode(private_key.encode()).decode()
+    app = harness.load_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-mirror-'), 'mirror.db')}")
+    from models import db, User, Course, Enrollment, ChainSyncState, ChainEnrollment, ChainCertificate
+    import smart_contracts
+    import certificates
+    import chain_mirror
+
+    chain_mirror.CHAIN_MIRROR_PAGE_LIMIT = args.page_limit
+    algod = FakeAlgod()
+    indexer = FakeIndexer(algod, page_seconds=args.page_ms / 1000)
+    smart_contracts.get_algod_client = lambda: algod
+    smart_contracts.get_indexer_client = lambda: indexer
+    private_key_bytes, _ = smart_contracts.get_admin_account()
+    rng = random.Random(5)
+    failures = []
+    results = {"workers": args.workers, "page_ms": args.page_ms, "page_limit": args.page_limit}
+
+    def enroll(rows):
+        # rows: [(enrollment id, contract, student id, course id)], spread over the rounds
+        txids = {}
+        for start in range(0, len(rows), ENROLL_BATCH):
+            batch = rows[start:start + ENROLL_BATCH]
+            txids.update(smart_contracts.enroll_students([(contract, s, c) for _, contract, s, c in batch]))
+            algod.advance(rng.randint(50, 400))
+        db.session.execute(update(Enrollment), [
+            {"id": enrollment_id, "transaction_id": txids[(s, c)]} for enrollment_id, _, s, c in rows
+        ])
+        db.session.commit()
+
+    with app.app_context():
+        db.create_all()
+        students = max(args.enrollments // 4, 50)
+        seed_university(students=students, professors=2, courses=args.courses, enrollments=0, assignments=0)
+        for course in Course.query.order_by(Course.id):
+            course.contract_address = smart_contracts._create_course_contract(course, private_key_bytes, admin_address)
+            algod.advance(rng.randint(10, 100))
+        db.session.commit()
+
+        contracts = {c.id: c.contract_address for c in Course.query}
+        student_ids = [u.id for u in User.query.filter_by(role='student')]
+        pairs = rng.sample([(s, c) for s in student_ids for c in contracts], args.enrollments)
+        now = datetime.datetime.utcnow()
+        db.session.execute(insert(Enrollment), [
+            dict(student_id=s, course_id=c, status='completed', grade=rng.choice(['A', 'B', 'C', 'F']),
+                 created_at=now, updated_at=now) for s, c in pairs
+        ])
+        db.session.commit()
+        rows = [(e.id, contracts[e.course_id], e.student_id, e.course_id) for e in Enrollment.query.order_by(Enrollment.id)]
+        enroll(rows)
+        for course in Course.query.order_by(Course.id).limit(3):
+            certificates.issue_course(algod, indexer, private_key_bytes, admin_address, course)
+            algod.advance(rng.randint(100, 500))
+        expected_enrollments = len(rows)
+        expected_certificates = sum(1 for _, note in algod.created_assets() if note.get("type") == 'course_certificate')
+        results.update(history_rounds=algod.round - 1000, transactions=len(algod.ledger),
+                       enrollments=expected_enrollments, certificates=expected_certificates)
+
+        def reset_mirror():
+            db.session.execute(delete(ChainEnrollment))
+            db.session.execute(delete(ChainCertificate))
+            db.session.execute(delete(ChainSyncState))
+            db.session.commit()
+
+        def check_mirror(label):
+            counts = (ChainEnrollment.query.count(), ChainCertificate.query.count())
+            if counts != (expected_enrollments, expected_certificates):
+                failures.append(f"{label}: mirrored {counts}, expected {(expected_enrollments, expected_certificates)}")
+
+        # Full catch-up, serial then parallel
+        for workers in (1, args.workers):
+            reset_mirror()
+            calls = indexer.calls
+            t0 = time.perf_counter()
+            totals = chain_mirror.sync(indexer, admin_address, workers=workers)
+            results[f"catch_up_{workers}_workers_s"] = round(time.perf_counter() - t0, 2)
+            results[f"catch_up_{workers}_workers_calls"] = indexer.calls - calls
+            check_mirror(f"catch-up with {workers} workers")
+            if db.session.get(ChainSyncState, admin_address).last_round != algod.round:
+                failures.append(f"catch-up with {workers} workers stopped at the wrong round")
+        results["catch_up_speedup"] = round(results["catch_up_1_workers_s"] / results[f"catch_up_{args.workers}_workers_s"], 1)
+
+        # Interrupted catch-up: one page fails part way, the rerun fills the gap
+        reset_mirror()
+        indexer.failures = {indexer.calls + 6}
+        try:
+            chain_mirror.sync(indexer, admin_address, workers=args.workers)
+            failures.append("sync with a failing page did not raise")
+        except ConnectionResetError:
+            db.session.rollback()
+        reached = db.session.get(ChainSyncState, admin_address).last_round
+        chain_mirror.sync(indexer, admin_address, workers=args.workers)
+        results["interrupted_catch_up_reached_round"] = reached
+        check_mirror("resumed catch-up")
+
+        # Incremental: only the new rounds are read
+        extra = Enrollment.query.order_by(Enrollment.id).limit(40).all()
+        for enrollment in extra:
+            enrollment.grade = 'A'
+        new_rows = []
+        for enrollment in extra:
+            clone = Enrollment(student_id=enrollment.student_id, course_id=enrollment.course_id, status='enrolled')
+            db.session.add(clone)
+            db.session.flush()
+            new_rows.append((clone.id, contracts[clone.course_id], clone.student_id, clone.course_id))
+        db.session.commit()
+        enroll(new_rows)
+        expected_enrollments += len(new_rows)
+        calls = indexer.calls
+        t0 = time.perf_counter()
+        totals = chain_mirror.sync(indexer, admin_address)
+        results["incremental_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        results["incremental_calls"] = indexer.calls - calls
+        if totals["enrollments"] != len(new_rows):
+            failures.append(f"incremental sync added {totals['enrollments']} enrollments, expected {len(new_rows)}")
+        check_mirror("incremental sync")
+
+        # Reading history again adds nothing
+        totals = chain_mirror.sync(indexer, admin_address, workers=args.workers, from_round=1)
+        if totals["enrollments"] or totals["certificates"]:
+            failures.append(f"re-reading history added rows: {totals}")
+        check_mirror("re-read")
+
+        sample = rng.sample([r[0] for r in rows], min(args.verify, len(rows)))
+        certificate_student = ChainCertificate.query.first().student_id
+        tokens = harness.build_tokens({"admin_id": 1, "student_id": certificate_student, "professor_id": 2})
+
+    # Verification and certificate lookups are local
+    client = app.test_client()
+    admin = {"Authorization": f"Bearer {tokens['admin']}"}
+    calls = indexer.calls
+    t0 = time.perf_counter()
+    for enrollment_id in sample:
+        body = client.get(f"/api/blockchain/verify-enrollment/{enrollment_id}", headers=admin).get_json()
+        if not body.get("verified") or body["blockchain_data"]["source"] != 'mirror':
+            failures.append(f"enrollment {enrollment_id} not verified from the mirror: {body}")
+            break
+    results["verify_mirror_ms"] = round((time.perf_counter() - t0) * 1000 / len(sample), 2)
+    if indexer.calls != calls:
+        failures.append(f"mirrored verification made {indexer.calls - calls} indexer calls")
+
+    with app.app_context():
+        db.session.execute(delete(ChainEnrollment).where(ChainEnrollment.transaction_id.in_(
+            db.session.query(Enrollment.transaction_id).filter(Enrollment.id.in_(sample)))))
+        db.session.commit()
+    t0 = time.perf_counter()
+    for enrollment_id in sample:
+        body = client.get(f"/api/blockchain/verify-enrollment/{enrollment_id}", headers=admin).get_json()
+        if not body.get("verified") or body["blockchain_data"]["source"] != 'indexer':
+            failures.append(f"enrollment {enrollment_id} not verified through the indexer fallback: {body}")
+            break
+    results["verify_indexer_ms"] = round((time.perf_counter() - t0) * 1000 / len(sample), 2)
+
+    student = {"Authorization": f"Bearer {tokens['student']}"}
+    listed = client.get(f"/api/blockchain/students/{certificate_student}/certificates", headers=student).get_json()
+    on_ledger = {asset_id for asset_id, note in algod.created_assets()
+                 if note.get("type") == 'course_certificate' and note["student_id"] == certificate_student}
+    if {c["asset_id"] for c in listed} != on_ledger:
+        failures.append("student certificate list does not match the ledger")
+    if client.get(f"/api/blockchain/certificates/{next(iter(on_ledger))}", headers=student).status_code != 200:
+        failures.append("certificate lookup by asset ID failed")
+    status = client.get("/api/blockchain/mirror", headers=admin).get_json()
+    if status.get("last_round") != algod.round:
+        failures.append(f"mirror status reports round {status.get('last_round')}, chain is at {algod.round}")
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# Query-count regression guard.
+#
+# Seeds the same synthetic university at two sizes, calls every endpoint once
+# per size and records the SQL statements it issues. The run fails when
+#   * an endpoint issues more queries than its budget in query_budgets.json, or
+#   * its query count grows with the data (an N+1) and it is not one of the
+#     known offenders marked "allow_growth" in the baseline.
+#
+#   cd backend
+#   python -m benchmarks.query_guard            # check, exit code 1 on regression
+#   python -m benchmarks.query_guard --update   # rewrite the baseline after a fix
+import os
+import sys
+import json
+import argparse
+import logging
+import tempfile
+from collections import Counter
+from benchmarks.seed import seed_university
+from benchmarks import harness
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'query_budgets.json')
+
+# Same population of users; more courses, enrollments and assignments per entity
+DATASET_SIZES = {
+    'small': dict(students=60, professors=6, courses=20, enrollments=300, assignments=60, submissions=200, grades=100),
+    'large': dict(students=60, professors=6, courses=40, enrollments=900, assignments=240, submissions=600, grades=300),
+}
+
+
+def record_queries(app, size):
+    from models import db
+    import search
+
+    with app.app_context():
+        # Only the default bind: another app in this process (the tests) may
+        # have registered replica or tenant binds this one doesn't have
+        db.drop_all(bind_key=None)
+        search.reset_index()
+        db.create_all(bind_key=None)
+        seed_university(seed=7, **DATASET_SIZES[size])
+        search.get_index()  # build the search index outside the measured calls
+        fixture = harness.build_fixture()
+        tokens = harness.build_tokens(fixture)
+        engine = db.engine
+
+    client = app.test_client()
+    recorded = {}
+    with harness.QueryCounter(engine, record=True) as counter:
+        for endpoint in harness.build_endpoints(fixture):
+            path, body = endpoint.request(0)
+            headers = {"Authorization": f"Bearer {tokens[endpoint.role]}"} if endpoint.role else {}
+            counter.reset()
+            response = client.open(path, method=endpoint.method, json=body, headers=headers)
+            recorded[endpoint.name] = {
+                "count": counter.count,
+                "status": response.status_code,
+                "statements": list(counter.statements)
+            }
+    return recorded
+
+
+def check(baseline, runs):
+    failures = []
+    budgets = baseline.get("endpoints", {})
+
+    for name in runs['large']:
+        small = runs['small'][name]["count"]
+        large = runs['large'][name]["count"]
+        budget = budgets.get(name)
+
+        if budget is None:
+            failures.append(f"{name}: no budget in {os.path.basename(BASELINE_PATH)} "
+                            f"(issued {small}/{large} queries); run with --update")
+            continue
+
+        for size, count in (('small', small), ('large', large)):
+            if count > budget[size]:
+                failures.append(f"{name}: {count} queries on the {size} dataset, budget is {budget[size]}")
+
+        if large > small and not budget.get("allow_growth"):
+            repeated = Counter(runs['large'][name]["statements"]).most_common(1)
+            detail = f"; most repeated ({repeated[0][1]}x): {repeated[0][0][:160]}" if repeated else ""
+            failures.append(f"{name}: query count grows with the data ({small} -> {large}), likely an N+1{detail}")
+
+    return failures
+
+
+def build_baseline(runs):
+    endpoints = {}
+    for name in runs['large']:
+        small = runs['small'][name]["count"]
+        large = runs['large'][name]["count"]
+        endpoints[name] = {"small": small, "large": large}
+        if large > small:
+            endpoints[name]["allow_growth"] = True
+
+    return {
+        "dataset_sizes": DATASET_SIZES,
+        "endpoints": endpoints
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fail on SQL query-count regressions per endpoint")
+    parser.add_argument('--update', action='store_true', help="rewrite the baseline with the current counts")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--verbose', action='store_true', help="print per-endpoint counts")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    database = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-queries-'), 'queries.db')}"
+    app = harness.load_app(database)
+    runs = {size: record_queries(app, size) for size in DATASET_SIZES}
+
+    if args.verbose or args.update:
+        for name in runs['large']:
+            print(f"{name:32} {runs['small'][name]['count']:>5} {runs['large'][name]['count']:>5}")
+
+    previous = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            previous = json.load(f)
+
+    if args.update:
+        with open(args.baseline, 'w') as f:
+            json.dump(build_baseline(runs), f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    failures = check(previous, runs)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        return 1
+
+    print(f"OK: {len(runs['large'])} endpoints within their query budgets")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,175 @@
+import random
+import datetime
+import logging
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from models import db, User, Course, Enrollment, Assignment, Submission, Grade, CourseMeeting
+from transcripts import rebuild_all
+
+logger = logging.getLogger(__name__)
+
+# Dataset presets; "large" matches the production-sized university we plan for
+SCALES = {
+    'tiny': dict(students=200, professors=20, courses=40, enrollments=1000, assignments=200, submissions=1000, grades=500),
+    'small': dict(students=2000, professors=100, courses=300, enrollments=20000, assignments=3000, submissions=20000, grades=10000),
+    'medium': dict(students=10000, professors=400, courses=1000, enrollments=200000, assignments=20000, submissions=100000, grades=50000),
+    'large': dict(students=50000, professors=1500, courses=3000, enrollments=1000000, assignments=100000, submissions=400000, grades=200000),
+}
+
+DEPARTMENTS = ['Computer Science', 'Mathematics', 'Physics', 'Chemistry', 'Biology',
+               'History', 'Economics', 'Philosophy', 'Engineering', 'Linguistics']
+TERMS = ['Spring', 'Summer', 'Fall']
+MAJORS = DEPARTMENTS
+TOPICS = ['Introduction to', 'Advanced', 'Topics in', 'Foundations of', 'Seminar on', 'Applied']
+SUBJECTS = ['Algorithms', 'Databases', 'Calculus', 'Linear Algebra', 'Quantum Mechanics', 'Organic Chemistry',
+            'Genetics', 'Medieval Europe', 'Macroeconomics', 'Ethics', 'Thermodynamics', 'Syntax',
+            'Machine Learning', 'Distributed Systems', 'Statistics', 'Number Theory']
+GRADES = ['A', 'B', 'C', 'D', 'F']
+# Weekly meeting patterns and start times handed out to seeded courses
+MEETING_DAYS = ['MWF', 'TR', 'MW', 'F']
+MEETING_STARTS = [datetime.time(hour, 0) for hour in range(8, 18)]
+
+# Every seeded account shares this password so benchmarks can log in
+PASSWORD = 'benchmark'
+BATCH_SIZE = 10000
+
+
+def _bulk_insert(model, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def _unique_pairs(rng, count, left_ids, right_ids):
+    pairs = set()
+    limit = len(left_ids) * len(right_ids)
+    count = min(count, limit)
+    while len(pairs) < count:
+        pairs.add((rng.choice(left_ids), rng.choice(right_ids)))
+    return sorted(pairs)
+
+
+# Populate the current app's database with a synthetic university.
+# Must be called inside an app context on an empty schema.
+def seed_university(students, professors, courses, enrollments, assignments,
+                    submissions=0, grades=0, seed=42):
+    rng = random.Random(seed)
+    password_hash = generate_password_hash(PASSWORD)
+    now = datetime.datetime(2024, 1, 15, 9, 0, 0)
+
+    # Admin + professors + students; ids are assigned sequentially from 1
+    users = [dict(id=1, email='admin@university.edu', password_hash=password_hash, name='Admin',
+                  role='admin', created_at=now)]
+    professor_ids = list(range(2, 2 + professors))
+    for i, user_id in enumerate(professor_ids):
+        users.append(dict(
+            id=user_id, email=f'professor{i}@university.edu', password_hash=password_hash,
+            name=f'Professor {i}', role='professor', professor_id=f'P{i:06d}',
+            department=DEPARTMENTS[i % len(DEPARTMENTS)], title='Professor', created_at=now
+        ))
+    student_ids = list(range(2 + professors, 2 + professors + students))
+    for i, user_id in enumerate(student_ids):
+        users.append(dict(
+            id=user_id, email=f'student{i}@university.edu', password_hash=password_hash,
+            name=f'Student {i}', role='student', student_id=f'S{i:07d}',
+            major=rng.choice(MAJORS), year=rng.randint(1, 4), created_at=now
+        ))
+    _bulk_insert(User, users)
+    logger.info(f"Seeded {len(users)} users")
+
+    course_ids = list(range(1, courses + 1))
+    # Spread enrollments so no course ends up over capacity
+    capacity = max(30, (enrollments * 2) // max(courses, 1))
+    course_rows = []
+    for course_id in course_ids:
+        department = DEPARTMENTS[course_id % len(DEPARTMENTS)]
+        course_rows.append(dict(
+            id=course_id, code=f'{department[:4].upper()}{course_id:05d}',
+            title=f'{rng.choice(TOPICS)} {rng.choice(SUBJECTS)}',
+            description=f'A course on {rng.choice(SUBJECTS).lower()} and {rng.choice(SUBJECTS).lower()}.',
+            credits=rng.choice([1, 2, 3, 3, 4]), capacity=capacity,
+            term=rng.choice(TERMS), year=rng.choice([2023, 2024]), status='active',
+            instructor_id=rng.choice(professor_ids) if professor_ids else None,
+            department=department, fee=float(rng.choice([0, 100, 250, 500])),
+            created_at=now, updated_at=now
+        ))
+    _bulk_insert(Course, course_rows)
+    logger.info(f"Seeded {len(course_rows)} courses")
+
+    enrollment_pairs = _unique_pairs(rng, enrollments, student_ids, course_ids)
+    enrollment_rows = []
+    for i, (student_id, course_id) in enumerate(enrollment_pairs, start=1):
+        enrollment_rows.append(dict(
+            id=i, student_id=student_id, course_id=course_id, status='enrolled',
+            grade=rng.choice(GRADES) if rng.random() < 0.3 else None,
+            created_at=now, updated_at=now
+        ))
+    _bulk_insert(Enrollment, enrollment_rows)
+    logger.info(f"Seeded {len(enrollment_rows)} enrollments")
+
+    assignments_by_course = {}
+    assignment_rows = []
+    for assignment_id in range(1, assignments + 1):
+        course_id = course_ids[(assignment_id - 1) % len(course_ids)]
+        assignments_by_course.setdefault(course_id, []).append(assignment_id)
+        assignment_rows.append(dict(
+            id=assignment_id, course_id=course_id, title=f'Assignment {assignment_id}',
+            description='Synthetic benchmark assignment',
+            due_date=now + datetime.timedelta(days=rng.randint(1, 120)),
+            points=rng.choice([10, 20, 50, 100]), weight=rng.choice([0.05, 0.1, 0.2]),
+            created_at=now, updated_at=now
+        ))
+    _bulk_insert(Assignment, assignment_rows)
+    logger.info(f"Seeded {len(assignment_rows)} assignments")
+
+    # Submissions (and their grades) only exist for enrolled (student, assignment) pairs
+    submission_keys = set()
+    gradable = [pair for pair in enrollment_pairs if pair[1] in assignments_by_course]
+    submissions = min(submissions, sum(len(assignments_by_course[c]) for _, c in gradable))
+    while gradable and len(submission_keys) < submissions:
+        student_id, course_id = rng.choice(gradable)
+        submission_keys.add((student_id, rng.choice(assignments_by_course[course_id])))
+
+    submission_rows = []
+    grade_rows = []
+    for i, (student_id, assignment_id) in enumerate(sorted(submission_keys), start=1):
+        submission_rows.append(dict(
+            id=i, assignment_id=assignment_id, student_id=student_id,
+            content='Synthetic submission', submitted_at=now
+        ))
+        if len(grade_rows) < grades:
+            points = assignment_rows[assignment_id - 1]['points']
+            grade_rows.append(dict(
+                id=len(grade_rows) + 1, student_id=student_id, assignment_id=assignment_id,
+                submission_id=i, score=round(rng.uniform(0.4, 1.0) * points, 1),
+                feedback='Good work', graded_at=now
+            ))
+    _bulk_insert(Submission, submission_rows)
+    _bulk_insert(Grade, grade_rows)
+    logger.info(f"Seeded {len(submission_rows)} submissions and {len(grade_rows)} grades")
+
+    # One weekly meeting per course; drawn last so earlier tables stay identical per seed
+    meeting_rows = []
+    for course_id in course_ids:
+        days = rng.choice(MEETING_DAYS)
+        start = rng.choice(MEETING_STARTS)
+        length = 50 if len(days) == 3 else 75
+        end = (datetime.datetime.combine(now.date(), start) + datetime.timedelta(minutes=length)).time()
+        meeting_rows.append(dict(
+            id=course_id, course_id=course_id, days=days, start_time=start, end_time=end,
+            room=f'Room {rng.randint(100, 499)}', created_at=now
+        ))
+    _bulk_insert(CourseMeeting, meeting_rows)
+    logger.info(f"Seeded {len(meeting_rows)} course meetings")
+
+    db.session.commit()
+    rebuild_all()
+
+    return {
+        "admin_id": 1,
+        "professor_ids": professor_ids,
+        "student_ids": student_ids,
+        "course_ids": course_ids,
+        "enrollments": enrollment_pairs,
+        "assignment_ids": list(range(1, assignments + 1)),
+        "submission_count": len(submission_rows)
+    }
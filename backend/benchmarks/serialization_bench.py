@@ -0,0 +1,121 @@
+# Microbenchmark: hand-built response dicts vs the precompiled row serializers.
+#
+# "handwritten" is what the handlers used to do: load ORM objects, build a dict
+# field by field and jsonify it. "serializers" runs the column-only select and
+# the generated serializer with the fastest available JSON encoder.
+#
+#   cd backend
+#   python -m benchmarks.serialization_bench --courses 4000
+import sys
+import os
+import json
+import time
+import argparse
+import logging
+import tempfile
+from benchmarks.seed import seed_university
+from benchmarks import harness
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return round(min(timings), 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare hand-written dict building with serializers.py")
+    parser.add_argument('--courses', type=int, default=4000)
+    parser.add_argument('--roster', type=int, default=2000, help="students enrolled in the roster course")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--stdlib-json', action='store_true', help="ignore orjson even if it is installed")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    app = harness.load_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-ser-'), 'ser.db')}")
+    from flask import jsonify
+    from models import db, User, Course, Enrollment, Assignment
+    import serializers
+    from serializers import COURSE, ROSTER, ASSIGNMENT
+    if args.stdlib_json:
+        serializers.orjson = None
+
+    with app.app_context():
+        db.create_all()
+        seed_university(students=args.roster, professors=50, courses=args.courses,
+                        enrollments=args.roster, assignments=args.courses * 5)
+        # Put every seeded student in course 1 so the roster has args.roster rows
+        db.session.execute(db.update(Enrollment).values(course_id=1))
+        db.session.commit()
+
+        def courses_handwritten():
+            result = []
+            for course in Course.query.all():
+                instructor = db.session.get(User, course.instructor_id) if course.instructor_id else None
+                result.append({
+                    "id": course.id, "code": course.code, "title": course.title,
+                    "description": course.description, "credits": course.credits, "term": course.term,
+                    "year": course.year, "department": course.department,
+                    "instructor": instructor.name if instructor else "TBA",
+                    "enrolled_count": course.enrolled_count, "capacity": course.capacity,
+                    "status": course.status, "fee": course.fee
+                })
+            return jsonify(result).get_data()
+
+        def courses_serialized():
+            rows = db.session.execute(COURSE.select().outerjoin(User, User.id == Course.instructor_id))
+            return serializers.dumps(COURSE.rows(rows))
+
+        def roster_handwritten():
+            result = []
+            for enrollment in Enrollment.query.filter_by(course_id=1).all():
+                student = db.session.get(User, enrollment.student_id)
+                result.append({
+                    "student_id": student.id, "name": student.name, "email": student.email,
+                    "student_number": student.student_id, "major": student.major, "year": student.year,
+                    "enrollment_status": enrollment.status, "grade": enrollment.grade
+                })
+            return jsonify(result).get_data()
+
+        def roster_serialized():
+            rows = db.session.execute(ROSTER.select().join(User, User.id == Enrollment.student_id)
+                                      .where(Enrollment.course_id == 1))
+            return serializers.dumps(ROSTER.rows(rows))
+
+        # Serialization only: same rows already in memory
+        assignments = Assignment.query.all()
+        assignment_rows = db.session.execute(ASSIGNMENT.select()).all()
+
+        def assignments_handwritten():
+            return json.dumps([{
+                "id": a.id, "title": a.title, "description": a.description,
+                "due_date": a.due_date.isoformat(), "points": a.points, "weight": a.weight,
+                "created_at": a.created_at.isoformat()
+            } for a in assignments]).encode()
+
+        def assignments_serialized():
+            return serializers.dumps(ASSIGNMENT.rows(assignment_rows))
+
+        cases = [
+            ("get_courses (query + serialize)", courses_handwritten, courses_serialized),
+            ("get_course_students (query + serialize)", roster_handwritten, roster_serialized),
+            (f"{len(assignments)} assignments (serialize only)", assignments_handwritten, assignments_serialized),
+        ]
+
+        print(f"JSON encoder: {'orjson' if serializers.orjson else 'json (stdlib)'}")
+        print(f"{'case':45} {'handwritten ms':>15} {'serializers ms':>15} {'speedup':>8}")
+        for name, handwritten, serialized in cases:
+            db.session.expire_all()
+            before = best_of(args.repeat, handwritten)
+            db.session.expire_all()
+            after = best_of(args.repeat, serialized)
+            print(f"{name:45} {before:>15} {after:>15} {before / after:>7.1f}x")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
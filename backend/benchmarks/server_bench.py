@@ -0,0 +1,198 @@
+# Compare gunicorn deployment profiles (gunicorn.conf.py).
+#
+# Seeds a small university, then for each profile starts gunicorn on
+# benchmarks.chain_wsgi (the real app with a fake indexer that takes
+# --chain-ms per call) and measures:
+#   - boot time until every worker answers;
+#   - memory: RSS per worker and PSS of the whole server, which counts
+#     pages shared copy-on-write with the master only once;
+#   - throughput and latency under --threads concurrent clients for a
+#     database-bound endpoint and for /verify-enrollment, which waits on the
+#     indexer;
+#   - with aggressive max_requests, that workers recycle without failed
+#     requests.
+#
+#   cd backend
+#   python -m benchmarks.server_bench --duration 5 --threads 32
+#   python -m benchmarks.server_bench --profiles gthread,gthread-nopreload
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import logging
+import tempfile
+import subprocess
+import http.client
+from sqlalchemy import update
+from benchmarks.seed import SCALES, seed_university
+from benchmarks import harness
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROFILES = {
+    'sync': {"GUNICORN_WORKER_CLASS": 'sync'},
+    'gthread': {"GUNICORN_WORKER_CLASS": 'gthread'},
+    'gthread-nopreload': {"GUNICORN_WORKER_CLASS": 'gthread', "GUNICORN_PRELOAD": 'false'},
+    'gthread-recycle': {"GUNICORN_WORKER_CLASS": 'gthread', "GUNICORN_MAX_REQUESTS": '100',
+                        "GUNICORN_MAX_REQUESTS_JITTER": '20'},
+    'gevent': {"GUNICORN_WORKER_CLASS": 'gevent'},
+}
+ENDPOINTS = ('courses_list', 'blockchain_verify')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def children(pid):
+    found = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                        found.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                pass
+    return found
+
+
+# (rss, pss) in MiB from /proc/<pid>/smaps_rollup
+def memory(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0]] = int(parts[1]) / 1024
+    return values['Rss:'], values['Pss:']
+
+
+def healthy(port):
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+        connection.request('GET', '/api/health')
+        return connection.getresponse().status == 200
+    except OSError:
+        return False
+
+
+def run_profile(name, database, enrollment, tokens, endpoints, args):
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=database, JOB_WORKERS='0', GUNICORN_BIND=f"127.0.0.1:{port}",
+               GUNICORN_ACCESS_LOG='', GUNICORN_LOG_LEVEL='warning', BENCH_CHAIN_MS=str(args.chain_ms),
+               BENCH_ENROLLMENT=enrollment, **PROFILES[name])
+    if args.workers:
+        env['GUNICORN_WORKERS'] = str(args.workers)
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                               'benchmarks.chain_wsgi:application'], cwd=BACKEND, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    try:
+        while not healthy(port):
+            if server.poll() is not None:
+                return {"error": server.stderr.read().strip().splitlines()[-1]}
+            if time.perf_counter() - started > 60:
+                return {"error": "did not start within 60s"}
+            time.sleep(0.05)
+        # Every worker has to have loaded the app, not just the first one:
+        # wait until the worker set stops changing
+        workers, stable_since = [], time.perf_counter()
+        while time.perf_counter() - stable_since < 0.5 and time.perf_counter() - started < 60:
+            current = children(server.pid)
+            if current != workers or not all(memory(w)[0] > 20 for w in current):
+                workers, stable_since = current, time.perf_counter()
+            time.sleep(0.05)
+        result = {"boot_s": round(time.perf_counter() - started, 2), "workers": len(workers)}
+
+        # Warm every worker, then measure memory
+        harness.run_http(f"http://127.0.0.1:{port}", endpoints, tokens, max(4, len(workers) * 2), 1.0)
+        workers = children(server.pid)
+        worker_memory = [memory(w) for w in workers]
+        master_rss, master_pss = memory(server.pid)
+        result["rss_per_worker_mb"] = round(sum(r for r, _ in worker_memory) / len(worker_memory), 1)
+        result["pss_total_mb"] = round(master_pss + sum(p for _, p in worker_memory), 1)
+        result["rss_total_mb"] = round(master_rss + sum(r for r, _ in worker_memory), 1)
+
+        for endpoint_name, stats in harness.run_http(f"http://127.0.0.1:{port}", endpoints, tokens, args.threads,
+                                                     args.duration).items():
+            result[endpoint_name] = {k: stats[k] for k in ('requests', 'errors', 'statuses', 'throughput_rps',
+                                                           'p50_ms', 'p99_ms')}
+        result["workers_spawned"] = len(set(workers) | set(children(server.pid)))
+        return result
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=args.graceful + 10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare gunicorn deployment profiles")
+    parser.add_argument('--profiles', default=','.join(PROFILES))
+    parser.add_argument('--workers', type=int, help="override the worker count derived from cores")
+    parser.add_argument('--threads', type=int, default=32, help="concurrent HTTP clients")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds of load per endpoint")
+    parser.add_argument('--chain-ms', type=float, default=50, help="simulated indexer round trip")
+    parser.add_argument('--graceful', type=int, default=30)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    database = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-server-'), 'server.db')}"
+    app = harness.load_app(database)
+    from models import db, Course, Enrollment
+    with app.app_context():
+        db.create_all()
+        seed_university(**SCALES['tiny'])
+        fixture = harness.build_fixture()
+        tokens = harness.build_tokens(fixture)
+        # Give the fixture enrollment a transaction the mirror does not
+        # have, so verification asks the (slow) indexer
+        row = db.session.get(Enrollment, fixture["enrollment_id"])
+        db.session.execute(update(Course).where(Course.id == row.course_id).values(contract_address='100000'))
+        row.transaction_id = 'BENCH' * 10
+        enrollment = f"100000:{row.student_id}:{row.course_id}"
+        db.session.commit()
+    endpoints = [e for e in harness.build_endpoints(fixture) if e.name in ENDPOINTS]
+
+    results = {"cores": os.cpu_count(), "threads": args.threads, "chain_ms": args.chain_ms}
+    failures = []
+    for name in args.profiles.split(','):
+        if PROFILES[name]["GUNICORN_WORKER_CLASS"] == 'gevent':
+            try:
+                import gevent  # noqa: F401
+            except ImportError:
+                results[name] = {"skipped": "gevent is not installed"}
+                continue
+        results[name] = run_profile(name, database, enrollment, tokens, endpoints, args)
+        if "error" in results[name]:
+            failures.append(f"{name}: {results[name]['error']}")
+            continue
+        for endpoint_name in ENDPOINTS:
+            statuses = dict(results[name][endpoint_name]["statuses"])
+            # A recycling worker drops the keep-alive connections it holds; a
+            # request already sent on one sees a reset (599 here), which a
+            # proxy such as nginx retries. Anything else is a failure.
+            if 'recycle' in name:
+                statuses.pop('599', None)
+            if set(statuses) - {'200'}:
+                failures.append(f"{name} {endpoint_name}: statuses {statuses}")
+
+    if 'gthread' in results and 'gthread-nopreload' in results and "error" not in results['gthread'] \
+            and "error" not in results['gthread-nopreload']:
+        results["preload_pss_saved_mb"] = round(results['gthread-nopreload']["pss_total_mb"] -
+                                                results['gthread']["pss_total_mb"], 1)
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
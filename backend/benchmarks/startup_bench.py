@@ -0,0 +1,97 @@
+# Worker cold start: time to import app.py and build the app, and resident
+# memory afterwards, each measured in a fresh interpreter.
+#
+# Variants:
+#   eager     all features, with algosdk imported up front the way
+#             smart_contracts.py used to
+#   lazy      all features; algosdk waits for the first chain call
+#   core      FEATURES="" - no blockchain, notifications or analytics
+# The first request a lazy worker serves on a blockchain route pays for the
+# import instead; first_chain_call_ms reports that. Under gunicorn --preload
+# the master imports it once for all workers (gunicorn.conf.py).
+#
+#   cd backend
+#   python -m benchmarks.startup_bench --runs 7
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+if {eager}:
+    import algosdk.v2client.algod, algosdk.v2client.indexer, algosdk.transaction
+from app import create_app
+app = create_app()
+elapsed = time.perf_counter() - started
+loaded, modules = 'algosdk' in sys.modules, len(sys.modules)
+with open('/proc/self/status') as f:
+    rss = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+t0 = time.perf_counter()
+with app.app_context():
+    import smart_contracts
+    smart_contracts.get_algod_client()
+first_chain_call = time.perf_counter() - t0
+print(json.dumps({{"start_ms": elapsed * 1000, "rss_mb": rss / 1024, "first_chain_call_ms": first_chain_call * 1000,
+                  "algosdk_loaded": loaded, "modules": modules}}))
+"""
+
+VARIANTS = {
+    'eager': {"eager": True, "features": None},
+    'lazy': {"eager": False, "features": None},
+    'core': {"eager": False, "features": ''},
+}
+
+
+def measure(variant, database):
+    env = dict(os.environ, DATABASE_URL=database, JOB_WORKERS='0', PYTHONDONTWRITEBYTECODE='1')
+    if variant["features"] is not None:
+        env['FEATURES'] = variant["features"]
+    completed = subprocess.run([sys.executable, '-c', PROBE.format(eager=variant["eager"])], cwd=BACKEND, env=env,
+                               capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure worker cold start per feature set")
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    database = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='ucm-startup-'), 'startup.db')}"
+    samples = {name: [] for name in VARIANTS}
+    # Interleave the variants so disk cache and CPU frequency affect them alike
+    for _ in range(args.runs):
+        for name, variant in VARIANTS.items():
+            samples[name].append(measure(variant, database))
+
+    results = {"runs": args.runs}
+    for name, runs in samples.items():
+        results[name] = {
+            "start_ms": round(statistics.median(r["start_ms"] for r in runs), 1),
+            "rss_mb": round(statistics.median(r["rss_mb"] for r in runs), 1),
+            "modules": runs[0]["modules"],
+            "algosdk_loaded_at_start": runs[0]["algosdk_loaded"],
+            "first_chain_call_ms": round(statistics.median(r["first_chain_call_ms"] for r in runs), 1)
+        }
+    results["lazy_saves_ms"] = round(results['eager']["start_ms"] - results['lazy']["start_ms"], 1)
+    results["lazy_saves_mb"] = round(results['eager']["rss_mb"] - results['lazy']["rss_mb"], 1)
+
+    failures = []
+    if results['lazy']["algosdk_loaded_at_start"] or results['core']["algosdk_loaded_at_start"]:
+        failures.append("algosdk is imported while building the app")
+    if results['lazy']["start_ms"] >= results['eager']["start_ms"]:
+        failures.append("deferring algosdk did not make start-up faster")
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
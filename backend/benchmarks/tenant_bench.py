@@ -0,0 +1,114 @@
+# Cross-tenant reports against slow databases (tenancy.py).
+#
+# Creates a default database and --tenants institution databases (SQLite
+# files), seeds each with a different synthetic university and serves them
+# from one app with TENANT_DATABASE_URLS. Then times
+# /api/tenants/summary and /api/tenants/terms with every database answering
+# after --latency-ms per statement (a remote database), reading all of them
+# at once and with TENANT_FANOUT_WORKERS=1. Routing and isolation between
+# institutions are checked by tests/test_tenancy.py.
+#
+#   cd backend
+#   python -m benchmarks.tenant_bench --tenants 3 --latency-ms 20
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import tempfile
+from sqlalchemy import event
+from benchmarks.seed import SCALES, PASSWORD, seed_university
+from benchmarks import harness
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - t0) * 1000)
+    return round(min(timings), 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tenancy.py")
+    parser.add_argument('--tenants', type=int, default=3)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='tiny')
+    parser.add_argument('--latency-ms', type=float, default=20, help="simulated round trip per statement")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    workdir = tempfile.mkdtemp(prefix='ucm-tenants-')
+    tenants = [f"campus{i}" for i in range(1, args.tenants + 1)]
+    paths = {None: os.path.join(workdir, 'default.db')}
+    paths.update({tenant: os.path.join(workdir, f"{tenant}.db") for tenant in tenants})
+    os.environ['TENANT_DATABASE_URLS'] = ','.join(f"{t}=sqlite:///{paths[t]}" for t in tenants)
+    app = harness.load_app(f"sqlite:///{paths[None]}")
+    from models import db, User
+    from tenancy import tenant_context, create_all, tenant_summary
+    from db_routing import tenant_bind_key
+    import analytics
+
+    create_all(app)
+    expected = {}
+    # Different seeds and sizes, so a request answered from the wrong
+    # database shows up in the numbers
+    for i, tenant in enumerate([None] + tenants):
+        scale = {key: value * (i + 1) for key, value in SCALES[args.scale].items()}
+        with tenant_context(app, tenant):
+            seed_university(**scale, seed=100 + i)
+            expected[tenant] = tenant_summary()
+
+    failures = []
+    client = app.test_client()
+    with app.app_context():
+        admin_email = User.query.filter_by(role='admin').first().email
+    response = client.post('/api/auth/login', json={"email": admin_email, "password": PASSWORD})
+    admin = response.get_json()["access_token"]
+
+    def get(path):
+        return client.get(path, headers={"Authorization": f"Bearer {admin}"})
+
+    summary = get('/api/tenants/summary').get_json()
+    reported = {entry["tenant"]: {k: entry.get(k) for k in expected[None]} for entry in summary["tenants"]}
+    wanted = {tenant or app.config['TENANT_DEFAULT_NAME']: counts for tenant, counts in expected.items()}
+    if reported != wanted or not summary["complete"]:
+        failures.append(f"tenant summary {reported} != {wanted}")
+    term_url = "/api/tenants/terms?term=Fall&year=2024"
+
+    # Reports against slow databases: all at once vs one at a time
+    def slow_statement(*_):
+        time.sleep(args.latency_ms / 1000)
+
+    with app.app_context():
+        engines = [db.engine] + [db.engines[tenant_bind_key(tenant)] for tenant in tenants]
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', slow_statement)
+    timings = {}
+    try:
+        for workers in (len(engines), 1):
+            app.config['TENANT_FANOUT_WORKERS'] = workers
+            timings[f"summary_{workers}_workers_ms"] = best_of(
+                args.repeat, lambda: get('/api/tenants/summary'))
+            timings[f"terms_{workers}_workers_ms"] = best_of(
+                args.repeat, lambda: (analytics.cache.clear(), get(term_url)))
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', slow_statement)
+    for report in ('summary', 'terms'):
+        parallel, serial = timings[f"{report}_{len(engines)}_workers_ms"], timings[f"{report}_1_workers_ms"]
+        if parallel >= serial:
+            failures.append(f"{report} took {parallel} ms reading databases at once, {serial} ms one at a time")
+
+    print(json.dumps({"databases": len(engines), "latency_ms": args.latency_ms,
+                      "rows": {tenant or 'default': counts for tenant, counts in expected.items()},
+                      **timings}, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# Streaming uploads and downloads: throughput, memory and correctness of uploads.py.
+#
+# Sends a generated file (default 32 MiB) as a one-shot multipart upload
+# from a lazily generated body, so the client never holds it in memory
+# either. Checks the stored hash and traced peak Python memory (which must
+# stay a small fraction of the file), that an identical upload by another
+# student is deduplicated, that a resumable upload survives a wrong offset
+# and finishes in several PATCHes, that the professor's download honours
+# Range and the submissions zip is streamed and intact, and that the size
+# limits return 413.
+#
+#   cd backend
+#   python -m benchmarks.upload_bench --size-mb 32
+import os
+import io
+import sys
+import json
+import time
+import hashlib
+import argparse
+import logging
+import tempfile
+import zipfile
+import tracemalloc
+from benchmarks.seed import SCALES, seed_university
+from benchmarks import harness
+
+BOUNDARY = 'ucm-upload-bench'
+
+
+# multipart/form-data body read straight from a file on disk
+class MultipartBody(io.RawIOBase):
+    def __init__(self, path, fields):
+        head = ''.join(f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+                       for name, value in fields.items())
+        head += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{os.path.basename(path)}"\r\n'
+                 f'Content-Type: application/octet-stream\r\n\r\n')
+        self.parts = [io.BytesIO(head.encode()), open(path, 'rb'), io.BytesIO(f'\r\n--{BOUNDARY}--\r\n'.encode())]
+        self.length = sum(len(p.getvalue()) for p in (self.parts[0], self.parts[2])) + os.path.getsize(path)
+
+    def readable(self):
+        return True
+
+    # The test client measures the body by seeking to the end and back before reading
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self.position = self.length + offset if whence == io.SEEK_END else offset
+        return self.position
+
+    def tell(self):
+        return getattr(self, 'position', 0)
+
+    def readinto(self, buffer):
+        while self.parts:
+            n = self.parts[0].readinto(buffer)
+            if n:
+                return n
+            self.parts.pop(0).close()
+        return 0
+
+
+def write_file(path, size, seed=0):
+    block = hashlib.sha256(str(seed).encode()).digest() * 32768  # 1 MiB
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        remaining = size
+        while remaining:
+            chunk = block[:min(len(block), remaining)]
+            out.write(chunk)
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def count_objects(folder):
+    return sum(len(files) for _, _, files in os.walk(os.path.join(folder, 'objects')))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark uploads.py")
+    parser.add_argument('--size-mb', type=int, default=32)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix='ucm-upload-bench-')
+    app = harness.load_app(f"sqlite:///{os.path.join(workdir, 'uploads.db')}")
+    from models import db, Course, Enrollment, Assignment, Submission
+
+    failures = []
+    with app.app_context():
+        db.create_all()
+        seed_university(**SCALES['tiny'])
+        # Students in a course with assignments, none of them submitted yet
+        course_id = db.session.query(Assignment.course_id).join(Course, Course.id == Assignment.course_id) \
+            .filter(Course.instructor_id.isnot(None)).first()[0]
+        professor_id = db.session.get(Course, course_id).instructor_id
+        assignment_ids = [a.id for a in Assignment.query.filter_by(course_id=course_id).order_by(Assignment.id)]
+        student_ids = [e.student_id for e in Enrollment.query.filter_by(course_id=course_id).order_by(Enrollment.id)]
+        db.session.query(Submission).filter(Submission.assignment_id.in_(assignment_ids)).delete()
+        db.session.commit()
+        tokens = {student_id: harness.build_tokens({"admin_id": 1, "student_id": student_id, "professor_id": 2})['student']
+                  for student_id in student_ids[:3]}
+        tokens[professor_id] = harness.build_tokens(
+            {"admin_id": 1, "student_id": student_ids[0], "professor_id": professor_id})['professor']
+    folder = app.config['UPLOAD_FOLDER']
+    client = app.test_client()
+
+    def headers(student_id, **extra):
+        return {"Authorization": f"Bearer {tokens[student_id]}", **extra}
+
+    size = args.size_mb * 1024 * 1024
+    path = os.path.join(workdir, 'submission.bin')
+    expected_hash = write_file(path, size)
+    results = {"file_mb": args.size_mb, "chunk_kb": app.config['UPLOAD_CHUNK_SIZE'] // 1024}
+
+    # One-shot multipart upload
+    first, second, third = student_ids[:3]
+    body = MultipartBody(path, {"assignment_id": assignment_ids[0]})
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    response = client.post(f"/api/students/{first}/submissions/upload", input_stream=body,
+                           content_length=body.length, content_type=f"multipart/form-data; boundary={BOUNDARY}",
+                           headers=headers(first))
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results.update(multipart_ms=round(elapsed * 1000, 1), multipart_mb_per_s=round(args.size_mb / elapsed, 1),
+                   multipart_peak_traced_kb=round(peak / 1024))
+    submission = response.get_json().get("submission") if response.status_code == 201 else None
+    if not submission:
+        failures.append(f"multipart upload returned {response.status_code}: {response.get_json()}")
+    elif submission["content_hash"] != expected_hash or submission["file_size"] != size:
+        failures.append("multipart upload stored the wrong hash or size")
+    if peak > size / 8:
+        failures.append(f"multipart upload traced {peak} bytes of Python memory for a {size} byte file")
+
+    # Same bytes from another student: a second submission, no second object
+    objects = count_objects(folder)
+    body = MultipartBody(path, {"assignment_id": assignment_ids[0]})
+    response = client.post(f"/api/students/{second}/submissions/upload", input_stream=body,
+                           content_length=body.length, content_type=f"multipart/form-data; boundary={BOUNDARY}",
+                           headers=headers(second))
+    if response.status_code != 201 or count_objects(folder) != objects:
+        failures.append(f"identical upload was not deduplicated ({response.status_code}, "
+                        f"{count_objects(folder) - objects} new objects)")
+
+    # Resumable upload in three PATCHes, with a wrong offset in between
+    other_path = os.path.join(workdir, 'other.bin')
+    other_hash = write_file(other_path, size, seed=1)
+    response = client.post(f"/api/students/{third}/submissions/uploads", headers=headers(third),
+                           json={"assignment_id": assignment_ids[0], "file_name": "other.bin", "size": size})
+    upload = response.get_json()["upload"]
+    url = f"/api/students/{third}/submissions/uploads/{upload['upload_id']}"
+    t0 = time.perf_counter()
+    with open(other_path, 'rb') as source:
+        cuts = [0, size // 3, size * 2 // 3, size]
+        for i, (start, end) in enumerate(zip(cuts, cuts[1:])):
+            source.seek(start)
+            response = client.patch(url, data=source.read(end - start), content_type='application/offset+octet-stream',
+                                    headers=headers(third, **{"Upload-Offset": str(start)}))
+            if i == 0:
+                stale = client.patch(url, data=b'x', content_type='application/offset+octet-stream',
+                                     headers=headers(third, **{"Upload-Offset": "0"}))
+                if stale.status_code != 409 or stale.get_json().get("offset") != end:
+                    failures.append(f"wrong offset returned {stale.status_code} {stale.get_json()}")
+                if client.get(url, headers=headers(third)).get_json()["upload"]["offset"] != end:
+                    failures.append("resumable upload lost its offset")
+    results["resumable_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    if response.status_code != 201 or response.get_json()["submission"]["content_hash"] != other_hash:
+        failures.append(f"resumable upload finished with {response.status_code}: {response.get_json()}")
+
+    # Downloads: whole file, a Range, and the zip of every submission
+    downloaded = client.get(f"/api/professors/{professor_id}/submissions/{submission['id']}/file",
+                            headers=headers(professor_id))
+    if downloaded.status_code != 200 or hashlib.sha256(downloaded.data).hexdigest() != expected_hash:
+        failures.append(f"download returned {downloaded.status_code} or the wrong bytes")
+    tail = client.get(f"/api/professors/{professor_id}/submissions/{submission['id']}/file",
+                      headers=headers(professor_id, Range=f"bytes={size - 1024 * 1024}-"))
+    with open(path, 'rb') as source:
+        source.seek(size - 1024 * 1024)
+        if tail.status_code != 206 or tail.data != source.read():
+            failures.append(f"range request returned {tail.status_code} or the wrong bytes")
+
+    archive_path = os.path.join(workdir, 'archive.zip')
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    response = client.get(f"/api/professors/{professor_id}/assignments/{assignment_ids[0]}/submissions/archive",
+                          headers=headers(professor_id), buffered=False)
+    with open(archive_path, 'wb') as out:
+        for chunk in response.response:
+            out.write(chunk)
+    response.close()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    archive_mb = os.path.getsize(archive_path) / (1024 * 1024)
+    results.update(archive_mb=round(archive_mb, 1), archive_ms=round(elapsed * 1000, 1),
+                   archive_mb_per_s=round(archive_mb / elapsed, 1), archive_peak_traced_kb=round(peak / 1024))
+    with zipfile.ZipFile(archive_path) as archive:
+        hashes = sorted(hashlib.sha256(archive.read(name)).hexdigest() for name in archive.namelist()
+                        if not name.endswith('submission.txt'))
+    if hashes != sorted([expected_hash, expected_hash, other_hash]):
+        failures.append("archive members do not match the uploaded files")
+    if peak > size / 8:
+        failures.append(f"archive traced {peak} bytes of Python memory for {archive_mb:.0f} MiB of files")
+
+    # Size limits
+    app.config['UPLOAD_MAX_BYTES'] = 1024
+    body = MultipartBody(path, {"assignment_id": assignment_ids[1]})
+    response = client.post(f"/api/students/{first}/submissions/upload", input_stream=body,
+                           content_length=body.length, content_type=f"multipart/form-data; boundary={BOUNDARY}",
+                           headers=headers(first))
+    if response.status_code != 413:
+        failures.append(f"oversized multipart upload returned {response.status_code}")
+    response = client.post(f"/api/students/{first}/submissions/uploads", headers=headers(first),
+                           json={"assignment_id": assignment_ids[1], "size": 4096})
+    if response.status_code != 413:
+        failures.append(f"oversized upload session returned {response.status_code}")
+    if os.listdir(os.path.join(folder, 'partial')):
+        failures.append(f"partial files left behind: {os.listdir(os.path.join(folder, 'partial'))}")
+
+    print(json.dumps(results, indent=2))
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
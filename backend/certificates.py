@@ -0,0 +1,323 @@
+import os
+import json
+import logging
+import datetime
+from sqlalchemy import bindparam, case, func, insert, literal, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Enrollment, Certificate
+from chain_guard import guarded_call, CircuitOpenError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ALGORAND_CONFIRM_ROUNDS = int(os.environ.get("ALGORAND_CONFIRM_ROUNDS", 4))
+# Groups sent before waiting for confirmations; they all land in the same round or two
+CERTIFICATE_GROUPS_IN_FLIGHT = int(os.environ.get("CERTIFICATE_GROUPS_IN_FLIGHT", 4))
+# Rejected submissions per certificate before it is marked failed
+CERTIFICATE_MAX_ATTEMPTS = int(os.environ.get("CERTIFICATE_MAX_ATTEMPTS", 3))
+
+NOT_PASSING = ('F', 'Incomplete')
+CLAIMABLE = ('pending', 'failed')
+# algosdk.TX_GROUP_LIMIT; algosdk itself is imported on first use,
+# see smart_contracts._client_modules
+TX_GROUP_LIMIT = 16
+
+
+class CertificateError(Exception):
+    def __init__(self, message, status=500):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def passing():
+    return (Enrollment.grade.isnot(None)) & (Enrollment.grade.notin_(NOT_PASSING)) & (Enrollment.status != 'dropped')
+
+
+def certificate_txn(params, admin_account, course, student_id, student_name, grade, issued_at):
+    from algosdk.transaction import AssetConfigTxn
+    return AssetConfigTxn(
+        sender=admin_account,
+        sp=params,
+        total=1,  # Only one certificate per student per course
+        default_frozen=False,
+        unit_name="CERT",
+        asset_name=f"Certificate_{course.code}_{student_id}",
+        manager=admin_account,
+        reserve=admin_account,
+        freeze=admin_account,
+        clawback=admin_account,
+        url=f"https://university.edu/certificates/{course.id}/{student_id}",
+        decimals=0,
+        note=json.dumps({
+            "type": "course_certificate",
+            "student_id": student_id,
+            "student_name": student_name,
+            "course_id": course.id,
+            "course_code": course.code,
+            "course_title": course.title,
+            "grade": grade,
+            "credits": course.credits,
+            "date_issued": issued_at.isoformat()
+        }).encode()
+    )
+
+
+# Put rejected or never-sent certificates back in the queue, or mark them
+# failed once they have used up their attempts
+def _release(certificate_ids, message, count_attempt=True):
+    if not certificate_ids:
+        return
+    attempts = Certificate.attempts if count_attempt else Certificate.attempts - 1
+    db.session.execute(
+        update(Certificate).where(Certificate.id.in_(certificate_ids))
+        .values(status=case((attempts >= CERTIFICATE_MAX_ATTEMPTS, 'failed'), else_='pending'),
+                attempts=attempts, error=message[:2000], transaction_id=None, last_valid_round=None,
+                updated_at=datetime.datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _record_issued(issued):
+    if issued:
+        now = datetime.datetime.utcnow()
+        db.session.execute(update(Certificate), [
+            {"id": certificate_id, "status": 'issued', "asset_id": asset_id, "error": None, "issued_at": now,
+             "updated_at": now}
+            for certificate_id, asset_id in issued
+        ])
+
+
+# Mint certificates for rows [(certificate_id, student_id, student_name, grade)]
+# in atomic groups of up to 16. The signed transaction IDs are committed as
+# 'submitted' before anything is sent, so a run that dies part way leaves
+# rows reconcile() can settle rather than rows that would be minted twice.
+# Returns the number of certificates issued; rows whose outcome is unknown
+# stay 'submitted'. Each network call goes through the circuit breaker on its
+# own, so an answer like a rejected group never counts against the node.
+def _issue_window(algod_client, private_key, admin_account, course, rows):
+    from algosdk import error, transaction
+    params = guarded_call('certificate_params', algod_client.suggested_params)
+    now = datetime.datetime.utcnow()
+
+    groups = []
+    for start in range(0, len(rows), TX_GROUP_LIMIT):
+        chunk = rows[start:start + TX_GROUP_LIMIT]
+        txns = [certificate_txn(params, admin_account, course, student_id, student_name, grade, now)
+                for _, student_id, student_name, grade in chunk]
+        if len(txns) > 1:
+            transaction.assign_group_id(txns)
+        signed_txns = [txn.sign(private_key) for txn in txns]
+        # Encoding a transaction for its ID is the costliest step here; do it once
+        groups.append((chunk, signed_txns, [signed_txn.get_txid() for signed_txn in signed_txns]))
+
+    # Plain OR rather than IN: an expanding IN cannot be used with executemany
+    claim = update(Certificate.__table__) \
+        .where(Certificate.id == bindparam('b_id'), or_(*[Certificate.status == status for status in CLAIMABLE])) \
+        .values(status='submitted', grade=bindparam('b_grade'), transaction_id=bindparam('b_txid'),
+                last_valid_round=params.last, attempts=Certificate.attempts + 1, error=None, updated_at=now)
+    claimed = db.session.connection().execute(claim, [
+        {"b_id": row[0], "b_grade": row[3], "b_txid": txid}
+        for chunk, _, txids in groups for row, txid in zip(chunk, txids)
+    ]).rowcount
+    if claimed != len(rows):
+        db.session.rollback()
+        raise CertificateError("Certificates were claimed by another issuance run", 409)
+    db.session.commit()
+
+    sent = []
+    for n, (chunk, signed_txns, txids) in enumerate(groups):
+        ids = [row[0] for row in chunk]
+        try:
+            guarded_call('certificate_send', algod_client.send_transactions, signed_txns)
+        except CircuitOpenError:
+            # Nothing was sent from here on
+            _release([row[0] for unsent, _, _ in groups[n:] for row in unsent], "Not sent", count_attempt=False)
+            break
+        except error.AlgodHTTPError as e:
+            # The node refused the group, so none of it is in the pool
+            logger.warning(f"Certificate group of {len(ids)} rejected: {str(e)}")
+            _release(ids, str(e))
+            continue
+        except Exception as e:
+            # No answer: the group may or may not have reached the pool. Leave it
+            # to reconcile() and hold back the groups that were never sent.
+            logger.error(f"Certificate group of {len(ids)} sent without a response: {str(e)}")
+            _release([row[0] for unsent, _, _ in groups[n + 1:] for row in unsent], "Not sent", count_attempt=False)
+            break
+        sent.append((ids, txids))
+    db.session.commit()
+
+    issued = []
+    for ids, txids in sent:
+        # A group is confirmed atomically; waiting on one transaction covers all
+        try:
+            guarded_call('certificate_confirm', transaction.wait_for_confirmation, algod_client, txids[0],
+                         ALGORAND_CONFIRM_ROUNDS)
+        except CircuitOpenError:
+            # Left 'submitted' for reconcile()
+            break
+        except error.TransactionRejectedError as e:
+            _release(ids, str(e))
+            continue
+        except error.ConfirmationTimeoutError:
+            logger.warning(f"Certificate group of {len(ids)} not confirmed within {ALGORAND_CONFIRM_ROUNDS} rounds")
+            continue
+        for certificate_id, txid in zip(ids, txids):
+            info = guarded_call('certificate_lookup', algod_client.pending_transaction_info, txid)
+            issued.append((certificate_id, info["asset-index"]))
+    _record_issued(issued)
+    db.session.commit()
+    return len(issued)
+
+
+# Settle 'submitted' certificates from an earlier, interrupted run: issued if
+# the transaction confirmed, back in the queue if it was rejected or expired
+# unconfirmed, left alone while it could still confirm. Algod only remembers
+# recent transactions, so once one is past its last valid round the indexer
+# decides, and only after it has caught up to that round.
+def reconcile(algod_client, indexer_client, certificates):
+    from algosdk import error
+    if not certificates:
+        return
+    last_round = guarded_call('certificate_status', algod_client.status)["last-round"]
+    issued = []
+    released = []
+    for certificate in certificates:
+        try:
+            info = guarded_call('certificate_lookup', algod_client.pending_transaction_info, certificate.transaction_id)
+        except error.AlgodHTTPError:
+            info = None
+
+        if info and info.get("confirmed-round"):
+            issued.append((certificate.id, info["asset-index"]))
+        elif info and info.get("pool-error"):
+            released.append(certificate.id)
+        elif info is None and last_round > certificate.last_valid_round:
+            found = guarded_call('certificate_search', indexer_client.search_transactions,
+                                 txid=certificate.transaction_id)
+            if found["transactions"]:
+                issued.append((certificate.id, found["transactions"][0]["created-asset-index"]))
+            elif found["current-round"] > certificate.last_valid_round:
+                released.append(certificate.id)
+
+    _record_issued(issued)
+    _release(released, "Transaction expired without confirming")
+    db.session.commit()
+    logger.info(f"Reconciled {len(certificates)} submitted certificates: "
+                f"{len(issued)} issued, {len(released)} queued again")
+
+
+# Queue a pending certificate for every passing enrollment in the course
+# that does not have one yet, in one INSERT ... SELECT
+def prepare_course(course_id):
+    now = datetime.datetime.utcnow()
+    missing = select(Enrollment.id, Enrollment.student_id, Enrollment.course_id, Enrollment.grade,
+                     literal('pending'), literal(0), literal(now), literal(now)) \
+        .where(Enrollment.course_id == course_id, passing(),
+               Enrollment.id.notin_(select(Certificate.enrollment_id).where(Certificate.course_id == course_id)))
+    created = db.session.execute(insert(Certificate).from_select(
+        ['enrollment_id', 'student_id', 'course_id', 'grade', 'status', 'attempts', 'created_at', 'updated_at'],
+        missing
+    )).rowcount
+    db.session.commit()
+    return created
+
+
+# Give failed certificates another full set of attempts
+def retry_failed(course_id):
+    return db.session.execute(
+        update(Certificate).where(Certificate.course_id == course_id, Certificate.status == 'failed')
+        .values(status='pending', attempts=0, updated_at=datetime.datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def course_summary(course_id):
+    counts = dict(db.session.query(Certificate.status, func.count(Certificate.id))
+                  .filter(Certificate.course_id == course_id).group_by(Certificate.status).all())
+    summary = {status: counts.get(status, 0) for status in ('pending', 'submitted', 'issued', 'failed')}
+    summary["total"] = sum(summary.values())
+    return summary
+
+
+# Issue certificates for every passing enrollment in a course. Safe to run
+# again after any failure: it picks up where the last run stopped and never
+# mints a second certificate for an enrollment. Raises CertificateError while
+# transactions are still awaiting confirmation, so a job retries later.
+def issue_course(algod_client, indexer_client, private_key, admin_account, course, progress=None):
+    if not algod_client or not indexer_client:
+        raise RuntimeError("Unable to connect to blockchain")
+
+    prepare_course(course.id)
+    reconcile(algod_client, indexer_client,
+              Certificate.query.filter_by(course_id=course.id, status='submitted').all())
+    summary = course_summary(course.id)
+    if progress:
+        progress(summary["issued"], summary["total"], f"Issuing certificates for {course.code}")
+
+    window = TX_GROUP_LIMIT * CERTIFICATE_GROUPS_IN_FLIGHT
+    while True:
+        rows = db.session.query(Certificate.id, User.id, User.name, Enrollment.grade) \
+            .join(User, User.id == Certificate.student_id) \
+            .join(Enrollment, Enrollment.id == Certificate.enrollment_id) \
+            .filter(Certificate.course_id == course.id, Certificate.status == 'pending', passing()) \
+            .order_by(Certificate.id).limit(window).all()
+        if not rows:
+            break
+        summary["issued"] += _issue_window(algod_client, private_key, admin_account, course, rows)
+        if progress:
+            progress(summary["issued"], summary["total"], f"Issuing certificates for {course.code}")
+
+    summary = course_summary(course.id)
+    logger.info(f"Certificates for course {course.id}: {summary}")
+    if summary["submitted"]:
+        raise CertificateError(f"{summary['submitted']} certificate transactions are awaiting confirmation", 503)
+    return summary
+
+
+# Issue (or return the already issued) certificate for one enrollment
+def issue_enrollment(algod_client, indexer_client, private_key, admin_account, user, course, enrollment):
+    if not algod_client or not indexer_client:
+        raise RuntimeError("Unable to connect to blockchain")
+
+    certificate = Certificate.query.filter_by(enrollment_id=enrollment.id).first()
+    if certificate is None:
+        certificate = Certificate(enrollment_id=enrollment.id, student_id=user.id, course_id=course.id,
+                                  grade=enrollment.grade, status='pending')
+        db.session.add(certificate)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            certificate = Certificate.query.filter_by(enrollment_id=enrollment.id).first()
+
+    if certificate.status == 'submitted':
+        reconcile(algod_client, indexer_client, [certificate])
+        db.session.refresh(certificate)
+    if certificate.status == 'issued':
+        return certificate
+    if certificate.status == 'submitted':
+        raise CertificateError("Certificate transaction is awaiting confirmation", 409)
+
+    _issue_window(algod_client, private_key, admin_account, course,
+                  [(certificate.id, user.id, user.name, enrollment.grade)])
+    db.session.refresh(certificate)
+    if certificate.status != 'issued':
+        raise CertificateError(certificate.error or "Certificate transaction was not confirmed", 502)
+    return certificate
+
+
+def serialize_certificate(certificate, student_name=None):
+    return {
+        "enrollment_id": certificate.enrollment_id,
+        "student_id": certificate.student_id,
+        "student_name": student_name,
+        "status": certificate.status,
+        "grade": certificate.grade,
+        "asset_id": certificate.asset_id,
+        "transaction_id": certificate.transaction_id,
+        "attempts": certificate.attempts,
+        "error": certificate.error,
+        "date_issued": certificate.issued_at.isoformat() if certificate.issued_at else None
+    }
@@ -0,0 +1,186 @@
+import os
+import json
+import base64
+import logging
+import datetime
+import aiohttp
+from algosdk import constants, encoding, error, transaction
+from chain_guard import guarded_acall, CircuitOpenError
+from smart_contracts import ALGORAND_TIMEOUT, ALGORAND_CONFIRM_ROUNDS, get_admin_account, enrollment_transfer
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Open connections to algod and the indexer per ASGI worker. Every chain call
+# in flight holds one, so this bounds how many can wait on the network at once.
+ALGORAND_MAX_CONNECTIONS = int(os.environ.get("ALGORAND_MAX_CONNECTIONS", 1000))
+
+
+# Async counterparts of the algosdk v2 clients for the calls the ASGI views
+# make (asgi.py). Same REST API, auth headers and errors as the SDK; requests
+# go through one shared aiohttp session, so a worker waits on thousands of
+# them without a thread each. (httpx's pool rescans every connection for each
+# request it hands out, which costs more CPU than the requests themselves at
+# a few hundred connections.)
+class AsyncAlgodClient:
+    def __init__(self, http, token, address):
+        self.http = http
+        self.address = address.rstrip('/')
+        self.headers = {"User-Agent": "py-algorand-sdk", constants.algod_auth_header: token}
+
+    async def request(self, method, path, params=None, data=None, headers=None):
+        try:
+            async with self.http.request(method, f"{self.address}/v2{path}", params=params, data=data,
+                                         headers={**self.headers, **(headers or {})}) as response:
+                body = await response.read()
+        except aiohttp.ClientConnectionError as e:
+            raise _connection_error(e)
+        if response.status >= 400:
+            raise error.AlgodHTTPError(_error_message(body), response.status)
+        return json.loads(body)
+
+    async def status(self):
+        return await self.request('GET', '/status')
+
+    async def status_after_block(self, round_num):
+        return await self.request('GET', f"/status/wait-for-block-after/{round_num}")
+
+    async def suggested_params(self):
+        res = await self.request('GET', '/transactions/params')
+        return transaction.SuggestedParams(res["fee"], res["last-round"], res["last-round"] + 1000,
+                                           res["genesis-hash"], res["genesis-id"], False,
+                                           res["consensus-version"], res["min-fee"])
+
+    async def send_transactions(self, signed_txns):
+        raw = b"".join(base64.b64decode(encoding.msgpack_encode(txn)) for txn in signed_txns)
+        res = await self.request('POST', '/transactions', data=raw,
+                                 headers={"Content-Type": "application/x-binary"})
+        return res["txId"]
+
+    async def send_transaction(self, signed_txn):
+        return await self.send_transactions([signed_txn])
+
+    async def pending_transaction_info(self, txid):
+        return await self.request('GET', f"/transactions/pending/{txid}", params={"format": "json"})
+
+
+class AsyncIndexerClient:
+    def __init__(self, http, token, address):
+        self.http = http
+        self.address = address.rstrip('/')
+        self.headers = {"User-Agent": "py-algorand-sdk", constants.indexer_auth_header: token}
+
+    async def request(self, path, params=None):
+        try:
+            async with self.http.get(f"{self.address}{path}", params=params, headers=self.headers) as response:
+                body = await response.read()
+        except aiohttp.ClientConnectionError as e:
+            raise _connection_error(e)
+        if response.status >= 400:
+            indexer_error = error.IndexerHTTPError(_error_message(body))
+            indexer_error.code = response.status  # kept for chain_guard.is_failure; the SDK drops it
+            raise indexer_error
+        return json.loads(body)
+
+    async def health(self):
+        return await self.request('/health')
+
+    async def transaction(self, txid):
+        return await self.request(f"/v2/transactions/{txid}")
+
+
+# Lost connections as the SDK reports them: an OSError. Some of aiohttp's
+# (a server disconnecting mid-response) are not one.
+def _connection_error(e):
+    if isinstance(e, OSError):
+        return e
+    connection_error = ConnectionError(str(e) or type(e).__name__)
+    connection_error.__cause__ = e
+    return connection_error
+
+
+# The node's error message, as the SDK reports it
+def _error_message(body):
+    try:
+        return json.loads(body)["message"]
+    except (ValueError, KeyError, TypeError):
+        return body.decode(errors='replace')
+
+
+# One pooled HTTP session per worker, created on its event loop and closed by
+# the ASGI app on shutdown
+def create_http_client():
+    return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=ALGORAND_TIMEOUT),
+                                 connector=aiohttp.TCPConnector(limit=ALGORAND_MAX_CONNECTIONS))
+
+
+# Same settings as get_algod_client / get_indexer_client in smart_contracts.py
+def get_algod_client(http):
+    return AsyncAlgodClient(http, os.environ.get("ALGORAND_API_KEY", ""),
+                            os.environ.get("ALGORAND_ALGOD_ADDRESS", "https://testnet-api.algonode.cloud"))
+
+
+def get_indexer_client(http):
+    return AsyncIndexerClient(http, os.environ.get("ALGORAND_API_KEY", ""),
+                              os.environ.get("ALGORAND_INDEXER_ADDRESS", "https://testnet-idx.algonode.cloud"))
+
+
+# algosdk.transaction.wait_for_confirmation, awaiting each round instead of blocking on it
+async def wait_for_confirmation(algod_client, txid, wait_rounds=0):
+    last_round = (await algod_client.status())["last-round"]
+    current_round = last_round + 1
+    wait_rounds = wait_rounds or 1000
+
+    while True:
+        if current_round > last_round + wait_rounds:
+            raise error.ConfirmationTimeoutError(f"Wait for transaction id {txid} timed out")
+
+        try:
+            tx_info = await algod_client.pending_transaction_info(txid)
+            if tx_info.get("pool-error"):
+                raise error.TransactionRejectedError("Transaction rejected: " + tx_info["pool-error"])
+            if tx_info.get("confirmed-round"):
+                return tx_info
+        except error.AlgodHTTPError:
+            # A node behind a load balancer may not know the transaction yet
+            pass
+
+        await algod_client.status_after_block(current_round)
+        current_round += 1
+
+
+# smart_contracts.submit_transaction: the send and the wait are guarded separately
+async def submit_transaction(algod_client, txn, private_key, operation):
+    signed_txn = txn.sign(private_key)
+    txid = await guarded_acall(f'{operation}_send', algod_client.send_transaction, signed_txn)
+    confirmed_txn = await guarded_acall(f'{operation}_confirm', wait_for_confirmation, algod_client, txid,
+                                        ALGORAND_CONFIRM_ROUNDS)
+    logger.info(f"Transaction {txid} confirmed in round: {confirmed_txn['confirmed-round']}")
+    return txid, confirmed_txn
+
+
+# smart_contracts.enroll_student for the ASGI enroll view: the transaction ID,
+# or None when the transfer could not be recorded
+async def enroll_student(algod_client, contract_address, student_id, course_id):
+    private_key, admin_account = get_admin_account()
+    if not private_key:
+        return None
+
+    try:
+        return await _enroll_student(algod_client, contract_address, student_id, course_id, private_key,
+                                     admin_account)
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        return None
+    except Exception as e:
+        logger.error(f"Error enrolling student: {str(e)}")
+        return None
+
+
+async def _enroll_student(algod_client, contract_address, student_id, course_id, private_key, admin_account):
+    params = await guarded_acall('enrollment_params', algod_client.suggested_params)
+    txn = enrollment_transfer(admin_account, params, contract_address, student_id, course_id,
+                              str(int(datetime.datetime.now().timestamp())))
+    txid, _ = await submit_transaction(algod_client, txn, private_key, 'enrollment')
+    logger.info(f"Enrollment transaction ID: {txid}")
+    return txid
@@ -0,0 +1,234 @@
+import os
+import time
+import threading
+import logging
+import http.client
+import urllib.error
+from collections import deque
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Guard configuration for outbound Algorand (algod / indexer) calls
+FAILURE_THRESHOLD = int(os.environ.get("ALGORAND_BREAKER_THRESHOLD", 5))
+RESET_TIMEOUT = float(os.environ.get("ALGORAND_BREAKER_RESET_SECONDS", 30))
+LATENCY_SAMPLES = 512
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+# Circuit breaker shared by every chain operation in this worker.
+# closed -> open after FAILURE_THRESHOLD consecutive failures; open -> half_open
+# once RESET_TIMEOUT has elapsed, letting a single probe call through.
+class CircuitBreaker:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.last_error = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self._probe_in_flight = False
+
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                logger.info("Algorand circuit breaker closed")
+            self.state = 'closed'
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    # The call failed without saying anything about the node (see is_failure):
+    # let another probe through, but leave the state alone
+    def record_ignored(self):
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            self._probe_in_flight = False
+
+            if self.state == 'half_open' or self.consecutive_failures >= self.failure_threshold:
+                if self.state != 'open':
+                    logger.warning(f"Algorand circuit breaker opened after {self.consecutive_failures} failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            retry_in = None
+            if self.state == 'open':
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_in_seconds": round(retry_in, 1) if retry_in is not None else None,
+                "last_error": self.last_error
+            }
+
+
+# Per-operation call counters and a rolling window of latencies
+class ChainMetrics:
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self.samples = samples
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def _get(self, operation):
+        stats = self._operations.get(operation)
+        if stats is None:
+            stats = {
+                "calls": 0,
+                "errors": 0,
+                "rejected": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "latencies": deque(maxlen=self.samples)
+            }
+            self._operations[operation] = stats
+        return stats
+
+    def record(self, operation, elapsed_ms, error=False):
+        with self._lock:
+            stats = self._get(operation)
+            stats["calls"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["latencies"].append(elapsed_ms)
+            if error:
+                stats["errors"] += 1
+
+    def record_rejected(self, operation):
+        with self._lock:
+            self._get(operation)["rejected"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for operation, stats in self._operations.items():
+                latencies = sorted(stats["latencies"])
+                result[operation] = {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "rejected": stats["rejected"],
+                    "avg_ms": round(stats["total_ms"] / stats["calls"], 2) if stats["calls"] else None,
+                    "max_ms": round(stats["max_ms"], 2),
+                    "p50_ms": percentile(latencies, 50),
+                    "p95_ms": percentile(latencies, 95),
+                    "p99_ms": percentile(latencies, 99)
+                }
+            return result
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return round(sorted_values[index], 2)
+
+
+breaker = CircuitBreaker()
+metrics = ChainMetrics()
+
+
+# HTTP status of an algod / indexer error, or None when there was no answer.
+# algosdk's indexer client drops the status; the HTTPError it was raised
+# while handling still has it.
+def http_status(error):
+    code = getattr(error, 'code', None)
+    context = error.__context__
+    while not isinstance(code, int) and context is not None:
+        if isinstance(context, urllib.error.HTTPError):
+            code = context.code
+        context = context.__context__
+    return code if isinstance(code, int) else None
+
+
+# Whether an error means the node is down or unreachable: a timeout, a
+# connection error or a 5xx. A 4xx is the node answering (a transaction not
+# indexed yet, a rejected group), and errors raised by our own code say
+# nothing about the node; neither may open the breaker.
+def is_failure(error):
+    status = http_status(error)
+    if status is not None:
+        return status >= 500
+    return isinstance(error, (OSError, http.client.HTTPException))
+
+
+def _record_error(operation, elapsed_ms, error):
+    metrics.record(operation, elapsed_ms, error=True)
+    if is_failure(error):
+        breaker.record_failure(error)
+    elif http_status(error) is not None:
+        breaker.record_success()
+    else:
+        breaker.record_ignored()
+
+
+# Run a chain call through the breaker, timing it and counting failures
+# (is_failure). Guard single network calls: anything else the function raises
+# is not the node's fault. Raises CircuitOpenError without touching the
+# network while the breaker is open.
+def guarded_call(operation, func, *args, **kwargs):
+    if not breaker.allow():
+        metrics.record_rejected(operation)
+        raise CircuitOpenError(f"Algorand unavailable, skipping {operation}")
+
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        _record_error(operation, (time.perf_counter() - start) * 1000, e)
+        raise
+
+    metrics.record(operation, (time.perf_counter() - start) * 1000)
+    breaker.record_success()
+    return result
+
+
+# guarded_call for coroutines (chain_async.py), sharing the same breaker and metrics
+async def guarded_acall(operation, func, *args, **kwargs):
+    if not breaker.allow():
+        metrics.record_rejected(operation)
+        raise CircuitOpenError(f"Algorand unavailable, skipping {operation}")
+
+    start = time.perf_counter()
+    try:
+        result = await func(*args, **kwargs)
+    except Exception as e:
+        _record_error(operation, (time.perf_counter() - start) * 1000, e)
+        raise
+
+    metrics.record(operation, (time.perf_counter() - start) * 1000)
+    breaker.record_success()
+    return result
+
+
+def health_report():
+    return {
+        "circuit_breaker": breaker.snapshot(),
+        "operations": metrics.snapshot()
+    }
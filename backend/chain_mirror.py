@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import base64
+import logging
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from models import db, ChainSyncState, ChainEnrollment, ChainCertificate
+from chain_guard import guarded_call
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Transactions per indexer page (the indexer's own maximum is 1000)
+CHAIN_MIRROR_PAGE_LIMIT = int(os.environ.get("CHAIN_MIRROR_PAGE_LIMIT", 1000))
+# Catch-up splits the missing rounds into this many slices per worker, so a
+# busy stretch of history does not leave the other workers idle
+SLICES_PER_WORKER = 4
+# Below this many rounds a catch-up is not worth splitting
+MIN_SLICE_ROUNDS = 1000
+# Existing-row lookups per IN (...) clause
+LOOKUP_CHUNK = 500
+
+
+def _note(txn):
+    try:
+        return json.loads(base64.b64decode(txn.get("note", "")))
+    except (ValueError, TypeError):
+        return None
+
+
+# Reduce one indexer transaction to a mirror row, or None if it is neither an
+# enrollment transfer nor a certificate mint. Returns ('enrollment', row) or
+# ('certificate', row).
+def parse_transaction(txn):
+    note = _note(txn)
+    if not isinstance(note, dict):
+        return None
+
+    if txn.get("tx-type") == 'axfer' and note.get("action") == 'enroll':
+        return 'enrollment', dict(
+            transaction_id=txn["id"],
+            asset_id=txn["asset-transfer-transaction"]["asset-id"],
+            student_id=_int(note.get("student_id")),
+            course_id=_int(note.get("course_id")),
+            confirmed_round=txn["confirmed-round"],
+            round_time=txn.get("round-time"),
+            fee=txn.get("fee"),
+            timestamp=note.get("timestamp")
+        )
+
+    if txn.get("tx-type") == 'acfg' and txn.get("created-asset-index") and note.get("type") == 'course_certificate':
+        return 'certificate', dict(
+            asset_id=txn["created-asset-index"],
+            transaction_id=txn["id"],
+            student_id=_int(note.get("student_id")),
+            course_id=_int(note.get("course_id")),
+            course_code=note.get("course_code"),
+            grade=note.get("grade"),
+            student_name=note.get("student_name"),
+            date_issued=note.get("date_issued"),
+            confirmed_round=txn["confirmed-round"]
+        )
+    return None
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Every transaction of the account in [min_round, max_round], page by page.
+# Returns (enrollment rows, certificate rows, transactions read).
+def fetch_rounds(indexer_client, address, min_round, max_round, page_limit=None):
+    page_limit = page_limit or CHAIN_MIRROR_PAGE_LIMIT
+    enrollments = []
+    certificates = []
+    seen = 0
+    next_page = None
+    while True:
+        page = guarded_call('mirror_page', indexer_client.search_transactions, address=address,
+                            min_round=min_round, max_round=max_round, limit=page_limit, next_page=next_page)
+        transactions = page.get("transactions", [])
+        seen += len(transactions)
+        for txn in transactions:
+            parsed = parse_transaction(txn)
+            if parsed:
+                (enrollments if parsed[0] == 'enrollment' else certificates).append(parsed[1])
+        next_page = page.get("next-token")
+        if not next_page or len(transactions) < page_limit:
+            return enrollments, certificates, seen
+
+
+def _insert_new(model, key, rows, retry=True):
+    if not rows:
+        return 0
+    column = getattr(model, key)
+    keys = [row[key] for row in rows]
+    existing = set()
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        existing.update(value for (value,) in db.session.query(column).filter(column.in_(keys[start:start + LOOKUP_CHUNK])))
+    fresh = {row[key]: row for row in rows if row[key] not in existing}
+    if not fresh:
+        return 0
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model), list(fresh.values()))
+    except IntegrityError:
+        # Another sync (the CLI follower, a second job) stored some of these
+        # between the lookup and the insert; look again and insert the rest
+        if not retry:
+            raise
+        return _insert_new(model, key, list(fresh.values()), retry=False)
+    return len(fresh)
+
+
+# Write fetched rows, skipping anything already mirrored, so a range can be
+# read again after an interruption without duplicates. The caller commits.
+def store(enrollments, certificates):
+    return _insert_new(ChainEnrollment, 'transaction_id', enrollments), \
+        _insert_new(ChainCertificate, 'asset_id', certificates)
+
+
+def get_state(address):
+    state = db.session.get(ChainSyncState, address)
+    if state is None:
+        state = ChainSyncState(account=address, last_round=0, transactions_seen=0)
+        db.session.add(state)
+        db.session.flush()
+    return state
+
+
+# Bring the mirror up to the indexer's current round. Normally one pass from
+# the last processed round; with workers > 1 a long gap (a first run, or a
+# catch-up after downtime) is split into round slices fetched in parallel.
+# Slices can finish in any order: rows are written as each one arrives, but
+# last_round only moves over slices that are done without a gap before them,
+# so an interrupted catch-up resumes without skipping history. progress(slices
+# done, slices) is called after each one is stored (a job's progress, which
+# also renews its lease).
+def sync(indexer_client, address, workers=1, from_round=None, progress=None):
+    state = get_state(address)
+    start = state.last_round + 1 if from_round is None else from_round
+    head = guarded_call('mirror_head', indexer_client.health)["round"]
+    totals = {"from_round": start, "to_round": head, "transactions": 0, "enrollments": 0, "certificates": 0}
+    if start > head:
+        db.session.commit()
+        return totals
+    started = time.perf_counter()
+
+    slice_count = 1
+    if workers > 1 and head - start + 1 >= 2 * MIN_SLICE_ROUNDS:
+        slice_count = min(workers * SLICES_PER_WORKER, (head - start + 1) // MIN_SLICE_ROUNDS)
+    size = -(-(head - start + 1) // slice_count)
+    slices = [(low, min(low + size - 1, head)) for low in range(start, head + 1, size)]
+
+    done = set()
+    next_slice = 0
+
+    def record(index, result):
+        nonlocal next_slice
+        enrollments, certificates, seen = result
+        new_enrollments, new_certificates = store(enrollments, certificates)
+        totals["transactions"] += seen
+        totals["enrollments"] += new_enrollments
+        totals["certificates"] += new_certificates
+        state.transactions_seen += seen
+        done.add(index)
+        while next_slice in done:
+            state.last_round = slices[next_slice][1]
+            next_slice += 1
+        state.last_synced_at = datetime.datetime.utcnow()
+        db.session.commit()
+        if progress:
+            progress(len(done), len(slices), f"Mirrored {len(done)} of {len(slices)} round slices")
+
+    if len(slices) == 1:
+        record(0, fetch_rounds(indexer_client, address, start, head))
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chain-mirror') as pool:
+            futures = {pool.submit(fetch_rounds, indexer_client, address, low, high): i
+                       for i, (low, high) in enumerate(slices)}
+            for future in as_completed(futures):
+                record(futures[future], future.result())
+
+    totals["slices"] = len(slices)
+    totals["seconds"] = round(time.perf_counter() - started, 3)
+    logger.info(f"Chain mirror for {address} synced rounds {start}-{head}: {totals}")
+    return totals
+
+
+# Keep syncing every interval seconds until stop is set
+def follow(indexer_client, address, interval=5.0, stop=None):
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        try:
+            sync(indexer_client, address)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Chain mirror sync failed: {str(e)}")
+        stop.wait(interval)
+
+
+def mirror_status(address):
+    state = db.session.get(ChainSyncState, address)
+    return {
+        "account": address,
+        "last_round": state.last_round if state else 0,
+        "transactions_seen": state.transactions_seen if state else 0,
+        "last_synced_at": state.last_synced_at.isoformat() if state and state.last_synced_at else None,
+        "enrollments": ChainEnrollment.query.count(),
+        "certificates": ChainCertificate.query.count()
+    }
+
+
+def serialize_chain_certificate(certificate):
+    return {
+        "asset_id": certificate.asset_id,
+        "transaction_id": certificate.transaction_id,
+        "student_id": certificate.student_id,
+        "student_name": certificate.student_name,
+        "course_id": certificate.course_id,
+        "course_code": certificate.course_code,
+        "grade": certificate.grade,
+        "date_issued": certificate.date_issued,
+        "confirmed_round": certificate.confirmed_round
+    }
+
+
+# python -m chain_mirror --catch-up --workers 8     backfill, then exit
+# python -m chain_mirror --interval 5               follow the chain
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mirror the admin account's enrollments and certificates")
+    parser.add_argument('--catch-up', action='store_true', help="sync once with parallel slices, then exit")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--from-round', type=int, default=None, help="re-read history from this round")
+    parser.add_argument('--interval', type=float, default=5.0)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from app import create_app
+    from tenancy import create_all
+    app = create_app()
+    from smart_contracts import get_admin_account, get_indexer_client
+    _, address = get_admin_account()
+    indexer_client = get_indexer_client()
+    if not address or not indexer_client:
+        logger.error("Admin account or indexer not configured")
+        return 1
+
+    create_all(app)
+    with app.app_context():
+        if args.catch_up:
+            print(json.dumps(sync(indexer_client, address, workers=args.workers, from_round=args.from_round)))
+            return 0
+        try:
+            follow(indexer_client, address, args.interval)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
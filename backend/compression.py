@@ -0,0 +1,134 @@
+import gzip
+import zlib
+import logging
+from flask import request
+
+# Brotli is optional; without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIMETYPES = [
+    'application/json',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'text/event-stream',
+    'application/javascript',
+]
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+# Pick the best encoding from an Accept-Encoding header, honouring q-values
+# (q=0 means "not acceptable"). Ties go to the server preference order.
+def negotiate_encoding(accept_encoding, available):
+    accepted = {}
+    for part in accept_encoding.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, params = part.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    best = None
+    best_quality = 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress_bytes(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BR_LEVEL'])
+    return gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+
+# Chunked compression for streamed bodies: every chunk is flushed so the
+# client still receives data (e.g. server-sent events) as it is produced.
+def compress_stream(chunks, encoding, config):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config['COMPRESS_BR_LEVEL'])
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+
+    compressor = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Compress eligible responses according to the client's Accept-Encoding.
+# Responses smaller than COMPRESS_MIN_SIZE, already encoded, partial (Range)
+# or served from files are left alone; streamed responses are only compressed
+# when COMPRESS_STREAMS enables chunked compression.
+def init_compression(app):
+    app.config.setdefault('COMPRESS_ENABLED', True)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_LEVEL', 4)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESS_STREAMS', False)
+    app.config.setdefault('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES)
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if not config['COMPRESS_ENABLED']:
+            return response
+
+        if (response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.mimetype not in config['COMPRESS_MIMETYPES']
+                or 'Content-Encoding' in response.headers
+                or 'Content-Range' in response.headers):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if request.method == 'HEAD':
+            return response
+
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''), available_encodings())
+        if encoding is None:
+            return response
+
+        if response.direct_passthrough or response.is_streamed:
+            # File downloads keep their zero-copy path; other streams need chunked compression
+            if response.direct_passthrough or not config['COMPRESS_STREAMS']:
+                return response
+            response.response = compress_stream(response.response, encoding, config)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = encoding
+            return response
+
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+
+        response.set_data(compress_bytes(data, encoding, config))
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,108 @@
+import os
+import logging
+from sqlalchemy import update
+from models import db, Course
+from chain_guard import guarded_call
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Assets per indexer page when listing the admin account's assets
+CONTRACT_SWEEP_PAGE_LIMIT = int(os.environ.get("CONTRACT_SWEEP_PAGE_LIMIT", 1000))
+
+COURSE_ASSET_PREFIX = 'Course_'
+
+
+# A course's asset is named after its code and its unit name carries the
+# course ID, so the asset can be found again without the address we failed
+# to store (e.g. when the request timed out after the asset was sent)
+def course_asset_name(course):
+    return f"{COURSE_ASSET_PREFIX}{course.code}"
+
+
+def course_unit_name(course):
+    return f"C{course.id}"
+
+
+def _course_id(asset):
+    unit = asset["params"].get("unit-name") or ''
+    if not asset["params"].get("name", '').startswith(COURSE_ASSET_PREFIX) or not unit.startswith('C'):
+        return None
+    try:
+        return int(unit[1:])
+    except ValueError:
+        return None
+
+
+# Every live asset created by the admin account that matches the filters, page by page
+def search_assets(indexer_client, creator, name=None, unit=None):
+    next_page = None
+    while True:
+        page = guarded_call('contract_lookup', indexer_client.search_assets, creator=creator, name=name, unit=unit,
+                            limit=CONTRACT_SWEEP_PAGE_LIMIT, next_page=next_page)
+        assets = page.get("assets", [])
+        for asset in assets:
+            if not asset.get("deleted") and asset["params"].get("creator") == creator:
+                yield asset
+        next_page = page.get("next-token")
+        if not next_page or len(assets) < CONTRACT_SWEEP_PAGE_LIMIT:
+            return
+
+
+# The ID of the course's asset if one was already minted, oldest first, else
+# None. The indexer trails algod by a round or two, so an asset confirmed a
+# moment ago may not be found yet; sweep() picks those up later.
+def find_course_asset(indexer_client, creator, course):
+    name, unit = course_asset_name(course), course_unit_name(course)
+    matches = [asset["index"] for asset in search_assets(indexer_client, creator, name=name, unit=unit)
+               if asset["params"].get("name") == name and asset["params"].get("unit-name") == unit]
+    return min(matches) if matches else None
+
+
+# Match the admin account's course assets with the courses table. A course
+# without a contract adopts the oldest asset minted for it (a creation whose
+# response was lost); further assets for a course are reported as duplicates,
+# and assets for courses that no longer exist, or whose code changed, as
+# orphans. Adoption only fills an empty contract_address, so a sweep racing
+# a contract job never overwrites the address the job stored.
+def sweep(indexer_client, creator):
+    found = {}
+    orphans = []
+    scanned = 0
+    for asset in search_assets(indexer_client, creator):
+        scanned += 1
+        course_id = _course_id(asset)
+        if course_id is not None:
+            found.setdefault(course_id, []).append(asset)
+
+    courses = {c.id: c for c in Course.query.filter(Course.id.in_(list(found)))} if found else {}
+    adopted = []
+    duplicates = []
+    for course_id, assets in sorted(found.items()):
+        course = courses.get(course_id)
+        matching = sorted(a["index"] for a in assets if course and a["params"]["name"] == course_asset_name(course))
+        orphans.extend({"asset_id": a["index"], "name": a["params"]["name"], "unit_name": a["params"]["unit-name"]}
+                       for a in assets if a["index"] not in matching)
+        if not matching:
+            continue
+
+        keep = str(matching[0])
+        if not course.contract_address:
+            result = db.session.execute(update(Course).where(Course.id == course_id, Course.contract_address.is_(None))
+                                        .values(contract_address=keep))
+            if result.rowcount:
+                adopted.append({"course_id": course_id, "asset_id": matching[0]})
+                logger.info(f"Course {course_id} adopted asset {keep}")
+        else:
+            keep = course.contract_address
+        duplicates.extend({"course_id": course_id, "asset_id": asset_id}
+                          for asset_id in matching if str(asset_id) != keep)
+    db.session.commit()
+
+    missing = [course_id for (course_id,) in
+               db.session.query(Course.id).filter(Course.contract_address.is_(None)).order_by(Course.id)]
+    report = {"assets_scanned": scanned, "adopted": adopted, "duplicates": duplicates, "orphans": orphans,
+              "missing": missing}
+    logger.info(f"Contract sweep: scanned {scanned}, adopted {len(adopted)}, {len(duplicates)} duplicates, "
+                f"{len(orphans)} orphans, {len(missing)} courses without a contract")
+    return report
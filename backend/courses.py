@@ -1,7 +1,17 @@
-from flask import Blueprint, request, jsonify
-from models import db, Course, User, Enrollment, Assignment, Submission, Grade
+from flask import Blueprint, Response, request, jsonify
+from sqlalchemy import func, select
+from models import db, Course, User, Enrollment, Assignment, Submission, Grade, CourseMeeting, WaitlistEntry
 from auth import jwt_required, get_jwt_identity
-from smart_contracts import create_course_contract, enroll_student
+from idempotency import idempotent
+from smart_contracts import chain_enabled, create_course_contract, enroll_student
+from serializers import COURSE, ASSIGNMENT, json_response
+from search import get_index, index_courses, tokenize
+from scheduling import ScheduleError, parse_days, parse_time, serialize_meeting, check_candidates
+import waitlist
+import registration
+import events
+import jobs
+import datetime
 
 courses_bp = Blueprint('courses', __name__)
 
@@ -13,41 +23,80 @@ def get_courses():
     department = request.args.get('department')
     status = request.args.get('status', 'active')
     
-    # Build query
-    query = Course.query
+    # Build query: one column-only select with the instructor and enrollment count inlined
+    query = COURSE.select().outerjoin(User, User.id == Course.instructor_id)
     
     if term:
-        query = query.filter_by(term=term)
+        query = query.where(Course.term == term)
     if year:
-        query = query.filter_by(year=int(year))
+        query = query.where(Course.year == int(year))
     if department:
-        query = query.filter_by(department=department)
+        query = query.where(Course.department == department)
     if status:
-        query = query.filter_by(status=status)
+        query = query.where(Course.status == status)
     
-    courses = query.all()
+    rows = db.session.execute(query.order_by(Course.id))
     
-    result = []
-    for course in courses:
-        instructor = User.query.get(course.instructor_id) if course.instructor_id else None
-        
-        result.append({
-            "id": course.id,
-            "code": course.code,
-            "title": course.title,
-            "description": course.description,
-            "credits": course.credits,
-            "term": course.term,
-            "year": course.year,
-            "department": course.department,
-            "instructor": instructor.name if instructor else "TBA",
-            "enrolled_count": course.enrolled_count,
-            "capacity": course.capacity,
-            "status": course.status,
-            "fee": course.fee
-        })
+    return json_response(COURSE.rows(rows))
+
+@courses_bp.route('/search', methods=['GET'])
+def search_courses():
+    terms = tokenize(request.args.get('q', ''))
+    if not terms:
+        return jsonify({"error": "Search query (q) is required"}), 400
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    term = request.args.get('term')
+    year = request.args.get('year')
+    department = request.args.get('department')
+    status = request.args.get('status', 'active')
     
-    return jsonify(result)
+    filters = []
+    if term:
+        filters.append(Course.term == term)
+    if year:
+        filters.append(Course.year == int(year))
+    if department:
+        filters.append(Course.department == department)
+    if status:
+        filters.append(Course.status == status)
+    
+    # Rank by score, then by course code for stable pages. Only the requested
+    # page is loaded and serialized; the total is counted separately.
+    index = get_index()
+    query = COURSE.select().outerjoin(User, User.id == Course.instructor_id)
+    
+    if index.name == 'fts5':
+        matches = index.match_subquery(terms)
+        total = db.session.execute(
+            select(func.count()).select_from(Course)
+            .join(matches, matches.c.course_id == Course.id).where(*filters)
+        ).scalar()
+        rows = db.session.execute(
+            query.add_columns(matches.c.score).join(matches, matches.c.course_id == Course.id).where(*filters)
+            .order_by(matches.c.score.desc(), Course.code).limit(limit).offset(offset)
+        ).all()
+        results = [dict(COURSE.row(row), score=round(row[-1], 4)) for row in rows]
+    else:
+        scores = index.search(terms)
+        if not scores:
+            return json_response({"query": request.args.get('q'), "total": 0, "results": []})
+        # Scores live in the in-memory index: rank the matching ids, then load the page
+        candidates = db.session.execute(select(Course.id, Course.code).where(Course.id.in_(scores), *filters)).all()
+        ranked = sorted(candidates, key=lambda row: (-scores[row[0]], row[1]))
+        page = [row[0] for row in ranked[offset:offset + limit]]
+        total = len(candidates)
+        rows = db.session.execute(query.where(Course.id.in_(page))).all() if page else []
+        position = {course_id: i for i, course_id in enumerate(page)}
+        results = [dict(COURSE.row(row), score=round(scores[row[0]], 4))
+                   for row in sorted(rows, key=lambda row: position[row[0]])]
+    
+    return json_response({
+        "query": request.args.get('q'),
+        "total": total,
+        "results": results
+    })
 
 @courses_bp.route('/<int:course_id>', methods=['GET'])
 def get_course(course_id):
@@ -89,11 +138,13 @@ def get_course(course_id):
         "status": course.status,
         "fee": course.fee,
         "assignments": assignments,
+        "meetings": [serialize_meeting(m) for m in course.meetings],
         "contract_address": course.contract_address
     })
 
 @courses_bp.route('/', methods=['POST'])
 @jwt_required
+@idempotent
 def create_course():
     current_user_id = get_jwt_identity()
     user = User.query.get(current_user_id)
@@ -141,21 +192,32 @@ def create_course():
     try:
         db.session.commit()
         
-        # Create Algorand smart contract for the course
-        if data.get('create_contract', True):
-            contract_address = create_course_contract(new_course)
-            if contract_address:
-                new_course.contract_address = contract_address
-                db.session.commit()
+        # Create Algorand smart contract for the course, in the background if asked
+        job = None
+        if data.get('create_contract', True) and chain_enabled():
+            if jobs.wants_async(request):
+                job, _ = jobs.enqueue('course_contract', {"course_id": new_course.id}, user_id=user.id)
+            else:
+                contract_address = create_course_contract(new_course)
+                if contract_address:
+                    new_course.contract_address = contract_address
+                    db.session.commit()
+        
+        index_courses([new_course.id])
+        
+        course_data = {
+            "id": new_course.id,
+            "code": new_course.code,
+            "title": new_course.title,
+            "contract_address": new_course.contract_address
+        }
+        # The course exists; the job tracks its contract
+        if job:
+            return jobs.accepted(job, course=course_data)
         
         return jsonify({
             "message": "Course created successfully",
-            "course": {
-                "id": new_course.id,
-                "code": new_course.code,
-                "title": new_course.title,
-                "contract_address": new_course.contract_address
-            }
+            "course": course_data
         }), 201
     
     except Exception as e:
@@ -192,7 +254,14 @@ def update_course(course_id):
             course.instructor_id = instructor.id
     
     try:
+        # Extra capacity (or reopening the course) goes to the waitlist first
+        seats_changed = 'capacity' in data or 'status' in data
+        promoted = waitlist.promote(course) if seats_changed else []
         db.session.commit()
+        index_courses([course.id])
+        if seats_changed:
+            waitlist.after_commit(course, promoted)
+        
         return jsonify({
             "message": "Course updated successfully",
             "course": {
@@ -210,51 +279,25 @@ def update_course(course_id):
 @jwt_required
 def enroll_in_course(course_id):
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
-    
-    if not user or user.role != 'student':
-        return jsonify({"error": "Only students can enroll in courses"}), 403
-    
-    course = Course.query.get(course_id)
-    if not course:
-        return jsonify({"error": "Course not found"}), 404
-    
-    # Check if student is already enrolled
-    existing_enrollment = Enrollment.query.filter_by(
-        student_id=user.id,
-        course_id=course.id
-    ).first()
-    
-    if existing_enrollment:
-        return jsonify({"error": "Already enrolled in this course"}), 409
     
-    # Check if course is full
-    if course.is_full:
-        return jsonify({"error": "Course is full"}), 400
-    
-    # Check if course is active
-    if course.status != 'active':
-        return jsonify({"error": "Course is not active for enrollment"}), 400
-    
-    # Create enrollment
-    new_enrollment = Enrollment(
-        student_id=user.id,
-        course_id=course.id,
-        status='enrolled'
-    )
-    
-    db.session.add(new_enrollment)
+    try:
+        new_enrollment, course = registration.enroll_one(current_user_id, course_id)
+    except registration.EnrollmentError as e:
+        return jsonify({"error": e.message, **e.extra}), e.status
     
     try:
         db.session.commit()
         
         # Record enrollment on blockchain if contract exists
         if course.contract_address:
-            transaction_id = enroll_student(course.contract_address, user.id, course.id)
+            transaction_id = enroll_student(course.contract_address, current_user_id, course.id)
             if transaction_id:
                 new_enrollment.transaction_id = transaction_id
                 db.session.commit()
         
+        waitlist.publish_seats(course)
+        events.notify(current_user_id, 'enrollment', waitlist.enrollment_event(new_enrollment, course))
+        
         return jsonify({
             "message": "Successfully enrolled in course",
             "enrollment": {
@@ -269,27 +312,62 @@ def enroll_in_course(course_id):
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+# Enroll in several courses at once: {"course_ids": [...], "mode": "atomic" | "best_effort"}
+@courses_bp.route('/enroll/batch', methods=['POST'])
+@jwt_required
+def enroll_in_courses():
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if not user or user.role != 'student':
+        return jsonify({"error": "Only students can enroll in courses"}), 403
+    
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('course_ids'), list) or not data['course_ids']:
+        return jsonify({"error": "course_ids must be a non-empty list"}), 400
+    
+    try:
+        course_ids = list(dict.fromkeys(int(course_id) for course_id in data['course_ids']))
+    except (TypeError, ValueError):
+        return jsonify({"error": "course_ids must be integers"}), 400
+    
+    if len(course_ids) > registration.MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {registration.MAX_BATCH_SIZE} courses per batch"}), 400
+    
+    mode = data.get('mode', 'atomic')
+    if mode not in registration.MODES:
+        return jsonify({"error": f"mode must be one of: {', '.join(registration.MODES)}"}), 400
+    
+    try:
+        results = registration.enroll_batch(user.id, course_ids, mode)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+    
+    enrolled = [r["course_id"] for r in results if r["ok"]]
+    if not enrolled:
+        return jsonify({"error": "No courses were enrolled", "mode": mode, "results": results}), 409
+    
+    registration.after_commit(user.id, results)
+    
+    return jsonify({
+        "message": f"Enrolled in {len(enrolled)} of {len(course_ids)} courses",
+        "mode": mode,
+        "enrolled": enrolled,
+        "results": results
+    }), 201
+
 @courses_bp.route('/<int:course_id>/assignments', methods=['GET'])
 def get_course_assignments(course_id):
     course = Course.query.get(course_id)
     if not course:
         return jsonify({"error": "Course not found"}), 404
     
-    assignments = Assignment.query.filter_by(course_id=course_id).all()
-    
-    result = []
-    for assignment in assignments:
-        result.append({
-            "id": assignment.id,
-            "title": assignment.title,
-            "description": assignment.description,
-            "due_date": assignment.due_date.isoformat(),
-            "points": assignment.points,
-            "weight": assignment.weight,
-            "created_at": assignment.created_at.isoformat()
-        })
+    rows = db.session.execute(ASSIGNMENT.select().where(Assignment.course_id == course_id))
     
-    return jsonify(result)
+    return json_response(ASSIGNMENT.rows(rows))
 
 @courses_bp.route('/<int:course_id>/assignments', methods=['POST'])
 @jwt_required
@@ -342,3 +420,288 @@ def create_assignment(course_id):
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+@courses_bp.route('/<int:course_id>/meetings', methods=['GET'])
+def get_course_meetings(course_id):
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({"error": "Course not found"}), 404
+    
+    return jsonify([serialize_meeting(m) for m in course.meetings])
+
+@courses_bp.route('/<int:course_id>/meetings', methods=['POST'])
+@jwt_required
+def create_course_meeting(course_id):
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({"error": "Course not found"}), 404
+    
+    # Check permissions
+    if user.role == 'professor' and course.instructor_id != user.id:
+        return jsonify({"error": "Permission denied"}), 403
+    elif user.role not in ['professor', 'admin']:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    data = request.get_json()
+    
+    # Validate required fields
+    required_fields = ['days', 'start_time', 'end_time']
+    for field in required_fields:
+        if field not in data:
+            return jsonify({"error": f"{field} is required"}), 400
+    
+    try:
+        days = parse_days(data['days'])
+        start_time = parse_time(data['start_time'])
+        end_time = parse_time(data['end_time'])
+    except ScheduleError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if end_time <= start_time:
+        return jsonify({"error": "end_time must be after start_time"}), 400
+    
+    new_meeting = CourseMeeting(
+        course_id=course.id,
+        days=days,
+        start_time=start_time,
+        end_time=end_time,
+        room=data.get('room')
+    )
+    
+    db.session.add(new_meeting)
+    
+    try:
+        db.session.commit()
+        return jsonify({
+            "message": "Meeting created successfully",
+            "meeting": serialize_meeting(new_meeting)
+        }), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@courses_bp.route('/<int:course_id>/meetings/<int:meeting_id>', methods=['DELETE'])
+@jwt_required
+def delete_course_meeting(course_id, meeting_id):
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    meeting = CourseMeeting.query.filter_by(id=meeting_id, course_id=course_id).first()
+    if not meeting:
+        return jsonify({"error": "Meeting not found"}), 404
+    
+    # Check permissions
+    if user.role == 'professor' and meeting.course.instructor_id != user.id:
+        return jsonify({"error": "Permission denied"}), 403
+    elif user.role not in ['professor', 'admin']:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    db.session.delete(meeting)
+    
+    try:
+        db.session.commit()
+        return jsonify({"message": "Meeting deleted successfully"})
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@courses_bp.route('/schedule/check', methods=['POST'])
+@jwt_required
+def check_schedule():
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if not user or user.role != 'student':
+        return jsonify({"error": "Only students can check schedules"}), 403
+    
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('course_ids'), list) or not data['course_ids']:
+        return jsonify({"error": "course_ids must be a non-empty list"}), 400
+    
+    try:
+        course_ids = list(dict.fromkeys(int(course_id) for course_id in data['course_ids']))
+    except (TypeError, ValueError):
+        return jsonify({"error": "course_ids must be integers"}), 400
+    
+    results = check_candidates(user.id, course_ids)
+    
+    return jsonify({
+        "ok": all(result["ok"] for result in results),
+        "results": results
+    })
+
+@courses_bp.route('/<int:course_id>/drop', methods=['POST'])
+@jwt_required
+def drop_course(course_id):
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if not user or user.role not in ['student', 'admin']:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    # Admins may drop any student; students only themselves
+    data = request.get_json(silent=True) or {}
+    student_id = data.get('student_id', user.id) if user.role == 'admin' else user.id
+    
+    enrollment = Enrollment.query.filter_by(student_id=student_id, course_id=course_id).first()
+    if not enrollment:
+        return jsonify({"error": "Enrollment not found"}), 404
+    
+    try:
+        promoted = waitlist.drop(enrollment)
+        db.session.commit()
+    except waitlist.WaitlistError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+    
+    course = enrollment.course
+    events.notify(enrollment.student_id, 'enrollment', waitlist.enrollment_event(enrollment, course))
+    waitlist.after_commit(course, promoted)
+    
+    return jsonify({
+        "message": "Enrollment dropped",
+        "enrollment_id": enrollment.id,
+        "promoted": [e.student_id for e in promoted]
+    })
+
+@courses_bp.route('/<int:course_id>/waitlist', methods=['POST'])
+@jwt_required
+def join_waitlist(course_id):
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if not user or user.role != 'student':
+        return jsonify({"error": "Only students can join waitlists"}), 403
+    
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({"error": "Course not found"}), 404
+    
+    try:
+        entry = waitlist.join(user.id, course)
+        entry_position = waitlist.position(entry)
+        db.session.commit()
+    except waitlist.WaitlistError as e:
+        db.session.rollback()
+        error = {"error": str(e)}
+        if getattr(e, 'conflicts', None):
+            error["conflicts"] = e.conflicts
+        return jsonify(error), e.status
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+    
+    waitlist.publish_seats(course)
+    
+    return jsonify({
+        "message": "Added to waitlist",
+        "waitlist": {
+            "id": entry.id,
+            "course_id": course.id,
+            "position": entry_position,
+            "events": f"/api/courses/events?course_id={course.id}"
+        }
+    }), 201
+
+@courses_bp.route('/<int:course_id>/waitlist', methods=['GET'])
+@jwt_required
+def get_waitlist(course_id):
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({"error": "Course not found"}), 404
+    
+    if user.role == 'student':
+        entry = waitlist.waiting_entry(user.id, course.id)
+        if not entry:
+            enrollment = Enrollment.query.filter_by(student_id=user.id, course_id=course.id).first()
+            return jsonify({
+                "course_id": course.id,
+                "position": None,
+                "enrolled": bool(enrollment and enrollment.status != 'dropped')
+            })
+        
+        return jsonify({
+            "course_id": course.id,
+            "position": waitlist.position(entry),
+            "joined_at": entry.created_at.isoformat()
+        })
+    
+    # Professors see the waitlist of their own courses, admins of all
+    if user.role == 'professor' and course.instructor_id != user.id:
+        return jsonify({"error": "Permission denied"}), 403
+    elif user.role not in ['professor', 'admin']:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    rows = db.session.query(WaitlistEntry, User.name) \
+        .join(User, User.id == WaitlistEntry.student_id) \
+        .filter(WaitlistEntry.course_id == course.id, WaitlistEntry.status == 'waiting') \
+        .order_by(WaitlistEntry.id).all()
+    
+    return jsonify([{
+        "position": position,
+        "student_id": entry.student_id,
+        "name": name,
+        "joined_at": entry.created_at.isoformat()
+    } for position, (entry, name) in enumerate(rows, start=1)])
+
+@courses_bp.route('/<int:course_id>/waitlist', methods=['DELETE'])
+@jwt_required
+def leave_waitlist(course_id):
+    current_user_id = get_jwt_identity()
+    
+    try:
+        waitlist.leave(current_user_id, course_id)
+        db.session.commit()
+    except waitlist.WaitlistError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+    
+    waitlist.publish_seats(Course.query.get(course_id))
+    
+    return jsonify({"message": "Removed from waitlist"})
+
+@courses_bp.route('/<int:course_id>/seats', methods=['GET'])
+def get_course_seats(course_id):
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({"error": "Course not found"}), 404
+    
+    return jsonify(waitlist.seat_status(course))
+
+# Server-sent events for seat changes: /api/courses/events?course_id=1&course_id=2
+# Each event carries the same payload as GET /<course_id>/seats.
+@courses_bp.route('/events', methods=['GET'])
+def course_events():
+    try:
+        course_ids = sorted({int(course_id) for course_id in request.args.getlist('course_id')})
+    except ValueError:
+        return jsonify({"error": "course_id must be an integer"}), 400
+    
+    if not course_ids:
+        return jsonify({"error": "At least one course_id is required"}), 400
+    if len(course_ids) > 50:
+        return jsonify({"error": "At most 50 courses per stream"}), 400
+    
+    # Subscribe before taking the snapshot so no change falls in between
+    subscription = events.subscribe([events.course_channel(course_id) for course_id in course_ids])
+    snapshot = [('seats', status) for status in waitlist.seat_statuses(course_ids)]
+    
+    return Response(
+        events.stream(subscription, snapshot, events.last_event_id(request)),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,223 @@
+import os
+import re
+import weakref
+import logging
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+from models import db
+from db_routing import init_replica_routing, tenant_bind_key
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Per-connection PRAGMAs for the "sqlite" profile. WAL lets readers keep going
+# while one writer commits; NORMAL sync is durable across app crashes in WAL mode.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "mmap_size": int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": -int(os.environ.get("SQLITE_CACHE_SIZE_KB", 64 * 1024)),  # negative = KiB
+    "temp_store": "MEMORY"
+}
+
+# Engine options per profile, resolved for each bind (see engine_options)
+ENGINE_PROFILES = {
+    # SQLAlchemy defaults, no tuning (what the app used before profiles existed)
+    "default": {},
+    "sqlite": {},
+    # PostgreSQL / MySQL behind gunicorn: a bounded pool per worker, dead
+    # connections detected before use and recycled before server-side timeouts
+    "server": {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+        "pool_pre_ping": True,
+    },
+}
+
+
+# Tenant names end up in bind keys, token claims and event channels
+TENANT_NAME = re.compile(r'[A-Za-z0-9_-]+')
+
+# Async driver used by the ASGI app (asgi.py) for each sync backend
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+
+def resolve_profile(profile, database_uri):
+    if profile and profile != "auto":
+        if profile not in ENGINE_PROFILES:
+            raise ValueError(f"Unknown DB_ENGINE_PROFILE '{profile}', expected one of {sorted(ENGINE_PROFILES)} or 'auto'")
+        return profile
+    return "sqlite" if make_url(database_uri).get_backend_name() == "sqlite" else "server"
+
+
+# Engine options for one database: its profile's, plus connect_args for its
+# driver. Only sqlite3 takes "timeout"; psycopg2 rejects it as an unknown
+# connection option, so it is never passed to another backend.
+def engine_options(profile, url):
+    options = dict(ENGINE_PROFILES[profile])
+    if profile == "sqlite" and make_url(url).get_backend_name() == "sqlite":
+        options["connect_args"] = {"timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000.0}
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+# Apps whose engines a forked child has to reset; weak, so an app that is
+# no longer used (benchmarks and tests build many) can still be collected
+_forking_apps = weakref.WeakSet()
+
+
+# A forked child must not reuse the connections its parent opened; with
+# gunicorn --preload every worker is such a child. close=False leaves the
+# parent's connections alone and just starts the child with an empty pool.
+def _dispose_engines():
+    for app in list(_forking_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_dispose_engines)
+
+
+# Apply the configured engine profile and initialise Flask-SQLAlchemy on the app.
+# SQLALCHEMY_ENGINE_OPTIONS only configures the primary; every other bind gets
+# a {"url": ..., **options} entry in SQLALCHEMY_BINDS resolved for its own backend.
+def init_database(app):
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    requested = app.config.get('DB_ENGINE_PROFILE', 'auto')
+    profile = resolve_profile(requested, uri)
+    profiles = {None: profile}
+
+    options = engine_options(profile, uri)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    app.config['DB_ENGINE_PROFILE'] = profile
+
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+
+    def add_bind(key, url):
+        profiles[key] = resolve_profile(requested, url)
+        binds[key] = {"url": url, **engine_options(profiles[key], url)}
+
+    # Each read replica becomes its own bind; RoutingSession picks between them
+    replica_binds = []
+    for i, url in enumerate(app.config.get('DATABASE_REPLICA_URLS') or []):
+        key = f"replica_{i}"
+        add_bind(key, url)
+        replica_binds.append(key)
+    app.config['DB_REPLICA_BINDS'] = replica_binds
+
+    # So does each institution's database; tenancy.py picks one per request
+    for tenant, url in (app.config.get('TENANT_DATABASE_URLS') or {}).items():
+        if not TENANT_NAME.fullmatch(tenant):
+            raise ValueError(f"Invalid tenant name '{tenant}', expected letters, digits, '-' or '_'")
+        add_bind(tenant_bind_key(tenant), url)
+    app.config['DB_BIND_PROFILES'] = profiles
+
+    db.init_app(app)
+    init_replica_routing(app)
+    _forking_apps.add(app)
+
+    with app.app_context():
+        for key, engine in db.engines.items():
+            # WAL needs a real file; in-memory databases keep their defaults
+            if (profiles.get(key) == "sqlite" and engine.url.get_backend_name() == "sqlite"
+                    and engine.url.database not in (None, "", ":memory:")):
+                event.listen(engine, "connect", set_sqlite_pragmas)
+
+    logger.info(f"Database engine profile: {profile}")
+
+
+# Bring a database created by an older release up to the models: create_all()
+# only creates missing tables, so columns and indexes added to existing tables
+# are added here. Only nullable or server-defaulted columns can be added this
+# way; anything else needs a hand-written migration. Safe to run repeatedly.
+def upgrade_schema(engine, metadata):
+    existing = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        preparer = conn.dialect.identifier_preparer
+        for table in metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            inspector = inspect(conn)
+            columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} "
+                                       f"without a server default")
+                ddl = f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} " \
+                      f"{column.type.compile(conn.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+                logger.info(f"Added column {table.name}.{column.name}")
+
+            indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    logger.info(f"Created index {index.name}")
+
+
+# The primary database (or a tenant's) for an async driver:
+# ASYNC_DATABASE_URL if set, else the app's own URL (after Flask-SQLAlchemy
+# resolved relative SQLite paths) with its driver swapped for the one in
+# ASYNC_DRIVERS
+def async_database_url(app, tenant=None):
+    if app.config.get('ASYNC_DATABASE_URL') and tenant is None:
+        return make_url(app.config['ASYNC_DATABASE_URL'])
+    with app.app_context():
+        url = db.engines[tenant_bind_key(tenant)].url if tenant else db.engine.url
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for '{backend}', set ASYNC_DATABASE_URL")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+# Engine and session factory for the ASGI views, with the same engine profile
+# as the sync engine. Everything goes to the primary: replica routing only
+# applies to requests served by Flask. Call from the worker that uses it,
+# after any fork.
+def create_async_sessions(app, tenant=None):
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    url = async_database_url(app, tenant)
+    key = tenant_bind_key(tenant) if tenant else None
+    profile = app.config['DB_BIND_PROFILES'][key]
+    if key is None:
+        options = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    else:
+        options = {k: v for k, v in app.config['SQLALCHEMY_BINDS'][key].items() if k != "url"}
+    with app.app_context():
+        sync_backend = db.engines[key].url.get_backend_name()
+    if url.get_backend_name() != sync_backend:
+        # ASYNC_DATABASE_URL points at another backend than the sync engine
+        options = engine_options(profile, url)
+    file_sqlite = url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+    if file_sqlite and "poolclass" not in options:
+        # aiosqlite defaults to NullPool here: a new connection, and a new
+        # thread to run it, for every session
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+        options.update(poolclass=AsyncAdaptedQueuePool, pool_size=int(os.environ.get("DB_POOL_SIZE", 10)),
+                       max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 20)))
+    engine = create_async_engine(url, **options)
+    if profile == "sqlite" and file_sqlite:
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
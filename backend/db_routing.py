@@ -0,0 +1,127 @@
+import time
+import random
+import threading
+from flask import g, request, has_request_context, has_app_context
+from flask_sqlalchemy.session import Session
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+# Requests that may be served from a replica
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+LAST_WRITE_COOKIE = 'ucm_last_write'
+CONSISTENCY_HEADER = 'X-Read-Consistency'
+
+# identity -> wall-clock time of that user's last write, for the staleness window
+_last_writes = {}
+_last_writes_lock = threading.Lock()
+
+
+# Bind key of an institution's database (see tenancy.py)
+def tenant_bind_key(tenant):
+    return f"tenant_{tenant}"
+
+
+# Session that sends everything on the default bind to the institution's
+# database while the app context belongs to a tenant (g.tenant, see
+# tenancy.py), and otherwise sends reads to a replica bind while the current
+# request is routed to one (see init_replica_routing). Flushes, and every
+# query after a flush in the same request, go to the primary.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+        if bind is not None or not has_app_context():
+            return engine
+
+        # Tenant databases have no replicas
+        tenant = g.get('tenant')
+        if tenant and engine is self._db.engines.get(None):
+            return self._db.engines[tenant_bind_key(tenant)]
+
+        if not has_request_context():
+            return engine
+
+        if self._flushing:
+            g.db_wrote = True
+            return engine
+
+        replica_key = g.get('db_replica')
+        engines = self._db.engines
+        # Only redirect tables that live on the default (primary) bind
+        if replica_key and not g.get('db_wrote') and engine is engines.get(None):
+            return engines[replica_key]
+
+        return engine
+
+
+def _current_identity():
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
+
+
+def _recently_wrote(app, identity):
+    window = app.config['REPLICA_STALENESS_SECONDS']
+    now = time.time()
+
+    try:
+        if now - float(request.cookies.get(LAST_WRITE_COOKIE, 0)) < window:
+            return True
+    except ValueError:
+        pass
+
+    if identity is not None:
+        with _last_writes_lock:
+            last_write = _last_writes.get(identity)
+        if last_write and now - last_write < window:
+            return True
+
+    return False
+
+
+def _record_write(app, identity, response):
+    now = time.time()
+    window = app.config['REPLICA_STALENESS_SECONDS']
+
+    if identity is not None:
+        with _last_writes_lock:
+            _last_writes[identity] = now
+            if len(_last_writes) > 10000:
+                for key in [k for k, t in _last_writes.items() if now - t >= window]:
+                    del _last_writes[key]
+
+    # The cookie carries read-your-writes across workers that don't share _last_writes
+    response.set_cookie(LAST_WRITE_COOKIE, str(now), max_age=int(window) + 1, httponly=True, samesite='Lax')
+
+
+# Route read-only requests to one of the DB_REPLICA_BINDS. Writes, requests
+# asking for strong consistency and reads within REPLICA_STALENESS_SECONDS of
+# the caller's own last write stay on the primary.
+def init_replica_routing(app):
+    replicas = list(app.config.get('DB_REPLICA_BINDS') or [])
+    app.config.setdefault('REPLICA_STALENESS_SECONDS', 5.0)
+
+    if not replicas:
+        return
+
+    @app.before_request
+    def choose_database():
+        g.db_replica = None
+        g.db_identity = _current_identity()
+
+        if request.method not in READ_METHODS:
+            return
+        if request.headers.get(CONSISTENCY_HEADER, '').lower() == 'strong':
+            return
+        if _recently_wrote(app, g.db_identity):
+            return
+
+        g.db_replica = random.choice(replicas)
+
+    @app.after_request
+    def remember_writes(response):
+        wrote = request.method not in READ_METHODS or g.get('db_wrote')
+        if wrote and response.status_code < 400:
+            _record_write(app, g.get('db_identity'), response)
+        return response
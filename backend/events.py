@@ -0,0 +1,341 @@
+import json
+import time
+import queue
+import logging
+import datetime
+import threading
+import itertools
+import collections
+from sqlalchemy import select, delete, insert, func
+from models import db, EventLog
+from tenancy import current_tenant
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Seconds between SSE keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+# Events buffered per subscriber before the oldest ones are dropped
+SUBSCRIBER_BUFFER = 100
+# Recent events kept by the local bus for Last-Event-ID replay
+HISTORY_SIZE = 1000
+
+
+class Subscription:
+    def __init__(self, bus, channels):
+        self.bus = bus
+        self.channels = set(channels)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_BUFFER)
+
+    def deliver(self, event):
+        # A slow client must never block publishers: drop its oldest event
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+# In-process publish/subscribe bus. Events only reach subscribers connected to
+# the same worker process.
+class EventBus:
+    name = 'local'
+
+    def __init__(self):
+        self._subscribers = {}  # channel -> set of Subscription
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history = collections.deque(maxlen=HISTORY_SIZE)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def publish(self, channel, event_type, data):
+        event = {"id": next(self._ids), "channel": channel, "type": event_type, "data": data}
+        self._history.append(event)
+        self._dispatch(event)
+        return event
+
+    # [(channel, event_type, data), ...]
+    def publish_many(self, items):
+        return [self.publish(channel, event_type, data) for channel, event_type, data in items]
+
+    def _dispatch(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(event["channel"], ()))
+        for subscription in subscribers:
+            subscription.deliver(event)
+
+    # Events after `last_id` on any of `channels`, oldest first
+    def replay(self, channels, last_id):
+        channels = set(channels)
+        return [e for e in list(self._history) if e["id"] > last_id and e["channel"] in channels]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({s for subscribers in self._subscribers.values() for s in subscribers})
+
+    def stop(self):
+        pass
+
+
+# Bus shared by every worker through the event_log table, a stand-in for an
+# external broker. publish() inserts a row; each process runs one poller
+# thread (started with its first subscriber, so it survives a pre-fork
+# server) that fans new rows out to its local subscribers. Row ids are
+# global, so Last-Event-ID replay works whichever worker a client reconnects to.
+#
+# Ids are taken at insert but become visible at commit, so on a server
+# database a lower id can show up after a higher one. The poller does not
+# rely on ids committing in order: it re-reads everything above the lowest id
+# it may still be missing (_floor), skips ids it has already dispatched, and
+# gives up on a missing id (a rolled-back insert) once it has been skipped for
+# reorder_seconds. Last-Event-ID replay still assumes ids commit in order.
+class DatabaseEventBus(EventBus):
+    name = 'database'
+
+    def __init__(self, app, poll_interval=0.5, retention_seconds=3600, reorder_seconds=5):
+        super().__init__()
+        self.app = app
+        self.poll_interval = poll_interval
+        self.retention_seconds = retention_seconds
+        self.reorder_seconds = reorder_seconds
+        self._thread = None
+        self._stopped = threading.Event()
+        self._floor = None  # every id up to here was dispatched or given up
+        self._seen = set()  # ids above _floor already dispatched
+        self._marks = collections.deque()  # (monotonic time, highest id seen by then)
+
+    def _engine(self):
+        with self.app.app_context():
+            return db.engine
+
+    def subscribe(self, channels):
+        subscription = super().subscribe(channels)
+        self._ensure_poller()
+        return subscription
+
+    def publish(self, channel, event_type, data):
+        with self._engine().begin() as conn:
+            result = conn.execute(insert(EventLog).values(
+                channel=channel, type=event_type, payload=json.dumps(data),
+                created_at=datetime.datetime.utcnow()
+            ))
+        return {"id": result.inserted_primary_key[0], "channel": channel, "type": event_type, "data": data}
+
+    # One multi-row insert, e.g. a notification per student for final grades
+    def publish_many(self, items):
+        now = datetime.datetime.utcnow()
+        rows = [dict(channel=channel, type=event_type, payload=json.dumps(data), created_at=now)
+                for channel, event_type, data in items]
+        if rows:
+            with self._engine().begin() as conn:
+                conn.execute(insert(EventLog), rows)
+
+    def replay(self, channels, last_id):
+        with self._engine().connect() as conn:
+            rows = conn.execute(
+                select(EventLog.id, EventLog.channel, EventLog.type, EventLog.payload)
+                .where(EventLog.id > last_id, EventLog.channel.in_(list(channels)))
+                .order_by(EventLog.id)
+                .limit(SUBSCRIBER_BUFFER)
+            ).all()
+        return [self._event(row) for row in rows]
+
+    def _event(self, row):
+        return {"id": row[0], "channel": row[1], "type": row[2], "data": json.loads(row[3])}
+
+    def _ensure_poller(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            with self._engine().connect() as conn:
+                self._floor = conn.execute(select(func.max(EventLog.id))).scalar() or 0
+            self._seen.clear()
+            self._marks.clear()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._poll, name='event-bus-poller', daemon=True)
+            self._thread.start()
+
+    # Raise _floor past every id that was dispatched, or that is still missing
+    # although a higher id was seen reorder_seconds ago
+    def _advance_floor(self):
+        now = time.monotonic()
+        if self._seen:
+            self._marks.append((now, max(self._seen)))
+        settled = self._floor
+        while self._marks and self._marks[0][0] <= now - self.reorder_seconds:
+            settled = max(settled, self._marks.popleft()[1])
+        self._floor = max(self._floor, settled)
+        while self._floor + 1 in self._seen:
+            self._floor += 1
+        self._seen = {event_id for event_id in self._seen if event_id > self._floor}
+
+    # Dispatch the rows above _floor that were not dispatched yet
+    def _poll_once(self, engine):
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(EventLog.id, EventLog.channel, EventLog.type, EventLog.payload)
+                .where(EventLog.id > self._floor)
+                .order_by(EventLog.id)
+                .limit(1000)
+            ).all()
+        for row in rows:
+            if row[0] not in self._seen:
+                self._seen.add(row[0])
+                self._dispatch(self._event(row))
+        self._advance_floor()
+
+    def _poll(self):
+        engine = self._engine()
+        last_pruned = time.monotonic()
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self._poll_once(engine)
+
+                if time.monotonic() - last_pruned > 60:
+                    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.retention_seconds)
+                    with engine.begin() as conn:
+                        conn.execute(delete(EventLog).where(EventLog.created_at < cutoff))
+                    last_pruned = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error polling event log: {str(e)}")
+
+    def stop(self):
+        self._stopped.set()
+
+
+bus = EventBus()
+
+
+# Select the bus from EVENT_BUS: 'local' (single process) or 'database'
+# (shared by all workers through the event_log table)
+def init_events(app):
+    global bus
+    app.config.setdefault('EVENT_BUS', 'local')
+    app.config.setdefault('EVENT_POLL_INTERVAL', 0.5)
+    app.config.setdefault('EVENT_RETENTION_SECONDS', 3600)
+    app.config.setdefault('EVENT_REORDER_SECONDS', 5)
+
+    bus.stop()
+    if app.config['EVENT_BUS'] == 'database':
+        bus = DatabaseEventBus(app, app.config['EVENT_POLL_INTERVAL'], app.config['EVENT_RETENTION_SECONDS'],
+                               app.config['EVENT_REORDER_SECONDS'])
+    elif app.config['EVENT_BUS'] == 'local':
+        bus = EventBus()
+    else:
+        raise ValueError(f"Unknown EVENT_BUS '{app.config['EVENT_BUS']}', expected 'local' or 'database'")
+    logger.info(f"Event bus: {bus.name}")
+
+
+# Channels of a tenant's users and courses are prefixed with the tenant:
+# ids repeat across institutions, and the bus is shared by all of them
+def _channel(name):
+    tenant = current_tenant()
+    return f"{tenant}:{name}" if tenant else name
+
+
+def course_channel(course_id):
+    return _channel(f"course:{course_id}")
+
+
+def user_channel(user_id):
+    return _channel(f"user:{user_id}")
+
+
+def subscribe(channels):
+    return bus.subscribe(channels)
+
+
+def publish(channel, event_type, data):
+    try:
+        return bus.publish(channel, event_type, data)
+    except Exception as e:
+        # Notifications are best effort; never fail the request that caused them
+        logger.error(f"Error publishing {event_type} event on {channel}: {str(e)}")
+
+
+def publish_many(items):
+    try:
+        return bus.publish_many(items)
+    except Exception as e:
+        logger.error(f"Error publishing {len(items)} events: {str(e)}")
+
+
+# Per-user notification (grades, final grades, enrollment changes)
+def notify(user_id, event_type, data):
+    return publish(user_channel(user_id), event_type, data)
+
+
+def format_sse(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+# Server-sent event stream for a subscription: `initial` events first (e.g. a
+# snapshot so the client doesn't miss changes made while it connected), then
+# anything published after `last_event_id` (a reconnecting client's
+# Last-Event-ID), then live events, with keep-alive comments while idle.
+def stream(subscription, initial=(), last_event_id=None, heartbeat=HEARTBEAT_SECONDS):
+    try:
+        yield 'retry: 3000\n\n'
+        for event_type, data in initial:
+            yield format_sse(event_type, data)
+
+        seen = 0
+        if last_event_id is not None:
+            for event in subscription.bus.replay(subscription.channels, last_event_id):
+                seen = event["id"]
+                yield format_sse(event["type"], event["data"], event["id"])
+
+        while True:
+            event = subscription.get(heartbeat)
+            if event is None:
+                yield ': keep-alive\n\n'
+                continue
+            if event["id"] <= seen:
+                continue  # already sent during replay
+            yield format_sse(event["type"], event["data"], event["id"])
+    finally:
+        subscription.close()
+
+
+# Parse a Last-Event-ID header (or ?last_event_id=), ignoring garbage
+def last_event_id(request):
+    value = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
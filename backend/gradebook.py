@@ -0,0 +1,153 @@
+import datetime
+import logging
+from sqlalchemy import and_, select, update
+from models import db, Enrollment, Assignment, Grade
+from students import get_letter_grade
+from analytics import LETTER_CUTOFFS
+import transcripts
+
+# NumPy is optional; without it the same grades are computed in pure Python
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+# A course section as a students x assignments score matrix, in two queries:
+# the assignments (ids, points, weights), then every active enrollment joined
+# to its grades on those assignments. Enrollments without any grade still get
+# one row (with a NULL assignment), so every student appears.
+def load_section(course_id):
+    assignments = db.session.query(Assignment.id, Assignment.points, Assignment.weight) \
+        .filter(Assignment.course_id == course_id).order_by(Assignment.id).all()
+    assignment_ids = [a[0] for a in assignments]
+
+    matrix = select(Enrollment.id, Enrollment.student_id, Enrollment.grade, Grade.assignment_id, Grade.score) \
+        .outerjoin(Grade, and_(Grade.student_id == Enrollment.student_id, Grade.assignment_id.in_(assignment_ids))) \
+        .where(Enrollment.course_id == course_id, Enrollment.status != 'dropped') \
+        .order_by(Enrollment.id, Grade.assignment_id)
+    # Plain driver tuples: building a Row per score costs more than the query
+    # itself on a large section, and these column types need no conversion
+    rows = db.session.connection().execute(matrix).cursor.fetchall()
+    return assignments, rows
+
+
+def _result(enrollment_id, student_id, final_grade, graded, earned, total):
+    percentage = earned / total * 100 if total > 0 else None
+    return {
+        "enrollment_id": enrollment_id,
+        "student_id": student_id,
+        "graded_assignments": graded,
+        "earned_points": round(earned, 2),
+        "total_points": round(total, 2),
+        "percentage": round(percentage, 2) if percentage is not None else None,
+        "computed_grade": get_letter_grade(percentage) if percentage is not None else None,
+        "final_grade": final_grade
+    }
+
+
+# Pure-Python path, grade by grade
+def _compute_python(assignments, rows):
+    weights = {assignment_id: weight for assignment_id, _, weight in assignments}
+    total = 0
+    for _, points, weight in assignments:
+        total += points * weight
+
+    students = {}
+    for enrollment_id, student_id, final_grade, assignment_id, score in rows:
+        entry = students.setdefault(enrollment_id, [student_id, final_grade, 0, 0])
+        if assignment_id is not None:
+            entry[2] += 1
+            entry[3] += score * weights[assignment_id]
+    return [_result(enrollment_id, student_id, final_grade, graded, earned, total)
+            for enrollment_id, (student_id, final_grade, graded, earned) in students.items()]
+
+
+# NumPy path: scatter the rows into a dense matrix, then weight and sum it a
+# column at a time. Summing column by column adds each student's scores in
+# assignment order, exactly as get_student_grades does, so percentages on a
+# letter boundary land on the same side.
+def _compute_numpy(assignments, rows):
+    n_assignments = len(assignments)
+    points = np.array([a[1] for a in assignments], dtype=np.float64)
+    weights = np.array([a[2] for a in assignments], dtype=np.float64)
+    total = 0
+    for p, w in zip(points.tolist(), weights.tolist()):
+        total += p * w
+
+    row_enrollments = np.array([r[0] for r in rows], dtype=np.int64)
+    enrollment_ids, first = np.unique(row_enrollments, return_index=True)
+    student_ids = [rows[i][1] for i in first.tolist()]
+    final_grades = [rows[i][2] for i in first.tolist()]
+
+    # NULL assignment (a student with no grades yet) becomes NaN
+    row_assignments = np.array([r[3] for r in rows], dtype=np.float64)
+    graded_rows = ~np.isnan(row_assignments)
+    student_pos = np.searchsorted(enrollment_ids, row_enrollments[graded_rows])
+    assignment_pos = np.searchsorted(np.array([a[0] for a in assignments], dtype=np.int64),
+                                     row_assignments[graded_rows].astype(np.int64))
+    scores = np.zeros((len(enrollment_ids), n_assignments))
+    mask = np.zeros((len(enrollment_ids), n_assignments), dtype=bool)
+    scores[student_pos, assignment_pos] = np.array([r[4] for r in rows], dtype=np.float64)[graded_rows]
+    mask[student_pos, assignment_pos] = True
+
+    earned = np.zeros(len(enrollment_ids))
+    for j in range(n_assignments):
+        earned += scores[:, j] * weights[j]
+    graded = mask.sum(axis=1)
+
+    results = []
+    if total > 0:
+        percentages = earned / total * 100
+        cutoffs = np.array([cutoff for cutoff, _ in LETTER_CUTOFFS], dtype=np.float64)
+        bands = np.array(['F'] + [letter for _, letter in LETTER_CUTOFFS])
+        letters = bands[np.searchsorted(cutoffs, percentages, side='right')].tolist()
+        percentages = [round(p, 2) for p in percentages.tolist()]
+    else:
+        letters = percentages = [None] * len(enrollment_ids)
+    earned = [round(e, 2) for e in earned.tolist()]
+    for i, enrollment_id in enumerate(enrollment_ids.tolist()):
+        results.append({
+            "enrollment_id": enrollment_id,
+            "student_id": student_ids[i],
+            "graded_assignments": int(graded[i]),
+            "earned_points": earned[i],
+            "total_points": round(total, 2),
+            "percentage": percentages[i],
+            "computed_grade": letters[i],
+            "final_grade": final_grades[i]
+        })
+    return results
+
+
+# Weighted percentage and letter grade for every active student in a course,
+# ordered by enrollment
+def section_grades(course_id, use_numpy=None):
+    use_numpy = np is not None if use_numpy is None else use_numpy
+    assignments, rows = load_section(course_id)
+    if not rows:
+        return []
+    compute_fn = _compute_numpy if use_numpy else _compute_python
+    return compute_fn(assignments, rows)
+
+
+# Write computed letters to Enrollment.grade in one bulk UPDATE. Grades
+# already submitted are kept unless overwrite is set. Transcripts of the
+# affected students are refreshed in the same transaction; the caller commits.
+# Returns the results that were written.
+def apply_grades(results, overwrite=False):
+    now = datetime.datetime.utcnow()
+    written = [r for r in results
+               if r["computed_grade"] and (overwrite or not r["final_grade"]) and r["computed_grade"] != r["final_grade"]]
+    if written:
+        db.session.execute(update(Enrollment), [
+            {"id": r["enrollment_id"], "grade": r["computed_grade"], "updated_at": now} for r in written
+        ])
+        transcripts.update_students([r["student_id"] for r in written])
+    for r in written:
+        r["final_grade"] = r["computed_grade"]
+    logger.info(f"Wrote {len(written)} computed final grades")
+    return written
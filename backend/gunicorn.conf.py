@@ -0,0 +1,74 @@
+# gunicorn settings, read automatically when gunicorn starts in backend/.
+# Every value can be overridden from the environment (GUNICORN_*) or the
+# command line. Profiles:
+#   gthread (default)  a few processes with a thread pool each. Blocking
+#                      Algorand calls (up to ALGORAND_TIMEOUT_SECONDS, plus
+#                      confirmation rounds) hold a thread, not a process.
+#   gevent             one process per core with many greenlets; suits
+#                      long-lived SSE streams and thousands of slow chain
+#                      calls. Needs `pip install gevent`.
+#   sync               one request per process, for comparison.
+#   uvicorn.workers.UvicornWorker
+#                      asgi:application only: one event loop per core; chain
+#                      verification and enrollment wait as coroutines, other
+#                      routes run on ASGI_THREADS threads.
+# python -m benchmarks.server_bench compares them; benchmarks.asgi_bench
+# compares ASGI with gthread.
+import os
+import gc
+import multiprocessing
+
+cores = multiprocessing.cpu_count()
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+
+if worker_class == 'gevent':
+    # Patch before the app is imported so its sockets and locks cooperate
+    from gevent import monkey
+    monkey.patch_all()
+    workers = int(os.environ.get('GUNICORN_WORKERS', cores))
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+elif worker_class == 'gthread':
+    workers = int(os.environ.get('GUNICORN_WORKERS', cores + 1))
+    # Most time on the blockchain routes is spent waiting on the network
+    threads = int(os.environ.get('GUNICORN_THREADS', max(8, 2 * cores)))
+    # A pooled connection per thread (server databases only)
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+elif worker_class.startswith('uvicorn'):
+    workers = int(os.environ.get('GUNICORN_WORKERS', cores))
+else:
+    workers = int(os.environ.get('GUNICORN_WORKERS', 2 * cores + 1))
+
+# Import the app once in the master and fork it: code, metadata and the
+# route map are shared copy-on-write instead of loaded per worker.
+# database.py gives each worker its own connection pool.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Recycle workers gracefully so slow leaks cannot accumulate; the jitter
+# keeps them from all restarting at once. A retiring worker finishes its
+# requests but drops idle keep-alive connections, so run it behind a proxy
+# that retries those (nginx does by default for idempotent requests).
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+# A synchronous certificate mint waits for confirmation rounds
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None  # empty to disable
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+# With preload, import algosdk here too (the app defers it to the first chain
+# call) so workers share it. Objects loaded before the fork never change
+# again; moving them out of the collector's reach keeps gc passes in the
+# workers from touching (and so copying) the shared pages.
+def when_ready(server):
+    if preload_app:
+        if 'blockchain' in server.app.wsgi().config['FEATURES']:
+            import smart_contracts
+            smart_contracts.load_sdk()
+        gc.freeze()
+    server.log.info(f"{workers} {worker_class} worker(s), preload={preload_app}")
@@ -0,0 +1,124 @@
+import hashlib
+import logging
+import datetime
+import functools
+from flask import Response, current_app, request, jsonify, make_response
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+from auth import get_jwt_identity
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def init_idempotency(app):
+    app.config.setdefault('IDEMPOTENCY_KEY_TTL', 24 * 3600)
+    app.config.setdefault('IDEMPOTENCY_LOCK_TIMEOUT', 120)
+
+
+def idempotency_key(req):
+    key = req.headers.get('Idempotency-Key', '').strip()
+    return key[:255] or None
+
+
+def _fingerprint(req):
+    digest = hashlib.sha256(f"{req.method} {req.path}\n".encode())
+    digest.update(req.get_data())
+    return digest.hexdigest()
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.status_code, content_type=record.content_type)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _in_progress():
+    response = jsonify({"error": "A request with this Idempotency-Key is still in progress"})
+    response.status_code = 409
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+# Make a POST safe to retry. With an Idempotency-Key header, the first
+# request runs and its response is stored; a retry with the same key and
+# body gets that response back without running the view again, and a retry
+# while the first is still running gets 409. A request still unfinished
+# after IDEMPOTENCY_LOCK_TIMEOUT is taken to be dead (its worker was killed
+# mid-request) and the next retry runs the view instead. Keys are per user
+# and expire after IDEMPOTENCY_KEY_TTL. Server errors are not stored, so they
+# can be retried. Goes below @jwt_required.
+def idempotent(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = idempotency_key(request)
+        if not key:
+            return view(*args, **kwargs)
+
+        user_id = get_jwt_identity()
+        fingerprint = _fingerprint(request)
+        record = IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+        now = datetime.datetime.utcnow()
+        expires = now - datetime.timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL'])
+        if record and record.created_at < expires:
+            db.session.delete(record)
+            db.session.commit()
+            record = None
+
+        if record:
+            if record.request_hash != fingerprint:
+                return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+            if record.status_code is not None:
+                return _replay(record)
+            abandoned = now - datetime.timedelta(seconds=current_app.config['IDEMPOTENCY_LOCK_TIMEOUT'])
+            if record.created_at >= abandoned:
+                return _in_progress()
+            # Take the abandoned request over; of several retries, one wins
+            taken = db.session.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.id == record.id, IdempotencyKey.status_code.is_(None),
+                       IdempotencyKey.created_at == record.created_at)
+                .values(created_at=now)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if not taken:
+                return _in_progress()
+            logger.warning(f"Idempotency-Key {key} of user {user_id} was abandoned mid-request; running it again")
+            record_id = record.id
+        else:
+            record = IdempotencyKey(user_id=user_id, key=key, request_hash=fingerprint, created_at=now)
+            db.session.add(record)
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # The same key arrived twice at once; the other request owns it
+                db.session.rollback()
+                return _in_progress()
+            record_id = record.id
+
+        # Only while this request still owns the key: after the lock timeout a
+        # retry may have taken it over
+        owned = IdempotencyKey.query.filter(IdempotencyKey.id == record_id, IdempotencyKey.created_at == now)
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            owned.delete(synchronize_session=False)
+            db.session.commit()
+            raise
+
+        if response.status_code >= 500 or response.is_streamed:
+            owned.delete(synchronize_session=False)
+        else:
+            owned.update({
+                "status_code": response.status_code,
+                "response_body": response.get_data(as_text=True),
+                "content_type": response.content_type,
+                "completed_at": datetime.datetime.utcnow()
+            }, synchronize_session=False)
+        db.session.commit()
+        return response
+    return wrapper
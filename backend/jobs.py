@@ -0,0 +1,453 @@
+import os
+import sys
+import json
+import time
+import random
+import socket
+import logging
+import argparse
+import datetime
+import threading
+from flask import Blueprint, current_app, request, jsonify
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Job
+from auth import jwt_required, get_jwt_identity
+from idempotency import idempotency_key
+from tenancy import all_tenants, current_tenant, tenant_context, create_all
+
+jobs_bp = Blueprint('jobs', __name__)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Candidates looked at per claim attempt; losing a race moves on to the next
+CLAIM_BATCH = 8
+FINISHED = ('succeeded', 'failed', 'cancelled')
+
+
+class JobError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+# Raised by a handler for failures a retry cannot fix (bad input, missing config)
+class PermanentJobError(Exception):
+    pass
+
+
+# Raised by JobContext.progress once another worker has taken the job over
+class LeaseLostError(Exception):
+    pass
+
+
+_handlers = {}
+
+
+# Register a job handler: handler(context, payload) -> JSON-serializable result.
+# Handlers run inside an app context on a worker thread, possibly more than
+# once (retries, a worker dying mid-job), so they should be safe to repeat.
+def register(kind):
+    def decorator(handler):
+        _handlers[kind] = handler
+        return handler
+    return decorator
+
+
+# Passed to handlers. progress() also renews the job's lease; it commits the
+# current transaction, so call it between units of work. The lease is held by
+# (worker_id, attempt): once it expires and another worker claims the job,
+# progress() raises LeaseLostError and this run's outcome is dropped.
+class JobContext:
+    def __init__(self, job_id, attempt, worker_id):
+        self.job_id = job_id
+        self.attempt = attempt
+        self.worker_id = worker_id
+
+    def holds_lease(self):
+        return and_(Job.id == self.job_id, Job.status == 'running', Job.locked_by == self.worker_id,
+                    Job.attempts == self.attempt)
+
+    # UPDATE the job while this run still holds it; False once it does not
+    def update(self, **values):
+        return db.session.execute(update(Job).where(self.holds_lease()).values(**values)
+                                  .execution_options(synchronize_session=False)).rowcount > 0
+
+    def progress(self, current, total=None, message=None):
+        values = {"progress_current": current, "locked_at": datetime.datetime.utcnow()}
+        if total is not None:
+            values["progress_total"] = total
+        if message is not None:
+            values["progress_message"] = message[:255]
+        held = self.update(**values)
+        db.session.commit()
+        if not held:
+            raise LeaseLostError(f"Job {self.job_id} was taken over by another worker")
+
+
+# Renew a running job's lease every lease_seconds / 3 until stop is set, so a
+# handler busy for longer than the lease without calling progress() (a long
+# chain catch-up) is not claimed again while its worker is alive. Runs in its
+# own app context, and so its own session.
+def _heartbeat(app, tenant, context, interval, stop):
+    while not stop.wait(interval):
+        with tenant_context(app, tenant):
+            try:
+                held = context.update(locked_at=datetime.datetime.utcnow())
+                db.session.commit()
+                if not held:
+                    return
+            except Exception as e:
+                db.session.rollback()
+                logger.warning(f"Could not renew the lease of job {context.job_id}: {e}")
+            finally:
+                db.session.remove()
+
+
+def backoff(attempts, base, cap):
+    # Exponential with jitter: half the delay fixed, half random
+    delay = min(cap, base * 2 ** max(attempts - 1, 0))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# Queue a job and commit. With an idempotency key, a repeat of the same
+# request by the same user returns the job it created the first time.
+# Returns (job, created).
+def enqueue(kind, payload=None, user_id=None, idempotency_key=None, max_attempts=None, delay=0):
+    if kind not in _handlers:
+        raise JobError(f"Unknown job kind '{kind}'", 500)
+    encoded = json.dumps(payload or {}, sort_keys=True)
+
+    if idempotency_key:
+        existing = Job.query.filter_by(created_by=user_id, idempotency_key=idempotency_key).first()
+        if existing:
+            return _replay(existing, kind, encoded), False
+
+    job = Job(
+        kind=kind,
+        payload=encoded,
+        created_by=user_id,
+        idempotency_key=idempotency_key,
+        max_attempts=max_attempts or runner.max_attempts,
+        run_at=datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+    )
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The same key was used by a concurrent request
+        db.session.rollback()
+        existing = Job.query.filter_by(created_by=user_id, idempotency_key=idempotency_key).first()
+        if not existing:
+            raise
+        return _replay(existing, kind, encoded), False
+
+    runner.wake()
+    logger.info(f"Queued job {job.id} ({kind})")
+    return job, True
+
+
+def _replay(job, kind, encoded):
+    if job.kind != kind or job.payload != encoded:
+        raise JobError("Idempotency key was already used for a different request", 422)
+    return job
+
+
+# Take the next due job: queued and past run_at, or running on a lease that
+# expired (its worker died). The conditional UPDATE makes the claim safe
+# across threads and processes without row locks. Returns the job id or None.
+def claim_next(worker_id, lease_seconds):
+    now = datetime.datetime.utcnow()
+    stale = now - datetime.timedelta(seconds=lease_seconds)
+    candidates = db.session.query(Job.id, Job.status, Job.locked_at).filter(or_(
+        and_(Job.status == 'queued', Job.run_at <= now),
+        and_(Job.status == 'running', Job.locked_at < stale)
+    )).order_by(Job.run_at, Job.id).limit(CLAIM_BATCH).all()
+
+    for job_id, status, locked_at in candidates:
+        lease = Job.locked_at.is_(None) if locked_at is None else Job.locked_at == locked_at
+        claimed = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == status, lease)
+            .values(status='running', locked_by=worker_id, locked_at=now, attempts=Job.attempts + 1,
+                    started_at=db.func.coalesce(Job.started_at, now))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed:
+            db.session.commit()
+            return job_id
+    db.session.commit()
+    return None
+
+
+# Run a job claimed by worker_id and record the outcome: succeeded, queued
+# again after a backoff delay, or failed once max_attempts is used up. The
+# outcome is only written while this run still holds the lease.
+def run_job(job_id, worker_id):
+    job = db.session.get(Job, job_id)
+    kind, attempts, max_attempts = job.kind, job.attempts, job.max_attempts
+    handler = _handlers.get(kind)
+    context = JobContext(job_id, attempts, worker_id)
+    payload = json.loads(job.payload or '{}')
+    db.session.commit()
+
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, name=f"job-heartbeat-{job_id}", daemon=True,
+                                 args=(current_app._get_current_object(), current_tenant(), context,
+                                       max(runner.lease_seconds / 3, 0.1), stop))
+    heartbeat.start()
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise PermanentJobError(f"No handler registered for job kind '{kind}'")
+        result = handler(context, payload)
+    except Exception as e:
+        db.session.rollback()
+        stop.set()
+        heartbeat.join()
+        error = f"{type(e).__name__}: {e}"[:2000]
+        now = datetime.datetime.utcnow()
+        if isinstance(e, LeaseLostError):
+            held = False
+        elif isinstance(e, PermanentJobError) or attempts >= max_attempts:
+            held = context.update(status='failed', error=error, finished_at=now, locked_by=None, locked_at=None)
+            if held:
+                logger.error(f"Job {job_id} ({kind}) failed after {attempts} attempt(s): {error}")
+        else:
+            delay = backoff(attempts, runner.retry_base, runner.retry_max)
+            held = context.update(status='queued', error=error, run_at=now + datetime.timedelta(seconds=delay),
+                                  locked_by=None, locked_at=None)
+            if held:
+                logger.warning(f"Job {job_id} ({kind}) attempt {attempts} failed, retrying in {delay:.1f}s: {error}")
+        db.session.commit()
+        if not held:
+            logger.warning(f"Job {job_id} ({kind}) attempt {attempts} lost its lease; dropping its outcome: {error}")
+        return
+
+    stop.set()
+    heartbeat.join()
+    held = context.update(status='succeeded', result=json.dumps(result), error=None,
+                          finished_at=datetime.datetime.utcnow(), locked_by=None, locked_at=None,
+                          progress_current=db.func.coalesce(Job.progress_total, Job.progress_current))
+    db.session.commit()
+    if held:
+        logger.info(f"Job {job_id} ({kind}) succeeded in {time.perf_counter() - started:.2f}s")
+    else:
+        logger.warning(f"Job {job_id} ({kind}) attempt {attempts} lost its lease; dropping its result")
+
+
+# Worker threads polling the jobs table. Started lazily in the process that
+# serves requests, so under a pre-forking server each worker gets its own.
+# An enqueue in the same process wakes them at once; jobs queued by other
+# processes are picked up within poll_interval. Every institution's database
+# has its own jobs table: each pass takes at most one job from each, so a
+# campus with a long queue does not hold up the others.
+class JobRunner:
+    def __init__(self):
+        self.app = None
+        self.workers = 0
+        self.poll_interval = 1.0
+        self.lease_seconds = 300
+        self.max_attempts = 5
+        self.retry_base = 2.0
+        self.retry_max = 300.0
+        self.worker_id = None
+        self._threads = []
+        self._pid = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def configure(self, app):
+        self.app = app
+        self.workers = app.config['JOB_WORKERS']
+        self.poll_interval = app.config['JOB_POLL_INTERVAL']
+        self.lease_seconds = app.config['JOB_LEASE_SECONDS']
+        self.max_attempts = app.config['JOB_MAX_ATTEMPTS']
+        self.retry_base = app.config['JOB_RETRY_BASE_SECONDS']
+        self.retry_max = app.config['JOB_RETRY_MAX_SECONDS']
+
+    def ensure_started(self):
+        if self.app is None or self.workers <= 0 or (self._threads and self._pid == os.getpid()):
+            return
+        with self._lock:
+            if self._threads and self._pid == os.getpid():
+                return
+            # Threads do not survive a fork; a forked child starts its own
+            self._pid = os.getpid()
+            self._stop.clear()
+            self.worker_id = f"{socket.gethostname()}:{self._pid}"
+            self._threads = [threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+                             for i in range(self.workers)]
+            for thread in self._threads:
+                thread.start()
+            logger.info(f"Started {self.workers} job worker thread(s) in process {self._pid}")
+
+    def wake(self):
+        self.ensure_started()
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _loop(self):
+        tenants = all_tenants(self.app)
+        while not self._stop.is_set():
+            ran = False
+            for tenant in tenants:
+                with tenant_context(self.app, tenant):
+                    try:
+                        worker_id = f"{self.worker_id}:{threading.current_thread().name}"
+                        job_id = claim_next(worker_id, self.lease_seconds)
+                        if job_id is not None:
+                            run_job(job_id, worker_id)
+                            ran = True
+                    except Exception as e:
+                        logger.exception(f"Job worker error: {e}")
+                    finally:
+                        db.session.remove()
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+
+runner = JobRunner()
+
+
+def init_jobs(app):
+    app.config.setdefault('JOB_WORKERS', 2)
+    app.config.setdefault('JOB_POLL_INTERVAL', 1.0)
+    app.config.setdefault('JOB_LEASE_SECONDS', 300)
+    app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+    app.config.setdefault('JOB_RETRY_BASE_SECONDS', 2.0)
+    app.config.setdefault('JOB_RETRY_MAX_SECONDS', 300.0)
+    runner.configure(app)
+
+    @app.before_request
+    def start_job_workers():
+        runner.ensure_started()
+
+
+# Whether the client asked for a 202 instead of waiting:
+# "Prefer: respond-async" (RFC 7240) or ?async=true
+def wants_async(req):
+    return 'respond-async' in req.headers.get('Prefer', '') or req.args.get('async', '').lower() in ('1', 'true')
+
+
+def serialize_job(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": {
+            "current": job.progress_current,
+            "total": job.progress_total,
+            "message": job.progress_message
+        },
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "next_attempt_at": job.run_at.isoformat() if job.status == 'queued' else None,
+        "url": f"/api/jobs/{job.id}"
+    }
+
+
+# 202 Accepted pointing at the job, with anything else the caller already knows
+def accepted(job, **extra):
+    response = jsonify({"message": "Accepted", "job": serialize_job(job), **extra})
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job.id}"
+    return response
+
+
+def _visible_job(job_id):
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    job = Job.query.get(job_id)
+    if not job or (user.role != 'admin' and job.created_by != user.id):
+        return None
+    return job
+
+
+@jobs_bp.route('/', methods=['GET'])
+@jwt_required
+def get_jobs():
+    current_user_id = get_jwt_identity()
+    query = Job.query.filter_by(created_by=current_user_id)
+
+    status = request.args.get('status')
+    if status:
+        query = query.filter_by(status=status)
+
+    jobs = query.order_by(Job.id.desc()).limit(request.args.get('limit', 50, type=int)).all()
+    return jsonify([serialize_job(job) for job in jobs])
+
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@jwt_required
+def get_job(job_id):
+    job = _visible_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    return jsonify(serialize_job(job))
+
+
+@jobs_bp.route('/<int:job_id>/cancel', methods=['POST'])
+@jwt_required
+def cancel_job(job_id):
+    job = _visible_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    # Only jobs no worker has claimed yet can be cancelled
+    cancelled = db.session.execute(
+        update(Job).where(Job.id == job.id, Job.status == 'queued')
+        .values(status='cancelled', finished_at=datetime.datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+
+    if not cancelled:
+        db.session.refresh(job)
+        return jsonify({"error": f"Job is {job.status}", "job": serialize_job(job)}), 409
+
+    db.session.refresh(job)
+    return jsonify({"message": "Job cancelled", "job": serialize_job(job)})
+
+
+# Dedicated worker process, for deployments that keep job work off the web
+# servers (run those with JOB_WORKERS=0):  python -m jobs --workers 4
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run background jobs from the jobs table")
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    os.environ['JOB_WORKERS'] = str(args.workers)
+    from app import create_app
+    app = create_app()
+    # The handlers registered themselves on the imported module, not on __main__
+    from jobs import runner as app_runner
+    create_all(app)
+    app_runner.ensure_started()
+    logger.info(f"Job worker {app_runner.worker_id} running; Ctrl-C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        app_runner.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
+from db_routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -60,6 +61,7 @@ class Course(db.Model):
     # Relationships
     enrollments = db.relationship('Enrollment', backref='course', lazy=True)
     assignments = db.relationship('Assignment', backref='course', lazy=True)
+    meetings = db.relationship('CourseMeeting', backref='course', lazy=True)
     
     @property
     def instructor_name(self):
@@ -69,7 +71,8 @@ class Course(db.Model):
     
     @property
     def enrolled_count(self):
-        return len(self.enrollments)
+        # Dropped enrollments free their seat
+        return len([e for e in self.enrollments if e.status != 'dropped'])
     
     @property
     def is_full(self):
@@ -78,12 +81,26 @@ class Course(db.Model):
     def __repr__(self):
         return f'<Course {self.code} - {self.title}>'
 
+class CourseMeeting(db.Model):
+    __tablename__ = 'course_meetings'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False, index=True)
+    days = db.Column(db.String(7), nullable=False)  # day codes, e.g. 'MWF' or 'TR' (M T W R F S U)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    room = db.Column(db.String(50), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CourseMeeting {self.days} {self.start_time}-{self.end_time} for Course {self.course_id}>'
+
 class Enrollment(db.Model):
     __tablename__ = 'enrollments'
     
     id = db.Column(db.Integer, primary_key=True)
-    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False, index=True)
     status = db.Column(db.String(20), nullable=False, default='enrolled')  # 'enrolled', 'completed', 'dropped'
     grade = db.Column(db.String(5), nullable=True)
     transaction_id = db.Column(db.String(100), nullable=True)  # Algorand transaction ID
@@ -93,11 +110,27 @@ class Enrollment(db.Model):
     def __repr__(self):
         return f'<Enrollment: Student {self.student_id} in Course {self.course_id}>'
 
+class WaitlistEntry(db.Model):
+    __tablename__ = 'waitlist_entries'
+    __table_args__ = (
+        db.Index('ix_waitlist_entries_course_status', 'course_id', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)  # FIFO order within a course
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='waiting')  # 'waiting', 'promoted', 'skipped', 'cancelled'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<WaitlistEntry: Student {self.student_id} for Course {self.course_id} ({self.status})>'
+
 class Assignment(db.Model):
     __tablename__ = 'assignments'
     
     id = db.Column(db.Integer, primary_key=True)
-    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False, index=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
     due_date = db.Column(db.DateTime, nullable=False)
@@ -121,6 +154,11 @@ class Submission(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     content = db.Column(db.Text, nullable=True)
     file_path = db.Column(db.String(255), nullable=True)
+    # Uploaded file metadata; the bytes live in the content-addressed store (uploads.py)
+    file_name = db.Column(db.String(255), nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    file_size = db.Column(db.Integer, nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # SHA-256 hex
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationship
@@ -131,10 +169,13 @@ class Submission(db.Model):
 
 class Grade(db.Model):
     __tablename__ = 'grades'
+    __table_args__ = (
+        db.Index('ix_grades_student_assignment', 'student_id', 'assignment_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    assignment_id = db.Column(db.Integer, db.ForeignKey('assignments.id'), nullable=False)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignments.id'), nullable=False, index=True)
     submission_id = db.Column(db.Integer, db.ForeignKey('submissions.id'), nullable=True)
     score = db.Column(db.Float, nullable=False)
     feedback = db.Column(db.Text, nullable=True)
@@ -143,3 +184,202 @@ class Grade(db.Model):
     def __repr__(self):
         return f'<Grade for Student {self.student_id} on Assignment {self.assignment_id}: {self.score}>'
 
+class TranscriptTerm(db.Model):
+    __tablename__ = 'transcript_terms'
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'year', 'term_order', 'term', name='uq_transcript_terms_student_term'),
+        db.Index('ix_transcript_terms_deans_list', 'year', 'term', 'term_gpa'),
+    )
+    
+    # One row per student per term, materialized from Enrollment.grade and Course.credits
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    term = db.Column(db.String(50), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    term_order = db.Column(db.Integer, nullable=False)  # position of the term within the year
+    courses = db.Column(db.Integer, nullable=False, default=0)
+    credits_attempted = db.Column(db.Integer, nullable=False, default=0)
+    credits_earned = db.Column(db.Integer, nullable=False, default=0)
+    gpa_credits = db.Column(db.Integer, nullable=False, default=0)  # credits with a GPA-bearing grade
+    quality_points = db.Column(db.Float, nullable=False, default=0.0)
+    term_gpa = db.Column(db.Float, nullable=True)
+    cumulative_credits_attempted = db.Column(db.Integer, nullable=False, default=0)
+    cumulative_credits_earned = db.Column(db.Integer, nullable=False, default=0)
+    cumulative_gpa_credits = db.Column(db.Integer, nullable=False, default=0)
+    cumulative_quality_points = db.Column(db.Float, nullable=False, default=0.0)
+    cumulative_gpa = db.Column(db.Float, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<TranscriptTerm: Student {self.student_id} {self.term} {self.year}>'
+
+class UploadSession(db.Model):
+    __tablename__ = 'upload_sessions'
+    
+    # Resumable upload; bytes received so far are kept in a partial file until complete
+    id = db.Column(db.String(32), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignments.id'), nullable=False)
+    file_name = db.Column(db.String(255), nullable=False)
+    content_type = db.Column(db.String(100), nullable=True)
+    size = db.Column(db.Integer, nullable=False)  # declared total size in bytes
+    received = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='open')  # 'open', 'completed', 'aborted', 'expired'
+    content_hash = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<UploadSession {self.id}: {self.received}/{self.size} bytes>'
+
+class EventLog(db.Model):
+    __tablename__ = 'event_log'
+    
+    id = db.Column(db.Integer, primary_key=True)  # also the SSE event id
+    channel = db.Column(db.String(100), nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<EventLog {self.id} {self.type} on {self.channel}>'
+
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.UniqueConstraint('created_by', 'idempotency_key', name='uq_jobs_idempotency_key'),
+        db.Index('ix_jobs_claim', 'status', 'run_at'),
+    )
+    
+    # Background job; this table is also the queue (jobs.py)
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON
+    result = db.Column(db.Text, nullable=True)  # JSON
+    error = db.Column(db.Text, nullable=True)
+    progress_current = db.Column(db.Integer, nullable=False, default=0)
+    progress_total = db.Column(db.Integer, nullable=True)
+    progress_message = db.Column(db.String(255), nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # not before; pushed back between retries
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)  # lease, renewed on progress
+    idempotency_key = db.Column(db.String(255), nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind}: {self.status}>'
+
+
+class Certificate(db.Model):
+    __tablename__ = 'certificates'
+    __table_args__ = (
+        db.Index('ix_certificates_course_status', 'course_id', 'status'),
+    )
+    
+    # Course certificate asset, one per enrollment (certificates.py). The
+    # transaction is recorded before it is sent, so an interrupted run can
+    # find out what happened to it instead of minting again.
+    id = db.Column(db.Integer, primary_key=True)
+    enrollment_id = db.Column(db.Integer, db.ForeignKey('enrollments.id'), nullable=False, unique=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'submitted', 'issued', 'failed'
+    grade = db.Column(db.String(5), nullable=True)  # grade written into the certificate
+    asset_id = db.Column(db.BigInteger, nullable=True)
+    transaction_id = db.Column(db.String(64), nullable=True)
+    last_valid_round = db.Column(db.BigInteger, nullable=True)  # the transaction can no longer confirm after this round
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    issued_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Certificate {self.enrollment_id}: {self.status}>'
+
+
+class ChainSyncState(db.Model):
+    __tablename__ = 'chain_sync_state'
+    
+    # How far the local chain mirror (chain_mirror.py) has read an account's history
+    account = db.Column(db.String(58), primary_key=True)
+    last_round = db.Column(db.BigInteger, nullable=False, default=0)  # every transaction up to here is mirrored
+    transactions_seen = db.Column(db.Integer, nullable=False, default=0)
+    last_synced_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ChainSyncState {self.account} @ {self.last_round}>'
+
+
+class ChainEnrollment(db.Model):
+    __tablename__ = 'chain_enrollments'
+    __table_args__ = (
+        db.Index('ix_chain_enrollments_student_course', 'student_id', 'course_id'),
+    )
+    
+    # Enrollment transfer as recorded on chain, mirrored from the indexer
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.String(64), nullable=False, unique=True)
+    asset_id = db.Column(db.BigInteger, nullable=False, index=True)
+    student_id = db.Column(db.Integer, nullable=True)  # from the note; not a foreign key, the chain may know users we don't
+    course_id = db.Column(db.Integer, nullable=True)
+    confirmed_round = db.Column(db.BigInteger, nullable=False)
+    round_time = db.Column(db.BigInteger, nullable=True)  # unix seconds
+    fee = db.Column(db.Integer, nullable=True)
+    timestamp = db.Column(db.String(20), nullable=True)  # as written in the note
+    
+    def __repr__(self):
+        return f'<ChainEnrollment {self.transaction_id}>'
+
+
+class ChainCertificate(db.Model):
+    __tablename__ = 'chain_certificates'
+    __table_args__ = (
+        db.Index('ix_chain_certificates_student_course', 'student_id', 'course_id'),
+    )
+    
+    # Certificate asset as minted on chain, mirrored from the indexer
+    id = db.Column(db.Integer, primary_key=True)
+    asset_id = db.Column(db.BigInteger, nullable=False, unique=True)
+    transaction_id = db.Column(db.String(64), nullable=False, unique=True)
+    student_id = db.Column(db.Integer, nullable=True)
+    course_id = db.Column(db.Integer, nullable=True)
+    course_code = db.Column(db.String(20), nullable=True)
+    grade = db.Column(db.String(5), nullable=True)
+    student_name = db.Column(db.String(100), nullable=True)
+    date_issued = db.Column(db.String(32), nullable=True)  # as written in the note
+    confirmed_round = db.Column(db.BigInteger, nullable=False)
+    
+    def __repr__(self):
+        return f'<ChainCertificate {self.asset_id}>'
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'key', name='uq_idempotency_keys_user_key'),
+    )
+    
+    # Stored response for a request sent with an Idempotency-Key header (idempotency.py)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # method, path and body of the first request
+    status_code = db.Column(db.Integer, nullable=True)  # NULL while the first request is still running
+    response_body = db.Column(db.Text, nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.user_id}:{self.key}>'
@@ -0,0 +1,29 @@
+from flask import Blueprint, Response, request, jsonify
+from models import User
+from auth import jwt_required_query, get_jwt_identity
+import events
+
+notifications_bp = Blueprint('notifications', __name__)
+
+# Server-sent events for the current user. Event types:
+#   grade        - an assignment grade was created or updated
+#   final_grade  - a final course grade was submitted
+#   enrollment   - enrolled, dropped or promoted from a waitlist
+# Browsers' EventSource can't send headers, so the token may also be passed
+# as ?jwt=<token>. Reconnecting clients resume from Last-Event-ID.
+@notifications_bp.route('/stream', methods=['GET'])
+@jwt_required_query
+def notification_stream():
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    subscription = events.subscribe([events.user_channel(user.id)])
+
+    return Response(
+        events.stream(subscription, last_event_id=events.last_event_id(request)),
+        mimetype='text/event-stream',
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
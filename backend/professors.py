@@ -1,6 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify
+from werkzeug.utils import secure_filename
 from models import db, User, Course, Enrollment, Assignment, Submission, Grade
 from auth import jwt_required, get_jwt_identity
+from serializers import PROFESSOR, ROSTER, json_response
+import events
+import transcripts
+import gradebook
+import uploads
+import jobs
+import os
 import datetime
 
 professors_bp = Blueprint('professors', __name__)
@@ -11,25 +19,14 @@ def get_professors():
     department = request.args.get('department')
     
     # Build query
-    query = User.query.filter_by(role='professor')
+    query = PROFESSOR.select().where(User.role == 'professor')
     
     if department:
-        query = query.filter_by(department=department)
+        query = query.where(User.department == department)
     
-    professors = query.all()
+    rows = db.session.execute(query)
     
-    result = []
-    for professor in professors:
-        result.append({
-            "id": professor.id,
-            "name": professor.name,
-            "email": professor.email,
-            "professor_id": professor.professor_id,
-            "department": professor.department,
-            "title": professor.title
-        })
-    
-    return jsonify(result)
+    return json_response(PROFESSOR.rows(rows))
 
 @professors_bp.route('/<int:professor_id>', methods=['GET'])
 def get_professor(professor_id):
@@ -113,6 +110,30 @@ def get_professor_courses(professor_id):
     
     return jsonify(result)
 
+# Payload of the 'grade' notification sent to the student
+def grade_event(grade, assignment, course, updated=False):
+    return {
+        "grade_id": grade.id,
+        "assignment_id": assignment.id,
+        "assignment_title": assignment.title,
+        "course_id": course.id,
+        "course_code": course.code,
+        "score": grade.score,
+        "points": assignment.points,
+        "feedback": grade.feedback,
+        "graded_at": grade.graded_at.isoformat(),
+        "updated": updated
+    }
+
+# The course of an assignment, if the professor teaches it; otherwise an error response
+def instructor_course(professor_id, assignment):
+    course = Course.query.get(assignment.course_id)
+    
+    if course.instructor_id != professor_id:
+        return None, (jsonify({"error": "You do not teach this course"}), 403)
+    
+    return course, None
+
 @professors_bp.route('/<int:professor_id>/assignments/grade', methods=['POST'])
 @jwt_required
 def grade_assignment(professor_id):
@@ -138,10 +159,9 @@ def grade_assignment(professor_id):
     
     # Verify professor teaches this course
     assignment = Assignment.query.get(submission.assignment_id)
-    course = Course.query.get(assignment.course_id)
-    
-    if course.instructor_id != professor_id:
-        return jsonify({"error": "You do not teach this course"}), 403
+    course, error = instructor_course(professor_id, assignment)
+    if error:
+        return error
     
     # Check if grade already exists
     existing_grade = Grade.query.filter_by(
@@ -156,7 +176,10 @@ def grade_assignment(professor_id):
         existing_grade.graded_at = datetime.datetime.utcnow()
         
         try:
+            # Build the notification before commit expires the loaded rows
+            notification = grade_event(existing_grade, assignment, course, updated=True)
             db.session.commit()
+            events.notify(existing_grade.student_id, 'grade', notification)
             return jsonify({
                 "message": "Grade updated successfully",
                 "grade": {
@@ -182,7 +205,10 @@ def grade_assignment(professor_id):
     db.session.add(new_grade)
     
     try:
+        db.session.flush()
+        notification = grade_event(new_grade, assignment, course)
         db.session.commit()
+        events.notify(new_grade.student_id, 'grade', notification)
         return jsonify({
             "message": "Grade created successfully",
             "grade": {
@@ -213,25 +239,14 @@ def get_course_students(professor_id, course_id):
     if course.instructor_id != professor_id:
         return jsonify({"error": "You do not teach this course"}), 403
     
-    # Get enrollments for this course
-    enrollments = Enrollment.query.filter_by(course_id=course_id).all()
-    
-    result = []
-    for enrollment in enrollments:
-        student = User.query.get(enrollment.student_id)
-        
-        result.append({
-            "student_id": student.id,
-            "name": student.name,
-            "email": student.email,
-            "student_number": student.student_id,
-            "major": student.major,
-            "year": student.year,
-            "enrollment_status": enrollment.status,
-            "grade": enrollment.grade
-        })
+    # Get enrolled students for this course in one joined select
+    rows = db.session.execute(
+        ROSTER.select()
+        .join(User, User.id == Enrollment.student_id)
+        .where(Enrollment.course_id == course_id)
+    )
     
-    return jsonify(result)
+    return json_response(ROSTER.rows(rows))
 
 @professors_bp.route('/<int:professor_id>/courses/<int:course_id>/grades', methods=['POST'])
 @jwt_required
@@ -255,17 +270,45 @@ def submit_final_grades(professor_id, course_id):
     if not data or 'grades' not in data or not isinstance(data['grades'], list):
         return jsonify({"error": "Invalid grade data format"}), 400
     
+    # Large sections can be submitted in the background and polled
+    if jobs.wants_async(request):
+        try:
+            job, _ = jobs.enqueue('final_grades', {"course_id": course.id, "grades": data['grades']},
+                                  user_id=current_user.id, idempotency_key=jobs.idempotency_key(request))
+        except jobs.JobError as e:
+            return jsonify({"error": e.message}), e.status
+        return jobs.accepted(job)
+    
+    try:
+        updated_grades, errors, notifications = apply_final_grades(course, data['grades'])
+        db.session.commit()
+        events.publish_many(notifications)
+        return jsonify({
+            "message": "Final grades submitted successfully",
+            "updated_grades": updated_grades,
+            "errors": errors
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+
+# Set Enrollment.grade for each {"student_id", "grade"} entry and refresh the
+# affected transcripts; the caller commits, then publishes the notifications.
+# Returns (updated_grades, errors, notifications).
+def apply_final_grades(course, grades):
     updated_grades = []
     errors = []
     
-    for grade_data in data['grades']:
+    for grade_data in grades:
         if 'student_id' not in grade_data or 'grade' not in grade_data:
             errors.append(f"Missing student_id or grade for entry: {grade_data}")
             continue
         
         enrollment = Enrollment.query.filter_by(
             student_id=grade_data['student_id'],
-            course_id=course_id
+            course_id=course.id
         ).first()
         
         if not enrollment:
@@ -278,15 +321,146 @@ def submit_final_grades(professor_id, course_id):
             "grade": enrollment.grade
         })
     
+    notifications = [
+        (events.user_channel(g["student_id"]), 'final_grade',
+         {"course_id": course.id, "course_code": course.code, "course_title": course.title, "grade": g["grade"]})
+        for g in updated_grades
+    ]
+    
+    # Refresh the affected transcripts in the same transaction as the grades
+    db.session.flush()
+    transcripts.update_students([g["student_id"] for g in updated_grades])
+    return updated_grades, errors, notifications
+
+
+@jobs.register('final_grades')
+def final_grades_job(context, payload):
+    course = Course.query.get(payload["course_id"])
+    if not course:
+        raise jobs.PermanentJobError("Course no longer exists")
+    
+    context.progress(0, len(payload["grades"]), f"Submitting grades for {course.code}")
+    updated_grades, errors, notifications = apply_final_grades(course, payload["grades"])
+    db.session.commit()
+    events.publish_many(notifications)
+    return {"updated_grades": updated_grades, "errors": errors}
+
+
+@professors_bp.route('/<int:professor_id>/courses/<int:course_id>/gradebook', methods=['GET', 'POST'])
+@jwt_required
+def course_gradebook(professor_id, course_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Professors can only compute grades for their own courses
+    if current_user.role != 'professor' or current_user.id != professor_id:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({"error": "Course not found"}), 404
+    
+    if course.instructor_id != professor_id:
+        return jsonify({"error": "You do not teach this course"}), 403
+    
+    # Weighted percentage and letter for the whole section (gradebook.py)
+    results = gradebook.section_grades(course.id)
+    
+    if request.method == 'GET':
+        return jsonify({"course_id": course.id, "students": results})
+    
+    # POST writes the computed letters to Enrollment.grade in one bulk update
+    data = request.get_json(silent=True) or {}
+    written = gradebook.apply_grades(results, overwrite=bool(data.get('overwrite')))
+    notifications = [
+        (events.user_channel(r["student_id"]), 'final_grade',
+         {"course_id": course.id, "course_code": course.code, "course_title": course.title, "grade": r["final_grade"]})
+        for r in written
+    ]
+    
     try:
         db.session.commit()
+        events.publish_many(notifications)
         return jsonify({
-            "message": "Final grades submitted successfully",
-            "updated_grades": updated_grades,
-            "errors": errors
+            "message": "Final grades computed successfully",
+            "updated": len(written),
+            "students": results
         })
     
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
+@professors_bp.route('/<int:professor_id>/submissions/<int:submission_id>/file', methods=['GET'])
+@jwt_required
+def download_submission(professor_id, submission_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Professors can only download submissions to their own assignments
+    if current_user.role != 'professor' or current_user.id != professor_id:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        return jsonify({"error": "Submission not found"}), 404
+    
+    _, error = instructor_course(professor_id, submission.assignment)
+    if error:
+        return error
+    
+    if not submission.content_hash:
+        return jsonify({"error": "Submission has no uploaded file"}), 404
+    
+    # Served from disk with Range support and without reading it into Python (uploads.py)
+    response = uploads.send_object(submission.content_hash, submission.file_name, submission.content_type)
+    if response is None:
+        return jsonify({"error": "Submitted file is missing from storage"}), 410
+    return response
+
+@professors_bp.route('/<int:professor_id>/assignments/<int:assignment_id>/submissions/archive', methods=['GET'])
+@jwt_required
+def download_submissions_archive(professor_id, assignment_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    if current_user.role != 'professor' or current_user.id != professor_id:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    assignment = Assignment.query.get(assignment_id)
+    if not assignment:
+        return jsonify({"error": "Assignment not found"}), 404
+    
+    course, error = instructor_course(professor_id, assignment)
+    if error:
+        return error
+    
+    rows = db.session.query(Submission, User.student_id, User.name) \
+        .join(User, User.id == Submission.student_id) \
+        .filter(Submission.assignment_id == assignment.id) \
+        .order_by(User.student_id, Submission.id).all()
+    
+    # One folder per student: the uploaded file, or the text of a text submission
+    entries = []
+    missing = []
+    for submission, student_number, name in rows:
+        folder = secure_filename(f"{student_number or submission.student_id}_{name}")
+        if submission.content_hash:
+            path = uploads.object_path(submission.content_hash)
+            if not os.path.exists(path):
+                missing.append(submission.id)
+                continue
+            file_name = secure_filename(submission.file_name or '') or submission.content_hash
+            entries.append((f"{folder}/{file_name}", path, submission.submitted_at))
+        elif submission.content:
+            entries.append((f"{folder}/submission.txt", submission.content.encode(), submission.submitted_at))
+    
+    archive_name = secure_filename(f"{course.code}_{assignment.title}") or f"assignment_{assignment.id}"
+    headers = {"Content-Disposition": f'attachment; filename="{archive_name}.zip"'}
+    if missing:
+        headers["X-Missing-Submissions"] = ",".join(str(submission_id) for submission_id in missing)
+    
+    # Built while it is sent; chunk size and compression read here, outside the generator
+    compress = request.args.get('compress', 'false').lower() == 'true'
+    return Response(uploads.stream_zip(entries, compress=compress, chunk_size=current_app.config['UPLOAD_CHUNK_SIZE']),
+                    mimetype='application/zip', headers=headers)
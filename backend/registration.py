@@ -0,0 +1,197 @@
+import logging
+from sqlalchemy import func, update
+from models import db, User, Course, Enrollment, WaitlistEntry
+from scheduling import check_candidates, find_conflicts
+from smart_contracts import enroll_students
+import events
+import waitlist
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MODES = ('atomic', 'best_effort')
+MAX_BATCH_SIZE = 20
+
+
+class EnrollmentError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+
+def _counts(model, course_ids, *criteria):
+    return dict(db.session.query(model.course_id, func.count(model.id))
+                .filter(model.course_id.in_(course_ids), *criteria)
+                .group_by(model.course_id).all())
+
+
+def _occupied(course_ids):
+    return _counts(Enrollment, course_ids, Enrollment.status != 'dropped')
+
+
+# Enroll a student in one course, or re-enroll after an earlier drop. Used by
+# the enroll route under both WSGI and ASGI (asgi.py). Raises EnrollmentError
+# when the request is refused; the caller commits.
+def enroll_one(student_id, course_id):
+    user = db.session.get(User, student_id)
+    if not user or user.role != 'student':
+        raise EnrollmentError("Only students can enroll in courses", 403)
+
+    course = db.session.get(Course, course_id)
+    if not course:
+        raise EnrollmentError("Course not found", 404)
+
+    # Check if student is already enrolled
+    existing_enrollment = Enrollment.query.filter_by(student_id=user.id, course_id=course.id).first()
+    if existing_enrollment and existing_enrollment.status != 'dropped':
+        raise EnrollmentError("Already enrolled in this course", 409)
+
+    # Check if course is full; free seats are handed to the waitlist first
+    if course.is_full or waitlist.waiting_entries(course.id).first():
+        raise EnrollmentError("Course is full", 400, waitlist=f"/api/courses/{course.id}/waitlist")
+
+    # Check if course is active
+    if course.status != 'active':
+        raise EnrollmentError("Course is not active for enrollment", 400)
+
+    # Check for clashes with the student's current schedule
+    conflicts = find_conflicts(user.id, course)
+    if conflicts:
+        raise EnrollmentError("Schedule conflict", 409, conflicts=conflicts)
+
+    if existing_enrollment:
+        enrollment = existing_enrollment
+        enrollment.status = 'enrolled'
+        enrollment.grade = None
+        enrollment.transaction_id = None
+    else:
+        enrollment = Enrollment(student_id=user.id, course_id=course.id, status='enrolled')
+        db.session.add(enrollment)
+    return enrollment, course
+
+
+# Enroll one student in several courses. Eligibility, duplicates, capacity and
+# schedule conflicts are checked for the whole cart with a handful of
+# set-based queries, then every accepted enrollment is written in one
+# transaction. In 'atomic' mode any rejection rejects the whole cart; in
+# 'best_effort' mode the accepted courses are enrolled and the rest reported.
+# Returns one result per requested course; the caller commits.
+def enroll_batch(student_id, course_ids, mode='atomic'):
+    courses = {c.id: c for c in Course.query.filter(Course.id.in_(course_ids)).all()}
+    existing = {e.course_id: e for e in Enrollment.query.filter(
+        Enrollment.student_id == student_id, Enrollment.course_id.in_(course_ids)).all()}
+    occupied = _occupied(course_ids)
+    waiting = _counts(WaitlistEntry, course_ids, WaitlistEntry.status == 'waiting')
+
+    results = {}
+    eligible = []
+    for course_id in course_ids:
+        course = courses.get(course_id)
+        enrollment = existing.get(course_id)
+        if not course:
+            error = "Course not found"
+        elif enrollment and enrollment.status != 'dropped':
+            error = "Already enrolled in this course"
+        elif course.status != 'active':
+            error = "Course is not active for enrollment"
+        elif occupied.get(course_id, 0) >= course.capacity or waiting.get(course_id):
+            # Free seats are handed to the waitlist first
+            error = "Course is full"
+        else:
+            eligible.append(course_id)
+            continue
+        results[course_id] = {"course_id": course_id, "ok": False, "error": error}
+
+    # Schedule conflicts against the current timetable and within the cart
+    for check in (check_candidates(student_id, eligible, courses) if eligible else []):
+        if not check["ok"]:
+            results[check["course_id"]] = {"course_id": check["course_id"], "ok": False,
+                                           "error": "Schedule conflict", "conflicts": check["conflicts"]}
+
+    accepted = [course_id for course_id in eligible if course_id not in results]
+    if mode == 'atomic' and len(accepted) != len(course_ids):
+        for course_id in accepted:
+            results[course_id] = {"course_id": course_id, "ok": False, "error": "Not enrolled: batch rejected"}
+        return [results[course_id] for course_id in course_ids]
+
+    enrolled = []
+    for course_id in accepted:
+        enrollment = existing.get(course_id)
+        if enrollment:
+            # Re-enroll after an earlier drop
+            enrollment.status = 'enrolled'
+            enrollment.grade = None
+            enrollment.transaction_id = None
+        else:
+            enrollment = Enrollment(student_id=student_id, course_id=course_id, status='enrolled')
+            db.session.add(enrollment)
+        enrolled.append(enrollment)
+    db.session.flush()
+
+    # Seats may have been taken since they were counted; re-check inside the
+    # transaction and give back any that overflowed
+    if accepted:
+        occupied = _occupied(accepted)
+        overflow = {course_id for course_id in accepted if occupied.get(course_id, 0) > courses[course_id].capacity}
+        if overflow:
+            if mode == 'atomic':
+                db.session.rollback()
+                for course_id in accepted:
+                    error = "Course is full" if course_id in overflow else "Not enrolled: batch rejected"
+                    results[course_id] = {"course_id": course_id, "ok": False, "error": error}
+                return [results[course_id] for course_id in course_ids]
+
+            for enrollment in [e for e in enrolled if e.course_id in overflow]:
+                if enrollment.course_id in existing:
+                    enrollment.status = 'dropped'
+                else:
+                    db.session.delete(enrollment)
+                enrolled.remove(enrollment)
+                results[enrollment.course_id] = {"course_id": enrollment.course_id, "ok": False, "error": "Course is full"}
+            db.session.flush()
+
+    for enrollment in enrolled:
+        course = courses[enrollment.course_id]
+        results[course.id] = {"course_id": course.id, "ok": True, "enrollment_id": enrollment.id,
+                              "code": course.code, "title": course.title, "transaction_id": None}
+
+    return [results[course_id] for course_id in course_ids]
+
+
+# After commit: one grouped chain submission for every enrollment whose course
+# has a contract, then student and seat notifications. Works from the results
+# so nothing expired by the commit has to be reloaded row by row.
+def after_commit(student_id, results):
+    enrolled = [r for r in results if r["ok"]]
+    if not enrolled:
+        return
+    course_ids = [r["course_id"] for r in enrolled]
+
+    contracts = dict(db.session.query(Course.id, Course.contract_address)
+                     .filter(Course.id.in_(course_ids), Course.contract_address.isnot(None)).all())
+    pending = [(contracts[r["course_id"]], student_id, r["course_id"]) for r in enrolled if r["course_id"] in contracts]
+    if pending:
+        txids = enroll_students(pending)
+        for r in enrolled:
+            r["transaction_id"] = txids.get((student_id, r["course_id"]))
+        updates = [{"id": r["enrollment_id"], "transaction_id": r["transaction_id"]} for r in enrolled if r["transaction_id"]]
+        if updates:
+            db.session.execute(update(Enrollment), updates)
+            db.session.commit()
+
+    events.publish_many([
+        (events.user_channel(student_id), 'enrollment', {
+            "enrollment_id": r["enrollment_id"],
+            "course_id": r["course_id"],
+            "course_code": r["code"],
+            "course_title": r["title"],
+            "status": 'enrolled',
+            "promoted": False
+        }) for r in enrolled
+    ])
+    events.publish_many([
+        (events.course_channel(status["course_id"]), 'seats', status)
+        for status in waitlist.seat_statuses(course_ids)
+    ])
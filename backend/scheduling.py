@@ -0,0 +1,184 @@
+import bisect
+import datetime
+from models import db, Course, CourseMeeting, Enrollment
+
+DAY_CODES = 'MTWRFSU'  # Monday .. Sunday; R = Thursday, U = Sunday
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+def parse_days(value):
+    days = (value or '').strip().upper()
+    if not days or any(day not in DAY_CODES for day in days) or len(set(days)) != len(days):
+        raise ScheduleError(f"days must be a combination of {DAY_CODES}, e.g. 'MWF'")
+    # Canonical order so 'FWM' and 'MWF' are stored the same way
+    return ''.join(day for day in DAY_CODES if day in days)
+
+
+def parse_time(value):
+    try:
+        return datetime.time.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ScheduleError(f"Invalid time '{value}', expected HH:MM")
+
+
+def minutes(value):
+    return value.hour * 60 + value.minute
+
+
+# Per-day interval index over a student's existing meetings.
+# Intervals are sorted by start; max_end[i] is the latest end among the first
+# i+1 intervals. A new [start, end) overlaps something iff some interval that
+# starts before `end` finishes after `start`, i.e. max_end[k-1] > start where
+# k = bisect(starts, end) -- one binary search per meeting day.
+class ScheduleIndex:
+    def __init__(self, meetings):
+        by_day = {}
+        for meeting in meetings:
+            for day in meeting["days"]:
+                by_day.setdefault(day, []).append((meeting["start"], meeting["end"], meeting))
+
+        self._days = {}
+        for day, intervals in by_day.items():
+            intervals.sort(key=lambda interval: interval[0])
+            starts = [interval[0] for interval in intervals]
+            max_end = []
+            latest = -1
+            for interval in intervals:
+                latest = max(latest, interval[1])
+                max_end.append(latest)
+            self._days[day] = (starts, max_end, intervals)
+
+    def overlaps(self, day, start, end):
+        entry = self._days.get(day)
+        if not entry:
+            return False
+        starts, max_end, _ = entry
+        k = bisect.bisect_left(starts, end)
+        return k > 0 and max_end[k - 1] > start
+
+    # The conflicting meetings themselves: walk back from the bisect point
+    # while earlier intervals can still reach past `start`
+    def conflicts(self, day, start, end):
+        if not self.overlaps(day, start, end):
+            return []
+        starts, max_end, intervals = self._days[day]
+        found = []
+        i = bisect.bisect_left(starts, end) - 1
+        while i >= 0 and max_end[i] > start:
+            if intervals[i][1] > start:
+                found.append(intervals[i][2])
+            i -= 1
+        return found
+
+
+def _meeting_dict(meeting, course):
+    return {
+        "meeting_id": meeting.id,
+        "course_id": course.id,
+        "code": course.code,
+        "days": meeting.days,
+        "start": minutes(meeting.start_time),
+        "end": minutes(meeting.end_time),
+        "start_time": meeting.start_time.strftime('%H:%M'),
+        "end_time": meeting.end_time.strftime('%H:%M'),
+        "room": meeting.room,
+        "term": course.term,
+        "year": course.year,
+    }
+
+
+def serialize_meeting(meeting):
+    return {
+        "id": meeting.id,
+        "days": meeting.days,
+        "start_time": meeting.start_time.strftime('%H:%M'),
+        "end_time": meeting.end_time.strftime('%H:%M'),
+        "room": meeting.room
+    }
+
+
+# Meetings of every course the student is actively enrolled in for the given
+# (term, year) pairs, in one query, grouped into a ScheduleIndex per term
+def load_schedules(student_id, terms):
+    if not terms:
+        return {}
+
+    rows = db.session.query(CourseMeeting, Course) \
+        .join(Course, Course.id == CourseMeeting.course_id) \
+        .join(Enrollment, Enrollment.course_id == Course.id) \
+        .filter(Enrollment.student_id == student_id, Enrollment.status == 'enrolled') \
+        .filter(db.tuple_(Course.term, Course.year).in_(list(terms))) \
+        .all()
+
+    meetings = {term: [] for term in terms}
+    for meeting, course in rows:
+        meetings[(course.term, course.year)].append(_meeting_dict(meeting, course))
+    return {term: ScheduleIndex(items) for term, items in meetings.items()}
+
+
+def _conflicts_with(index, meetings, course_id):
+    conflicts = []
+    seen = set()
+    for meeting in meetings:
+        for day in meeting["days"]:
+            for other in index.conflicts(day, meeting["start"], meeting["end"]):
+                key = (other["meeting_id"], day)
+                if other["course_id"] == course_id or key in seen:
+                    continue
+                seen.add(key)
+                conflicts.append({
+                    "course_id": other["course_id"],
+                    "code": other["code"],
+                    "day": day,
+                    "time": f"{other['start_time']}-{other['end_time']}",
+                    "room": other["room"]
+                })
+    return conflicts
+
+
+# Check a single course against the student's current schedule
+def find_conflicts(student_id, course):
+    meetings = [_meeting_dict(m, course) for m in course.meetings]
+    if not meetings:
+        return []
+    schedules = load_schedules(student_id, {(course.term, course.year)})
+    return _conflicts_with(schedules[(course.term, course.year)], meetings, course.id)
+
+
+# Check a cart of candidate courses at once: three queries in total (courses,
+# candidate meetings, current schedule), then each candidate is checked
+# against the schedule plus the candidates before it in the cart. Callers that
+# already loaded the courses can pass them as {course_id: Course}.
+def check_candidates(student_id, course_ids, courses=None):
+    if courses is None:
+        courses = {c.id: c for c in Course.query.filter(Course.id.in_(course_ids)).all()}
+    candidate_meetings = {course_id: [] for course_id in courses}
+    for meeting in CourseMeeting.query.filter(CourseMeeting.course_id.in_(list(courses))).all():
+        candidate_meetings[meeting.course_id].append(_meeting_dict(meeting, courses[meeting.course_id]))
+
+    terms = {(c.term, c.year) for c in courses.values()}
+    schedules = load_schedules(student_id, terms)
+    accepted = {term: [] for term in terms}
+
+    results = []
+    for course_id in course_ids:
+        course = courses.get(course_id)
+        if not course:
+            results.append({"course_id": course_id, "ok": False, "error": "Course not found", "conflicts": []})
+            continue
+
+        term = (course.term, course.year)
+        meetings = candidate_meetings[course_id]
+        conflicts = _conflicts_with(schedules[term], meetings, course_id)
+        # Conflicts inside the cart itself
+        if accepted[term]:
+            conflicts += _conflicts_with(ScheduleIndex(accepted[term]), meetings, course_id)
+
+        if not conflicts:
+            accepted[term].extend(meetings)
+        results.append({"course_id": course_id, "code": course.code, "ok": not conflicts, "conflicts": conflicts})
+
+    return results
@@ -0,0 +1,251 @@
+import re
+import math
+import bisect
+import logging
+import threading
+from sqlalchemy import text, func, Integer, Float
+from models import db, Course, User
+from tenancy import current_tenant, primary_engine
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Indexed course fields and their ranking weights (code matches count most)
+FIELDS = ('code', 'title', 'description', 'department', 'instructor')
+WEIGHTS = {'code': 10.0, 'title': 5.0, 'description': 1.0, 'department': 2.0, 'instructor': 3.0}
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+FTS_TABLE = 'course_search'
+
+
+def tokenize(value):
+    return TOKEN_RE.findall(value.lower()) if value else []
+
+
+def _document_rows(course_ids=None, updated_since=None):
+    query = db.session.query(
+        Course.id, Course.code, Course.title, Course.description, Course.department,
+        func.coalesce(User.name, ''), Course.updated_at
+    ).outerjoin(User, User.id == Course.instructor_id)
+
+    if course_ids is not None:
+        query = query.filter(Course.id.in_(course_ids))
+    if updated_since is not None:
+        query = query.filter(Course.updated_at >= updated_since)
+
+    return query.all()
+
+
+# SQLite FTS5 virtual table keyed by course id (rowid), ranked with bm25()
+class FTS5Index:
+    name = 'fts5'
+
+    def __init__(self):
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            # Maintenance always goes to the primary engine, never a read replica
+            with primary_engine().begin() as conn:
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                    f"USING fts5({', '.join(FIELDS)}, tokenize='unicode61')"
+                ))
+                indexed = conn.execute(text(f"SELECT count(*) FROM {FTS_TABLE}")).scalar()
+                courses = conn.execute(text("SELECT count(*) FROM courses")).scalar()
+            if indexed != courses:
+                self.rebuild()
+            self._ready = True
+
+    def rebuild(self):
+        rows = _document_rows()
+        with primary_engine().begin() as conn:
+            conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+            if rows:
+                conn.execute(text(
+                    f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FIELDS)}) "
+                    f"VALUES (:id, :code, :title, :description, :department, :instructor)"
+                ), [self._params(row) for row in rows])
+        logger.info(f"Rebuilt FTS5 course index with {len(rows)} courses")
+
+    def update(self, course_ids):
+        rows = _document_rows(course_ids=course_ids)
+        with primary_engine().begin() as conn:
+            conn.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(str(int(i)) for i in course_ids)})"))
+            if rows:
+                conn.execute(text(
+                    f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FIELDS)}) "
+                    f"VALUES (:id, :code, :title, :description, :department, :instructor)"
+                ), [self._params(row) for row in rows])
+
+    def _params(self, row):
+        return {"id": row[0], "code": row[1], "title": row[2], "description": row[3] or '',
+                "department": row[4], "instructor": row[5]}
+
+    # (course_id, score) subquery for a search, higher score = better match
+    def match_subquery(self, terms):
+        # Every term must match, each as a quoted prefix query
+        expression = ' AND '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+        weights = ', '.join(str(WEIGHTS[field]) for field in FIELDS)
+        return text(
+            f"SELECT rowid AS course_id, -bm25({FTS_TABLE}, {weights}) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :expression"
+        ).bindparams(expression=expression).columns(course_id=Integer, score=Float).subquery()
+
+
+# Pure-Python inverted index used when FTS5 is not available (non-SQLite
+# databases, or SQLite builds without the extension). It is per process, so
+# every search first pulls in courses edited since the last refresh.
+class InvertedIndex:
+    name = 'inverted'
+
+    def __init__(self):
+        self.postings = {}      # token -> {course_id: weighted term frequency}
+        self.documents = {}     # course_id -> set of tokens, for removal on update
+        self.vocabulary = []    # sorted tokens, for prefix lookups
+        self.last_updated = None
+        self._ready = False
+        self._lock = threading.RLock()
+
+    def ensure(self):
+        with self._lock:
+            if not self._ready:
+                self.rebuild()
+                return
+
+            last_updated, count = db.session.query(func.max(Course.updated_at), func.count(Course.id)).one()
+            if count < len(self.documents):
+                # Courses were deleted; removals can't be seen incrementally
+                self.rebuild()
+            elif count > len(self.documents) or (last_updated and (self.last_updated is None or last_updated > self.last_updated)):
+                self._apply(_document_rows(updated_since=self.last_updated))
+
+    def rebuild(self):
+        with self._lock:
+            self.postings = {}
+            self.documents = {}
+            self.last_updated = None
+            self._apply(_document_rows(), rebuild_vocabulary=True)
+            self._ready = True
+        logger.info(f"Built in-memory course index with {len(self.documents)} courses")
+
+    def update(self, course_ids):
+        with self._lock:
+            if self._ready:
+                self._apply(_document_rows(course_ids=course_ids))
+
+    def _apply(self, rows, rebuild_vocabulary=False):
+        new_tokens = False
+        for row in rows:
+            course_id = row[0]
+            self._remove(course_id)
+
+            weighted = {}
+            for field, value in zip(FIELDS, row[1:6]):
+                for token in tokenize(value):
+                    weighted[token] = weighted.get(token, 0.0) + WEIGHTS[field]
+
+            for token, weight in weighted.items():
+                posting = self.postings.get(token)
+                if posting is None:
+                    posting = self.postings[token] = {}
+                    new_tokens = True
+                posting[course_id] = weight
+            self.documents[course_id] = set(weighted)
+
+            if row[6] and (self.last_updated is None or row[6] > self.last_updated):
+                self.last_updated = row[6]
+
+        if new_tokens or rebuild_vocabulary:
+            self.vocabulary = sorted(self.postings)
+
+    def _remove(self, course_id):
+        for token in self.documents.pop(course_id, ()):
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.pop(course_id, None)
+
+    def _prefix_tokens(self, prefix):
+        vocabulary = self.vocabulary
+        i = bisect.bisect_left(vocabulary, prefix)
+        while i < len(vocabulary) and vocabulary[i].startswith(prefix):
+            yield vocabulary[i]
+            i += 1
+
+    # {course_id: score} for courses matching every term (as a prefix)
+    def search(self, terms):
+        with self._lock:
+            total = max(len(self.documents), 1)
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for token in self._prefix_tokens(term):
+                    posting = self.postings[token]
+                    if not posting:
+                        continue
+                    idf = math.log(1 + total / len(posting))
+                    # Exact token matches rank above longer prefix completions
+                    boost = 1.0 if token == term else 0.5
+                    for course_id, weight in posting.items():
+                        score = weight * idf * boost
+                        if score > term_scores.get(course_id, 0.0):
+                            term_scores[course_id] = score
+
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {cid: s + term_scores[cid] for cid, s in scores.items() if cid in term_scores}
+                if not scores:
+                    return {}
+            return scores or {}
+
+
+# tenant -> index of that institution's courses (None: the default database)
+_indexes = {}
+_index_lock = threading.Lock()
+
+
+def _fts5_available():
+    engine = primary_engine()
+    if engine.url.get_backend_name() != 'sqlite':
+        return False
+    try:
+        with engine.connect() as conn:
+            options = {row[0] for row in conn.execute(text("PRAGMA compile_options"))}
+        return 'ENABLE_FTS5' in options
+    except Exception:
+        return False
+
+
+def get_index():
+    tenant = current_tenant()
+    index = _indexes.get(tenant)
+    if index is None:
+        with _index_lock:
+            index = _indexes.get(tenant)
+            if index is None:
+                index = _indexes[tenant] = FTS5Index() if _fts5_available() else InvertedIndex()
+                logger.info(f"Course search backend: {index.name}")
+    index.ensure()
+    return index
+
+
+# Drop the index (e.g. after the database was recreated); rebuilt on next use
+def reset_index():
+    with _index_lock:
+        _indexes.pop(current_tenant(), None)
+        with primary_engine().begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+
+
+# Called after create_course / update_course commit
+def index_courses(course_ids):
+    try:
+        get_index().update(list(course_ids))
+    except Exception as e:
+        logger.error(f"Error updating course search index: {str(e)}")
@@ -0,0 +1,150 @@
+import json
+from flask import Response
+from sqlalchemy import select, func
+from sqlalchemy.orm import QueryableAttribute
+from models import User, Course, Enrollment, Assignment, Grade
+
+# Use orjson when it is installed; it is several times faster than the stdlib encoder
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+
+def json_response(payload, status=200):
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+# Serializer for a fixed list of (key, column_or_expression[, converter]) fields.
+# The row -> dict function is generated once, when the serializer is defined,
+# so serializing a row is a single dict display with no per-field lookups.
+# Works on Row tuples from select(*serializer.columns) and on ORM instances.
+class RowSerializer:
+    def __init__(self, fields):
+        self.keys = tuple(field[0] for field in fields)
+        self.columns = tuple(field[1] for field in fields)
+        converters = [field[2] if len(field) > 2 else None for field in fields]
+
+        namespace = {f"c{i}": converter for i, converter in enumerate(converters) if converter}
+        row_items = []
+        obj_items = []
+        for i, (key, column, converter) in enumerate(zip(self.keys, self.columns, converters)):
+            value = f"r[{i}]"
+            # Attribute name on the mapped class, for serializing ORM instances
+            attribute = column.key if isinstance(column, QueryableAttribute) else key
+            obj_value = f"o.{attribute}"
+            if converter:
+                value = f"c{i}({value})"
+                obj_value = f"c{i}({obj_value})"
+            row_items.append(f"{key!r}: {value}")
+            obj_items.append(f"{key!r}: {obj_value}")
+
+        exec(f"def from_row(r): return {{{', '.join(row_items)}}}", namespace)
+        exec(f"def from_object(o): return {{{', '.join(obj_items)}}}", namespace)
+        self.row = namespace['from_row']
+        self.object = namespace['from_object']
+
+    def select(self):
+        return select(*self.columns)
+
+    def rows(self, rows):
+        from_row = self.row
+        return [from_row(r) for r in rows]
+
+    def objects(self, objects):
+        from_object = self.object
+        return [from_object(o) for o in objects]
+
+
+# Number of occupied seats per course, correlated to the outer Course row
+enrolled_count = select(func.count(Enrollment.id)) \
+    .where(Enrollment.course_id == Course.id, Enrollment.status != 'dropped') \
+    .correlate(Course) \
+    .scalar_subquery()
+
+# Course catalog entry; select() needs an outer join to the instructor (User)
+COURSE = RowSerializer([
+    ("id", Course.id),
+    ("code", Course.code),
+    ("title", Course.title),
+    ("description", Course.description),
+    ("credits", Course.credits),
+    ("term", Course.term),
+    ("year", Course.year),
+    ("department", Course.department),
+    ("instructor", func.coalesce(User.name, "TBA")),
+    ("enrolled_count", enrolled_count),
+    ("capacity", Course.capacity),
+    ("status", Course.status),
+    ("fee", Course.fee),
+])
+
+STUDENT = RowSerializer([
+    ("id", User.id),
+    ("name", User.name),
+    ("email", User.email),
+    ("student_id", User.student_id),
+    ("major", User.major),
+    ("year", User.year),
+])
+
+PROFESSOR = RowSerializer([
+    ("id", User.id),
+    ("name", User.name),
+    ("email", User.email),
+    ("professor_id", User.professor_id),
+    ("department", User.department),
+    ("title", User.title),
+])
+
+ASSIGNMENT = RowSerializer([
+    ("id", Assignment.id),
+    ("title", Assignment.title),
+    ("description", Assignment.description),
+    ("due_date", Assignment.due_date, isoformat),
+    ("points", Assignment.points),
+    ("weight", Assignment.weight),
+    ("created_at", Assignment.created_at, isoformat),
+])
+
+ENROLLMENT = RowSerializer([
+    ("id", Enrollment.id),
+    ("student_id", Enrollment.student_id),
+    ("course_id", Enrollment.course_id),
+    ("status", Enrollment.status),
+    ("grade", Enrollment.grade),
+    ("transaction_id", Enrollment.transaction_id),
+    ("created_at", Enrollment.created_at, isoformat),
+])
+
+GRADE = RowSerializer([
+    ("id", Grade.id),
+    ("student_id", Grade.student_id),
+    ("assignment_id", Grade.assignment_id),
+    ("submission_id", Grade.submission_id),
+    ("score", Grade.score),
+    ("feedback", Grade.feedback),
+    ("graded_at", Grade.graded_at, isoformat),
+])
+
+# Course roster line: the student joined with their enrollment
+ROSTER = RowSerializer([
+    ("student_id", User.id),
+    ("name", User.name),
+    ("email", User.email),
+    ("student_number", User.student_id),
+    ("major", User.major),
+    ("year", User.year),
+    ("enrollment_status", Enrollment.status),
+    ("grade", Enrollment.grade),
+])
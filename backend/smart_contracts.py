@@ -1,14 +1,16 @@
-from flask import Blueprint, request, jsonify
-from models import db, Course, User, Enrollment
+from flask import Blueprint, current_app, request, jsonify
+from models import db, Course, User, Enrollment, Certificate, Job, ChainEnrollment, ChainCertificate
 from auth import jwt_required, get_jwt_identity
+from chain_guard import guarded_call, CircuitOpenError
+import jobs
+import certificates
+import chain_mirror
+import course_contracts
 import os
 import json
 import base64
-import algosdk
-from algosdk.v2client import algod
-from algosdk import transaction
-from algosdk.transaction import PaymentTxn, AssetConfigTxn, AssetTransferTxn, AssetOptInTxn
-from algosdk.v2client import indexer
+import functools
+import urllib.request
 import logging
 import datetime
 
@@ -18,12 +20,41 @@ smart_contracts_bp = Blueprint('smart_contracts', __name__)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Network timeouts for algod / indexer requests
+ALGORAND_TIMEOUT = float(os.environ.get("ALGORAND_TIMEOUT_SECONDS", 10))
+ALGORAND_CONFIRM_ROUNDS = int(os.environ.get("ALGORAND_CONFIRM_ROUNDS", 4))
+
+# Whether the app runs with the blockchain feature (FEATURES in app.py). When
+# it is off, course contracts and enrollment transfers are skipped, and
+# algosdk is never imported.
+def chain_enabled():
+    return 'blockchain' in current_app.config.get('FEATURES', ('blockchain',))
+
+# algosdk takes a noticeable share of worker start-up, so it is imported on
+# first use (the functions below import what they need) instead of with this module
+@functools.lru_cache(maxsize=None)
+def _client_modules():
+    from algosdk.v2client import algod, indexer
+    
+    # The SDK clients call urlopen() without a timeout, so a slow node would block
+    # the worker indefinitely. Give both client modules a bounded urlopen instead.
+    algod.urlopen = functools.partial(urllib.request.urlopen, timeout=ALGORAND_TIMEOUT)
+    indexer.urlopen = functools.partial(urllib.request.urlopen, timeout=ALGORAND_TIMEOUT)
+    return algod, indexer
+
+# Import algosdk now instead of on the first chain call; gunicorn.conf.py
+# does this in the master so preloaded workers share it
+def load_sdk():
+    _client_modules()
+    import algosdk.transaction
+
 # Algorand client configuration
 def get_algod_client():
     algod_address = os.environ.get("ALGORAND_ALGOD_ADDRESS", "https://testnet-api.algonode.cloud")
     algod_token = os.environ.get("ALGORAND_API_KEY", "")
     
     try:
+        algod, _ = _client_modules()
         algod_client = algod.AlgodClient(algod_token, algod_address)
         return algod_client
     except Exception as e:
@@ -35,146 +66,233 @@ def get_indexer_client():
     indexer_token = os.environ.get("ALGORAND_API_KEY", "")
     
     try:
+        _, indexer = _client_modules()
         indexer_client = indexer.IndexerClient(indexer_token, indexer_address)
         return indexer_client
     except Exception as e:
         logger.error(f"Error creating Indexer client: {str(e)}")
         return None
 
-# Function to create a new course smart contract on Algorand
-def create_course_contract(course):
+def get_admin_account():
+    admin_private_key = os.environ.get("ALGORAND_ADMIN_PRIVATE_KEY")
+    if not admin_private_key:
+        logger.error("Admin private key not found in environment variables")
+        return None, None
+    
     try:
-        # Get admin account
-        admin_private_key = os.environ.get("ALGORAND_ADMIN_PRIVATE_KEY")
-        if not admin_private_key:
-            logger.error("Admin private key not found in environment variables")
-            return None
-        
+        from algosdk import account
         private_key = base64.b64decode(admin_private_key)
-        admin_account = algosdk.account.address_from_private_key(private_key)
-        
-        # Get Algorand client
-        algod_client = get_algod_client()
-        if not algod_client:
-            return None
-        
-        # Get suggested parameters for transaction
-        params = algod_client.suggested_params()
-        
-        # Create a new asset for the course
-        # The asset will represent enrollment rights in the course
-        txn = AssetConfigTxn(
-            sender=admin_account,
-            sp=params,
-            total=course.capacity,
-            default_frozen=False,
-            unit_name=f"C{course.id}",
-            asset_name=f"Course_{course.code}",
-            manager=admin_account,
-            reserve=admin_account,
-            freeze=admin_account,
-            clawback=admin_account,
-            url=f"https://university.edu/courses/{course.id}",
-            decimals=0,
-            note=json.dumps({
-                "course_id": course.id,
-                "title": course.title,
-                "code": course.code,
-                "credits": course.credits,
-                "capacity": course.capacity,
-                "fee": course.fee
-            }).encode()
-        )
-        
-        # Sign transaction
-        signed_txn = txn.sign(private_key)
-        
-        # Send transaction
-        txid = algod_client.send_transaction(signed_txn)
-        logger.info(f"Asset creation transaction ID: {txid}")
-        
-        # Wait for confirmation
-        try:
-            confirmed_txn = algosdk.wait_for_confirmation(algod_client, txid, 4)
-            logger.info(f"Transaction confirmed in round: {confirmed_txn['confirmed-round']}")
-            
-            # Get asset ID
-            asset_id = confirmed_txn["asset-index"]
-            logger.info(f"Asset ID: {asset_id}")
-            
-            # Return asset ID as contract address
-            return str(asset_id)
-        
-        except Exception as e:
-            logger.error(f"Error waiting for confirmation: {str(e)}")
-            return None
+        admin_account = account.address_from_private_key(private_key)
+        return private_key, admin_account
+    except Exception as e:
+        logger.error(f"Invalid admin private key: {str(e)}")
+        return None, None
+
+# Sign, send and wait for a transaction; raises on any network or confirmation error.
+# The send and the wait go through the circuit breaker separately, as
+# '<operation>_send' and '<operation>_confirm'.
+def submit_transaction(algod_client, txn, private_key, operation):
+    from algosdk import transaction
+    signed_txn = txn.sign(private_key)
+    txid = guarded_call(f'{operation}_send', algod_client.send_transaction, signed_txn)
+    confirmed_txn = guarded_call(f'{operation}_confirm', transaction.wait_for_confirmation, algod_client, txid,
+                                 ALGORAND_CONFIRM_ROUNDS)
+    logger.info(f"Transaction {txid} confirmed in round: {confirmed_txn['confirmed-round']}")
+    return txid, confirmed_txn
+
+# Function to create a new course smart contract on Algorand
+def create_course_contract(course):
+    if not chain_enabled():
+        return None
+    
+    private_key, admin_account = get_admin_account()
+    if not private_key:
+        return None
     
+    try:
+        return _create_course_contract(course, private_key, admin_account)
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        return None
     except Exception as e:
         logger.error(f"Error creating course contract: {str(e)}")
         return None
 
+def _create_course_contract(course, private_key, admin_account):
+    from algosdk.transaction import AssetConfigTxn
+    
+    # Get Algorand client
+    algod_client = get_algod_client()
+    if not algod_client:
+        raise RuntimeError("Unable to create Algorand client")
+    
+    # A retried creation adopts the asset an earlier attempt already minted.
+    # If the lookup fails we raise rather than risk minting a duplicate.
+    indexer_client = get_indexer_client()
+    if not indexer_client:
+        raise RuntimeError("Unable to create Indexer client")
+    existing = course_contracts.find_course_asset(indexer_client, admin_account, course)
+    if existing:
+        logger.info(f"Course {course.id} already has asset {existing}, not minting another")
+        return str(existing)
+    
+    # Get suggested parameters for transaction
+    params = guarded_call('contract_params', algod_client.suggested_params)
+    
+    # Create a new asset for the course
+    # The asset will represent enrollment rights in the course
+    txn = AssetConfigTxn(
+        sender=admin_account,
+        sp=params,
+        total=course.capacity,
+        default_frozen=False,
+        unit_name=course_contracts.course_unit_name(course),
+        asset_name=course_contracts.course_asset_name(course),
+        manager=admin_account,
+        reserve=admin_account,
+        freeze=admin_account,
+        clawback=admin_account,
+        url=f"https://university.edu/courses/{course.id}",
+        decimals=0,
+        note=json.dumps({
+            "course_id": course.id,
+            "title": course.title,
+            "code": course.code,
+            "credits": course.credits,
+            "capacity": course.capacity,
+            "fee": course.fee
+        }).encode()
+    )
+    
+    txid, confirmed_txn = submit_transaction(algod_client, txn, private_key, 'contract')
+    logger.info(f"Asset creation transaction ID: {txid}")
+    
+    # Get asset ID
+    asset_id = confirmed_txn["asset-index"]
+    logger.info(f"Asset ID: {asset_id}")
+    
+    # Return asset ID as contract address
+    return str(asset_id)
+
 # Function to enroll a student in a course using Algorand
 def enroll_student(contract_address, student_id, course_id):
+    if not chain_enabled():
+        return None
+    
+    private_key, admin_account = get_admin_account()
+    if not private_key:
+        return None
+    
     try:
-        # Get admin account
-        admin_private_key = os.environ.get("ALGORAND_ADMIN_PRIVATE_KEY")
-        if not admin_private_key:
-            logger.error("Admin private key not found in environment variables")
-            return None
-        
-        private_key = base64.b64decode(admin_private_key)
-        admin_account = algosdk.account.address_from_private_key(private_key)
-        
-        # Get Algorand client
-        algod_client = get_algod_client()
-        if not algod_client:
-            return None
-        
-        # Get suggested parameters for transaction
-        params = algod_client.suggested_params()
-        
-        # Create opt-in transaction for the student
-        # In a real system, the student would have their own Algorand account
-        # For demo purposes, we're using the admin account to represent the student
-        asset_id = int(contract_address)
-        
-        # Record the enrollment by sending a 0 quantity of the asset to the admin (representing the student)
-        txn = AssetTransferTxn(
-            sender=admin_account,
-            sp=params,
-            receiver=admin_account,
-            amt=1,
-            index=asset_id,
-            note=json.dumps({
-                "action": "enroll",
-                "student_id": student_id,
-                "course_id": course_id,
-                "timestamp": str(int(datetime.datetime.now().timestamp()))
-            }).encode()
-        )
-        
-        # Sign transaction
-        signed_txn = txn.sign(private_key)
-        
-        # Send transaction
-        txid = algod_client.send_transaction(signed_txn)
-        logger.info(f"Enrollment transaction ID: {txid}")
+        return _enroll_student(contract_address, student_id, course_id, private_key, admin_account)
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        return None
+    except Exception as e:
+        logger.error(f"Error enrolling student: {str(e)}")
+        return None
+
+def _enroll_student(contract_address, student_id, course_id, private_key, admin_account):
+    # Get Algorand client
+    algod_client = get_algod_client()
+    if not algod_client:
+        raise RuntimeError("Unable to create Algorand client")
+    
+    # Get suggested parameters for transaction
+    params = guarded_call('enrollment_params', algod_client.suggested_params)
+    
+    txn = enrollment_transfer(admin_account, params, contract_address, student_id, course_id,
+                              str(int(datetime.datetime.now().timestamp())))
+    
+    txid, confirmed_txn = submit_transaction(algod_client, txn, private_key, 'enrollment')
+    logger.info(f"Enrollment transaction ID: {txid}")
+    
+    # Return transaction ID
+    return txid
+
+# The asset transfer that records one enrollment on chain
+def enrollment_transfer(admin_account, params, contract_address, student_id, course_id, timestamp):
+    from algosdk.transaction import AssetTransferTxn
+    
+    # Create opt-in transaction for the student
+    # In a real system, the student would have their own Algorand account
+    # For demo purposes, we're using the admin account to represent the student
+    asset_id = int(contract_address)
+    
+    # Record the enrollment by sending a 0 quantity of the asset to the admin (representing the student)
+    return AssetTransferTxn(
+        sender=admin_account,
+        sp=params,
+        receiver=admin_account,
+        amt=1,
+        index=asset_id,
+        note=json.dumps({
+            "action": "enroll",
+            "student_id": student_id,
+            "course_id": course_id,
+            "timestamp": timestamp
+        }).encode()
+    )
+
+# Record several enrollments with one grouped (atomic) submission per 16
+# transactions instead of one round trip each. A group that fails is logged
+# and skipped; the groups that confirmed keep their transaction IDs.
+# enrollments: [(contract_address, student_id, course_id)] -> {(student_id, course_id): txid}
+def enroll_students(enrollments):
+    if not enrollments or not chain_enabled():
+        return {}
+    
+    private_key, admin_account = get_admin_account()
+    if not private_key:
+        return {}
+    
+    try:
+        return _enroll_students(enrollments, private_key, admin_account)
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        return {}
+    except Exception as e:
+        logger.error(f"Error enrolling students: {str(e)}")
+        return {}
+
+# Each network call goes through the circuit breaker on its own, so a failed
+# group still counts against the node without losing the groups before it
+def _enroll_students(enrollments, private_key, admin_account):
+    from algosdk import constants, transaction
+    
+    algod_client = get_algod_client()
+    if not algod_client:
+        raise RuntimeError("Unable to create Algorand client")
+    
+    params = guarded_call('enrollment_params', algod_client.suggested_params)
+    timestamp = str(int(datetime.datetime.now().timestamp()))
+    
+    txids = {}
+    for start in range(0, len(enrollments), constants.TX_GROUP_LIMIT):
+        chunk = enrollments[start:start + constants.TX_GROUP_LIMIT]
+        txns = [enrollment_transfer(admin_account, params, contract_address, student_id, course_id, timestamp)
+                for contract_address, student_id, course_id in chunk]
         
-        # Wait for confirmation
+        if len(txns) > 1:
+            transaction.assign_group_id(txns)
+        signed_txns = [txn.sign(private_key) for txn in txns]
         try:
-            confirmed_txn = algosdk.wait_for_confirmation(algod_client, txid, 4)
-            logger.info(f"Transaction confirmed in round: {confirmed_txn['confirmed-round']}")
-            
-            # Return transaction ID
-            return txid
-        
+            guarded_call('enrollment_send', algod_client.send_transactions, signed_txns)
+            # A group is confirmed atomically; waiting on one transaction covers all
+            confirmed_txn = guarded_call('enrollment_confirm', transaction.wait_for_confirmation, algod_client,
+                                         signed_txns[0].get_txid(), ALGORAND_CONFIRM_ROUNDS)
+        except CircuitOpenError as e:
+            logger.warning(f"{str(e)}; {len(enrollments) - start} enrollments left off chain")
+            break
         except Exception as e:
-            logger.error(f"Error waiting for confirmation: {str(e)}")
-            return None
+            logger.error(f"Enrollment group of {len(txns)} failed: {str(e)}")
+            continue
+        logger.info(f"Enrollment group of {len(txns)} confirmed in round: {confirmed_txn['confirmed-round']}")
+        
+        for (contract_address, student_id, course_id), signed_txn in zip(chunk, signed_txns):
+            txids[(student_id, course_id)] = signed_txn.get_txid()
     
-    except Exception as e:
-        logger.error(f"Error enrolling student: {str(e)}")
-        return None
+    return txids
 
 @smart_contracts_bp.route('/verify-enrollment/<int:enrollment_id>', methods=['GET'])
 @jwt_required
@@ -183,73 +301,118 @@ def verify_enrollment(enrollment_id):
     user = User.query.get(current_user_id)
     
     enrollment = Enrollment.query.get(enrollment_id)
+    course = Course.query.get(enrollment.course_id) if enrollment else None
+    answer = verification_precheck(user, enrollment, course)
+    if answer:
+        return jsonify(answer[0]), answer[1]
+    
+    # Answer from the local chain mirror when it has the transaction
+    mirrored = ChainEnrollment.query.filter_by(transaction_id=enrollment.transaction_id).first()
+    if mirrored:
+        return jsonify(verify_mirrored(enrollment, course, mirrored))
+    
+    # Verify on blockchain
+    try:
+        indexer_client = get_indexer_client()
+        if not indexer_client:
+            return jsonify({"error": "Unable to connect to blockchain"}), 500
+        
+        # Look up transaction
+        transaction_info = guarded_call('verify_enrollment', indexer_client.transaction, enrollment.transaction_id)
+        return jsonify(verify_indexed(enrollment, course, transaction_info))
+    
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        return jsonify({"error": "Blockchain temporarily unavailable"}), 503
+    
+    except Exception as e:
+        logger.error(f"Error verifying enrollment: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+# The verification steps are shared with the ASGI view (asgi.py), which runs
+# the same checks over an async session and an async indexer client.
+# (body, status) for the cases answered without the chain, or None when the
+# enrollment's transaction has to be looked up
+def verification_precheck(user, enrollment, course):
     if not enrollment:
-        return jsonify({"error": "Enrollment not found"}), 404
+        return {"error": "Enrollment not found"}, 404
     
     # Check permissions
     if user.role == 'student' and enrollment.student_id != user.id:
-        return jsonify({"error": "Permission denied"}), 403
+        return {"error": "Permission denied"}, 403
     
-    course = Course.query.get(enrollment.course_id)
     if not course or not course.contract_address:
-        return jsonify({"error": "Course has no blockchain contract"}), 400
+        return {"error": "Course has no blockchain contract"}, 400
     
     # If there's no transaction ID, it wasn't recorded on blockchain
     if not enrollment.transaction_id:
-        return jsonify({
+        return {
             "verified": False,
             "message": "Enrollment not verified on blockchain"
-        })
+        }, 200
     
-    # Verify on blockchain
-    try:
-        indexer_client = get_indexer_client()
-        if not indexer_client:
-            return jsonify({"error": "Unable to connect to blockchain"}), 500
+    return None
+
+def verification_failed(enrollment):
+    return {
+        "verified": False,
+        "message": "Unable to verify enrollment on blockchain",
+        "transaction_id": enrollment.transaction_id
+    }
+
+def verify_mirrored(enrollment, course, mirrored):
+    if (mirrored.asset_id == int(course.contract_address) and
+        mirrored.student_id == enrollment.student_id and
+        mirrored.course_id == enrollment.course_id):
         
-        # Look up transaction
-        transaction_info = indexer_client.transaction(enrollment.transaction_id)
+        return {
+            "verified": True,
+            "blockchain_data": {
+                "transaction_id": enrollment.transaction_id,
+                "confirmed_round": mirrored.confirmed_round,
+                "timestamp": mirrored.timestamp,
+                "fee": mirrored.fee,
+                "source": "mirror"
+            }
+        }
+    
+    return verification_failed(enrollment)
+
+# transaction_info is the indexer's answer for the enrollment's transaction ID
+def verify_indexed(enrollment, course, transaction_info):
+    # Verify transaction exists and is valid
+    if 'transaction' in transaction_info:
+        txn = transaction_info['transaction']
         
-        # Verify transaction exists and is valid
-        if 'transaction' in transaction_info:
-            txn = transaction_info['transaction']
+        # Verify this is for the right asset/course
+        if 'asset-transfer-transaction' in txn and txn['asset-transfer-transaction']['asset-id'] == int(course.contract_address):
             
-            # Verify this is for the right asset/course
-            if 'asset-transfer-transaction' in txn and txn['asset-transfer-transaction']['asset-id'] == int(course.contract_address):
-                
-                # If we have a note with enrollment data, parse and verify it
-                if 'note' in txn:
-                    try:
-                        note_bytes = base64.b64decode(txn['note'])
-                        note_json = json.loads(note_bytes)
-                        
-                        if (note_json.get('action') == 'enroll' and 
-                            int(note_json.get('student_id')) == enrollment.student_id and
-                            int(note_json.get('course_id')) == enrollment.course_id):
-                            
-                            return jsonify({
-                                "verified": True,
-                                "blockchain_data": {
-                                    "transaction_id": enrollment.transaction_id,
-                                    "confirmed_round": txn.get('confirmed-round'),
-                                    "timestamp": note_json.get('timestamp'),
-                                    "fee": txn.get('fee')
-                                }
-                            })
+            # If we have a note with enrollment data, parse and verify it
+            if 'note' in txn:
+                try:
+                    note_bytes = base64.b64decode(txn['note'])
+                    note_json = json.loads(note_bytes)
                     
-                    except Exception as e:
-                        logger.error(f"Error parsing transaction note: {str(e)}")
-        
-        # If we get here, verification failed
-        return jsonify({
-            "verified": False,
-            "message": "Unable to verify enrollment on blockchain",
-            "transaction_id": enrollment.transaction_id
-        })
+                    if (note_json.get('action') == 'enroll' and 
+                        int(note_json.get('student_id')) == enrollment.student_id and
+                        int(note_json.get('course_id')) == enrollment.course_id):
+                        
+                        return {
+                            "verified": True,
+                            "blockchain_data": {
+                                "transaction_id": enrollment.transaction_id,
+                                "confirmed_round": txn.get('confirmed-round'),
+                                "timestamp": note_json.get('timestamp'),
+                                "fee": txn.get('fee'),
+                                "source": "indexer"
+                            }
+                        }
+                
+                except Exception as e:
+                    logger.error(f"Error parsing transaction note: {str(e)}")
     
-    except Exception as e:
-        logger.error(f"Error verifying enrollment: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+    # If we get here, verification failed
+    return verification_failed(enrollment)
 
 @smart_contracts_bp.route('/course/<int:course_id>/certificate', methods=['POST'])
 @jwt_required
@@ -273,81 +436,304 @@ def generate_certificate(course_id):
     if not enrollment.grade or enrollment.grade in ['F', 'Incomplete']:
         return jsonify({"error": "Course not completed with passing grade"}), 400
     
+    private_key, admin_account = get_admin_account()
+    if not private_key:
+        return jsonify({"error": "Blockchain configuration error"}), 500
+    
+    # Minting waits for confirmation; clients may take a 202 and poll the job
+    if jobs.wants_async(request):
+        try:
+            job, _ = jobs.enqueue('certificate', {"student_id": user.id, "course_id": course.id},
+                                  user_id=user.id, idempotency_key=jobs.idempotency_key(request))
+        except jobs.JobError as e:
+            return jsonify({"error": e.message}), e.status
+        return jobs.accepted(job)
+    
     try:
-        # Get admin account
-        admin_private_key = os.environ.get("ALGORAND_ADMIN_PRIVATE_KEY")
-        if not admin_private_key:
-            logger.error("Admin private key not found in environment variables")
-            return jsonify({"error": "Blockchain configuration error"}), 500
-        
-        private_key = base64.b64decode(admin_private_key)
-        admin_account = algosdk.account.address_from_private_key(private_key)
-        
-        # Get Algorand client
-        algod_client = get_algod_client()
-        if not algod_client:
-            return jsonify({"error": "Unable to connect to blockchain"}), 500
-        
-        # Get suggested parameters for transaction
-        params = algod_client.suggested_params()
-        
-        # Create a certificate as a new asset
-        txn = AssetConfigTxn(
-            sender=admin_account,
-            sp=params,
-            total=1,  # Only one certificate per student per course
-            default_frozen=False,
-            unit_name="CERT",
-            asset_name=f"Certificate_{course.code}_{user.id}",
-            manager=admin_account,
-            reserve=admin_account,
-            freeze=admin_account,
-            clawback=admin_account,
-            url=f"https://university.edu/certificates/{course.id}/{user.id}",
-            decimals=0,
-            note=json.dumps({
-                "type": "course_certificate",
-                "student_id": user.id,
-                "student_name": user.name,
-                "course_id": course.id,
-                "course_code": course.code,
-                "course_title": course.title,
-                "grade": enrollment.grade,
-                "credits": course.credits,
-                "date_issued": datetime.datetime.utcnow().isoformat()
-            }).encode()
-        )
-        
-        # Sign transaction
-        signed_txn = txn.sign(private_key)
-        
-        # Send transaction
-        txid = algod_client.send_transaction(signed_txn)
-        logger.info(f"Certificate creation transaction ID: {txid}")
-        
-        # Wait for confirmation
-        confirmed_txn = algosdk.wait_for_confirmation(algod_client, txid, 4)
-        logger.info(f"Transaction confirmed in round: {confirmed_txn['confirmed-round']}")
-        
-        # Get asset ID
-        asset_id = confirmed_txn["asset-index"]
-        logger.info(f"Certificate Asset ID: {asset_id}")
+        certificate = certificates.issue_enrollment(get_algod_client(), get_indexer_client(), private_key,
+                                                    admin_account, user, course, enrollment)
         
         return jsonify({
             "message": "Course certificate generated successfully",
-            "certificate": {
-                "asset_id": asset_id,
-                "transaction_id": txid,
-                "student_id": user.id,
-                "student_name": user.name,
-                "course_code": course.code,
-                "course_title": course.title,
-                "grade": enrollment.grade,
-                "date_issued": datetime.datetime.utcnow().isoformat()
-            }
+            "certificate": serialize_certificate(user, course, certificate)
         })
     
+    except CircuitOpenError as e:
+        logger.warning(str(e))
+        return jsonify({"error": "Blockchain temporarily unavailable"}), 503
+    
+    except certificates.CertificateError as e:
+        return jsonify({"error": e.message}), e.status
+    
     except Exception as e:
         logger.error(f"Error generating certificate: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+def serialize_certificate(user, course, certificate):
+    return {
+        "asset_id": certificate.asset_id,
+        "transaction_id": certificate.transaction_id,
+        "student_id": user.id,
+        "student_name": user.name,
+        "course_code": course.code,
+        "course_title": course.title,
+        "grade": certificate.grade,
+        "date_issued": certificate.issued_at.isoformat()
+    }
+
+# Background version of generate_certificate. The checks are repeated since
+# the grade may have changed while the job was queued; network errors and an
+# open circuit are raised so the runner retries with backoff.
+@jobs.register('certificate')
+def certificate_job(context, payload):
+    user = User.query.get(payload["student_id"])
+    course = Course.query.get(payload["course_id"])
+    enrollment = Enrollment.query.filter_by(student_id=payload["student_id"], course_id=payload["course_id"]).first()
+    if not user or not course or not enrollment:
+        raise jobs.PermanentJobError("Enrollment no longer exists")
+    if not enrollment.grade or enrollment.grade in ['F', 'Incomplete']:
+        raise jobs.PermanentJobError("Course not completed with passing grade")
+    
+    private_key, admin_account = get_admin_account()
+    if not private_key:
+        raise jobs.PermanentJobError("Blockchain configuration error")
+    
+    context.progress(0, 1, "Minting certificate")
+    certificate = certificates.issue_enrollment(get_algod_client(), get_indexer_client(), private_key,
+                                                admin_account, user, course, enrollment)
+    return serialize_certificate(user, course, certificate)
+
+# The course's instructor or an admin
+def can_manage_course(user, course):
+    return user.role == 'admin' or (user.role == 'professor' and course.instructor_id == user.id)
+
+@smart_contracts_bp.route('/course/<int:course_id>/certificates', methods=['POST'])
+@jwt_required
+def issue_course_certificates(course_id):
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({"error": "Course not found"}), 404
+    
+    if not can_manage_course(user, course):
+        return jsonify({"error": "Permission denied"}), 403
+    
+    private_key, admin_account = get_admin_account()
+    if not private_key:
+        return jsonify({"error": "Blockchain configuration error"}), 500
+    
+    # One run per course at a time; asking again returns the run in progress
+    payload = {"course_id": course.id}
+    active = Job.query.filter(Job.kind == 'course_certificates', Job.payload == json.dumps(payload, sort_keys=True),
+                              Job.status.in_(('queued', 'running'))).first()
+    if active:
+        return jobs.accepted(active)
+    
+    # A new run gives certificates that failed before another chance
+    certificates.retry_failed(course.id)
+    try:
+        job, _ = jobs.enqueue('course_certificates', payload, user_id=user.id,
+                              idempotency_key=jobs.idempotency_key(request))
+    except jobs.JobError as e:
+        return jsonify({"error": e.message}), e.status
+    return jobs.accepted(job)
+
+@smart_contracts_bp.route('/course/<int:course_id>/certificates', methods=['GET'])
+@jwt_required
+def get_course_certificates(course_id):
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    course = Course.query.get(course_id)
+    if not course:
+        return jsonify({"error": "Course not found"}), 404
+    
+    if not can_manage_course(user, course):
+        return jsonify({"error": "Permission denied"}), 403
+    
+    query = db.session.query(Certificate, User.name).join(User, User.id == Certificate.student_id) \
+        .filter(Certificate.course_id == course.id)
+    status = request.args.get('status')
+    if status:
+        query = query.filter(Certificate.status == status)
+    
+    return jsonify({
+        "course_id": course.id,
+        "summary": certificates.course_summary(course.id),
+        "certificates": [certificates.serialize_certificate(certificate, name)
+                         for certificate, name in query.order_by(Certificate.id).all()]
+    })
+
+# Certificates for every passing enrollment in a course, resuming where an
+# earlier attempt stopped
+@jobs.register('course_certificates')
+def course_certificates_job(context, payload):
+    course = Course.query.get(payload["course_id"])
+    if not course:
+        raise jobs.PermanentJobError("Course no longer exists")
+    
+    private_key, admin_account = get_admin_account()
+    if not private_key:
+        raise jobs.PermanentJobError("Blockchain configuration error")
+    
+    return certificates.issue_course(get_algod_client(), get_indexer_client(), private_key, admin_account,
+                                     course, progress=context.progress)
+
+# Background version of create_course_contract, queued by course creation.
+# Skips courses that already have a contract, so a retry never mints twice
+# once the address is stored.
+@jobs.register('course_contract')
+def course_contract_job(context, payload):
+    course = Course.query.get(payload["course_id"])
+    if not course:
+        raise jobs.PermanentJobError("Course no longer exists")
+    if course.contract_address:
+        return {"course_id": course.id, "contract_address": course.contract_address}
+    
+    private_key, admin_account = get_admin_account()
+    if not private_key:
+        raise jobs.PermanentJobError("Blockchain configuration error")
+    
+    context.progress(0, 1, "Creating course asset")
+    course.contract_address = _create_course_contract(course, private_key, admin_account)
+    db.session.commit()
+    return {"course_id": course.id, "contract_address": course.contract_address}
+
+# Certificate as recorded on chain, from the local mirror
+@smart_contracts_bp.route('/certificates/<int:asset_id>', methods=['GET'])
+@jwt_required
+def get_chain_certificate(asset_id):
+    certificate = ChainCertificate.query.filter_by(asset_id=asset_id).first()
+    if not certificate:
+        return jsonify({"error": "Certificate not found"}), 404
+    
+    return jsonify(chain_mirror.serialize_chain_certificate(certificate))
+
+@smart_contracts_bp.route('/students/<int:student_id>/certificates', methods=['GET'])
+@jwt_required
+def get_student_chain_certificates(student_id):
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    # Students can only list their own certificates
+    if user.role == 'student' and user.id != student_id:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    rows = ChainCertificate.query.filter_by(student_id=student_id).order_by(ChainCertificate.confirmed_round).all()
+    return jsonify([chain_mirror.serialize_chain_certificate(certificate) for certificate in rows])
+
+@smart_contracts_bp.route('/mirror', methods=['GET'])
+@jwt_required
+def get_mirror_status():
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if user.role != 'admin':
+        return jsonify({"error": "Permission denied"}), 403
+    
+    _, admin_account = get_admin_account()
+    if not admin_account:
+        return jsonify({"error": "Blockchain configuration error"}), 500
+    
+    return jsonify(chain_mirror.mirror_status(admin_account))
+
+@smart_contracts_bp.route('/mirror/sync', methods=['POST'])
+@jwt_required
+def sync_mirror():
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if user.role != 'admin':
+        return jsonify({"error": "Permission denied"}), 403
+    
+    _, admin_account = get_admin_account()
+    if not admin_account:
+        return jsonify({"error": "Blockchain configuration error"}), 500
+    
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    
+    try:
+        workers = int(data.get('workers', 1))
+    except (TypeError, ValueError):
+        return jsonify({"error": "workers must be an integer"}), 400
+    
+    from_round = data.get('from_round')
+    if from_round is not None:
+        try:
+            from_round = int(from_round)
+        except (TypeError, ValueError):
+            return jsonify({"error": "from_round must be an integer"}), 400
+        if from_round < 0:
+            return jsonify({"error": "from_round must not be negative"}), 400
+    
+    # One sync at a time; asking again returns the one in progress
+    active = Job.query.filter(Job.kind == 'chain_sync', Job.status.in_(('queued', 'running'))).first()
+    if active:
+        return jobs.accepted(active)
+    
+    payload = {"workers": max(1, min(workers, 32)), "from_round": from_round}
+    try:
+        job, _ = jobs.enqueue('chain_sync', payload, user_id=user.id, idempotency_key=jobs.idempotency_key(request))
+    except jobs.JobError as e:
+        return jsonify({"error": e.message}), e.status
+    return jobs.accepted(job)
+
+@jobs.register('chain_sync')
+def chain_sync_job(context, payload):
+    _, admin_account = get_admin_account()
+    indexer_client = get_indexer_client()
+    if not admin_account or not indexer_client:
+        raise jobs.PermanentJobError("Blockchain configuration error")
+    
+    return chain_mirror.sync(indexer_client, admin_account, workers=payload.get("workers", 1),
+                             from_round=payload.get("from_round"), progress=context.progress)
+
+# Match the admin account's course assets with the courses table; see
+# course_contracts.sweep. With create_missing, courses still without a
+# contract afterwards get a contract job each.
+@smart_contracts_bp.route('/contracts/sweep', methods=['POST'])
+@jwt_required
+def sweep_contracts():
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if user.role != 'admin':
+        return jsonify({"error": "Permission denied"}), 403
+    
+    _, admin_account = get_admin_account()
+    if not admin_account:
+        return jsonify({"error": "Blockchain configuration error"}), 500
+    
+    # One sweep at a time; asking again returns the one in progress
+    active = Job.query.filter(Job.kind == 'course_contract_sweep', Job.status.in_(('queued', 'running'))).first()
+    if active:
+        return jobs.accepted(active)
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        job, _ = jobs.enqueue('course_contract_sweep', {"create_missing": bool(data.get('create_missing', False))},
+                              user_id=user.id, idempotency_key=jobs.idempotency_key(request))
+    except jobs.JobError as e:
+        return jsonify({"error": e.message}), e.status
+    return jobs.accepted(job)
+
+@jobs.register('course_contract_sweep')
+def course_contract_sweep_job(context, payload):
+    _, admin_account = get_admin_account()
+    indexer_client = get_indexer_client()
+    if not admin_account or not indexer_client:
+        raise jobs.PermanentJobError("Blockchain configuration error")
+    
+    context.progress(0, 1, "Scanning course assets")
+    report = course_contracts.sweep(indexer_client, admin_account)
+    if payload.get("create_missing"):
+        # Courses whose contract job is still pending are left to it
+        pending = {json.loads(encoded)["course_id"] for (encoded,) in db.session.query(Job.payload).filter(
+            Job.kind == 'course_contract', Job.status.in_(('queued', 'running')))}
+        report["queued"] = [jobs.enqueue('course_contract', {"course_id": course_id})[0].id
+                            for course_id in report["missing"] if course_id not in pending]
+    return report
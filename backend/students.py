@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
-from models import db, User, Course, Enrollment, Assignment, Submission, Grade
+from models import db, User, Course, Enrollment, Assignment, Submission, Grade, TranscriptTerm, UploadSession
 from auth import jwt_required, get_jwt_identity
+from serializers import STUDENT, json_response
+from transcripts import get_transcript, serialize_term
+import uploads
 
 students_bp = Blueprint('students', __name__)
 
@@ -18,27 +21,16 @@ def get_students():
     year = request.args.get('year')
     
     # Build query
-    query = User.query.filter_by(role='student')
+    query = STUDENT.select().where(User.role == 'student')
     
     if major:
-        query = query.filter_by(major=major)
+        query = query.where(User.major == major)
     if year:
-        query = query.filter_by(year=int(year))
+        query = query.where(User.year == int(year))
     
-    students = query.all()
+    rows = db.session.execute(query)
     
-    result = []
-    for student in students:
-        result.append({
-            "id": student.id,
-            "name": student.name,
-            "email": student.email,
-            "student_id": student.student_id,
-            "major": student.major,
-            "year": student.year
-        })
-    
-    return jsonify(result)
+    return json_response(STUDENT.rows(rows))
 
 @students_bp.route('/<int:student_id>', methods=['GET'])
 @jwt_required
@@ -212,9 +204,41 @@ def submit_assignment(student_id):
     if not data or 'assignment_id' not in data:
         return jsonify({"error": "Assignment ID is required"}), 400
     
-    assignment = Assignment.query.get(data['assignment_id'])
+    assignment, error = submission_target(student_id, data['assignment_id'])
+    if error:
+        return error
+    
+    # Create submission
+    new_submission = Submission(
+        assignment_id=assignment.id,
+        student_id=student_id,
+        content=data.get('content', ''),
+        file_path=data.get('file_path')
+    )
+    
+    db.session.add(new_submission)
+    
+    try:
+        db.session.commit()
+        return jsonify({
+            "message": "Assignment submitted successfully",
+            "submission": {
+                "id": new_submission.id,
+                "assignment_id": new_submission.assignment_id,
+                "submitted_at": new_submission.submitted_at.isoformat()
+            }
+        }), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+# The assignment a student may submit to, or an error response: the
+# assignment must exist, the student must be enrolled and not have submitted yet
+def submission_target(student_id, assignment_id):
+    assignment = Assignment.query.get(assignment_id)
     if not assignment:
-        return jsonify({"error": "Assignment not found"}), 404
+        return None, (jsonify({"error": "Assignment not found"}), 404)
     
     # Check if student is enrolled in the course
     enrollment = Enrollment.query.filter_by(
@@ -223,7 +247,7 @@ def submit_assignment(student_id):
     ).first()
     
     if not enrollment:
-        return jsonify({"error": "Not enrolled in this course"}), 403
+        return None, (jsonify({"error": "Not enrolled in this course"}), 403)
     
     # Check if assignment is already submitted
     existing_submission = Submission.query.filter_by(
@@ -232,14 +256,66 @@ def submit_assignment(student_id):
     ).first()
     
     if existing_submission:
-        return jsonify({"error": "Assignment already submitted"}), 409
+        return None, (jsonify({"error": "Assignment already submitted"}), 409)
     
-    # Create submission
+    return assignment, None
+
+def serialize_file_submission(submission):
+    return {
+        "id": submission.id,
+        "assignment_id": submission.assignment_id,
+        "file_name": submission.file_name,
+        "content_type": submission.content_type,
+        "file_size": submission.file_size,
+        "content_hash": submission.content_hash,
+        "submitted_at": submission.submitted_at.isoformat()
+    }
+
+# One-shot upload: multipart/form-data with an assignment_id field (or query
+# parameter) and one file part. The file is streamed to disk in chunks and
+# hashed on the way (uploads.py); only its metadata and hash are stored here.
+@students_bp.route('/<int:student_id>/submissions/upload', methods=['POST'])
+@jwt_required
+def upload_submission(student_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Students can only submit their own assignments
+    if current_user.role != 'student' or current_user.id != student_id:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    # Checking up front, when possible, saves receiving a file that will be refused
+    assignment_id = request.args.get('assignment_id', type=int)
+    if assignment_id is not None:
+        _, error = submission_target(student_id, assignment_id)
+        if error:
+            return error
+    
+    try:
+        upload = uploads.receive_multipart(request)
+    except uploads.UploadError as e:
+        return jsonify(e.payload()), e.status
+    
+    if assignment_id is None:
+        try:
+            assignment_id = int(upload["fields"].get('assignment_id', ''))
+        except ValueError:
+            uploads.discard(upload["path"])
+            return jsonify({"error": "Assignment ID is required"}), 400
+    
+    assignment, error = submission_target(student_id, assignment_id)
+    if error:
+        uploads.discard(upload["path"])
+        return error
+    
+    uploads.store_object(upload["path"], upload["content_hash"])
     new_submission = Submission(
         assignment_id=assignment.id,
         student_id=student_id,
-        content=data.get('content', ''),
-        file_path=data.get('file_path')
+        file_name=upload["file_name"],
+        content_type=upload["content_type"],
+        file_size=upload["size"],
+        content_hash=upload["content_hash"]
     )
     
     db.session.add(new_submission)
@@ -248,11 +324,102 @@ def submit_assignment(student_id):
         db.session.commit()
         return jsonify({
             "message": "Assignment submitted successfully",
-            "submission": {
-                "id": new_submission.id,
-                "assignment_id": new_submission.assignment_id,
-                "submitted_at": new_submission.submitted_at.isoformat()
-            }
+            "submission": serialize_file_submission(new_submission)
+        }), 201
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+# Resumable upload: POST creates a session for a file of known size, then the
+# client PATCHes the raw bytes in any number of requests, each starting at the
+# offset the server has (Upload-Offset header). GET reports that offset after
+# a dropped connection. The submission is created with the last byte.
+@students_bp.route('/<int:student_id>/submissions/uploads', methods=['POST'])
+@jwt_required
+def create_upload(student_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    if current_user.role != 'student' or current_user.id != student_id:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    data = request.get_json()
+    
+    if not data or 'assignment_id' not in data or 'size' not in data:
+        return jsonify({"error": "assignment_id and size are required"}), 400
+    
+    assignment, error = submission_target(student_id, data['assignment_id'])
+    if error:
+        return error
+    
+    try:
+        upload = uploads.create_session(student_id, assignment.id, data.get('file_name'), data['size'],
+                                        data.get('content_type'))
+        db.session.commit()
+    except uploads.UploadError as e:
+        db.session.rollback()
+        return jsonify(e.payload()), e.status
+    
+    return jsonify({"upload": uploads.serialize_session(upload)}), 201
+
+@students_bp.route('/<int:student_id>/submissions/uploads/<upload_id>', methods=['GET', 'PATCH', 'DELETE'])
+@jwt_required
+def upload_session(student_id, upload_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    if current_user.role != 'student' or current_user.id != student_id:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    upload = UploadSession.query.filter_by(id=upload_id, student_id=student_id).first()
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+    
+    if request.method == 'GET':
+        return jsonify({"upload": uploads.serialize_session(upload)})
+    
+    if request.method == 'DELETE':
+        uploads.abort_session(upload)
+        db.session.commit()
+        return jsonify({"upload": uploads.serialize_session(upload)})
+    
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        return jsonify({"error": "Upload-Offset header is required"}), 400
+    
+    try:
+        uploads.append_chunk(upload, offset, request.stream)
+    except uploads.UploadError as e:
+        db.session.rollback()
+        return jsonify(e.payload()), e.status
+    
+    if upload.status != 'completed':
+        db.session.commit()
+        return jsonify({"upload": uploads.serialize_session(upload)})
+    
+    assignment, error = submission_target(student_id, upload.assignment_id)
+    if error:
+        db.session.commit()
+        return error
+    
+    new_submission = Submission(
+        assignment_id=assignment.id,
+        student_id=student_id,
+        file_name=upload.file_name,
+        content_type=upload.content_type,
+        file_size=upload.size,
+        content_hash=upload.content_hash
+    )
+    
+    db.session.add(new_submission)
+    
+    try:
+        db.session.commit()
+        return jsonify({
+            "message": "Assignment submitted successfully",
+            "upload": uploads.serialize_session(upload),
+            "submission": serialize_file_submission(new_submission)
         }), 201
     
     except Exception as e:
@@ -327,6 +494,73 @@ def get_student_grades(student_id):
     
     return jsonify(result)
 
+@students_bp.route('/<int:student_id>/transcript', methods=['GET'])
+@jwt_required
+def get_student_transcript(student_id):
+    current_user_id = get_jwt_identity()
+    current_user = User.query.get(current_user_id)
+    
+    # Students can only view their own transcript
+    if current_user.role == 'student' and current_user.id != student_id:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    student = User.query.filter_by(id=student_id, role='student').first()
+    if not student:
+        return jsonify({"error": "Student not found"}), 404
+    
+    # Materialized per-term rows (transcripts.py), already in term order
+    terms = [serialize_term(row) for row in get_transcript(student.id)]
+    latest = terms[-1] if terms else None
+    
+    return jsonify({
+        "student_id": student.id,
+        "name": student.name,
+        "cumulative_gpa": latest["cumulative_gpa"] if latest else None,
+        "credits_attempted": latest["cumulative_credits_attempted"] if latest else 0,
+        "credits_earned": latest["cumulative_credits_earned"] if latest else 0,
+        "terms": terms
+    })
+
+@students_bp.route('/deans-list', methods=['GET'])
+@jwt_required
+def get_deans_list():
+    current_user_id = get_jwt_identity()
+    user = User.query.get(current_user_id)
+    
+    if not user or user.role not in ['professor', 'admin']:
+        return jsonify({"error": "Permission denied"}), 403
+    
+    term = request.args.get('term')
+    year = request.args.get('year', type=int)
+    if not term or year is None:
+        return jsonify({"error": "term and year are required"}), 400
+    
+    min_gpa = request.args.get('min_gpa', 3.5, type=float)
+    min_credits = request.args.get('min_credits', 12, type=int)
+    
+    # Single range read on (year, term, term_gpa)
+    rows = db.session.query(TranscriptTerm, User.name, User.student_id) \
+        .join(User, User.id == TranscriptTerm.student_id) \
+        .filter(TranscriptTerm.year == year, TranscriptTerm.term == term,
+                TranscriptTerm.term_gpa >= min_gpa, TranscriptTerm.gpa_credits >= min_credits) \
+        .order_by(TranscriptTerm.term_gpa.desc(), TranscriptTerm.student_id) \
+        .all()
+    
+    return jsonify({
+        "term": term,
+        "year": year,
+        "min_gpa": min_gpa,
+        "min_credits": min_credits,
+        "students": [{
+            "id": row.student_id,
+            "name": name,
+            "student_id": student_number,
+            "term_gpa": row.term_gpa,
+            "credits": row.gpa_credits,
+            "cumulative_gpa": row.cumulative_gpa
+        } for row, name, student_number in rows]
+    })
+
 def get_letter_grade(percentage):
     if percentage >= 90:
         return "A"
@@ -0,0 +1,244 @@
+import time
+import logging
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, current_app, g, request, jsonify, has_app_context
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from sqlalchemy import select, func
+from models import db, User, Course, Enrollment, Grade
+from db_routing import tenant_bind_key
+from database import upgrade_schema
+from auth import jwt, jwt_required, get_jwt_identity
+
+tenants_bp = Blueprint('tenants', __name__)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class TenantError(Exception):
+    def __init__(self, message, status=403):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+# The institution the current app context serves, or None for the default
+# database
+def current_tenant():
+    return g.get('tenant') if has_app_context() else None
+
+
+# Every institution: None (the default database) first, then TENANT_DATABASE_URLS
+def all_tenants(app):
+    return [None] + sorted(app.config['TENANT_DATABASE_URLS'])
+
+
+def tenant_name(app, tenant):
+    return tenant or app.config['TENANT_DEFAULT_NAME']
+
+
+# The current institution's primary engine, for code that bypasses the
+# session (DDL, raw connections)
+def primary_engine():
+    tenant = current_tenant()
+    return db.engines[tenant_bind_key(tenant)] if tenant else db.engine
+
+
+# An app context serving one institution. The Flask-SQLAlchemy session is
+# per app context, so it never carries connections from another tenant.
+@contextlib.contextmanager
+def tenant_context(app, tenant):
+    with app.app_context():
+        g.tenant = tenant
+        yield
+
+
+# The tenant a request is for. claims is the decoded token, or None without
+# a valid one (the view's own jwt_required then answers it). A token names its
+# institution in TENANT_CLAIM (no claim: the default database); without a
+# token, TENANT_HOSTS maps the Host header to one. A token used on another
+# institution's host is refused, since user ids repeat across databases.
+def choose_tenant(config, host, claims):
+    host_tenant = config['TENANT_HOSTS'].get(host.split(':', 1)[0].lower()) if host else None
+    if claims is None:
+        return host_tenant
+
+    tenant = claims.get(config['TENANT_CLAIM'])
+    if tenant is not None and tenant not in config['TENANT_DATABASE_URLS']:
+        raise TenantError("Unknown institution", 401)
+    if host_tenant is not None and host_tenant != tenant:
+        raise TenantError("Token was issued for another institution")
+    return tenant
+
+
+def _request_claims():
+    try:
+        verify_jwt_in_request(optional=True, locations=['headers', 'query_string'])
+        return get_jwt() or None
+    except Exception:
+        return None
+
+
+# Create missing tables, and upgrade existing ones, in every institution's database
+def create_all(app):
+    with app.app_context():
+        for tenant in all_tenants(app):
+            engine = db.engines[tenant_bind_key(tenant)] if tenant else db.engine
+            db.metadata.create_all(engine)
+            upgrade_schema(engine, db.metadata)
+
+
+# Route each request to its institution's database (see choose_tenant). The
+# binds themselves are set up by database.init_database; without
+# TENANT_DATABASE_URLS everything stays on the default database.
+def init_tenancy(app):
+    app.config.setdefault('TENANT_DATABASE_URLS', {})
+    app.config.setdefault('TENANT_HOSTS', {})
+    app.config.setdefault('TENANT_CLAIM', 'tenant')
+    app.config.setdefault('TENANT_DEFAULT_NAME', 'default')
+    app.config.setdefault('TENANT_FANOUT_WORKERS', 8)
+
+    unknown = set(app.config['TENANT_HOSTS'].values()) - set(app.config['TENANT_DATABASE_URLS'])
+    if unknown:
+        raise ValueError(f"TENANT_HOSTS names unknown tenants {sorted(unknown)}, "
+                         f"expected some of {sorted(app.config['TENANT_DATABASE_URLS'])}")
+    app.config['TENANT_HOSTS'] = {host.lower(): tenant for host, tenant in app.config['TENANT_HOSTS'].items()}
+
+    # Tokens carry the institution they were issued for
+    @jwt.additional_claims_loader
+    def tenant_claim(identity):
+        tenant = current_tenant()
+        return {app.config['TENANT_CLAIM']: tenant} if tenant else {}
+
+    if not app.config['TENANT_DATABASE_URLS']:
+        return
+
+    @app.before_request
+    def choose_tenant_database():
+        try:
+            g.tenant = choose_tenant(app.config, request.host, _request_claims())
+        except TenantError as e:
+            return jsonify({"error": e.message}), e.status
+
+    logger.info(f"Tenants: {', '.join(sorted(app.config['TENANT_DATABASE_URLS']))}")
+
+
+def _run_in_tenant(app, tenant, func, args):
+    started = time.perf_counter()
+    with tenant_context(app, tenant):
+        result = func(*args)
+    return result, round((time.perf_counter() - started) * 1000, 1)
+
+
+# Run func(*args) for every institution at once, each on its own thread and
+# connection, so a report costs the slowest database rather than the sum.
+# Returns [(tenant, result, elapsed ms, error)]; a failing database yields
+# its error instead of failing the whole report.
+def fan_out(app, func, *args):
+    tenants = all_tenants(app)
+    outcomes = []
+    with ThreadPoolExecutor(max_workers=min(len(tenants), app.config['TENANT_FANOUT_WORKERS']),
+                            thread_name_prefix='tenant-fanout') as pool:
+        futures = [(tenant, pool.submit(_run_in_tenant, app, tenant, func, args)) for tenant in tenants]
+        for tenant, future in futures:
+            try:
+                result, elapsed = future.result()
+                outcomes.append((tenant, result, elapsed, None))
+            except Exception as e:
+                logger.error(f"Error reading tenant {tenant_name(app, tenant)}: {str(e)}")
+                outcomes.append((tenant, None, None, str(e)))
+    return outcomes
+
+
+def _count(column, *criteria):
+    return select(func.count(column)).where(*criteria).scalar_subquery()
+
+
+# Row counts of one institution's database, in one query
+def tenant_summary():
+    row = db.session.execute(select(
+        _count(Course.id),
+        _count(User.id, User.role == 'student'),
+        _count(User.id, User.role == 'professor'),
+        _count(Enrollment.id),
+        _count(Grade.id)
+    )).one()
+    return dict(zip(('courses', 'students', 'professors', 'enrollments', 'grades'), row))
+
+
+# Cross-institution reports are for admins of the default database, which
+# the deployment itself runs; a campus admin only sees their own campus
+def _platform_admin():
+    if current_tenant() is not None:
+        return False
+    user = db.session.get(User, get_jwt_identity())
+    return user is not None and user.role == 'admin'
+
+
+def _report(app, outcomes, fields):
+    tenants = []
+    for tenant, result, elapsed, error in outcomes:
+        entry = {"tenant": tenant_name(app, tenant)}
+        entry.update({"error": error} if error else {**fields(result), "elapsed_ms": elapsed})
+        tenants.append(entry)
+    return tenants
+
+
+# Row counts per institution and in total: /api/tenants/summary
+@tenants_bp.route('/summary', methods=['GET'])
+@jwt_required
+def get_tenants_summary():
+    if not _platform_admin():
+        return jsonify({"error": "Permission denied"}), 403
+
+    app = current_app._get_current_object()
+    started = time.perf_counter()
+    outcomes = fan_out(app, tenant_summary)
+    totals = {}
+    for _, result, _, error in outcomes:
+        for key, value in (result or {}).items():
+            totals[key] = totals.get(key, 0) + value
+
+    return jsonify({
+        "tenants": _report(app, outcomes, lambda result: result),
+        "totals": totals,
+        "complete": all(error is None for _, _, _, error in outcomes),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    })
+
+
+# Term analytics per institution and combined across all of them:
+# /api/tenants/terms?term=Fall&year=2024[&department=Physics]
+@tenants_bp.route('/terms', methods=['GET'])
+@jwt_required
+def get_tenants_term_analytics():
+    if not _platform_admin():
+        return jsonify({"error": "Permission denied"}), 403
+
+    app = current_app._get_current_object()
+    if 'analytics' not in app.config['FEATURES']:
+        return jsonify({"error": "Not found", "message": "The requested resource does not exist"}), 404
+    import analytics
+
+    term = request.args.get('term')
+    year = request.args.get('year', type=int)
+    department = request.args.get('department')
+    if not term or year is None:
+        return jsonify({"error": "term and year are required"}), 400
+
+    def term_summaries():
+        courses, statistics = analytics.term_statistics(term, year, department)
+        return [statistics[c.id] for c in courses if c.id in statistics]
+
+    started = time.perf_counter()
+    outcomes = fan_out(app, term_summaries)
+    return jsonify({
+        "term": term,
+        "year": year,
+        "department": department,
+        "tenants": _report(app, outcomes, lambda summaries: {"summary": analytics.combine(summaries)}),
+        "summary": analytics.combine([s for _, summaries, _, _ in outcomes for s in summaries or []]),
+        "complete": all(error is None for _, _, _, error in outcomes),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    })
@@ -0,0 +1,21 @@
+import os
+import sys
+import pytest
+
+# The backend is a flat set of modules, imported the way app.py imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# An app on fresh SQLite files under a temp dir. Background job threads are
+# off so they never touch the database behind a test's back.
+def build_app(directory, **config):
+    from app import create_app
+    config.setdefault('SQLALCHEMY_DATABASE_URI', f"sqlite:///{os.path.join(directory, 'primary.db')}")
+    config.setdefault('UPLOAD_FOLDER', os.path.join(directory, 'uploads'))
+    config.setdefault('JOB_WORKERS', 0)
+    return create_app(config)
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    return lambda **config: build_app(str(tmp_path), **config)
@@ -0,0 +1,119 @@
+# Grade analytics (analytics.py): the NumPy and pure-Python paths give the
+# same statistics, including the awkward courses (no assignments, nobody
+# enrolled, dropped students with grades, letter overrides), and cached
+# statistics are recomputed once a grade changes.
+import random
+import datetime
+import pytest
+from flask_jwt_extended import create_access_token
+from models import db, User, Course, Enrollment, Assignment, Grade
+from tenancy import create_all
+import analytics
+
+STUDENTS = 60
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    create_all(app)
+    rng = random.Random(38)
+    due = datetime.datetime(2024, 12, 1)
+    with app.app_context():
+        db.session.add(User(id=1000, email='professor@university.edu', password_hash='x', name='Professor',
+                            role='professor', department='Computer Science'))
+        db.session.add(User(id=1001, email='other@university.edu', password_hash='x', name='Other',
+                            role='professor', department='Physics'))
+        for student_id in range(1, STUDENTS + 1):
+            db.session.add(User(id=student_id, email=f"student{student_id}@university.edu", password_hash='x',
+                                name=f"Student {student_id}", role='student'))
+        # 1: a full course, 2: no assignments yet, 3: nobody enrolled, 4: a zero-point assignment
+        for course_id in (1, 2, 3, 4):
+            db.session.add(Course(id=course_id, code=f"CS10{course_id}", title=f"Course {course_id}", credits=3,
+                                  capacity=STUDENTS, term='Fall', year=2024, department='Computer Science', fee=0,
+                                  instructor_id=1000))
+        assignments = [(1, 1, 100, 0.5), (2, 1, 40, 0.3), (3, 1, 10, 0.2), (4, 3, 100, 1.0),
+                       (5, 4, 0, 0.1), (6, 4, 20, 0.9)]
+        for assignment_id, course_id, points, weight in assignments:
+            db.session.add(Assignment(id=assignment_id, course_id=course_id, title=f"Assignment {assignment_id}",
+                                      due_date=due, points=points, weight=weight))
+        for student_id in range(1, STUDENTS + 1):
+            for course_id in (1, 2, 4):
+                status = 'dropped' if student_id % 10 == 0 else 'enrolled'
+                grade = 'Incomplete' if student_id == 7 and course_id == 1 else None
+                db.session.add(Enrollment(student_id=student_id, course_id=course_id, status=status, grade=grade))
+            for assignment_id, course_id, points, _ in assignments:
+                if course_id != 3 and rng.random() < 0.85:
+                    db.session.add(Grade(student_id=student_id, assignment_id=assignment_id,
+                                         score=round(rng.uniform(0, points), 1)))
+        db.session.commit()
+    analytics.cache.clear()
+    yield app
+    analytics.cache.clear()
+
+
+def test_numpy_and_python_paths_agree(app):
+    if analytics.np is None:
+        pytest.skip("NumPy is not installed")
+    with app.app_context():
+        vectorized = analytics.compute([1, 2, 3, 4], use_numpy=True)
+        plain = analytics.compute([1, 2, 3, 4], use_numpy=False)
+    assert vectorized == plain
+
+    full, _ = plain[1]
+    # Dropped students are left out even though they have grades
+    assert full["students"] == STUDENTS - STUDENTS // 10
+    assert full["letter_grades"]["Incomplete"] == 1
+    assert sum(full["letter_grades"].values()) == full["students"]
+    assert sum(full["distribution"]) == full["graded_students"] == full["students"]
+
+    no_assignments, percentages = plain[2]
+    assert (no_assignments["graded_students"], no_assignments["average_percentage"], percentages) == (0, None, [])
+    empty, _ = plain[3]
+    assert (empty["students"], empty["assignments"][0]["completion_rate"]) == (0, None)
+    zero_points, _ = plain[4]
+    assert zero_points["assignments"][0]["mean_percentage"] == 0
+
+
+def test_percentile_matches_numpy():
+    if analytics.np is None:
+        pytest.skip("NumPy is not installed")
+    rng = random.Random(1)
+    for size in (1, 2, 7, 100):
+        values = sorted(rng.uniform(0, 100) for _ in range(size))
+        for q in analytics.PERCENTILES:
+            assert analytics.percentile(values, q) == pytest.approx(float(analytics.np.percentile(values, q)))
+    assert analytics.percentile([], 50) is None
+
+
+def test_statistics_are_cached_until_a_grade_changes(app):
+    with app.app_context():
+        token = create_access_token(identity=1000)
+        outsider = create_access_token(identity=1001)
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    first = client.get('/api/analytics/courses/1', headers=headers).get_json()
+    misses = analytics.cache.misses
+    assert client.get('/api/analytics/courses/1', headers=headers).get_json() == first
+    assert analytics.cache.misses == misses
+
+    with app.app_context():
+        grade = Grade.query.filter_by(assignment_id=1).order_by(Grade.id).first()
+        grade.score = 100 if grade.score < 50 else 0
+        grade.graded_at = datetime.datetime.utcnow()
+        db.session.commit()
+    changed = client.get('/api/analytics/courses/1', headers=headers).get_json()
+    assert analytics.cache.misses == misses + 1
+    assert changed["average_percentage"] != first["average_percentage"]
+
+    term = client.get('/api/analytics/terms?term=Fall&year=2024&department=Computer+Science',
+                      headers=headers).get_json()
+    assert [course["code"] for course in term["courses"]] == ['CS101', 'CS102', 'CS103', 'CS104']
+    assert term["summary"]["courses"] == 4
+
+    # Another department's professor sees neither
+    other = {"Authorization": f"Bearer {outsider}"}
+    assert client.get('/api/analytics/courses/1', headers=other).status_code == 403
+    assert client.get('/api/analytics/terms?term=Fall&year=2024&department=Computer+Science',
+                      headers=other).status_code == 403
@@ -0,0 +1,206 @@
+# The async serving path (asgi.py, chain_async.py): enrollment and its
+# verification run as coroutines on the async database session, reaching
+# algod and the indexer over HTTP through aiohttp. The chain is
+# benchmarks/chain_http.py served by uvicorn on the test's own event loop;
+# the ASGI app is called directly, the way a server would.
+import json
+import base64
+import asyncio
+import pytest
+import uvicorn
+from algosdk import account
+from flask_jwt_extended import create_access_token
+from benchmarks.fake_algod import FakeAlgod, FakeIndexer
+from benchmarks.server_bench import free_port
+from benchmarks import chain_http
+from chain_guard import CircuitBreaker, ChainMetrics
+from models import db, User, Course, Enrollment, ChainEnrollment
+from tenancy import create_all
+import chain_guard
+
+ASSET_ID = 100000
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    monkeypatch.setattr(chain_guard, 'breaker', CircuitBreaker(failure_threshold=5, reset_timeout=60))
+    monkeypatch.setattr(chain_guard, 'metrics', ChainMetrics())
+    algod = FakeAlgod()
+    monkeypatch.setattr(chain_http, 'algod', algod)
+    monkeypatch.setattr(chain_http, 'indexer', FakeIndexer(algod))
+    monkeypatch.setattr(chain_http, 'block', asyncio.Event())
+    monkeypatch.setattr(chain_http, 'ROUND_SECONDS', 0.01)
+    monkeypatch.setattr(chain_http, 'CHAIN_SECONDS', 0)
+    chain_http.reset_stats()
+
+    port = free_port()
+    monkeypatch.setenv('ALGORAND_ALGOD_ADDRESS', f"http://127.0.0.1:{port}")
+    monkeypatch.setenv('ALGORAND_INDEXER_ADDRESS', f"http://127.0.0.1:{port}/indexer")
+    private_key, _ = account.generate_account()
+    monkeypatch.setenv('ALGORAND_ADMIN_PRIVATE_KEY', base64.b64encode(private_key.encode()).decode())
+    return algod, port
+
+
+@pytest.fixture
+def application(make_app, monkeypatch, tmp_path):
+    # asgi.py builds a module-level app from the environment when imported
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'module.db'}")
+    monkeypatch.setenv('JOB_WORKERS', '0')
+    from asgi import AsyncApplication
+
+    app = make_app()
+    create_all(app)
+    with app.app_context():
+        db.session.add(User(id=1, email='student1@university.edu', password_hash='x', name='Student 1',
+                            role='student'))
+        db.session.add(User(id=2, email='student2@university.edu', password_hash='x', name='Student 2',
+                            role='student'))
+        db.session.add(Course(id=1, code='CS101', title='Algorithms', credits=3, capacity=30, term='Fall',
+                              year=2024, department='Computer Science', fee=0, status='active',
+                              contract_address=str(ASSET_ID)))
+        db.session.commit()
+    return AsyncApplication(app)
+
+
+def token(application, user_id):
+    with application.flask_app.app_context():
+        return create_access_token(identity=user_id)
+
+
+# Start the chain server and the app's lifespan, run the requests, shut both down
+def serve(chain_port, application, requests):
+    async def main():
+        server = uvicorn.Server(uvicorn.Config(chain_http.application, host='127.0.0.1', port=chain_port,
+                                               log_level='warning'))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        lifespan = asyncio.Queue()
+        sent = asyncio.Queue()
+        running = asyncio.create_task(application({'type': 'lifespan'}, lifespan.get, sent.put))
+        await lifespan.put({'type': 'lifespan.startup'})
+        assert (await sent.get())['type'] == 'lifespan.startup.complete'
+        try:
+            return await requests(lambda *args, **kwargs: call(application, *args, **kwargs))
+        finally:
+            await lifespan.put({'type': 'lifespan.shutdown'})
+            await running
+            server.should_exit = True
+            await serving
+
+    return asyncio.run(main())
+
+
+# One HTTP request through the ASGI interface: (status, JSON body)
+async def call(application, method, path, user_id=None):
+    headers = [(b'host', b'localhost')]
+    if user_id is not None:
+        headers.append((b'authorization', f"Bearer {token(application, user_id)}".encode()))
+    scope = {'type': 'http', 'http_version': '1.1', 'method': method, 'path': path, 'root_path': '',
+             'scheme': 'http', 'query_string': b'', 'headers': headers, 'server': ('localhost', 80),
+             'client': ('127.0.0.1', 50000)}
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client stays connected until the response is sent
+        await asyncio.Event().wait()
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    status = messages[0]['status']
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return status, json.loads(body)
+
+
+def test_enroll_and_verify(chain, application):
+    algod, port = chain
+
+    async def requests(call):
+        enrolled = await call('POST', '/api/courses/1/enroll', 1)
+        enrollment = enrolled[1]["enrollment"]
+        verified = await call('GET', f"/api/blockchain/verify-enrollment/{enrollment['id']}", 1)
+        # Another student's enrollment is not theirs to look at
+        other = await call('GET', f"/api/blockchain/verify-enrollment/{enrollment['id']}", 2)
+        return enrolled, verified, other
+
+    (status, body), verified, other = serve(port, application, requests)
+    assert status == 201
+    enrollment = body["enrollment"]
+    # Confirmed on chain before the answer, and stored with the enrollment
+    assert enrollment["transaction_id"] in algod.ledger
+    with application.flask_app.app_context():
+        assert db.session.get(Enrollment, enrollment["id"]).transaction_id == enrollment["transaction_id"]
+
+    assert verified[0] == 200
+    assert verified[1]["verified"]
+    assert verified[1]["blockchain_data"]["transaction_id"] == enrollment["transaction_id"]
+    assert verified[1]["blockchain_data"]["source"] == 'indexer'
+    assert other == (403, {"error": "Permission denied"})
+    assert chain_http.stats["indexer_calls"] == 1
+
+
+def test_verify_answers_from_the_mirror(chain, application):
+    _, port = chain
+    with application.flask_app.app_context():
+        db.session.add(Enrollment(id=1, student_id=1, course_id=1, status='enrolled', transaction_id='T' * 52))
+        db.session.add(ChainEnrollment(transaction_id='T' * 52, asset_id=ASSET_ID, student_id=1, course_id=1,
+                                       confirmed_round=1200, fee=1000, timestamp='1700000000'))
+        db.session.commit()
+
+    async def requests(call):
+        return await call('GET', '/api/blockchain/verify-enrollment/1', 1)
+
+    status, body = serve(port, application, requests)
+    assert status == 200
+    assert body["blockchain_data"] == {"transaction_id": 'T' * 52, "confirmed_round": 1200,
+                                       "timestamp": '1700000000', "fee": 1000, "source": 'mirror'}
+    assert chain_http.stats["indexer_calls"] == 0
+
+
+@pytest.mark.parametrize('failure, outages', [('reject', 0), ('down', 1)])
+def test_enrollment_survives_the_chain_failing(chain, application, monkeypatch, failure, outages):
+    algod, port = chain
+    if failure == 'reject':
+        algod.failures[1] = failure
+    else:
+        # Nothing listening at the algod address: an outage for the breaker
+        monkeypatch.setenv('ALGORAND_ALGOD_ADDRESS', f"http://127.0.0.1:{free_port()}")
+
+    async def requests(call):
+        enrolled = await call('POST', '/api/courses/1/enroll', 1)
+        verified = await call('GET', f"/api/blockchain/verify-enrollment/{enrolled[1]['enrollment']['id']}", 1)
+        return enrolled, verified
+
+    (status, body), verified = serve(port, application, requests)
+    # The seat is kept; only the on-chain record is missing
+    assert status == 201
+    assert body["enrollment"]["transaction_id"] is None
+    assert verified == (200, {"verified": False, "message": 'Enrollment not verified on blockchain'})
+    assert chain_guard.breaker.consecutive_failures == outages
+
+
+def test_errors_and_flask_routes(chain, application):
+    _, port = chain
+
+    async def requests(call):
+        return [await call('POST', '/api/courses/1/enroll'),
+                await call('POST', '/api/courses/9/enroll', 1),
+                await call('GET', '/api/blockchain/verify-enrollment/9', 1),
+                await call('GET', '/api/courses/', 1)]
+
+    missing_token, no_course, no_enrollment, courses = serve(port, application, requests)
+    assert missing_token == (401, {"msg": 'Missing Authorization Header'})
+    assert no_course[0] == 404
+    assert no_enrollment == (404, {"error": 'Enrollment not found'})
+    # Everything else is the Flask app, on a pool thread
+    assert courses[0] == 200
+    assert [course["code"] for course in courses[1]] == ['CS101']
@@ -0,0 +1,137 @@
+# Bulk certificate issuance (certificates.py) against the in-memory algod
+# and indexer from benchmarks/fake_algod.py: rejected groups go back in the
+# queue, transactions whose outcome is unknown are settled by reconcile(),
+# a course can be issued again after any failure without minting twice, and
+# progress is reported per window.
+from collections import Counter
+import pytest
+from algosdk import account
+from benchmarks.fake_algod import FakeAlgod, FakeIndexer
+from chain_guard import CircuitBreaker
+from models import db, User, Course, Enrollment, Certificate
+from tenancy import create_all
+import certificates
+import chain_guard
+
+PASSING = 20
+GRADES = ['A', 'B', 'C'] * 7 + ['F', 'Incomplete']
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    # A breaker of its own, so failures injected here never leak into other tests
+    monkeypatch.setattr(chain_guard, 'breaker', CircuitBreaker(failure_threshold=100, reset_timeout=60))
+    algod = FakeAlgod()
+    private_key, address = account.generate_account()
+    return algod, FakeIndexer(algod), private_key, address
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    create_all(app)
+    with app.app_context():
+        db.session.add(Course(id=1, code='CS101', title='Algorithms', credits=3, capacity=50, term='Fall',
+                              year=2024, department='Computer Science', fee=0, status='completed'))
+        for i, grade in enumerate(GRADES[:PASSING] + GRADES[-2:], start=1):
+            db.session.add(User(id=i, email=f"student{i}@university.edu", password_hash='x',
+                                name=f"Student {i}", role='student'))
+            db.session.add(Enrollment(student_id=i, course_id=1, status='completed', grade=grade))
+        db.session.commit()
+    return app
+
+
+def issue(chain, progress=None):
+    algod, indexer, private_key, address = chain
+    return certificates.issue_course(algod, indexer, private_key, address, db.session.get(Course, 1), progress)
+
+
+# Every passing student owns exactly one certificate asset on the ledger,
+# the one recorded locally
+def assert_minted_once(algod):
+    minted = Counter(note["student_id"] for _, note in algod.created_assets())
+    assert minted == Counter(range(1, PASSING + 1))
+    recorded = {c.student_id: c.asset_id for c in Certificate.query.filter_by(status='issued')}
+    assert recorded == {note["student_id"]: asset_id for asset_id, note in algod.created_assets()}
+
+
+def test_rejected_group_is_queued_again(app, chain):
+    algod = chain[0]
+    algod.failures[1] = 'reject'
+    with app.app_context():
+        summary = issue(chain)
+        assert summary == {"pending": 0, "submitted": 0, "issued": PASSING, "failed": 0, "total": PASSING}
+        assert_minted_once(algod)
+        # The first group of 16 was refused once and sent again
+        attempts = Counter(c.attempts for c in Certificate.query)
+        assert attempts == {2: 16, 1: PASSING - 16}
+
+
+def test_unconfirmed_group_that_landed_is_found_on_the_indexer(app, chain, monkeypatch):
+    algod = chain[0]
+    with app.app_context():
+        # A stalled node: the groups reach the pool, but no block is produced
+        # while we wait for them
+        monkeypatch.setattr(algod, 'status_after_block', lambda round_num: algod.status())
+        with pytest.raises(certificates.CertificateError) as info:
+            issue(chain)
+        assert info.value.status == 503
+        assert certificates.course_summary(1)["submitted"] == PASSING
+        monkeypatch.undo()
+
+        # They confirm later; by the next run algod has forgotten them and
+        # their validity window has passed, so only the indexer can tell
+        algod.advance(1)
+        algod.forget()
+        algod.advance(1001)
+        sends = algod.sends
+        assert issue(chain)["issued"] == PASSING
+        assert algod.sends == sends
+        assert_minted_once(algod)
+
+
+def test_unconfirmed_group_that_never_landed_is_minted_again(app, chain):
+    algod = chain[0]
+    algod.failures[1] = 'lose'
+    with app.app_context():
+        with pytest.raises(certificates.CertificateError):
+            issue(chain)
+        assert certificates.course_summary(1) == {"pending": 0, "submitted": 16, "issued": PASSING - 16,
+                                                  "failed": 0, "total": PASSING}
+
+        # Still valid: reconcile leaves it alone rather than mint a second time
+        with pytest.raises(certificates.CertificateError):
+            issue(chain)
+        assert algod.sends == 2
+
+        # Past its last valid round and unknown to the indexer: queued again
+        algod.advance(1001)
+        assert issue(chain)["issued"] == PASSING
+        assert_minted_once(algod)
+
+
+def test_resuming_a_partial_course_mints_nothing_twice(app, chain):
+    algod = chain[0]
+    # The second group reaches the pool without an answer, so the run stops there
+    algod.failures[2] = 'timeout'
+    with app.app_context():
+        with pytest.raises(certificates.CertificateError):
+            issue(chain)
+        assert certificates.course_summary(1)["submitted"] == PASSING - 16
+
+        algod.advance(1)
+        assert issue(chain)["issued"] == PASSING
+        assert_minted_once(algod)
+
+        # A finished course sends nothing more
+        sends = algod.sends
+        assert issue(chain)["issued"] == PASSING
+        assert algod.sends == sends
+
+
+def test_progress_is_reported_per_window(app, chain, monkeypatch):
+    monkeypatch.setattr(certificates, 'CERTIFICATE_GROUPS_IN_FLIGHT', 1)
+    reports = []
+    with app.app_context():
+        issue(chain, lambda done, total, message: reports.append((done, total)))
+    assert reports == [(0, PASSING), (16, PASSING), (PASSING, PASSING)]
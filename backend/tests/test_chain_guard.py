@@ -0,0 +1,81 @@
+# Only outages count against the Algorand circuit breaker (chain_guard.py):
+# timeouts, connection errors and 5xx answers. A 4xx, such as an indexer 404
+# for a transaction not indexed yet, or an error raised by our own code must
+# never open it.
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from algosdk.v2client import algod, indexer
+from chain_guard import CircuitBreaker, CircuitOpenError, guarded_call, is_failure
+from certificates import CertificateError
+import chain_guard
+
+
+class Node(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status = int(self.path.split('?')[0].rsplit('/', 1)[-1])
+        body = json.dumps({"message": f"status {status}"}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def node():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Node)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    monkeypatch.setattr(chain_guard, 'breaker', breaker)
+    return breaker
+
+
+def raised(func, *args):
+    with pytest.raises(Exception) as info:
+        func(*args)
+    return info.value
+
+
+def test_sdk_errors(node):
+    indexer_client = indexer.IndexerClient('', node)
+    algod_client = algod.AlgodClient('', node)
+    assert not is_failure(raised(indexer_client.transaction, '404'))
+    assert is_failure(raised(indexer_client.transaction, '503'))
+    assert not is_failure(raised(algod_client.pending_transaction_info, '404'))
+    assert is_failure(raised(algod_client.pending_transaction_info, '500'))
+    assert is_failure(raised(indexer.IndexerClient('', 'http://127.0.0.1:1').health))
+
+
+def test_answers_and_our_own_errors_never_open_the_breaker(node, breaker):
+    indexer_client = indexer.IndexerClient('', node)
+
+    def claimed():
+        raise CertificateError("Certificates were claimed by another issuance run", 409)
+
+    for _ in range(5):
+        raised(guarded_call, 'verify_enrollment', indexer_client.transaction, '404')
+        raised(guarded_call, 'generate_certificate', claimed)
+    assert breaker.state == 'closed'
+
+
+def test_outages_open_the_breaker(node, breaker):
+    indexer_client = indexer.IndexerClient('', node)
+
+    def timeout():
+        raise TimeoutError("timed out")
+
+    raised(guarded_call, 'verify_enrollment', indexer_client.transaction, '502')
+    raised(guarded_call, 'enroll_student', timeout)
+    assert breaker.state == 'open'
+    assert isinstance(raised(guarded_call, 'verify_enrollment', indexer_client.transaction, '404'), CircuitOpenError)
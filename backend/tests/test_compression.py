@@ -0,0 +1,116 @@
+# Response compression (compression.py): Accept-Encoding negotiation with
+# q-values, the size threshold, the responses that are never touched, and
+# chunked compression of streams that still delivers each chunk as it comes.
+import gzip
+import zlib
+import pytest
+from flask import Response, stream_with_context
+from models import db, Course
+from tenancy import create_all
+import compression
+from compression import negotiate_encoding, compress_stream
+
+COURSES = 30
+EVENTS = [f"data: {{\"event\": {i}}}\n\n" for i in range(5)]
+# Brotli is optional, like in compression.py
+br = pytest.param('br', marks=pytest.mark.skipif(compression.brotli is None, reason="brotli is not installed"))
+
+
+@pytest.fixture
+def make_client(make_app):
+    def build(**config):
+        app = make_app(**config)
+        create_all(app)
+        with app.app_context():
+            # Apps built in one test share a database
+            for i in range(COURSES - Course.query.count()):
+                db.session.add(Course(code=f"CS{100 + i}", title=f"Course number {i}", credits=3, capacity=30,
+                                      term='Fall', year=2024, department='Computer Science', fee=0))
+            db.session.commit()
+
+        @app.route('/stream')
+        def stream():
+            return Response(stream_with_context(iter(EVENTS)), mimetype='text/event-stream')
+
+        return app.test_client()
+    return build
+
+
+@pytest.mark.parametrize('header, encoding', [
+    ('gzip, deflate, br', 'br'),
+    ('gzip;q=1.0, br;q=0.5', 'gzip'),
+    ('br;q=0, gzip', 'gzip'),
+    ('BR', 'br'),
+    ('*;q=0.1', 'br'),
+    ('*, br;q=0', 'gzip'),
+    ('gzip;q=abc', None),
+    ('identity', None),
+    ('', None),
+])
+def test_negotiate_encoding(header, encoding):
+    assert negotiate_encoding(header, ('br', 'gzip')) == encoding
+
+
+def test_negotiation_without_brotli(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    assert negotiate_encoding('br, gzip;q=0.5', compression.available_encodings()) == 'gzip'
+
+
+@pytest.mark.parametrize('accept', ['gzip', br])
+def test_large_json_is_compressed(make_client, accept):
+    client = make_client()
+    plain = client.get('/api/courses/')
+    assert 'Content-Encoding' not in plain.headers
+    assert len(plain.data) >= 1024
+
+    compressed = client.get('/api/courses/', headers={"Accept-Encoding": accept})
+    assert compressed.headers['Content-Encoding'] == accept
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert int(compressed.headers['Content-Length']) == len(compressed.data) < len(plain.data)
+    decoded = gzip.decompress(compressed.data) if accept == 'gzip' else compression.brotli.decompress(compressed.data)
+    assert decoded == plain.data
+
+
+def test_responses_left_alone(make_client):
+    client = make_client(COMPRESS_MIN_SIZE=1024)
+    headers = {"Accept-Encoding": 'gzip'}
+    # Below the threshold: not worth it, but caches still learn it could vary
+    small = client.get('/api/courses/1', headers=headers)
+    assert len(small.data) < 1024
+    assert 'Content-Encoding' not in small.headers
+    assert 'Accept-Encoding' in small.headers['Vary']
+
+    head = client.head('/api/courses/', headers=headers)
+    assert 'Content-Encoding' not in head.headers
+
+    disabled = make_client(COMPRESS_ENABLED=False).get('/api/courses/', headers=headers)
+    assert 'Content-Encoding' not in disabled.headers
+    assert 'Vary' not in disabled.headers
+
+
+def test_streams(make_client):
+    headers = {"Accept-Encoding": 'gzip'}
+    off = make_client().get('/stream', headers=headers)
+    assert 'Content-Encoding' not in off.headers
+    assert off.data == ''.join(EVENTS).encode()
+
+    on = make_client(COMPRESS_STREAMS=True).get('/stream', headers=headers)
+    assert on.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in on.headers
+    assert gzip.decompress(on.data) == ''.join(EVENTS).encode()
+
+
+@pytest.mark.parametrize('encoding', ['gzip', br])
+def test_every_chunk_is_flushed(encoding):
+    config = {'COMPRESS_LEVEL': 6, 'COMPRESS_BR_LEVEL': 4}
+    if encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        decompress = decompressor.decompress
+    else:
+        decompress = compression.brotli.Decompressor().process
+
+    # A client decoding as it reads gets each event before the next is produced
+    chunks = compress_stream(iter(EVENTS), encoding, config)
+    for event in EVENTS:
+        assert decompress(next(chunks)) == event.encode()
+    assert decompress(b''.join(chunks)) == b''
@@ -0,0 +1,124 @@
+# Read replica and tenant routing in RoutingSession (db_routing.py, tenancy.py).
+# Each database holds a different name for user 1, so /api/profile shows
+# which one answered.
+import time
+import pytest
+from flask import jsonify
+from sqlalchemy import select
+from flask_jwt_extended import create_access_token
+import db_routing
+from models import db, User, Course
+from tenancy import tenant_context, create_all
+
+
+def add_user(engine, name):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), dict(id=1, email='student@university.edu', password_hash='x',
+                                                   name=name, role='student'))
+
+
+def touch_course():
+    db.session.add(Course(code='CS101', title='Algorithms', credits=3, capacity=30, term='Fall', year=2024,
+                          department='Computer Science', fee=0))
+    db.session.commit()
+    return jsonify({"ok": True}), 201
+
+
+@pytest.fixture(autouse=True)
+def forget_writes():
+    db_routing._last_writes.clear()
+    yield
+    db_routing._last_writes.clear()
+
+
+@pytest.fixture
+def replicated(make_app, tmp_path):
+    def make(**config):
+        app = make_app(DATABASE_REPLICA_URLS=[f"sqlite:///{tmp_path / 'replica.db'}"], **config)
+        app.add_url_rule('/test/write', view_func=touch_course, methods=['POST'])
+        with app.app_context():
+            add_user(db.engine, 'Primary')
+            add_user(db.engines['replica_0'], 'Replica')
+            token = create_access_token(identity=1)
+        return app, {"Authorization": f"Bearer {token}"}
+    return make
+
+
+def profile_name(client, headers, **extra):
+    return client.get('/api/profile', headers={**headers, **extra}).get_json()["name"]
+
+
+def test_reads_go_to_the_replica(replicated):
+    app, auth = replicated()
+    client = app.test_client()
+    assert profile_name(client, auth) == 'Replica'
+    assert profile_name(client, auth, **{db_routing.CONSISTENCY_HEADER: 'strong'}) == 'Primary'
+
+
+def test_flush_pins_the_rest_of_the_request_to_the_primary(replicated):
+    app, _ = replicated()
+    with app.test_request_context('/api/profile'):
+        app.preprocess_request()
+        name = select(User.name).where(User.id == 1)
+        assert db.session.execute(name).scalar() == 'Replica'
+
+        db.session.add(Course(code='CS102', title='Databases', credits=3, capacity=30, term='Fall', year=2024,
+                              department='Computer Science', fee=0))
+        db.session.flush()
+        assert db.session.execute(name).scalar() == 'Primary'
+        db.session.rollback()
+
+
+def test_write_sends_the_next_reads_to_the_primary(replicated):
+    app, auth = replicated(REPLICA_STALENESS_SECONDS=0.5)
+    client = app.test_client()
+    response = client.post('/test/write', headers=auth)
+    assert response.status_code == 201
+    assert db_routing.LAST_WRITE_COOKIE in response.headers.get('Set-Cookie', '')
+
+    # Same worker: remembered per identity, even without the cookie
+    assert profile_name(app.test_client(), auth) == 'Primary'
+
+    # Another worker: only the cookie knows
+    db_routing._last_writes.clear()
+    assert profile_name(client, auth) == 'Primary'
+    assert profile_name(app.test_client(), auth) == 'Replica'
+
+    # Once the staleness window has passed the replica has caught up
+    time.sleep(0.6)
+    assert profile_name(client, auth) == 'Replica'
+
+
+def test_tenant_reads_and_writes_go_to_the_tenant_database(replicated, tmp_path):
+    app, auth = replicated(TENANT_DATABASE_URLS={'north': f"sqlite:///{tmp_path / 'north.db'}"})
+    create_all(app)
+    with app.app_context():
+        add_user(db.engines[db_routing.tenant_bind_key('north')], 'North')
+    with tenant_context(app, 'north'):
+        tenant_auth = {"Authorization": f"Bearer {create_access_token(identity=1)}"}
+
+    client = app.test_client()
+    assert profile_name(client, tenant_auth) == 'North'
+    assert profile_name(client, auth) == 'Replica'
+
+    assert client.post('/test/write', headers=tenant_auth).status_code == 201
+    with tenant_context(app, 'north'):
+        assert Course.query.count() == 1
+    with app.app_context():
+        assert Course.query.count() == 0
+        assert db.session.execute(select(Course.id), bind_arguments={"bind": db.engines['replica_0']}).first() is None
+
+
+def test_sqlite_connect_args_only_reach_sqlite_binds(replicated):
+    from database import engine_options
+    assert engine_options('sqlite', 'sqlite:///replica.db')["connect_args"]["timeout"] > 0
+    assert 'connect_args' not in engine_options('sqlite', 'postgresql://db/replica')
+    assert 'connect_args' not in engine_options('server', 'postgresql://db/replica')
+
+    app, _ = replicated()
+    assert app.config['SQLALCHEMY_BINDS']['replica_0']["connect_args"] == \
+        app.config['SQLALCHEMY_ENGINE_OPTIONS']["connect_args"]
+    with app.app_context():
+        with db.engines['replica_0'].connect() as conn:
+            assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == 'wal'
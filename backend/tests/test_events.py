@@ -0,0 +1,139 @@
+# Event bus (events.py): subscribers get only their channels' events, a slow
+# subscriber loses its oldest events instead of blocking publishers, the
+# database bus replays what a reconnecting client missed, and an SSE stream
+# sends replayed events once before going live. On a server database a lower
+# id can commit after a higher one; the poller still delivers it, delivers
+# nothing twice, and gives up on an id that stays missing for reorder_seconds.
+import time
+from flask import request
+from sqlalchemy import insert
+from models import db, EventLog
+import events
+from events import EventBus, DatabaseEventBus
+from tenancy import create_all
+
+
+def add_event(app, event_id):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(insert(EventLog).values(id=event_id, channel='course:1', type='test', payload='{}'))
+
+
+def received(subscription):
+    ids = []
+    while (event := subscription.get(timeout=0)) is not None:
+        ids.append(event["id"])
+    return ids
+
+
+def test_subscribers_get_their_channels():
+    bus = EventBus()
+    both = bus.subscribe(['course:1', 'user:2'])
+    course = bus.subscribe(['course:1'])
+    bus.publish('course:1', 'seats', {"available": 3})
+    bus.publish('course:2', 'seats', {"available": 0})
+    bus.publish_many([('user:2', 'grade', {"grade": 'A'}), ('user:3', 'grade', {"grade": 'B'})])
+    assert (received(both), received(course)) == ([1, 3], [1])
+    assert bus.subscriber_count() == 2
+
+    both.close()
+    bus.publish('user:2', 'grade', {"grade": 'B'})
+    assert received(both) == []
+    assert bus.replay(['user:2', 'course:1'], 1) == [
+        {"id": 3, "channel": 'user:2', "type": 'grade', "data": {"grade": 'A'}},
+        {"id": 5, "channel": 'user:2', "type": 'grade', "data": {"grade": 'B'}}]
+    course.close()
+    assert bus.subscriber_count() == 0
+
+
+def test_slow_subscriber_drops_oldest(monkeypatch):
+    monkeypatch.setattr(events, 'SUBSCRIBER_BUFFER', 3)
+    bus = EventBus()
+    subscription = bus.subscribe(['course:1'])
+    for i in range(5):
+        bus.publish('course:1', 'seats', {"n": i})
+    assert received(subscription) == [3, 4, 5]
+
+
+def test_database_bus_replay(make_app):
+    app = make_app()
+    create_all(app)
+    # No subscriber, so no poller thread: publish and replay only touch the table
+    bus = DatabaseEventBus(app)
+    first = bus.publish('user:1', 'grade', {"grade": 'A'})
+    bus.publish_many([('user:1', 'final_grade', {"grade": 'B+'}), ('user:2', 'final_grade', {"grade": 'C'}),
+                      ('course:1', 'seats', {"available": 1})])
+    bus.publish_many([])
+
+    replayed = bus.replay(['user:1', 'course:1'], 0)
+    assert [(e["channel"], e["type"], e["data"]) for e in replayed] == [
+        ('user:1', 'grade', {"grade": 'A'}), ('user:1', 'final_grade', {"grade": 'B+'}),
+        ('course:1', 'seats', {"available": 1})]
+    assert replayed[0]["id"] == first["id"]
+    assert [e["id"] for e in bus.replay(['user:1', 'course:1'], first["id"])] == \
+        [e["id"] for e in replayed[1:]]
+    assert bus.replay(['user:3'], 0) == []
+
+
+def test_stream_replays_then_goes_live():
+    bus = EventBus()
+    bus.publish('course:1', 'seats', {"available": 2})
+    subscription = bus.subscribe(['course:1'])
+    # Published while the client reconnects: in both the replay and the queue
+    bus.publish('course:1', 'seats', {"available": 1})
+    bus.publish('course:1', 'seats', {"available": 0})
+
+    sse = events.stream(subscription, [('seats', {"available": 0})], last_event_id=1, heartbeat=0.01)
+    assert next(sse) == 'retry: 3000\n\n'
+    assert next(sse) == 'event: seats\ndata: {"available":0}\n\n'
+    assert next(sse) == 'id: 2\nevent: seats\ndata: {"available":1}\n\n'
+    assert next(sse) == 'id: 3\nevent: seats\ndata: {"available":0}\n\n'
+    # The queued copies of 2 and 3 are skipped
+    assert next(sse) == ': keep-alive\n\n'
+
+    bus.publish('course:1', 'seats', {"available": 1})
+    assert next(sse) == 'id: 4\nevent: seats\ndata: {"available":1}\n\n'
+    sse.close()
+    assert bus.subscriber_count() == 0
+
+
+def test_last_event_id(make_app):
+    app = make_app()
+    for kwargs, expected in [({"headers": {"Last-Event-ID": '42'}}, 42),
+                             ({"query_string": {"last_event_id": '7'}}, 7),
+                             ({"headers": {"Last-Event-ID": 'abc'}}, None),
+                             ({}, None)]:
+        with app.test_request_context('/', **kwargs):
+            assert events.last_event_id(request) == expected
+
+
+def test_poller_delivers_ids_that_commit_out_of_order(make_app):
+    app = make_app()
+    create_all(app)
+    bus = DatabaseEventBus(app, reorder_seconds=0.3)
+    bus._floor = 0
+    # Subscribe without starting the poller thread; the test polls by hand
+    subscription = EventBus.subscribe(bus, ['course:1'])
+    with app.app_context():
+        engine = db.engine
+
+    add_event(app, 1)
+    add_event(app, 3)
+    bus._poll_once(engine)
+    assert received(subscription) == [1, 3]
+    assert bus._floor == 1
+
+    # 2 commits late: delivered once, and nothing is delivered again
+    add_event(app, 2)
+    bus._poll_once(engine)
+    bus._poll_once(engine)
+    assert received(subscription) == [2]
+    assert bus._floor == 3
+
+    # 4 never shows up in time (rolled back): the poller moves past it
+    add_event(app, 5)
+    bus._poll_once(engine)
+    time.sleep(0.35)
+    bus._poll_once(engine)
+    assert received(subscription) == [5]
+    assert (bus._floor, bus._seen) == (5, set())
@@ -0,0 +1,90 @@
+# Section gradebook (gradebook.py): the NumPy and pure-Python paths give the
+# same results, and writing final grades keeps the materialized transcripts
+# (transcripts.py) in sync in the same transaction.
+import random
+import datetime
+import pytest
+from models import db, User, Course, Enrollment, Assignment, Grade, TranscriptTerm
+from tenancy import create_all
+import gradebook
+import transcripts
+
+STUDENTS = 40
+
+
+@pytest.fixture
+def section(make_app):
+    app = make_app()
+    create_all(app)
+    rng = random.Random(7)
+    with app.app_context():
+        db.session.add(Course(id=1, code='CS101', title='Algorithms', credits=4, capacity=STUDENTS, term='Fall',
+                              year=2024, department='Computer Science', fee=0))
+        due = datetime.datetime(2024, 12, 1)
+        for i, (points, weight) in enumerate([(100, 0.3), (50, 0.2), (20, 0.1), (100, 0.4)], start=1):
+            db.session.add(Assignment(id=i, course_id=1, title=f"Assignment {i}", due_date=due, points=points,
+                                      weight=weight))
+        for student_id in range(1, STUDENTS + 1):
+            db.session.add(User(id=student_id, email=f"student{student_id}@university.edu", password_hash='x',
+                                name=f"Student {student_id}", role='student'))
+            db.session.add(Enrollment(id=student_id, student_id=student_id, course_id=1, status='enrolled'))
+            # The last student has no grades yet; the others miss one now and then
+            for assignment_id, points in [(1, 100), (2, 50), (3, 20), (4, 100)]:
+                if student_id < STUDENTS and rng.random() < 0.9:
+                    score = rng.choice([points, 0, round(rng.uniform(0, points), 1)])
+                    db.session.add(Grade(student_id=student_id, assignment_id=assignment_id, score=score))
+        # Full marks on everything
+        db.session.query(Grade).filter(Grade.student_id == 1).delete()
+        for assignment_id, points in [(1, 100), (2, 50), (3, 20), (4, 100)]:
+            db.session.add(Grade(student_id=1, assignment_id=assignment_id, score=points))
+        db.session.commit()
+    return app
+
+
+def test_numpy_and_python_paths_agree(section):
+    if gradebook.np is None:
+        pytest.skip("NumPy is not installed")
+    with section.app_context():
+        vectorized = gradebook.section_grades(1, use_numpy=True)
+        plain = gradebook.section_grades(1, use_numpy=False)
+    assert vectorized == plain
+    assert [r["enrollment_id"] for r in plain] == list(range(1, STUDENTS + 1))
+
+    first, last = plain[0], plain[-1]
+    assert (first["graded_assignments"], first["total_points"], first["percentage"]) == (4, 82.0, 100.0)
+    assert first["computed_grade"] == 'A'
+    assert (last["graded_assignments"], last["earned_points"], last["computed_grade"]) == (0, 0, 'F')
+
+
+def test_final_grades_refresh_transcripts(section):
+    with section.app_context():
+        db.session.get(Enrollment, 2).grade = 'A'
+        transcripts.update_students([2])
+        db.session.commit()
+
+        results = gradebook.section_grades(1)
+        written = gradebook.apply_grades(results)
+        db.session.commit()
+        # A grade already submitted is kept unless asked to overwrite it
+        assert 2 not in {r["enrollment_id"] for r in written}
+        assert db.session.get(Enrollment, 2).grade == 'A'
+
+        computed = {r["student_id"]: r["computed_grade"] for r in results}
+        stored = dict(db.session.query(Enrollment.student_id, Enrollment.grade))
+        assert stored == {**computed, 2: 'A'}
+
+        def transcript_rows():
+            return sorted((row.student_id, row.term_gpa, row.cumulative_gpa, row.credits_earned)
+                          for row in TranscriptTerm.query)
+
+        # Every graded student has a transcript term matching their grade
+        expected = sorted((r["student_id"], r["term_gpa"], r["cumulative_gpa"], r["credits_earned"])
+                          for r in transcripts.compute_students(list(range(1, STUDENTS + 1))))
+        assert transcript_rows() == expected
+        assert len(expected) == STUDENTS
+
+        # Overwriting changes the transcript in the same transaction
+        gradebook.apply_grades(gradebook.section_grades(1), overwrite=True)
+        db.session.commit()
+        assert TranscriptTerm.query.filter_by(student_id=2).one().term_gpa == \
+            transcripts.GRADE_POINTS[computed[2]]
@@ -0,0 +1,83 @@
+# Idempotency-Key handling (idempotency.py): a request left unfinished past
+# IDEMPOTENCY_LOCK_TIMEOUT (its worker was killed) is taken over by the next
+# retry, and the abandoned request can no longer store its response.
+import hashlib
+import datetime
+import pytest
+from flask import jsonify
+from flask_jwt_extended import create_access_token
+from sqlalchemy import update
+from auth import jwt_required
+from idempotency import idempotent
+from models import db, IdempotencyKey
+from tenancy import create_all
+
+BODY = b'{"title": "Algorithms"}'
+calls = []
+
+
+@jwt_required
+@idempotent
+def create_thing():
+    calls.append(1)
+    return jsonify({"created": len(calls)}), 201
+
+
+@jwt_required
+@idempotent
+def taken_over_meanwhile():
+    # A retry takes the key over while this request is still running
+    db.session.execute(update(IdempotencyKey).values(created_at=datetime.datetime.utcnow()))
+    db.session.commit()
+    return jsonify({"created": True}), 201
+
+
+@pytest.fixture
+def app(make_app):
+    calls.clear()
+    app = make_app(IDEMPOTENCY_LOCK_TIMEOUT=60)
+    app.add_url_rule('/test/things', view_func=create_thing, methods=['POST'])
+    app.add_url_rule('/test/slow-things', view_func=taken_over_meanwhile, methods=['POST'])
+    create_all(app)
+    return app
+
+
+def post(app, path='/test/things'):
+    with app.app_context():
+        token = create_access_token(identity=1)
+    return app.test_client().post(path, data=BODY, content_type='application/json',
+                                  headers={"Authorization": f"Bearer {token}", "Idempotency-Key": 'key-1'})
+
+
+def unfinished(app, age_seconds, path='/test/things'):
+    with app.app_context():
+        db.session.add(IdempotencyKey(
+            user_id=1, key='key-1', request_hash=hashlib.sha256(f"POST {path}\n".encode() + BODY).hexdigest(),
+            created_at=datetime.datetime.utcnow() - datetime.timedelta(seconds=age_seconds)))
+        db.session.commit()
+
+
+def test_retry_waits_for_a_running_request(app):
+    unfinished(app, 5)
+    response = post(app)
+    assert response.status_code == 409
+    assert calls == []
+
+
+def test_retry_takes_over_an_abandoned_request(app):
+    unfinished(app, 120)
+    response = post(app)
+    assert response.status_code == 201
+    assert calls == [1]
+
+    replayed = post(app)
+    assert replayed.get_json() == response.get_json()
+    assert replayed.headers['Idempotent-Replayed'] == 'true'
+    assert calls == [1]
+
+
+def test_abandoned_request_does_not_store_its_response(app):
+    assert post(app, '/test/slow-things').status_code == 201
+    with app.app_context():
+        record = IdempotencyKey.query.one()
+        assert record.status_code is None
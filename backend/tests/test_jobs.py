@@ -0,0 +1,98 @@
+# Job leases (jobs.py): a run only records its outcome while it still holds
+# the job, and a heartbeat keeps the lease of a long handler alive.
+import time
+import threading
+import pytest
+import jobs
+import chain_mirror
+from models import db, Job, ChainEnrollment
+from tenancy import create_all, tenant_context
+from sqlalchemy import event, update
+
+taken_over = threading.Event()
+
+
+@jobs.register('test_taken_over')
+def taken_over_job(context, payload):
+    # The lease expired and another worker claimed the job meanwhile
+    db.session.execute(update(Job).where(Job.id == context.job_id)
+                       .values(locked_by='other-worker', attempts=Job.attempts + 1))
+    db.session.commit()
+    if payload.get("progress"):
+        context.progress(1, 2)
+    return {"done": True}
+
+
+@jobs.register('test_quiet')
+def quiet_job(context, payload):
+    time.sleep(payload["seconds"])
+    return {"slept": payload["seconds"]}
+
+
+@pytest.fixture
+def app(make_app, monkeypatch):
+    app = make_app()
+    create_all(app)
+    monkeypatch.setattr(jobs.runner, 'lease_seconds', 0.3)
+    return app
+
+
+def run(app, kind, payload):
+    with app.app_context():
+        job, _ = jobs.enqueue(kind, payload)
+        job_id = jobs.claim_next('worker-1', jobs.runner.lease_seconds)
+        assert job_id == job.id
+        jobs.run_job(job_id, 'worker-1')
+    with app.app_context():
+        return db.session.get(Job, job_id)
+
+
+@pytest.mark.parametrize('progress', [False, True])
+def test_outcome_is_dropped_after_losing_the_lease(app, progress):
+    job = run(app, 'test_taken_over', {"progress": progress})
+    assert job.status == 'running'
+    assert job.locked_by == 'other-worker'
+    assert job.result is None
+
+
+def test_heartbeat_keeps_a_quiet_handler_leased(app):
+    claims = []
+
+    def other_worker():
+        time.sleep(0.8)
+        with tenant_context(app, None):
+            claims.append(jobs.claim_next('worker-2', jobs.runner.lease_seconds))
+            db.session.remove()
+
+    thread = threading.Thread(target=other_worker)
+    thread.start()
+    job = run(app, 'test_quiet', {"seconds": 1.2})
+    thread.join()
+    assert claims == [None]
+    assert job.status == 'succeeded'
+    assert job.attempts == 1
+
+
+def test_mirror_skips_rows_stored_by_a_concurrent_sync(app):
+    row = dict(transaction_id='TX1', asset_id=1, student_id=1, course_id=1, confirmed_round=10)
+    other = dict(row, transaction_id='TX2')
+
+    with app.app_context():
+        engine = db.engine
+
+        inserted = []
+
+        # The other sync commits TX1 between this one's lookup and its insert
+        def concurrent_insert(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith('INSERT INTO chain_enrollments') and not inserted:
+                inserted.append(True)
+                with engine.begin() as other_conn:
+                    other_conn.execute(ChainEnrollment.__table__.insert(), row)
+
+        event.listen(engine, 'before_cursor_execute', concurrent_insert)
+        try:
+            assert chain_mirror.store([row, other], []) == (1, 0)
+        finally:
+            event.remove(engine, 'before_cursor_execute', concurrent_insert)
+        db.session.commit()
+        assert sorted(t for (t,) in db.session.query(ChainEnrollment.transaction_id)) == ['TX1', 'TX2']
@@ -0,0 +1,31 @@
+# Every endpoint stays within its SQL query budget in
+# benchmarks/query_budgets.json, and only the endpoints marked "allow_growth"
+# issue more queries on the larger dataset (an N+1). After an intentional
+# change, refresh the budgets with `python -m benchmarks.query_guard --update`.
+import json
+import pytest
+from conftest import build_app
+from benchmarks import query_guard
+
+with open(query_guard.BASELINE_PATH) as f:
+    BUDGETS = json.load(f)["endpoints"]
+
+
+@pytest.fixture(scope='module')
+def runs(tmp_path_factory):
+    app = build_app(str(tmp_path_factory.mktemp('queries')))
+    return {size: query_guard.record_queries(app, size) for size in query_guard.DATASET_SIZES}
+
+
+def test_every_endpoint_has_a_budget(runs):
+    assert sorted(runs['large']) == sorted(BUDGETS)
+
+
+@pytest.mark.parametrize('name', sorted(BUDGETS))
+def test_query_budget(runs, name):
+    small, large = runs['small'][name]["count"], runs['large'][name]["count"]
+    budget = BUDGETS[name]
+    assert small <= budget['small'], f"{name}: {small} queries on the small dataset, budget is {budget['small']}"
+    assert large <= budget['large'], f"{name}: {large} queries on the large dataset, budget is {budget['large']}"
+    if not budget.get("allow_growth"):
+        assert large <= small, f"{name}: query count grows with the data ({small} -> {large}), likely an N+1"
@@ -0,0 +1,109 @@
+# Re-enrolling after a drop (registration.py): the old enrollment row is
+# reused, so it must not keep the drop's grade or on-chain transaction,
+# whether it comes through enroll_one, enroll_batch or a waitlist promotion.
+# Also two waitlist promotions racing for the same seat.
+import threading
+import pytest
+from models import db, User, Course, Enrollment, WaitlistEntry
+from registration import enroll_one, enroll_batch
+import waitlist
+from tenancy import create_all
+
+
+@pytest.fixture
+def dropped(make_app):
+    app = make_app()
+    create_all(app)
+    with app.app_context():
+        db.session.add(User(id=1, email='student@university.edu', password_hash='x', name='Student', role='student'))
+        for course_id in (1, 2):
+            db.session.add(Course(id=course_id, code=f"CS10{course_id}", title='Algorithms', credits=3,
+                                  capacity=30, term='Fall', year=2024, department='Computer Science', fee=0))
+            db.session.add(Enrollment(student_id=1, course_id=course_id, status='dropped', grade='W',
+                                      transaction_id=f"TX{course_id}"))
+        db.session.commit()
+    return app
+
+
+def test_enroll_one_clears_the_dropped_transaction(dropped):
+    with dropped.app_context():
+        enrollment, _ = enroll_one(1, 1)
+        db.session.commit()
+        assert (enrollment.status, enrollment.grade, enrollment.transaction_id) == ('enrolled', None, None)
+
+
+def test_enroll_batch_clears_the_dropped_transaction(dropped):
+    with dropped.app_context():
+        assert [result["ok"] for result in enroll_batch(1, [2])] == [True]
+        db.session.commit()
+        enrollment = Enrollment.query.filter_by(student_id=1, course_id=2).one()
+        assert (enrollment.status, enrollment.grade, enrollment.transaction_id) == ('enrolled', None, None)
+
+
+def test_waitlist_promotion_clears_the_dropped_transaction(dropped):
+    with dropped.app_context():
+        # Course 1 is full again, with student 1 waiting for a seat
+        db.session.add(User(id=2, email='other@university.edu', password_hash='x', name='Other', role='student'))
+        db.session.get(Course, 1).capacity = 1
+        taken = Enrollment(student_id=2, course_id=1, status='enrolled', transaction_id='TX-OTHER')
+        db.session.add(taken)
+        db.session.flush()
+        waitlist.join(1, db.session.get(Course, 1))
+        db.session.commit()
+
+        # Student 2 drops; student 1 is promoted into their old row, and with
+        # no contract on the course nothing is sent on chain
+        promoted = waitlist.drop(taken)
+        db.session.commit()
+        waitlist.after_commit(db.session.get(Course, 1), promoted)
+
+        enrollment = Enrollment.query.filter_by(student_id=1, course_id=1).one()
+        assert [e.id for e in promoted] == [enrollment.id]
+        assert (enrollment.status, enrollment.grade, enrollment.transaction_id) == ('enrolled', None, None)
+
+
+# Worker A has counted one free seat and read the head of the waitlist when
+# worker B promotes that student and commits. A's claim on the entry fails,
+# and A must not hand the seat B just filled to the next student in line.
+def test_concurrent_promotions_fill_each_seat_once(make_app, monkeypatch):
+    app = make_app()
+    create_all(app)
+    with app.app_context():
+        db.session.add(Course(id=1, code='CS101', title='Algorithms', credits=3, capacity=2, term='Fall', year=2024,
+                              department='Computer Science', fee=0))
+        for student_id in range(1, 6):
+            db.session.add(User(id=student_id, email=f"student{student_id}@university.edu", password_hash='x',
+                                name=f"Student {student_id}", role='student'))
+        for student_id in (1, 2):
+            db.session.add(Enrollment(student_id=student_id, course_id=1, status='enrolled'))
+        db.session.flush()
+        for student_id in (3, 4, 5):
+            waitlist.join(student_id, db.session.get(Course, 1))
+        # One more seat, promoted by two workers at once
+        db.session.get(Course, 1).capacity = 3
+        db.session.commit()
+
+    def promote_elsewhere():
+        with app.app_context():
+            other.extend(e.student_id for e in waitlist.promote(db.session.get(Course, 1)))
+            db.session.commit()
+
+    other = []
+    find_conflicts = waitlist.find_conflicts
+
+    def race(student_id, course):
+        if not other and threading.current_thread() is threading.main_thread():
+            worker = threading.Thread(target=promote_elsewhere)
+            worker.start()
+            worker.join()
+        return find_conflicts(student_id, course)
+
+    monkeypatch.setattr(waitlist, 'find_conflicts', race)
+    with app.app_context():
+        mine = waitlist.promote(db.session.get(Course, 1))
+        db.session.commit()
+
+        assert (other, mine) == ([3], [])
+        assert waitlist.occupied_seats(1) == 3
+        assert dict(db.session.query(WaitlistEntry.student_id, WaitlistEntry.status)) == \
+            {3: 'promoted', 4: 'waiting', 5: 'waiting'}
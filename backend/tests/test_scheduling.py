@@ -0,0 +1,119 @@
+# Schedule-conflict detection (scheduling.py): the per-day interval index
+# agrees with checking every pair, and enrollment, the schedule check and the
+# cart see conflicts with the current timetable and inside the cart, per term.
+import random
+import datetime
+import pytest
+from flask_jwt_extended import create_access_token
+from models import db, User, Course, CourseMeeting, Enrollment
+from tenancy import create_all
+from scheduling import ScheduleIndex, ScheduleError, parse_days, parse_time
+
+
+def brute_force(meetings, day, start, end):
+    return [m for m in meetings if day in m["days"] and m["start"] < end and start < m["end"]]
+
+
+def test_index_matches_brute_force():
+    rng = random.Random(34)
+    meetings = []
+    for i in range(200):
+        start = rng.randrange(8 * 60, 20 * 60, 5)
+        meetings.append({"id": i, "days": ''.join(rng.sample('MTWRF', rng.randint(1, 3))), "start": start,
+                         "end": start + rng.choice([50, 75, 110, 180])})
+    index = ScheduleIndex(meetings)
+
+    for _ in range(2000):
+        day = rng.choice('MTWRFS')
+        start = rng.randrange(7 * 60, 22 * 60, 5)
+        end = start + rng.randrange(5, 240, 5)
+        expected = brute_force(meetings, day, start, end)
+        assert index.overlaps(day, start, end) == bool(expected)
+        assert sorted(m["id"] for m in index.conflicts(day, start, end)) == sorted(m["id"] for m in expected)
+
+
+def test_index_edges():
+    long = {"days": 'M', "start": 540, "end": 720}  # 9:00-12:00
+    short = {"days": 'M', "start": 600, "end": 650}  # 10:00-10:50
+    index = ScheduleIndex([short, long])
+    # Back to back is not a conflict
+    assert not index.overlaps('M', 720, 780)
+    assert not index.overlaps('M', 480, 540)
+    # A long meeting that started earlier is still found past a shorter one
+    assert index.conflicts('M', 700, 710) == [long]
+    assert not index.overlaps('T', 600, 650)
+    assert not ScheduleIndex([]).overlaps('M', 0, 1440)
+
+
+def test_parsing():
+    assert parse_days('fwm') == 'MWF'
+    assert parse_days(' RT ') == 'TR'
+    for days in ('', None, 'MXF', 'MM'):
+        with pytest.raises(ScheduleError):
+            parse_days(days)
+    assert parse_time('09:30') == datetime.time(9, 30)
+    with pytest.raises(ScheduleError):
+        parse_time('9.30am')
+
+
+COURSES = {
+    # id: (code, term, days, start, end)
+    1: ('CS101', 'Fall', 'MWF', '09:00', '10:15'),
+    2: ('CS102', 'Fall', 'WF', '10:00', '11:00'),  # overlaps CS101 on W and F
+    3: ('CS103', 'Fall', 'TR', '09:00', '10:15'),
+    4: ('CS104', 'Spring', 'MWF', '09:00', '10:15'),  # same hours, another term
+    5: ('CS105', 'Fall', 'TR', '10:00', '11:00'),  # overlaps CS103
+    6: ('CS106', 'Fall', 'M', '10:15', '11:00'),  # starts as CS101 ends
+}
+
+
+@pytest.fixture
+def client(make_app):
+    app = make_app()
+    create_all(app)
+    with app.app_context():
+        db.session.add(User(id=1, email='student@university.edu', password_hash='x', name='Student',
+                            role='student'))
+        for course_id, (code, term, days, start, end) in COURSES.items():
+            db.session.add(Course(id=course_id, code=code, title=code, credits=3, capacity=30, term=term,
+                                  year=2024, department='Computer Science', fee=0))
+            db.session.add(CourseMeeting(course_id=course_id, days=days, start_time=parse_time(start),
+                                         end_time=parse_time(end), room=f"Room {course_id}"))
+        db.session.add(Enrollment(student_id=1, course_id=1, status='enrolled'))
+        db.session.add(Enrollment(student_id=1, course_id=3, status='dropped'))
+        db.session.commit()
+        token = create_access_token(identity=1)
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {token}"
+    return client
+
+
+def test_enrolling_into_a_conflict(client):
+    refused = client.post('/api/courses/2/enroll')
+    assert refused.status_code == 409
+    assert refused.get_json()["conflicts"] == [
+        {"course_id": 1, "code": 'CS101', "day": day, "time": '09:00-10:15', "room": 'Room 1'} for day in 'WF']
+
+    # Another term, a meeting that starts as the other ends, and a dropped course's slot are free
+    for course_id in (4, 6, 5):
+        assert client.post(f"/api/courses/{course_id}/enroll").status_code == 201
+
+
+def test_schedule_check_and_cart(client):
+    check = client.post('/api/courses/schedule/check', json={"course_ids": [2, 3, 5, 4, 99]}).get_json()
+    assert not check["ok"]
+    assert [(r["course_id"], r["ok"]) for r in check["results"]] == \
+        [(2, False), (3, True), (5, False), (4, True), (99, False)]
+    # CS105 clashes with CS103 from earlier in the cart, not with the timetable
+    assert {c["code"] for c in check["results"][2]["conflicts"]} == {'CS103'}
+
+    # An atomic cart with a conflict inside it enrolls nothing
+    atomic = client.post('/api/courses/enroll/batch', json={"course_ids": [3, 5], "mode": 'atomic'})
+    assert atomic.status_code == 409
+
+    cart = client.post('/api/courses/enroll/batch', json={"course_ids": [3, 5, 6], "mode": 'best_effort'})
+    assert cart.status_code == 201
+    assert cart.get_json()["enrolled"] == [3, 6]
+    results = {r["course_id"]: r for r in cart.get_json()["results"]}
+    assert results[5]["error"] == 'Schedule conflict'
+    assert [c["code"] for c in results[5]["conflicts"]] == ['CS103', 'CS103']
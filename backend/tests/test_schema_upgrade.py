@@ -0,0 +1,52 @@
+# create_all() upgrades a database created by the baseline release
+# (instance/university.db): columns and indexes added to existing tables since
+# then are created, and running it again changes nothing.
+import os
+import shutil
+import sqlite3
+from sqlalchemy import inspect
+from flask_jwt_extended import create_access_token
+from models import db
+from tenancy import create_all
+
+BASELINE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'university.db')
+
+
+def baseline_database(path):
+    shutil.copy(BASELINE_DB, path)
+    with sqlite3.connect(path) as conn:
+        conn.execute("INSERT INTO users (id, email, password_hash, name, role) "
+                     "VALUES (1, 'student@university.edu', 'x', 'Student', 'student')")
+        conn.execute("INSERT INTO courses (id, code, title, credits, capacity, term, year, status, department, fee) "
+                     "VALUES (1, 'CS101', 'Algorithms', 3, 30, 'Fall', 2024, 'active', 'Computer Science', 0)")
+        conn.execute("INSERT INTO enrollments (student_id, course_id, status) VALUES (1, 1, 'enrolled')")
+        conn.execute("INSERT INTO assignments (id, course_id, title, due_date, points, weight) "
+                     "VALUES (1, 1, 'Homework', '2024-10-01 00:00:00', 100, 1.0)")
+
+
+def submit(app):
+    with app.app_context():
+        token = create_access_token(identity=1)
+    return app.test_client().post('/api/students/1/submissions', json={"assignment_id": 1, "content": "answer"},
+                                  headers={"Authorization": f"Bearer {token}"})
+
+
+def test_upgrade_baseline_database(make_app, tmp_path):
+    path = str(tmp_path / 'university.db')
+    baseline_database(path)
+    app = make_app(SQLALCHEMY_DATABASE_URI=f"sqlite:///{path}")
+
+    # The models already expect the new submission columns
+    assert submit(app).status_code == 500
+
+    create_all(app)
+    create_all(app)
+    assert submit(app).status_code == 201
+
+    with app.app_context():
+        inspector = inspect(db.engine)
+        columns = {c['name'] for c in inspector.get_columns('submissions')}
+        assert {'file_name', 'content_type', 'file_size', 'content_hash'} <= columns
+        for table in ('enrollments', 'assignments', 'grades', 'submissions'):
+            indexes = {i['name'] for i in inspector.get_indexes(table)}
+            assert {i.name for i in db.metadata.tables[table].indexes} <= indexes
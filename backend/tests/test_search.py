@@ -0,0 +1,89 @@
+# Ranked course search (GET /api/courses/search, search.py) on both index
+# backends: SQLite FTS5 and the in-memory inverted index used elsewhere.
+# Ranking, paging through results and picking up created or edited courses.
+import pytest
+from flask_jwt_extended import create_access_token
+from models import db, User, Course
+from tenancy import create_all
+import search
+
+SEMINARS = 25
+
+
+def add_course(code, title, description='', department='Computer Science'):
+    db.session.add(Course(code=code, title=title, description=description, credits=3, capacity=30, term='Fall',
+                          year=2024, department=department, fee=0, status='active'))
+
+
+@pytest.fixture(params=['fts5', 'inverted'])
+def client(request, make_app, monkeypatch):
+    app = make_app()
+    create_all(app)
+    with app.app_context():
+        if request.param == 'fts5' and not search._fts5_available():
+            pytest.skip("SQLite without FTS5")
+        if request.param == 'inverted':
+            monkeypatch.setattr(search, '_fts5_available', lambda: False)
+        db.session.add(User(id=1, email='admin@university.edu', password_hash='x', name='Admin', role='admin'))
+        add_course('CS101', 'Algorithms')
+        add_course('CS201', 'Advanced Algorithms')
+        add_course('MATH150', 'Linear Algebra', description='Algorithms for systems of equations',
+                   department='Mathematics')
+        for i in range(SEMINARS):
+            add_course(f"SEM{i:03d}", f"Research Seminar {i}")
+        db.session.commit()
+        token = create_access_token(identity=1)
+    # Indexes are kept per process; start from an empty one on this database
+    monkeypatch.setattr(search, '_indexes', {})
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {token}"
+    with app.app_context():
+        assert search.get_index().name == request.param
+    return client
+
+
+def find(client, q, **params):
+    return client.get('/api/courses/search', query_string={"q": q, **params}).get_json()
+
+
+def codes(answer):
+    return [result["code"] for result in answer["results"]]
+
+
+def test_ranking(client):
+    answer = find(client, 'algorithms')
+    assert answer["total"] == 3
+    # Title matches rank above a description match, ties by code
+    assert codes(answer) == ['CS101', 'CS201', 'MATH150']
+    scores = [result["score"] for result in answer["results"]]
+    assert scores == sorted(scores, reverse=True)
+
+    # A code match outranks everything, and every term has to match (as a prefix)
+    assert codes(find(client, 'cs201')) == ['CS201']
+    assert codes(find(client, 'adv algo')) == ['CS201']
+    assert codes(find(client, 'algorithms', department='Mathematics')) == ['MATH150']
+    assert find(client, 'algorithms zebra') == {"query": 'algorithms zebra', "total": 0, "results": []}
+
+
+def test_pages(client):
+    everything = find(client, 'seminar', limit=100)
+    assert everything["total"] == SEMINARS
+    pages = [find(client, 'seminar', limit=10, offset=offset) for offset in (0, 10, 20)]
+    assert [len(page["results"]) for page in pages] == [10, 10, 5]
+    assert all(page["total"] == SEMINARS for page in pages)
+    assert sum((codes(page) for page in pages), []) == codes(everything)
+
+    past_the_end = find(client, 'seminar', limit=10, offset=40)
+    assert (past_the_end["total"], past_the_end["results"]) == (SEMINARS, [])
+
+
+def test_created_and_edited_courses_are_found(client):
+    created = client.post('/api/courses/', json={
+        "code": 'PHYS300', "title": 'Quantum Computing', "credits": 3, "capacity": 20, "term": 'Fall',
+        "year": 2024, "department": 'Physics', "fee": 0, "create_contract": False})
+    assert created.status_code == 201
+    assert codes(find(client, 'quantum')) == ['PHYS300']
+
+    assert client.put('/api/courses/1', json={"title": 'Data Structures'}).status_code == 200
+    assert codes(find(client, 'algorithms')) == ['CS201', 'MATH150']
+    assert codes(find(client, 'structures')) == ['CS101']
@@ -0,0 +1,114 @@
+# Grouped enrollment transfers (smart_contracts.enroll_students) against the
+# in-memory algod from benchmarks/fake_algod.py: a failed group must not cost
+# the groups that already confirmed their transaction IDs, and a node that
+# does not answer still counts against the circuit breaker, while one that is
+# merely slow to confirm does not. Also the input
+# checks of the admin endpoints that queue chain jobs.
+import json
+import base64
+import pytest
+from algosdk import account
+from flask_jwt_extended import create_access_token
+from benchmarks.fake_algod import FakeAlgod, FakeIndexer
+from chain_guard import CircuitBreaker, ChainMetrics
+from models import db, User, Course, Job
+from tenancy import create_all
+import chain_guard
+import smart_contracts
+
+ENROLLMENTS = [('100000', student_id, 1) for student_id in range(1, 21)]  # two groups: 16 and 4
+
+
+@pytest.fixture(autouse=True)
+def admin_key(monkeypatch):
+    private_key, _ = account.generate_account()
+    # get_admin_account() expects the base64 of the SDK's base64 private key
+    monkeypatch.setenv('ALGORAND_ADMIN_PRIVATE_KEY', base64.b64encode(private_key.encode()).decode())
+
+
+@pytest.fixture
+def algod(make_app, monkeypatch):
+    monkeypatch.setattr(chain_guard, 'breaker', CircuitBreaker(failure_threshold=5, reset_timeout=60))
+    monkeypatch.setattr(chain_guard, 'metrics', ChainMetrics())
+    algod = FakeAlgod()
+    monkeypatch.setattr(smart_contracts, 'get_algod_client', lambda: algod)
+    monkeypatch.setattr(smart_contracts, 'get_indexer_client', lambda: FakeIndexer(algod))
+    app = make_app()
+    create_all(app)
+    with app.app_context():
+        yield algod
+
+
+@pytest.mark.parametrize('failure', ['reject', 'timeout'])
+def test_second_group_failing_keeps_the_first_groups_transactions(algod, failure):
+    algod.failures[2] = failure
+    txids = smart_contracts.enroll_students(ENROLLMENTS)
+
+    assert set(txids) == {(student_id, course_id) for _, student_id, course_id in ENROLLMENTS[:16]}
+    assert set(txids.values()) <= set(algod.ledger)
+    # Only an unanswered send is an outage; a rejected group is the node answering
+    assert chain_guard.breaker.consecutive_failures == (1 if failure == 'timeout' else 0)
+
+
+def test_open_breaker_stops_before_the_next_group(algod):
+    algod.failures[1] = 'timeout'
+    chain_guard.breaker.failure_threshold = 1
+    assert smart_contracts.enroll_students(ENROLLMENTS) == {}
+    assert algod.sends == 1
+    assert chain_guard.breaker.state == 'open'
+
+
+# Only the send can trip the breaker: a group that is slow to confirm is the
+# node answering, and the breaker's timeout never covers the whole sequence
+@pytest.mark.parametrize('failure, outages', [(None, 0), ('lose', 0), ('timeout', 1)])
+def test_course_contract_guards_each_call(algod, failure, outages):
+    if failure:
+        algod.failures[1] = failure
+    course = Course(code='CS101', title='Algorithms', credits=3, capacity=30, term='Fall', year=2024,
+                    department='Computer Science', fee=0)
+    db.session.add(course)
+    db.session.commit()
+
+    address = smart_contracts.create_course_contract(course)
+    assert (address is not None) == (failure is None)
+    assert chain_guard.breaker.consecutive_failures == outages
+    operations = set(chain_guard.metrics.snapshot())
+    assert operations == {'contract_lookup', 'contract_params', 'contract_send'} | \
+        ({'contract_confirm'} if failure != 'timeout' else set())
+
+
+@pytest.fixture
+def admin(make_app):
+    app = make_app()
+    create_all(app)
+    with app.app_context():
+        db.session.add(User(id=1, email='admin@university.edu', password_hash='x', name='Admin', role='admin'))
+        db.session.commit()
+        token = create_access_token(identity=1)
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {token}"
+    return app, client
+
+
+@pytest.mark.parametrize('body, error', [
+    ({"workers": 'abc'}, "workers must be an integer"),
+    ({"workers": None}, "workers must be an integer"),
+    ({"from_round": 'latest'}, "from_round must be an integer"),
+    ({"from_round": [1]}, "from_round must be an integer"),
+    ({"from_round": -1}, "from_round must not be negative"),
+    ([4], "Request body must be a JSON object"),
+])
+def test_mirror_sync_rejects_bad_input(admin, body, error):
+    app, client = admin
+    response = client.post('/api/blockchain/mirror/sync', json=body)
+    assert (response.status_code, response.get_json()) == (400, {"error": error})
+    with app.app_context():
+        assert Job.query.count() == 0
+
+
+def test_mirror_sync_queues_a_job(admin):
+    app, client = admin
+    response = client.post('/api/blockchain/mirror/sync', json={"workers": '64', "from_round": 1200})
+    assert response.status_code == 202
+    with app.app_context():
+        assert json.loads(Job.query.one().payload) == {"workers": 32, "from_round": 1200}
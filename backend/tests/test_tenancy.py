@@ -0,0 +1,144 @@
+# A database per institution (tenancy.py, db_routing.py). Each database
+# holds the same user ids with different names, so an answer from the wrong
+# one shows. Covers how a request picks its institution (token claim vs Host
+# header), refusing a token on another institution's host, writes landing in
+# one database only, and the cross-institution reports being for admins of
+# the default database only.
+import sqlite3
+import pytest
+from werkzeug.security import generate_password_hash
+from models import db, User, Course, Enrollment
+from tenancy import TenantError, choose_tenant, create_all, tenant_context
+import analytics
+import events
+
+PASSWORD = 'secret'
+TENANTS = ('north', 'south')
+HOSTS = {'north.university.test': 'north', 'south.university.test': 'south'}
+
+
+@pytest.fixture
+def tenants(make_app, tmp_path):
+    paths = {None: tmp_path / 'primary.db'}
+    paths.update({tenant: tmp_path / f"{tenant}.db" for tenant in TENANTS})
+    app = make_app(TENANT_DATABASE_URLS={tenant: f"sqlite:///{paths[tenant]}" for tenant in TENANTS},
+                   TENANT_HOSTS=HOSTS)
+    create_all(app)
+    password_hash = generate_password_hash(PASSWORD)
+    # One more course and student per institution, so the counts differ too
+    for n, tenant in enumerate((None,) + TENANTS, start=1):
+        label = tenant or 'default'
+        with tenant_context(app, tenant):
+            db.session.add(User(id=1, email='admin@university.edu', password_hash=password_hash,
+                                name=f"Admin {label}", role='admin'))
+            for i in range(n):
+                db.session.add(User(id=2 + i, email=f"student{i}@university.edu", password_hash=password_hash,
+                                    name=f"Student {label}", role='student'))
+                db.session.add(Course(id=1 + i, code=f"CS{101 + i}", title='Algorithms', credits=3, capacity=30,
+                                      term='Fall', year=2024, department='Computer Science', fee=0, status='active'))
+            db.session.commit()
+    analytics.cache.clear()
+    return app, paths
+
+
+def host(tenant):
+    return next((h for h, t in HOSTS.items() if t == tenant), 'localhost')
+
+
+def login(client, tenant, email='student0@university.edu'):
+    response = client.post('/api/auth/login', json={"email": email, "password": PASSWORD},
+                           base_url=f"http://{host(tenant)}")
+    assert response.status_code == 200
+    return response.get_json()["access_token"]
+
+
+def get(client, path, token, on=None):
+    return client.get(path, headers={"Authorization": f"Bearer {token}"}, base_url=f"http://{host(on)}")
+
+
+def test_choose_tenant():
+    config = {'TENANT_HOSTS': HOSTS, 'TENANT_CLAIM': 'tenant',
+              'TENANT_DATABASE_URLS': {tenant: 'sqlite://' for tenant in TENANTS}}
+    # Without a token the Host header decides, port and case aside
+    assert choose_tenant(config, 'North.University.test:443', None) == 'north'
+    assert choose_tenant(config, 'localhost', None) is None
+    assert choose_tenant(config, None, None) is None
+    # With one, its claim decides, on its own host or an unmapped one
+    assert choose_tenant(config, 'north.university.test', {'tenant': 'north'}) == 'north'
+    assert choose_tenant(config, 'localhost', {'tenant': 'south'}) == 'south'
+    assert choose_tenant(config, 'localhost', {}) is None
+
+    for host_name, claims, status in [('north.university.test', {'tenant': 'south'}, 403),
+                                      ('north.university.test', {}, 403),
+                                      ('localhost', {'tenant': 'east'}, 401)]:
+        with pytest.raises(TenantError) as info:
+            choose_tenant(config, host_name, claims)
+        assert info.value.status == status
+
+
+def test_tokens_read_their_own_institution(tenants):
+    app, _ = tenants
+    client = app.test_client()
+    tokens = {tenant: login(client, tenant) for tenant in (None,) + TENANTS}
+
+    for courses, (tenant, token) in enumerate(tokens.items(), start=1):
+        label = tenant or 'default'
+        assert get(client, '/api/profile', token, on=tenant).get_json()["name"] == f"Student {label}"
+        # The claim alone is enough off the institution's own host
+        assert get(client, '/api/profile', token).get_json()["name"] == f"Student {label}"
+        assert len(get(client, '/api/courses/', token, on=tenant).get_json()) == courses
+
+    # Never on another institution's host: user ids repeat across databases
+    assert get(client, '/api/profile', tokens['north'], on='south').status_code == 403
+    assert get(client, '/api/profile', tokens[None], on='north').status_code == 403
+
+
+def test_writes_stay_in_their_institution(tenants):
+    app, paths = tenants
+    client = app.test_client()
+    token = login(client, 'south')
+
+    def counts():
+        result = {}
+        for tenant, path in paths.items():
+            with sqlite3.connect(path) as conn:
+                result[tenant] = conn.execute(f"SELECT COUNT(*) FROM {Enrollment.__tablename__}").fetchone()[0]
+        return result
+
+    before = counts()
+    response = client.post('/api/courses/1/enroll', headers={"Authorization": f"Bearer {token}"},
+                           base_url=f"http://{host('south')}")
+    assert response.status_code == 201
+    after = counts()
+    assert {tenant: after[tenant] - before[tenant] for tenant in paths} == {None: 0, 'north': 0, 'south': 1}
+
+    # Event channels are kept apart too: course 1 exists in every database
+    with tenant_context(app, 'south'):
+        assert events.course_channel(1) == 'south:course:1'
+    with app.app_context():
+        assert events.course_channel(1) == 'course:1'
+
+
+def test_reports_across_institutions_are_for_platform_admins(tenants):
+    app, _ = tenants
+    client = app.test_client()
+    admin = login(client, None, 'admin@university.edu')
+
+    summary = get(client, '/api/tenants/summary', admin).get_json()
+    assert summary["complete"]
+    assert {entry["tenant"]: (entry["courses"], entry["students"]) for entry in summary["tenants"]} == \
+        {'default': (1, 1), 'north': (2, 2), 'south': (3, 3)}
+    assert summary["totals"]["courses"] == 6
+
+    terms = get(client, '/api/tenants/terms?term=Fall&year=2024', admin)
+    assert terms.status_code == 200
+    assert [entry["tenant"] for entry in terms.get_json()["tenants"]] == ['default', 'north', 'south']
+    # Each institution's statistics are cached under its own name
+    assert {key[0] for key in analytics.cache._entries} == {None, 'north', 'south'}
+
+    # Not for an institution's own admin, nor for a student of the default one
+    campus_admin = login(client, 'north', 'admin@university.edu')
+    student = login(client, None)
+    for path in ('/api/tenants/summary', '/api/tenants/terms?term=Fall&year=2024'):
+        assert get(client, path, campus_admin, on='north').status_code == 403
+        assert get(client, path, student).status_code == 403
@@ -0,0 +1,120 @@
+# Materialized transcripts (transcripts.py): term and cumulative GPA from
+# final grades, kept in sync by the writes that change them (final grades,
+# dropping a graded course), and a full rebuild, in one process or several,
+# giving the same rows as those incremental updates.
+import pytest
+from flask_jwt_extended import create_access_token
+from models import db, User, Course, Enrollment, TranscriptTerm
+from tenancy import create_all
+import transcripts
+
+PROFESSOR = 100
+STUDENTS = 12
+# id: (term, year, credits)
+COURSES = {1: ('Fall', 2023, 3), 2: ('Spring', 2024, 4), 3: ('Fall', 2024, 3), 4: ('Fall', 2024, 2)}
+
+
+def test_compute_transcript():
+    rows = transcripts.compute_transcript(1, [
+        ('Fall', 2024, 3, 'b+'),
+        ('Spring', 2024, 4, 'A'),
+        ('Fall', 2024, 2, ' F '),
+        ('Fall', 2024, 1, 'P'),
+        ('Fall', 2024, 3, 'W'),
+        ('Summer', 2024, 3, None),  # still in progress
+    ])
+    assert [(row["term"], row["year"]) for row in rows] == [('Spring', 2024), ('Fall', 2024)]
+    spring, fall = rows
+    assert (spring["term_gpa"], spring["cumulative_gpa"]) == (4.0, 4.0)
+    # B+ on 3 credits and F on 2: 9.9 quality points over 5 GPA credits; P earns credit only
+    assert fall["courses"] == 4
+    assert (fall["credits_attempted"], fall["credits_earned"], fall["gpa_credits"]) == (6, 4, 5)
+    assert fall["term_gpa"] == round(9.9 / 5, 3)
+    assert fall["cumulative_gpa"] == round((16 + 9.9) / 9, 3)
+    assert (fall["cumulative_credits_attempted"], fall["cumulative_credits_earned"]) == (10, 8)
+
+    assert transcripts.compute_transcript(1, [('Fall', 2024, 3, 'W')])[0]["term_gpa"] is None
+    assert transcripts.compute_transcript(1, []) == []
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    create_all(app)
+    with app.app_context():
+        db.session.add(User(id=PROFESSOR, email='professor@university.edu', password_hash='x', name='Professor',
+                            role='professor'))
+        for course_id, (term, year, credits) in COURSES.items():
+            db.session.add(Course(id=course_id, code=f"CS{course_id}00", title=f"Course {course_id}",
+                                  credits=credits, capacity=STUDENTS, term=term, year=year,
+                                  department='Computer Science', fee=0, instructor_id=PROFESSOR))
+        for student_id in range(1, STUDENTS + 1):
+            db.session.add(User(id=student_id, email=f"student{student_id}@university.edu", password_hash='x',
+                                name=f"Student {student_id}", role='student'))
+            for course_id in COURSES:
+                db.session.add(Enrollment(student_id=student_id, course_id=course_id, status='enrolled'))
+        db.session.commit()
+    return app
+
+
+def client_for(app, user_id):
+    with app.app_context():
+        token = create_access_token(identity=user_id)
+    client = app.test_client()
+    client.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {token}"
+    return client
+
+
+def stored_rows():
+    return sorted((row.student_id, row.year, row.term_order, row.term, row.courses, row.credits_attempted,
+                   row.credits_earned, row.term_gpa, row.cumulative_gpa) for row in TranscriptTerm.query)
+
+
+def fresh_rows():
+    return sorted((row["student_id"], row["year"], row["term_order"], row["term"], row["courses"],
+                   row["credits_attempted"], row["credits_earned"], row["term_gpa"], row["cumulative_gpa"])
+                  for row in transcripts.compute_students(list(range(1, STUDENTS + 1))))
+
+
+def submit(app, course_id, grades):
+    response = client_for(app, PROFESSOR).post(
+        f"/api/professors/{PROFESSOR}/courses/{course_id}/grades",
+        json={"grades": [{"student_id": student_id, "grade": grade} for student_id, grade in grades.items()]})
+    assert response.status_code == 200
+    assert response.get_json()["errors"] == []
+
+
+def test_writes_keep_transcripts_in_sync(app):
+    letters = ['A', 'B', 'C', 'D', 'F', 'A-']
+    for course_id in (1, 2, 3):
+        submit(app, course_id, {s: letters[(s + course_id) % len(letters)] for s in range(1, STUDENTS + 1)})
+    with app.app_context():
+        assert stored_rows() == fresh_rows()
+
+    student = client_for(app, 1)
+    before = student.get('/api/students/1/transcript').get_json()
+    assert [(t["term"], t["year"]) for t in before["terms"]] == [('Fall', 2023), ('Spring', 2024), ('Fall', 2024)]
+
+    # A changed grade and a graded course dropped both show at once
+    submit(app, 1, {1: 'F'})
+    after_grade = student.get('/api/students/1/transcript').get_json()
+    assert after_grade["terms"][0]["term_gpa"] == 0.0
+    assert after_grade["cumulative_gpa"] < before["cumulative_gpa"]
+
+    submit(app, 4, {1: 'A'})
+    assert student.post('/api/courses/4/drop').status_code == 200
+    with app.app_context():
+        assert stored_rows() == fresh_rows()
+    assert student.get('/api/students/1/transcript').get_json() == after_grade
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_rebuild_matches_incremental_updates(app, workers):
+    for course_id in COURSES:
+        submit(app, course_id, {s: 'ABCDF'[(s * course_id) % 5] for s in range(1, STUDENTS + 1)})
+    with app.app_context():
+        incremental = stored_rows()
+        assert len(incremental) == STUDENTS * 3
+        result = transcripts.rebuild_all(workers=workers, batch_size=5)
+        assert (result["students"], result["rows"]) == (STUDENTS, len(incremental))
+        assert stored_rows() == incremental
@@ -0,0 +1,212 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import datetime
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import delete, insert
+from models import db, User, Course, Enrollment, TranscriptTerm
+from tenancy import primary_engine, tenant_context, create_all
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# 4.0 scale; grades not listed here (P, W, I, ...) carry no GPA weight
+GRADE_POINTS = {
+    'A+': 4.0, 'A': 4.0, 'A-': 3.7,
+    'B+': 3.3, 'B': 3.0, 'B-': 2.7,
+    'C+': 2.3, 'C': 2.0, 'C-': 1.7,
+    'D+': 1.3, 'D': 1.0, 'D-': 0.7,
+    'F': 0.0,
+}
+# Grades that earn credit without affecting GPA
+PASS_GRADES = {'P', 'S', 'CR'}
+# Order of terms within a year; unknown term names sort after these
+TERM_ORDER = {'Winter': 0, 'Spring': 1, 'Summer': 2, 'Fall': 3}
+
+REBUILD_BATCH_SIZE = 2000
+
+
+def term_order(term):
+    return TERM_ORDER.get(term, len(TERM_ORDER))
+
+
+def _gpa(quality_points, credits):
+    return round(quality_points / credits, 3) if credits else None
+
+
+# Build transcript rows for one student from [(term, year, credits, grade)].
+# Ungraded courses are still in progress and are left out entirely.
+def compute_transcript(student_id, courses):
+    terms = {}
+    for term, year, credits, grade in courses:
+        if not grade:
+            continue
+        grade = grade.strip().upper()
+        key = (year, term_order(term), term)
+        row = terms.get(key)
+        if row is None:
+            row = terms[key] = dict(student_id=student_id, term=term, year=year, term_order=key[1], courses=0,
+                                    credits_attempted=0, credits_earned=0, gpa_credits=0, quality_points=0.0)
+        row["courses"] += 1
+        if grade in GRADE_POINTS:
+            row["credits_attempted"] += credits
+            row["gpa_credits"] += credits
+            row["quality_points"] += GRADE_POINTS[grade] * credits
+            if grade != 'F':
+                row["credits_earned"] += credits
+        elif grade in PASS_GRADES:
+            row["credits_attempted"] += credits
+            row["credits_earned"] += credits
+
+    rows = []
+    attempted = earned = gpa_credits = 0
+    quality_points = 0.0
+    now = datetime.datetime.utcnow()
+    for key in sorted(terms):
+        row = terms[key]
+        attempted += row["credits_attempted"]
+        earned += row["credits_earned"]
+        gpa_credits += row["gpa_credits"]
+        quality_points += row["quality_points"]
+        row.update(
+            term_gpa=_gpa(row["quality_points"], row["gpa_credits"]),
+            cumulative_credits_attempted=attempted,
+            cumulative_credits_earned=earned,
+            cumulative_gpa_credits=gpa_credits,
+            cumulative_quality_points=quality_points,
+            cumulative_gpa=_gpa(quality_points, gpa_credits),
+            updated_at=now
+        )
+        rows.append(row)
+    return rows
+
+
+# Transcript rows for many students from one query over their enrollments
+def compute_students(student_ids):
+    records = db.session.query(Enrollment.student_id, Course.term, Course.year, Course.credits, Enrollment.grade) \
+        .join(Course, Course.id == Enrollment.course_id) \
+        .filter(Enrollment.student_id.in_(student_ids), Enrollment.status != 'dropped',
+                Enrollment.grade.isnot(None)) \
+        .all()
+
+    by_student = {student_id: [] for student_id in student_ids}
+    for student_id, term, year, credits, grade in records:
+        by_student[student_id].append((term, year, credits, grade))
+
+    rows = []
+    for student_id, courses in by_student.items():
+        rows.extend(compute_transcript(student_id, courses))
+    return rows
+
+
+def write_rows(student_ids, rows):
+    db.session.execute(delete(TranscriptTerm).where(TranscriptTerm.student_id.in_(student_ids)))
+    if rows:
+        db.session.execute(insert(TranscriptTerm), rows)
+
+
+# Recompute the transcripts of the given students inside the caller's
+# transaction (e.g. right before submit_final_grades commits), so grades and
+# GPA can never disagree. The caller commits.
+def update_students(student_ids):
+    student_ids = list(set(student_ids))
+    for start in range(0, len(student_ids), REBUILD_BATCH_SIZE):
+        batch = student_ids[start:start + REBUILD_BATCH_SIZE]
+        write_rows(batch, compute_students(batch))
+
+
+def get_transcript(student_id):
+    return TranscriptTerm.query.filter_by(student_id=student_id) \
+        .order_by(TranscriptTerm.year, TranscriptTerm.term_order, TranscriptTerm.term).all()
+
+
+def serialize_term(row):
+    return {
+        "term": row.term,
+        "year": row.year,
+        "courses": row.courses,
+        "credits_attempted": row.credits_attempted,
+        "credits_earned": row.credits_earned,
+        "term_gpa": row.term_gpa,
+        "cumulative_credits_attempted": row.cumulative_credits_attempted,
+        "cumulative_credits_earned": row.cumulative_credits_earned,
+        "cumulative_gpa": row.cumulative_gpa
+    }
+
+
+# Full rebuild. Student ids are split into batches; worker processes compute
+# transcript rows in parallel (read-only), and the parent writes each batch
+# as it arrives, so a single writer never contends with itself on SQLite.
+def rebuild_all(workers=1, batch_size=REBUILD_BATCH_SIZE):
+    student_ids = [row[0] for row in db.session.query(User.id).filter(User.role == 'student').order_by(User.id)]
+    batches = [student_ids[i:i + batch_size] for i in range(0, len(student_ids), batch_size)]
+    started = time.perf_counter()
+
+    db.session.execute(delete(TranscriptTerm))
+    written = 0
+    if workers > 1 and len(batches) > 1:
+        # Fresh interpreters, so no worker inherits the parent's open connections
+        context = multiprocessing.get_context('spawn')
+        database_url = primary_engine().url.render_as_string(hide_password=False)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(database_url,)) as pool:
+            for batch_rows in pool.map(_compute_batch, batches):
+                if batch_rows:
+                    db.session.execute(insert(TranscriptTerm), batch_rows)
+                written += len(batch_rows)
+    else:
+        for batch in batches:
+            batch_rows = compute_students(batch)
+            if batch_rows:
+                db.session.execute(insert(TranscriptTerm), batch_rows)
+            written += len(batch_rows)
+    db.session.commit()
+
+    elapsed = time.perf_counter() - started
+    logger.info(f"Rebuilt transcripts for {len(student_ids)} students ({written} term rows) "
+                f"with {workers} worker(s) in {elapsed:.2f}s")
+    return {"students": len(student_ids), "rows": written, "workers": workers, "seconds": round(elapsed, 3)}
+
+
+_worker_app = None
+
+
+def _init_worker(database_url):
+    global _worker_app
+    os.environ['DATABASE_URL'] = database_url
+    logging.disable(logging.INFO)
+    from app import create_app
+    _worker_app = create_app()
+
+
+def _compute_batch(student_ids):
+    with _worker_app.app_context():
+        try:
+            return compute_students(student_ids)
+        finally:
+            db.session.remove()
+
+
+# python -m transcripts --workers 4
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the materialized transcripts (transcript_terms)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+    parser.add_argument('--tenant', default=None, help="institution from TENANT_DATABASE_URLS (default: DATABASE_URL)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    from app import create_app
+    app = create_app()
+    create_all(app)
+    with tenant_context(app, args.tenant):
+        result = rebuild_all(workers=args.workers, batch_size=args.batch_size)
+    print(result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
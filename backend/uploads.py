@@ -0,0 +1,379 @@
+import os
+import uuid
+import hashlib
+import logging
+import zipfile
+import datetime
+import threading
+import collections
+from flask import current_app, send_file
+from sqlalchemy import update
+from werkzeug.exceptions import ClientDisconnected
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+from models import db, UploadSession
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Form fields sent next to the file are small; anything bigger is rejected
+MAX_FIELD_BYTES = 64 * 1024
+# Headers and boundaries a multipart body may carry on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+# In-process SHA-256 states of open sessions, so a resumed chunk does not re-hash the partial file
+HASHER_CACHE_SIZE = 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+    def payload(self):
+        return {"error": self.message, **self.extra}
+
+
+def init_uploads(app):
+    app.config.setdefault('UPLOAD_FOLDER', os.path.join(app.instance_path, 'uploads'))
+    app.config.setdefault('UPLOAD_MAX_BYTES', 100 * 1024 * 1024)
+    app.config.setdefault('UPLOAD_CHUNK_SIZE', 64 * 1024)
+    app.config.setdefault('UPLOAD_SESSION_TTL', 24 * 3600)
+
+    for folder in ('objects', 'partial'):
+        os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], folder), exist_ok=True)
+    logger.info(f"Upload storage: {app.config['UPLOAD_FOLDER']}")
+
+
+def _folder(*parts):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], *parts)
+
+
+# Content-addressed store: objects/<first two hex digits>/<sha256>
+def object_path(content_hash):
+    return _folder('objects', content_hash[:2], content_hash)
+
+
+def partial_path(upload_id):
+    return _folder('partial', upload_id)
+
+
+# Move a finished partial file into the store. Identical content is stored
+# once: if the object already exists the partial copy is simply removed.
+# Returns True when a new object was written.
+def store_object(path, content_hash):
+    target = object_path(content_hash)
+    if os.path.exists(target):
+        os.remove(path)
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+    return True
+
+
+def discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# Writes chunks to an open file while hashing and counting them. The hash
+# only ever covers bytes that reached the file.
+class _Sink:
+    def __init__(self, out, hasher, limit, written=0):
+        self.out = out
+        self.hasher = hasher
+        self.limit = limit
+        self.written = written
+
+    def write(self, chunk):
+        if self.written + len(chunk) > self.limit:
+            raise UploadError("File too large", 413, max_bytes=self.limit)
+        self.out.write(chunk)
+        self.hasher.update(chunk)
+        self.written += len(chunk)
+
+
+# Stream a multipart/form-data request with a single file part straight to a
+# partial file, in UPLOAD_CHUNK_SIZE reads, hashing as it goes. Nothing but
+# the small form fields is held in memory. Returns the file's metadata, the
+# form fields and the partial path; the caller stores or discards it.
+def receive_multipart(request):
+    config = current_app.config
+    max_bytes = config['UPLOAD_MAX_BYTES']
+    mimetype, options = parse_options_header(request.headers.get('Content-Type', ''))
+    if mimetype != 'multipart/form-data' or not options.get('boundary'):
+        raise UploadError("Expected a multipart/form-data body")
+    if request.content_length and request.content_length > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadError("File too large", 413, max_bytes=max_bytes)
+
+    # The decoder's own max_form_memory_size caps its whole buffer, file data
+    # included, so field sizes are checked below instead
+    decoder = MultipartDecoder(options['boundary'].encode())
+    path = partial_path(uuid.uuid4().hex)
+    fields = {}
+    field_name = None
+    field_data = []
+    field_size = 0
+    upload = None
+    sink = None
+    out = None
+    try:
+        while True:
+            chunk = request.stream.read(config['UPLOAD_CHUNK_SIZE'])
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, File):
+                    if out is not None:
+                        raise UploadError("Only one file can be uploaded at a time")
+                    out = open(path, 'wb')
+                    sink = _Sink(out, hashlib.sha256(), max_bytes)
+                    field_name = None
+                    upload = {"file_name": os.path.basename(event.filename or '') or 'upload',
+                              "content_type": event.headers.get('Content-Type')}
+                elif isinstance(event, Field):
+                    field_name = event.name
+                    field_data = []
+                    field_size = 0
+                elif isinstance(event, Data):
+                    if field_name is None:
+                        sink.write(event.data)
+                    else:
+                        field_size += len(event.data)
+                        if field_size > MAX_FIELD_BYTES:
+                            raise UploadError("Form field too large", 413)
+                        field_data.append(event.data)
+                        if not event.more_data:
+                            fields[field_name] = b''.join(field_data).decode('utf-8', 'replace')
+                event = decoder.next_event()
+            if isinstance(event, Epilogue) or not chunk:
+                break
+    except ValueError:
+        discard(path)
+        raise UploadError("Malformed multipart body")
+    except (UploadError, ClientDisconnected):
+        discard(path)
+        raise
+    finally:
+        if out is not None:
+            out.close()
+
+    if upload is None:
+        raise UploadError("No file in upload")
+    upload.update(size=sink.written, content_hash=sink.hasher.hexdigest(), path=path, fields=fields)
+    return upload
+
+
+_hashers = collections.OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def _remember_hasher(upload_id, offset, hasher):
+    with _hashers_lock:
+        _hashers[upload_id] = (offset, hasher)
+        _hashers.move_to_end(upload_id)
+        while len(_hashers) > HASHER_CACHE_SIZE:
+            _hashers.popitem(last=False)
+
+
+# SHA-256 state for the bytes received so far: taken from this process's
+# cache, or rebuilt from the partial file after a restart or when the
+# previous chunk went to another worker
+def _take_hasher(upload):
+    with _hashers_lock:
+        cached = _hashers.pop(upload.id, None)
+    if cached and cached[0] == upload.received:
+        return cached[1]
+
+    hasher = hashlib.sha256()
+    remaining = upload.received
+    chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+    with open(partial_path(upload.id), 'rb') as partial:
+        while remaining:
+            chunk = partial.read(min(chunk_size, remaining))
+            if not chunk:
+                raise UploadError("Partial upload is missing data; start a new upload", 410)
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher
+
+
+def expired(upload):
+    return upload.expires_at < datetime.datetime.utcnow()
+
+
+# Drop open sessions past their expiry, with their partial files
+def prune_sessions():
+    stale = UploadSession.query.filter(UploadSession.status == 'open',
+                                       UploadSession.expires_at < datetime.datetime.utcnow()).all()
+    for upload in stale:
+        discard(partial_path(upload.id))
+        upload.status = 'expired'
+    if stale:
+        logger.info(f"Expired {len(stale)} upload sessions")
+
+
+# Start a resumable upload of a file of known size; the caller commits
+def create_session(student_id, assignment_id, file_name, size, content_type=None):
+    max_bytes = current_app.config['UPLOAD_MAX_BYTES']
+    if not isinstance(size, int) or size < 0:
+        raise UploadError("size must be a non-negative integer")
+    if size > max_bytes:
+        raise UploadError("File too large", 413, max_bytes=max_bytes)
+
+    prune_sessions()
+    now = datetime.datetime.utcnow()
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        student_id=student_id,
+        assignment_id=assignment_id,
+        file_name=os.path.basename(file_name or '') or 'upload',
+        content_type=content_type,
+        size=size,
+        received=0,
+        status='open',
+        expires_at=now + datetime.timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+    )
+    db.session.add(upload)
+    open(partial_path(upload.id), 'wb').close()
+    return upload
+
+
+# Append the request body to an open session at the given offset. The body
+# is streamed to the partial file chunk by chunk; if the client disconnects
+# midway, the bytes that arrived are recorded so the upload resumes from there.
+# Once every declared byte is in, the file is hashed, moved into the store
+# and the session marked completed. The caller commits.
+def append_chunk(upload, offset, stream):
+    if upload.status != 'open':
+        raise UploadError(f"Upload is {upload.status}", 409)
+    if expired(upload):
+        raise UploadError("Upload session expired", 410)
+    if offset != upload.received:
+        raise UploadError("Upload offset mismatch", 409, offset=upload.received)
+
+    hasher = _take_hasher(upload)
+    chunk_size = current_app.config['UPLOAD_CHUNK_SIZE']
+    with open(partial_path(upload.id), 'r+b') as out:
+        # Anything past the committed offset is left over from an interrupted request
+        out.seek(offset)
+        out.truncate()
+        sink = _Sink(out, hasher, upload.size, offset)
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                sink.write(chunk)
+        except ClientDisconnected:
+            # Keep what arrived; the client resumes from the new offset
+            pass
+        except UploadError as e:
+            if e.status == 413:
+                e.message = "Chunk exceeds the declared upload size"
+                e.extra = {"size": upload.size, "offset": offset}
+            raise
+
+    # Only one request may advance a given offset
+    claimed = db.session.execute(
+        update(UploadSession)
+        .where(UploadSession.id == upload.id, UploadSession.received == offset, UploadSession.status == 'open')
+        .values(received=sink.written, updated_at=datetime.datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        raise UploadError("Upload was modified concurrently", 409)
+    upload.received = sink.written
+
+    if upload.received == upload.size:
+        upload.content_hash = hasher.hexdigest()
+        upload.status = 'completed'
+        store_object(partial_path(upload.id), upload.content_hash)
+    else:
+        _remember_hasher(upload.id, upload.received, hasher)
+    return upload
+
+
+def abort_session(upload):
+    if upload.status == 'open':
+        upload.status = 'aborted'
+        with _hashers_lock:
+            _hashers.pop(upload.id, None)
+        discard(partial_path(upload.id))
+
+
+# Response for a stored object. send_file hands the open file to the
+# server's wsgi.file_wrapper (sendfile(2) under gunicorn), or to the front-end
+# proxy with USE_X_SENDFILE, and answers Range and If-None-Match requests.
+def send_object(content_hash, file_name, content_type=None):
+    path = object_path(content_hash)
+    if not os.path.exists(path):
+        logger.error(f"Stored object {content_hash} is missing")
+        return None
+    return send_file(path, mimetype=content_type or 'application/octet-stream', as_attachment=True,
+                     download_name=file_name or content_hash, etag=content_hash, conditional=True,
+                     max_age=0)
+
+
+# Write-only file object that hands whatever zipfile wrote back to the generator
+class _ZipBuffer:
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+# Zip archive generated on the fly from [(name, path_or_bytes, datetime)].
+# Nothing is staged on disk: each member is read in UPLOAD_CHUNK_SIZE pieces
+# and yielded as it is compressed (or stored), and zipfile writes data
+# descriptors because the output cannot seek. Entries are stored rather
+# than deflated by default, since submissions are mostly compressed formats.
+def stream_zip(entries, compress=False, chunk_size=64 * 1024):
+    buffer = _ZipBuffer()
+    method = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(buffer, 'w', compression=method, allowZip64=True) as archive:
+        for name, source, modified in entries:
+            info = zipfile.ZipInfo(name, date_time=(modified or datetime.datetime.utcnow()).timetuple()[:6])
+            info.compress_type = method
+            # A known size lets zipfile decide whether the member needs ZIP64 fields
+            info.file_size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+            with archive.open(info, 'w') as member:
+                if isinstance(source, bytes):
+                    member.write(source)
+                else:
+                    with open(source, 'rb') as data:
+                        for chunk in iter(lambda: data.read(chunk_size), b''):
+                            member.write(chunk)
+                            output = buffer.drain()
+                            if output:
+                                yield output
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def serialize_session(upload):
+    return {
+        "upload_id": upload.id,
+        "assignment_id": upload.assignment_id,
+        "file_name": upload.file_name,
+        "content_type": upload.content_type,
+        "size": upload.size,
+        "offset": upload.received,
+        "status": upload.status,
+        "content_hash": upload.content_hash,
+        "chunk_size": current_app.config['UPLOAD_CHUNK_SIZE'],
+        "expires_at": upload.expires_at.isoformat()
+    }
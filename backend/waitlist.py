@@ -0,0 +1,205 @@
+import logging
+import datetime
+from sqlalchemy import func
+from models import db, Course, Enrollment, WaitlistEntry
+from scheduling import find_conflicts
+from smart_contracts import enroll_student
+import events
+import transcripts
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class WaitlistError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def occupied_seats(course_id):
+    return db.session.query(func.count(Enrollment.id)) \
+        .filter(Enrollment.course_id == course_id, Enrollment.status != 'dropped') \
+        .scalar()
+
+
+def waiting_entries(course_id):
+    return WaitlistEntry.query.filter_by(course_id=course_id, status='waiting').order_by(WaitlistEntry.id)
+
+
+def waiting_entry(student_id, course_id):
+    return WaitlistEntry.query.filter_by(student_id=student_id, course_id=course_id, status='waiting').first()
+
+
+# 1-based FIFO position; entry ids are assigned in join order
+def position(entry):
+    return db.session.query(func.count(WaitlistEntry.id)) \
+        .filter(WaitlistEntry.course_id == entry.course_id,
+                WaitlistEntry.status == 'waiting',
+                WaitlistEntry.id <= entry.id) \
+        .scalar()
+
+
+# Seats and waitlist length for one course in a single query
+def seat_status(course):
+    enrolled, waiting = db.session.query(
+        db.select(func.count(Enrollment.id))
+        .where(Enrollment.course_id == course.id, Enrollment.status != 'dropped')
+        .scalar_subquery(),
+        db.select(func.count(WaitlistEntry.id))
+        .where(WaitlistEntry.course_id == course.id, WaitlistEntry.status == 'waiting')
+        .scalar_subquery()
+    ).one()
+    return {
+        "course_id": course.id,
+        "capacity": course.capacity,
+        "enrolled": enrolled,
+        "available": max(course.capacity - enrolled, 0),
+        "waitlist": waiting
+    }
+
+
+def seat_statuses(course_ids):
+    occupied = dict(db.session.query(Enrollment.course_id, func.count(Enrollment.id))
+                    .filter(Enrollment.course_id.in_(course_ids), Enrollment.status != 'dropped')
+                    .group_by(Enrollment.course_id).all())
+    waiting = dict(db.session.query(WaitlistEntry.course_id, func.count(WaitlistEntry.id))
+                   .filter(WaitlistEntry.course_id.in_(course_ids), WaitlistEntry.status == 'waiting')
+                   .group_by(WaitlistEntry.course_id).all())
+    return [{
+        "course_id": course.id,
+        "capacity": course.capacity,
+        "enrolled": occupied.get(course.id, 0),
+        "available": max(course.capacity - occupied.get(course.id, 0), 0),
+        "waitlist": waiting.get(course.id, 0)
+    } for course in Course.query.filter(Course.id.in_(course_ids)).order_by(Course.id)]
+
+
+def join(student_id, course):
+    if course.status != 'active':
+        raise WaitlistError("Course is not active for enrollment")
+
+    enrollment = Enrollment.query.filter_by(student_id=student_id, course_id=course.id).first()
+    if enrollment and enrollment.status != 'dropped':
+        raise WaitlistError("Already enrolled in this course", 409)
+    if waiting_entry(student_id, course.id):
+        raise WaitlistError("Already on the waitlist for this course", 409)
+    if occupied_seats(course.id) < course.capacity and not waiting_entries(course.id).first():
+        raise WaitlistError("Course has open seats; enroll directly", 409)
+
+    conflicts = find_conflicts(student_id, course)
+    if conflicts:
+        error = WaitlistError("Schedule conflict", 409)
+        error.conflicts = conflicts
+        raise error
+
+    entry = WaitlistEntry(course_id=course.id, student_id=student_id, status='waiting')
+    db.session.add(entry)
+    db.session.flush()
+    return entry
+
+
+def leave(student_id, course_id):
+    entry = waiting_entry(student_id, course_id)
+    if not entry:
+        raise WaitlistError("Not on the waitlist for this course", 404)
+    entry.status = 'cancelled'
+    return entry
+
+
+# Fill free seats from the head of the waitlist. Runs inside the caller's
+# transaction, so a drop and the promotion it causes commit (or roll back)
+# together. Each entry is claimed with a conditional UPDATE, so two workers
+# promoting concurrently can never hand the same entry a seat twice; losing a
+# claim recounts the free seats, since the winner may have taken the last one.
+# Returns the enrollments created or reactivated; the caller commits.
+def promote(course):
+    promoted = []
+    if course.status != 'active':
+        return promoted
+
+    available = course.capacity - occupied_seats(course.id)
+    while available > 0:
+        entry = waiting_entries(course.id).first()
+        if entry is None:
+            break
+
+        conflicts = find_conflicts(entry.student_id, course)
+        claimed = db.session.query(WaitlistEntry) \
+            .filter(WaitlistEntry.id == entry.id, WaitlistEntry.status == 'waiting') \
+            .update({"status": 'skipped' if conflicts else 'promoted',
+                     "updated_at": datetime.datetime.utcnow()}, synchronize_session=False)
+        db.session.expire(entry)
+        if not claimed:
+            # Taken by a concurrent promotion, which may have filled the seat counted above
+            available = course.capacity - occupied_seats(course.id)
+            continue
+        if conflicts:
+            # The student's schedule changed since joining
+            continue
+
+        enrollment = Enrollment.query.filter_by(student_id=entry.student_id, course_id=course.id).first()
+        if enrollment:
+            enrollment.status = 'enrolled'
+            enrollment.grade = None
+            enrollment.transaction_id = None
+        else:
+            enrollment = Enrollment(student_id=entry.student_id, course_id=course.id, status='enrolled')
+            db.session.add(enrollment)
+        db.session.flush()
+
+        promoted.append(enrollment)
+        available -= 1
+
+    return promoted
+
+
+# Drop an enrollment and promote the next waiting student in the same transaction
+def drop(enrollment):
+    if enrollment.status == 'dropped':
+        raise WaitlistError("Enrollment is already dropped", 409)
+    if enrollment.status != 'enrolled':
+        raise WaitlistError(f"Cannot drop a {enrollment.status} enrollment")
+
+    enrollment.status = 'dropped'
+    db.session.flush()
+    if enrollment.grade:
+        # A graded course leaves the transcript when dropped
+        transcripts.update_students([enrollment.student_id])
+    return promote(enrollment.course)
+
+
+def enrollment_event(enrollment, course, promoted=False):
+    return {
+        "enrollment_id": enrollment.id,
+        "course_id": course.id,
+        "course_code": course.code,
+        "course_title": course.title,
+        "status": enrollment.status,
+        "promoted": promoted
+    }
+
+
+# After commit: record promotions on chain, tell promoted students and
+# notify seat subscribers
+def after_commit(course, promoted=()):
+    if promoted and course.contract_address:
+        for enrollment in promoted:
+            transaction_id = enroll_student(course.contract_address, enrollment.student_id, course.id)
+            if transaction_id:
+                enrollment.transaction_id = transaction_id
+        db.session.commit()
+
+    if promoted:
+        events.publish_many([
+            (events.user_channel(e.student_id), 'enrollment', enrollment_event(e, course, promoted=True))
+            for e in promoted
+        ])
+    publish_seats(course)
+
+
+def publish_seats(course):
+    try:
+        events.publish(events.course_channel(course.id), 'seats', seat_status(course))
+    except Exception as e:
+        logger.error(f"Error publishing seat update for course {course.id}: {str(e)}")
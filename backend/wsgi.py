@@ -0,0 +1,7 @@
+# Production entry point:
+#   cd backend
+#   flask --app wsgi init-db
+#   gunicorn wsgi:application        (settings in gunicorn.conf.py)
+from app import create_app
+
+application = create_app()